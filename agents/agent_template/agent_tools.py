@@ -180,9 +180,24 @@ def upsert():
     )
 
 
+_world_cache = {"etag": "", "text": ""}
+
+
 def get_world():
-    r = _world_session.get(f"{WORLD_API}/world", timeout=10)
+    # The backend answers 304 while the world is unchanged; reuse the last body then, with the
+    # clock (day, minute_of_day) from the 304's headers since it moves on regardless.
+    # agent_id adds a `nearby` block (agents/landmarks around us) from the backend's spatial index.
+    headers = {"If-None-Match": _world_cache["etag"]} if _world_cache["etag"] else {}
+    r = _world_session.get(f"{WORLD_API}/world", params={"agent_id": AGENT_ID}, headers=headers, timeout=10)
+    if r.status_code == 304 and _world_cache["text"]:
+        world = json.loads(_world_cache["text"])
+        if r.headers.get("X-World-Day") and r.headers.get("X-World-Minute"):
+            world["day"] = int(r.headers["X-World-Day"])
+            world["minute_of_day"] = int(r.headers["X-World-Minute"])
+        return world
     r.raise_for_status()
+    _world_cache["etag"] = r.headers.get("ETag", "")
+    _world_cache["text"] = r.text
     return r.json()
 
 
@@ -249,8 +249,15 @@ def node_perceive(state: AgentState, config: RunnableConfig | None = None) -> Ag
 
     place_id = ""
     nearby_agents: List[dict] = []
+    nearby = w.get("nearby")
     try:
-        if me:
+        if me and isinstance(nearby, dict) and nearby.get("agent_id") == state.get("agent_id"):
+            # Backend already answered the proximity query (GET /world?agent_id=...).
+            place_id = str(nearby.get("place_id") or "")
+            for a in (nearby.get("agents") or []):
+                if int(a.get("distance", 0)) <= 2:
+                    nearby_agents.append({"agent_id": a.get("agent_id"), "x": a.get("x"), "y": a.get("y"), "display_name": a.get("display_name")})
+        elif me:
             ax, ay = int(me.get("x", 0)), int(me.get("y", 0))
             # nearest landmark within 1 tile
             for lm in (w.get("landmarks") or []):
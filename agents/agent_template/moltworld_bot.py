@@ -39,11 +39,23 @@ def _session():
     return s, base
 
 
+_world_cache = {"etag": "", "text": ""}
+
+
 def get_world_state() -> dict:
-    """GET /world: world_size, tick, landmarks, agents, recent_chat."""
+    """GET /world: world_size, tick, landmarks, agents, recent_chat. Sends If-None-Match; a 304 reuses the last body with the clock from its headers."""
     sess, base = _session()
-    r = sess.get(f"{base}/world", timeout=15)
+    headers = {"If-None-Match": _world_cache["etag"]} if _world_cache["etag"] else {}
+    r = sess.get(f"{base}/world", headers=headers, timeout=15)
+    if r.status_code == 304 and _world_cache["text"]:
+        world = json.loads(_world_cache["text"])
+        if r.headers.get("X-World-Day") and r.headers.get("X-World-Minute"):
+            world["day"] = int(r.headers["X-World-Day"])
+            world["minute_of_day"] = int(r.headers["X-World-Minute"])
+        return world
     r.raise_for_status()
+    _world_cache["etag"] = r.headers.get("ETag", "")
+    _world_cache["text"] = r.text
     return r.json()
 
 
@@ -0,0 +1,117 @@
+"""
+Checkpoints of event-sourced projections (jobs, village events, balances).
+
+A checkpoint stores a projection together with the storage cursor of its log
+stream (byte offset for JSONL, row sequence for SQLite) at the moment it was
+taken, so startup can load it and replay only the log tail. Each file carries a
+sha256 checksum of its content plus a token identifying the log data just before
+the cursor; any mismatch makes the loader fall back to an older checkpoint or a
+full replay.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import time
+from pathlib import Path
+from typing import List, Optional
+
+from app.config import CHECKPOINT_KEEP, CHECKPOINTS_DIR
+from app.storage import storage
+
+_log = logging.getLogger(__name__)
+
+CHECKPOINT_VERSION = 2
+
+
+def _checksum(doc: dict) -> str:
+    body = {k: v for k, v in doc.items() if k != "checksum"}
+    raw = json.dumps(body, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def snapshot_checkpoint(name: str, stream: str, payload: dict, schema: str = "") -> dict:
+    """Build a checkpoint document for `payload`, pinned to the current end of `stream`.
+
+    Must be called without yielding to the event loop between building `payload`
+    and this call, so the offset covers exactly the events already applied.
+    """
+    offset = storage.cursor(stream)
+    doc = {
+        "version": CHECKPOINT_VERSION,
+        "name": name,
+        "backend": storage.name,
+        "log": stream,
+        "schema": schema,
+        "offset": offset,
+        "prefix_sha": storage.cursor_token(stream, offset),
+        "created_at": time.time(),
+        "payload": payload,
+    }
+    doc["checksum"] = _checksum(doc)
+    return doc
+
+
+def save_checkpoint(doc: dict) -> Path:
+    CHECKPOINTS_DIR.mkdir(parents=True, exist_ok=True)
+    name = str(doc["name"])
+    path = CHECKPOINTS_DIR / f"{name}-{int(float(doc['created_at']) * 1000):015d}.json"
+    tmp = path.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps(doc, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+    tmp.replace(path)
+    for old in _list_checkpoints(name)[CHECKPOINT_KEEP:]:
+        try:
+            old.unlink()
+        except Exception:
+            _log.debug("Failed to prune checkpoint %s", old, exc_info=True)
+    return path
+
+
+def write_checkpoint(name: str, stream: str, payload: dict, schema: str = "") -> Path:
+    return save_checkpoint(snapshot_checkpoint(name, stream, payload, schema))
+
+
+def _list_checkpoints(name: str) -> List[Path]:
+    if not CHECKPOINTS_DIR.exists():
+        return []
+    return sorted(CHECKPOINTS_DIR.glob(f"{name}-*.json"), reverse=True)
+
+
+def invalidate_checkpoints(name: str) -> int:
+    """Delete all checkpoints for `name` (call after rewriting its log)."""
+    removed = 0
+    for p in _list_checkpoints(name):
+        try:
+            p.unlink()
+            removed += 1
+        except Exception:
+            _log.debug("Failed to remove checkpoint %s", p, exc_info=True)
+    return removed
+
+
+def load_checkpoint(name: str, stream: str, schema: str = "") -> Optional[dict]:
+    """Return the newest checkpoint for `name` that still matches `stream`, or None."""
+    size = storage.cursor(stream)
+    for p in _list_checkpoints(name):
+        try:
+            doc = json.loads(p.read_text(encoding="utf-8"))
+            if not isinstance(doc, dict) or doc.get("checksum") != _checksum(doc):
+                _log.warning("Checkpoint %s failed checksum; ignoring", p.name)
+                continue
+            if doc.get("version") != CHECKPOINT_VERSION or doc.get("schema", "") != schema:
+                continue
+            if doc.get("backend") != storage.name:
+                continue
+            offset = int(doc.get("offset") or 0)
+            if offset > 0 and not doc.get("prefix_sha"):
+                continue
+            if offset > size or storage.cursor_token(stream, offset) != doc.get("prefix_sha", ""):
+                _log.warning("Checkpoint %s does not match %s; ignoring", p.name, stream)
+                continue
+            if not isinstance(doc.get("payload"), dict):
+                continue
+            return doc
+        except Exception:
+            _log.warning("Failed to read checkpoint %s", p, exc_info=True)
+    return None
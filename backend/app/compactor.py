@@ -0,0 +1,301 @@
+"""
+Background compaction and retention for the event-sourced logs.
+
+Retention policies (each knob is off at 0):
+
+    audit, trace   drop rows older than N days, then keep the newest rows within N bytes
+    economy        fold entries older than N days into one carry_forward entry per account
+    jobs           collapse terminal jobs idle for N days into a single snapshot event,
+                   and drop cancelled jobs idle for N days entirely
+
+The rewrite of each log runs in a worker thread via storage.compact(); in-memory
+projections and checkpoints are refreshed on the event loop afterwards.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections import deque
+from dataclasses import asdict, dataclass
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import app.state as _state
+from app import checkpoints
+from app.config import (
+    CHECKPOINTS_ENABLED, COMPACTOR_INTERVAL_SECONDS,
+    RETENTION_AUDIT_MAX_AGE_DAYS, RETENTION_AUDIT_MAX_BYTES,
+    RETENTION_JOBS_CANCELLED_AGE_DAYS, RETENTION_JOBS_TERMINAL_AGE_DAYS,
+    RETENTION_LEDGER_MAX_AGE_DAYS, RETENTION_TRACE_MAX_AGE_DAYS,
+    RETENTION_TRACE_MAX_BYTES,
+)
+from app.models import Job, JobEvent
+from app.storage import storage
+
+_log = logging.getLogger(__name__)
+
+_DAY = 86400.0
+TERMINAL_JOB_STATES = ("approved", "rejected", "cancelled")
+# Checkpoint that must be rebuilt after a stream is rewritten.
+_CHECKPOINT_FOR = {"jobs": "jobs", "economy": "balances"}
+
+
+@dataclass
+class RetentionPolicy:
+    stream: str
+    max_age_seconds: float = 0.0
+    max_bytes: int = 0
+    terminal_age_seconds: float = 0.0
+    cancelled_age_seconds: float = 0.0
+
+    def enabled(self) -> bool:
+        return any(v > 0 for v in (self.max_age_seconds, self.max_bytes, self.terminal_age_seconds, self.cancelled_age_seconds))
+
+
+def policies_from_config() -> List[RetentionPolicy]:
+    return [
+        RetentionPolicy("audit", max_age_seconds=RETENTION_AUDIT_MAX_AGE_DAYS * _DAY, max_bytes=RETENTION_AUDIT_MAX_BYTES),
+        RetentionPolicy("trace", max_age_seconds=RETENTION_TRACE_MAX_AGE_DAYS * _DAY, max_bytes=RETENTION_TRACE_MAX_BYTES),
+        RetentionPolicy("economy", max_age_seconds=RETENTION_LEDGER_MAX_AGE_DAYS * _DAY),
+        RetentionPolicy(
+            "jobs",
+            terminal_age_seconds=RETENTION_JOBS_TERMINAL_AGE_DAYS * _DAY,
+            cancelled_age_seconds=RETENTION_JOBS_CANCELLED_AGE_DAYS * _DAY,
+        ),
+    ]
+
+
+# --- Row transforms (pure; run in the compaction thread) ---
+# Each takes a re-iterable of rows (a list, or the file-backed source of
+# compact_jsonl) and yields the rows to keep, so a log is streamed, not loaded.
+
+def _row_time(r: dict) -> float:
+    try:
+        return float(r.get("created_at") or 0.0)
+    except Exception:
+        return 0.0
+
+
+def drop_expired(rows: Iterable[dict], max_age_seconds: float, max_bytes: int, now: float) -> Iterator[dict]:
+    cutoff = now - max_age_seconds if max_age_seconds > 0 else None
+    live = (r for r in rows if cutoff is None or _row_time(r) >= cutoff)
+    if max_bytes <= 0:
+        yield from live
+        return
+    # The newest rows within max_bytes: a sliding window, so memory is bounded by max_bytes.
+    kept: Deque[Tuple[dict, int]] = deque()
+    total = 0
+    for r in live:
+        size = len(json.dumps(r, ensure_ascii=False).encode("utf-8")) + 1
+        kept.append((r, size))
+        total += size
+        while total > max_bytes:
+            total -= kept.popleft()[1]
+    for r, _ in kept:
+        yield r
+
+
+def carry_forward(rows: Iterable[dict], max_age_seconds: float, now: float) -> Iterator[dict]:
+    """Fold ledger entries older than the cutoff into one carry_forward entry per account.
+
+    Every account seen in the folded entries keeps a row (even at zero) so it is not
+    treated as new, and re-granted a genesis balance, after a restart. Reads `rows`
+    twice (sum the old entries, then emit), so it never holds the log in memory.
+    """
+    if max_age_seconds <= 0:
+        yield from rows
+        return
+    cutoff = now - max_age_seconds
+    net: Dict[str, float] = {}
+    old = 0
+    last_at = 0.0
+    for r in rows:
+        t = _row_time(r)
+        if t >= cutoff:
+            continue
+        old += 1
+        last_at = max(last_at, t)
+        try:
+            amount = float(r.get("amount") or 0.0)
+        except Exception:
+            continue
+        src, dst = str(r.get("from_id") or ""), str(r.get("to_id") or "")
+        if src:
+            net[src] = net.get(src, 0.0) - amount
+        if dst:
+            net[dst] = net.get(dst, 0.0) + amount
+    if len(net) >= old:
+        yield from rows
+        return
+    for aid, amt in sorted(net.items()):
+        yield {
+            "entry_id": f"carry-{aid}-{int(cutoff)}",
+            "entry_type": "carry_forward",
+            "amount": amt,
+            "from_id": "",
+            "to_id": aid,
+            "memo": f"carry forward of ledger before {int(cutoff)}",
+            "created_at": last_at,
+        }
+    for r in rows:
+        if _row_time(r) >= cutoff:
+            yield r
+
+
+def collapse_jobs(
+    rows: Iterable[dict],
+    terminal_age_seconds: float,
+    cancelled_age_seconds: float,
+    now: float,
+    purge: Optional[Set[str]] = None,
+    dropped: Optional[Set[str]] = None,
+) -> Iterator[dict]:
+    """Replace idle terminal jobs' history with one snapshot event; drop idle cancelled / purged jobs.
+
+    Reads `rows` twice: once to replay every job, once to emit.
+    """
+    purge = purge or set()
+    scratch: Dict[str, Job] = {}
+    counts: Dict[str, int] = {}
+    last_at: Dict[str, float] = {}
+    for r in rows:
+        jid = str(r.get("job_id"))
+        counts[jid] = counts.get(jid, 0) + 1
+        last_at[jid] = max(last_at.get(jid, 0.0), _row_time(r))
+        try:
+            _state.apply_job_event(JobEvent(
+                event_id=str(r.get("event_id") or ""),
+                event_type=r.get("event_type"),
+                job_id=jid,
+                data=dict(r.get("data") or {}),
+                created_at=_row_time(r),
+            ), target=scratch)
+        except Exception:
+            continue
+    drop: Set[str] = set()
+    collapse: Set[str] = set()
+    for jid, job in scratch.items():
+        idle = now - last_at.get(jid, now)
+        if jid in purge or (job.status == "cancelled" and cancelled_age_seconds > 0 and idle >= cancelled_age_seconds):
+            drop.add(jid)
+        elif (job.status in TERMINAL_JOB_STATES and terminal_age_seconds > 0
+              and idle >= terminal_age_seconds and counts.get(jid, 0) > 1):
+            collapse.add(jid)
+    if dropped is not None:
+        dropped.update(drop)
+    emitted: Set[str] = set()
+    for r in rows:
+        jid = str(r.get("job_id"))
+        if jid in drop:
+            continue
+        if jid in collapse:
+            if jid not in emitted:
+                emitted.add(jid)
+                yield {
+                    "event_id": f"snapshot-{jid}",
+                    "event_type": "snapshot",
+                    "job_id": jid,
+                    "data": asdict(scratch[jid]),
+                    "created_at": last_at[jid],
+                }
+            continue
+        yield r
+
+
+# --- Passes ---
+
+last_report: dict = {}
+_pass_lock: Optional[asyncio.Lock] = None
+
+
+def _lock() -> asyncio.Lock:
+    global _pass_lock
+    if _pass_lock is None:
+        _pass_lock = asyncio.Lock()
+    return _pass_lock
+
+
+def _transform(policy: RetentionPolicy, now: float, purge: Optional[Set[str]], dropped: Set[str]):
+    if policy.stream == "economy":
+        return lambda rows: carry_forward(rows, policy.max_age_seconds, now)
+    if policy.stream == "jobs":
+        return lambda rows: collapse_jobs(
+            rows, policy.terminal_age_seconds, policy.cancelled_age_seconds, now, purge=purge, dropped=dropped)
+    return lambda rows: drop_expired(rows, policy.max_age_seconds, policy.max_bytes, now)
+
+
+async def _refresh_after(stream: str, dropped: Set[str]) -> None:
+    if stream == "jobs" and dropped:
+        _state.remove_jobs(dropped)
+        _state.job_events[:] = [ev for ev in _state.job_events if str(ev.job_id) not in dropped]
+        await asyncio.to_thread(storage.delete_jobs, list(dropped))
+    name = _CHECKPOINT_FOR.get(stream)
+    if name is None:
+        return
+    # Old checkpoints point at offsets in the previous log.
+    await asyncio.to_thread(checkpoints.invalidate_checkpoints, name)
+    if CHECKPOINTS_ENABLED:
+        for doc in _state.snapshot_checkpoints([name]):
+            await asyncio.to_thread(checkpoints.save_checkpoint, doc)
+
+
+async def compact_stream(policy: RetentionPolicy, purge: Optional[Set[str]] = None) -> dict:
+    start = time.perf_counter()
+    dropped: Set[str] = set()
+    transform = _transform(policy, time.time(), purge, dropped)
+    try:
+        out = await asyncio.to_thread(storage.compact, policy.stream, transform)
+    except Exception:
+        _log.warning("Compaction of %s failed", policy.stream, exc_info=True)
+        return {"stream": policy.stream, "error": "compaction_failed"}
+    if out["rows_after"] != out["rows_before"] or dropped:
+        await _refresh_after(policy.stream, dropped)
+    out["stream"] = policy.stream
+    out["bytes_reclaimed"] = max(0, int(out["bytes_before"]) - int(out["bytes_after"]))
+    out["duration_ms"] = round((time.perf_counter() - start) * 1000.0, 3)
+    if policy.stream == "jobs":
+        out["jobs_dropped"] = len(dropped)
+    return out
+
+
+async def run_compaction(policies: Optional[List[RetentionPolicy]] = None) -> dict:
+    global last_report
+    async with _lock():
+        started_at = time.time()
+        start = time.perf_counter()
+        results = []
+        for policy in policies if policies is not None else policies_from_config():
+            if policy.enabled():
+                results.append(await compact_stream(policy))
+        report = {
+            "id": str(uuid.uuid4()),
+            "started_at": started_at,
+            "duration_ms": round((time.perf_counter() - start) * 1000.0, 3),
+            "bytes_reclaimed": sum(int(r.get("bytes_reclaimed") or 0) for r in results),
+            "streams": results,
+        }
+        last_report = report
+    if results:
+        _log.info("Compaction reclaimed %d bytes in %.1f ms", report["bytes_reclaimed"], report["duration_ms"])
+    return report
+
+
+async def purge_jobs(job_ids: Set[str]) -> dict:
+    """Drop every event of `job_ids` from the jobs log (used by /admin/jobs/purge_cancelled)."""
+    async with _lock():
+        return await compact_stream(RetentionPolicy("jobs"), purge=set(job_ids))
+
+
+async def compactor_loop() -> None:
+    if COMPACTOR_INTERVAL_SECONDS <= 0 or not any(p.enabled() for p in policies_from_config()):
+        return
+    while True:
+        await asyncio.sleep(COMPACTOR_INTERVAL_SECONDS)
+        try:
+            await run_compaction()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            _log.warning("Periodic compaction failed", exc_info=True)
@@ -26,9 +26,31 @@ MEMORY_DIR.mkdir(parents=True, exist_ok=True)
 MEMORY_EMBED_DIR = DATA_DIR / "memory_embeddings"
 MEMORY_EMBED_DIR.mkdir(parents=True, exist_ok=True)
 OPPORTUNITIES_PATH = DATA_DIR / "opportunities.jsonl"
+CHECKPOINTS_DIR = DATA_DIR / "checkpoints"
 ARTIFACTS_DIR = (DATA_DIR / "artifacts").resolve()
 ARTIFACTS_DIR.mkdir(parents=True, exist_ok=True)
 
+LOG_WRITER_ENABLED = os.getenv("LOG_WRITER_ENABLED", "1").strip().lower() in ("1", "true", "yes", "on")
+LOG_WRITER_QUEUE_MAX = int(float(os.getenv("LOG_WRITER_QUEUE_MAX", "10000")))
+LOG_WRITER_FLUSH_INTERVAL_MS = float(os.getenv("LOG_WRITER_FLUSH_INTERVAL_MS", "50"))
+LOG_WRITER_BATCH_MAX = int(float(os.getenv("LOG_WRITER_BATCH_MAX", "500")))
+ECONOMY_LEDGER_FSYNC = os.getenv("ECONOMY_LEDGER_FSYNC", "1").strip().lower() in ("1", "true", "yes", "on")
+CHECKPOINTS_ENABLED = os.getenv("CHECKPOINTS_ENABLED", "1").strip().lower() in ("1", "true", "yes", "on")
+CHECKPOINT_INTERVAL_SECONDS = float(os.getenv("CHECKPOINT_INTERVAL_SECONDS", "300"))
+CHECKPOINT_KEEP = max(1, int(float(os.getenv("CHECKPOINT_KEEP", "3"))))
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "jsonl").strip().lower()
+SQLITE_PATH = Path(os.getenv("SQLITE_PATH", str(DATA_DIR / "moltworld.db"))).resolve()
+
+# Background log compaction. Each retention knob is off at 0.
+COMPACTOR_INTERVAL_SECONDS = float(os.getenv("COMPACTOR_INTERVAL_SECONDS", "3600"))
+RETENTION_AUDIT_MAX_AGE_DAYS = float(os.getenv("RETENTION_AUDIT_MAX_AGE_DAYS", "0"))
+RETENTION_AUDIT_MAX_BYTES = int(float(os.getenv("RETENTION_AUDIT_MAX_BYTES", "0")))
+RETENTION_TRACE_MAX_AGE_DAYS = float(os.getenv("RETENTION_TRACE_MAX_AGE_DAYS", "0"))
+RETENTION_TRACE_MAX_BYTES = int(float(os.getenv("RETENTION_TRACE_MAX_BYTES", "0")))
+RETENTION_LEDGER_MAX_AGE_DAYS = float(os.getenv("RETENTION_LEDGER_MAX_AGE_DAYS", "0"))
+RETENTION_JOBS_TERMINAL_AGE_DAYS = float(os.getenv("RETENTION_JOBS_TERMINAL_AGE_DAYS", "0"))
+RETENTION_JOBS_CANCELLED_AGE_DAYS = float(os.getenv("RETENTION_JOBS_CANCELLED_AGE_DAYS", "0"))
+
 STARTING_AIDOLLARS = float(os.getenv("STARTING_AIDOLLARS", "100"))
 TREASURY_ID = os.getenv("TREASURY_ID", "treasury")
 ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "").strip()
@@ -62,14 +84,55 @@ SIM_MINUTES_PER_REAL_SECOND = float(os.getenv("SIM_MINUTES_PER_REAL_SECOND", "5"
 
 BACKEND_VERSION = "2.0.0"
 
+WS_SEND_QUEUE_MAX = int(float(os.getenv("WS_SEND_QUEUE_MAX", "256")))
+WS_SLOW_CLIENT_POLICY = os.getenv("WS_SLOW_CLIENT_POLICY", "coalesce").strip().lower()
+WS_SEND_TIMEOUT_SECONDS = float(os.getenv("WS_SEND_TIMEOUT_SECONDS", "10"))
+WORLD_FULL_SNAPSHOT_EVERY = int(float(os.getenv("WORLD_FULL_SNAPSHOT_EVERY", "100")))
+# Proximity: grid cell size (tiles) for the spatial index; radius of the per-agent `nearby` block in GET /world.
+WORLD_SPATIAL_CELL_SIZE = int(float(os.getenv("WORLD_SPATIAL_CELL_SIZE", "4")))
+WORLD_NEARBY_RADIUS = int(float(os.getenv("WORLD_NEARBY_RADIUS", "2")))
+HTTP_POOL_MAX_CONNECTIONS = int(float(os.getenv("HTTP_POOL_MAX_CONNECTIONS", "100")))
+HTTP_POOL_KEEPALIVE_SECONDS = float(os.getenv("HTTP_POOL_KEEPALIVE_SECONDS", "30"))
+HTTP_PER_HOST_LIMIT = int(float(os.getenv("HTTP_PER_HOST_LIMIT", "8")))
+HTTP_DEFAULT_TIMEOUT_SECONDS = float(os.getenv("HTTP_DEFAULT_TIMEOUT_SECONDS", "30"))
+
 EMBEDDINGS_BASE_URL = os.getenv("EMBEDDINGS_BASE_URL", "").rstrip("/")
 EMBEDDINGS_MODEL = os.getenv("EMBEDDINGS_MODEL", "llama3.1:8b")
 EMBEDDINGS_TRUNCATE = int(os.getenv("EMBEDDINGS_TRUNCATE", "256"))
 EMBEDDINGS_TIMEOUT_SECONDS = float(os.getenv("EMBEDDINGS_TIMEOUT_SECONDS", "30"))
+EMBEDDING_CACHE_MAX_ENTRIES = int(float(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "4096")))
+EMBEDDING_CACHE_DISK_ENABLED = os.getenv("EMBEDDING_CACHE_DISK_ENABLED", "1").strip().lower() in ("1", "true", "yes", "on")
+EMBEDDING_CACHE_DIR = DATA_DIR / "embedding_cache"
+EMBEDDING_CACHE_DISK_MAX_ENTRIES = int(float(os.getenv("EMBEDDING_CACHE_DISK_MAX_ENTRIES", "100000")))
+EMBEDDING_CACHE_DISK_TTL_SECONDS = float(os.getenv("EMBEDDING_CACHE_DISK_TTL_SECONDS", str(30 * 86400)))
+EMBEDDINGS_BATCH_SIZE = int(float(os.getenv("EMBEDDINGS_BATCH_SIZE", "16")))
+EMBEDDING_WORKER_MAX_ATTEMPTS = int(float(os.getenv("EMBEDDING_WORKER_MAX_ATTEMPTS", "8")))
+EMBEDDING_WORKER_BACKOFF_SECONDS = float(os.getenv("EMBEDDING_WORKER_BACKOFF_SECONDS", "1"))
+EMBEDDING_WORKER_BACKOFF_MAX_SECONDS = float(os.getenv("EMBEDDING_WORKER_BACKOFF_MAX_SECONDS", "60"))
+EMBEDDING_MIGRATION_CONCURRENCY = int(float(os.getenv("EMBEDDING_MIGRATION_CONCURRENCY", "4")))
+MEMORY_CACHE_MAX_AGENTS = int(float(os.getenv("MEMORY_CACHE_MAX_AGENTS", "64")))
+MEMORY_TOKEN_INDEX_SAVE_EVERY = int(float(os.getenv("MEMORY_TOKEN_INDEX_SAVE_EVERY", "500")))
+MEMORY_ANN_ENABLED = os.getenv("MEMORY_ANN_ENABLED", "0").strip().lower() in ("1", "true", "yes", "on")
+MEMORY_ANN_MIN_ROWS = int(float(os.getenv("MEMORY_ANN_MIN_ROWS", "5000")))
+# ANN retrieve is approximate: on `python -m app.memory_ann` (100k x 256) recall@8 vs exact is ~0.70 at
+# nprobe 8 and ~0.87 at 64. Raise it (or set nprobe=0 per request) when missed memories matter.
+MEMORY_ANN_NPROBE = int(float(os.getenv("MEMORY_ANN_NPROBE", "8")))
+MEMORY_ANN_RECENT = int(float(os.getenv("MEMORY_ANN_RECENT", "200")))
+MEMORY_ANN_SAVE_EVERY = int(float(os.getenv("MEMORY_ANN_SAVE_EVERY", "500")))
 
 VERIFY_LLM_BASE_URL = os.getenv("VERIFY_LLM_BASE_URL", "").rstrip("/")
 VERIFY_LLM_MODEL = os.getenv("VERIFY_LLM_MODEL", os.getenv("OLLAMA_MODEL", "llama3.1:8b"))
 VERIFY_LLM_TIMEOUT_SECONDS = float(os.getenv("VERIFY_LLM_TIMEOUT_SECONDS", "60"))
+VERIFY_LLM_CONCURRENCY = int(float(os.getenv("VERIFY_LLM_CONCURRENCY", "4")))
+VERIFY_WORKERS = int(float(os.getenv("VERIFY_WORKERS", "2")))
+VERIFY_QUEUE_MAX = int(float(os.getenv("VERIFY_QUEUE_MAX", "500")))
+SANDBOX_POOL_SIZE = int(float(os.getenv("SANDBOX_POOL_SIZE", "1")))
+SANDBOX_MAX_RUNS = int(float(os.getenv("SANDBOX_MAX_RUNS", "50")))
+SANDBOX_MEMORY_MB = int(float(os.getenv("SANDBOX_MEMORY_MB", "2048")))
+SANDBOX_FILE_MB = int(float(os.getenv("SANDBOX_FILE_MB", "64")))
+VERIFY_CACHE_ENABLED = os.getenv("VERIFY_CACHE_ENABLED", "1").strip().lower() in ("1", "true", "yes", "on")
+VERIFY_CACHE_TTL_SECONDS = float(os.getenv("VERIFY_CACHE_TTL_SECONDS", str(7 * 86400)))
+VERIFY_CACHE_DIR = DATA_DIR / "verify_cache"
 
 REWARD_ACTION_DIVERSITY_BASE = float(os.getenv("REWARD_ACTION_DIVERSITY_BASE", "0.02"))
 REWARD_ACTION_DIVERSITY_WINDOW = int(os.getenv("REWARD_ACTION_DIVERSITY_WINDOW", "20"))
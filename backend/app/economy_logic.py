@@ -5,6 +5,7 @@ All functions operate on globals in app.state via module reference.
 """
 from __future__ import annotations
 
+import asyncio
 import logging
 import re
 import time
@@ -14,12 +15,12 @@ from typing import Dict, List, Optional
 
 import app.state as _state
 from app.config import (
-    ECONOMY_PATH, REWARD_ACTION_DIVERSITY_BASE, REWARD_ACTION_DIVERSITY_WINDOW,
+    REWARD_ACTION_DIVERSITY_BASE, REWARD_ACTION_DIVERSITY_WINDOW,
     REWARD_FIVERR_DISCOVERY, REWARD_FIVERR_MIN_TEXT_LEN, STARTING_AIDOLLARS,
     TREASURY_ID,
 )
 from app.models import EconomyEntry
-from app.utils import append_jsonl
+from app.storage import storage
 from app.ws import ws_manager
 
 _log = logging.getLogger(__name__)
@@ -30,16 +31,90 @@ _fiverr_awarded: List[dict] = []
 _fiverr_awarded_max = 500
 
 
+def _apply_entry(b: Dict[str, float], e: EconomyEntry) -> None:
+    if e.from_id:
+        b[e.from_id] = float(b.get(e.from_id, 0.0)) - float(e.amount)
+    if e.to_id:
+        b[e.to_id] = float(b.get(e.to_id, 0.0)) + float(e.amount)
+
+
 def recompute_balances() -> None:
-    b: Dict[str, float] = {}
+    """Full rebuild from the checkpoint base plus the in-memory ledger. Used at load time."""
+    b: Dict[str, float] = dict(_state.balances_base)
     for e in _state.economy_ledger:
-        if e.from_id:
-            b[e.from_id] = float(b.get(e.from_id, 0.0)) - float(e.amount)
-        if e.to_id:
-            b[e.to_id] = float(b.get(e.to_id, 0.0)) + float(e.amount)
+        _apply_entry(b, e)
     _state.balances = b
 
 
+def post_ledger_entry(entry: EconomyEntry) -> None:
+    """Append an entry to the ledger (memory + log) and update balances in O(1)."""
+    _state.economy_ledger.append(entry)
+    storage.append("economy", asdict(entry))
+    _apply_entry(_state.balances, entry)
+
+
+def _replay_ledger_log(ledger: List[EconomyEntry], start: int) -> tuple:
+    """Balances from the full ledger log, plus the ids of rows that are also in ledger[start:]. Runs in a thread."""
+    full: Dict[str, float] = {}
+    rows = storage.read("economy")
+    entries = 0
+    for r in rows:
+        try:
+            e = EconomyEntry(
+                entry_id=str(r.get("entry_id") or r.get("id") or ""),
+                entry_type=r.get("entry_type") or "award",
+                amount=float(r.get("amount") or 0.0),
+                from_id=str(r.get("from_id") or ""),
+                to_id=str(r.get("to_id") or ""),
+                memo="",
+                created_at=0.0,
+            )
+        except Exception:
+            continue
+        _apply_entry(full, e)
+        entries += 1
+    # Entries posted since `start` that the read already saw are the last rows of the log.
+    tail_ids = {e.entry_id for e in ledger[start:]}
+    seen = set()
+    for r in reversed(rows):
+        rid = str(r.get("entry_id") or r.get("id") or "")
+        if rid not in tail_ids:
+            break
+        seen.add(rid)
+    return full, entries, seen
+
+
+async def check_balances(repair: bool = False, tolerance: float = 1e-9) -> dict:
+    """Recompute every balance from the full ledger log and report drift from the live balances.
+
+    The log is read in a worker thread; entries posted meanwhile are applied on
+    top before comparing, and the comparison and repair run on the event loop,
+    so no live update is lost.
+    """
+    ledger = _state.economy_ledger
+    start = len(ledger)
+    await ledger_barrier()
+    full, entries, seen = await asyncio.to_thread(_replay_ledger_log, ledger, start)
+    for e in ledger[start:]:
+        if e.entry_id not in seen:
+            _apply_entry(full, e)
+            entries += 1
+    drift = []
+    for aid in sorted(set(full) | set(_state.balances)):
+        live = float(_state.balances.get(aid, 0.0))
+        expected = float(full.get(aid, 0.0))
+        if abs(live - expected) > tolerance:
+            drift.append({"account": aid, "live": live, "recomputed": expected, "delta": live - expected})
+    if repair and drift:
+        _state.balances = full
+    return {"ok": not drift, "entries": entries, "accounts": len(full), "drift": drift, "repaired": bool(repair and drift)}
+
+
+async def ledger_barrier() -> None:
+    """Wait until every ledger entry appended so far is durable on disk."""
+    await asyncio.to_thread(storage.flush, "economy")
+
+
 def ensure_account(agent_id: str) -> None:
     if agent_id in _state.balances:
         return
@@ -56,9 +131,7 @@ def ensure_account(agent_id: str) -> None:
         memo="starting balance",
         created_at=now,
     )
-    _state.economy_ledger.append(entry)
-    append_jsonl(ECONOMY_PATH, asdict(entry))
-    recompute_balances()
+    post_ledger_entry(entry)
 
 
 def action_diversity_decay(agent_id: str, action_kind: str) -> float:
@@ -146,8 +219,6 @@ async def apply_penalty(agent_id: str, amount: float, reason: str = "", by: str
         memo=memo,
         created_at=now,
     )
-    _state.economy_ledger.append(entry)
-    append_jsonl(ECONOMY_PATH, asdict(entry))
-    recompute_balances()
+    post_ledger_entry(entry)
     await ws_manager.broadcast({"type": "balances", "data": {"balances": _state.balances}})
     return (amount, entry)
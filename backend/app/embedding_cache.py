@@ -0,0 +1,244 @@
+"""
+Content-addressed cache in front of the embeddings endpoint.
+
+Vectors are keyed by sha256 of (model, truncate, text), so a change of
+EMBEDDINGS_MODEL or EMBEDDINGS_TRUNCATE never serves a stale vector. Lookups go
+to an in-memory LRU first, then to one small JSON file per key under
+DATA_DIR/embedding_cache/<2 hex>/<key>.json (read and written in a worker
+thread), and only then upstream. The disk tier is pruned every few hundred
+writes: files unused for EMBEDDING_CACHE_DISK_TTL_SECONDS go first, then the
+least recently used beyond EMBEDDING_CACHE_DISK_MAX_ENTRIES (a disk hit
+refreshes the file's mtime). Concurrent misses for the same key share a
+single upstream call: the first caller fetches, the others await its result.
+Failed fetches (None) are not cached. Batch callers use `peek` and `put`
+around their own upstream call.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from app.config import (
+    EMBEDDING_CACHE_DIR,
+    EMBEDDING_CACHE_DISK_ENABLED,
+    EMBEDDING_CACHE_DISK_MAX_ENTRIES,
+    EMBEDDING_CACHE_DISK_TTL_SECONDS,
+    EMBEDDING_CACHE_MAX_ENTRIES,
+)
+
+_log = logging.getLogger(__name__)
+
+_PRUNE_EVERY = 256
+
+
+def embedding_key(model: str, truncate: int, text: str) -> str:
+    raw = f"{model}\x00{int(truncate)}\x00{text}".encode("utf-8", errors="replace")
+    return hashlib.sha256(raw).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(
+        self,
+        max_entries: int = 4096,
+        disk_dir: Optional[Path] = None,
+        disk_max_entries: int = 100_000,
+        disk_ttl_seconds: float = 30 * 86400.0,
+    ) -> None:
+        self.max_entries = max(1, int(max_entries))
+        self.disk_dir = disk_dir
+        self.disk_max_entries = int(disk_max_entries)
+        self.disk_ttl_seconds = float(disk_ttl_seconds)
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.pruned = 0
+        self._lru: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._flights: Dict[str, "asyncio.Future[Optional[List[float]]]"] = {}
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.shared = 0
+        self.errors = 0
+        self.evictions = 0
+
+    def _disk_path(self, key: str) -> Optional[Path]:
+        if self.disk_dir is None:
+            return None
+        return self.disk_dir / key[:2] / f"{key}.json"
+
+    def _read_disk(self, key: str) -> Optional[List[float]]:
+        p = self._disk_path(key)
+        if p is None:
+            return None
+        try:
+            vec = json.loads(p.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return None
+        except Exception:
+            _log.debug("Unreadable embedding cache entry %s", p, exc_info=True)
+            return None
+        if not isinstance(vec, list) or not vec:
+            return None
+        try:
+            # Recently used entries survive pruning.
+            os.utime(p)
+        except OSError:
+            pass
+        return [float(x) for x in vec]
+
+    def _write_disk(self, key: str, vec: List[float]) -> None:
+        p = self._disk_path(key)
+        if p is None:
+            return
+        try:
+            p.parent.mkdir(parents=True, exist_ok=True)
+            tmp = p.with_name(f"{p.name}.{threading.get_ident()}.tmp")
+            tmp.write_text(json.dumps(vec), encoding="utf-8")
+            os.replace(tmp, p)
+        except Exception:
+            _log.warning("Could not write embedding cache entry %s", p, exc_info=True)
+            return
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % _PRUNE_EVERY == 0
+        if prune:
+            self.prune()
+
+    def prune(self) -> int:
+        """Delete disk entries past the TTL, then the oldest beyond the entry cap; returns how many."""
+        if self.disk_dir is None or not self.disk_dir.exists():
+            return 0
+        cutoff = time.time() - self.disk_ttl_seconds if self.disk_ttl_seconds > 0 else None
+        live = []
+        removed = 0
+        for p in self.disk_dir.glob("*/*.json"):
+            try:
+                mtime = p.stat().st_mtime
+                if cutoff is not None and mtime < cutoff:
+                    p.unlink()
+                    removed += 1
+                else:
+                    live.append((mtime, p))
+            except OSError:
+                continue
+        if self.disk_max_entries > 0 and len(live) > self.disk_max_entries:
+            live.sort()
+            for _, p in live[:len(live) - self.disk_max_entries]:
+                try:
+                    p.unlink()
+                    removed += 1
+                except OSError:
+                    continue
+        with self._lock:
+            self.pruned += removed
+        return removed
+
+    def _remember(self, key: str, vec: List[float]) -> None:
+        # Caller holds self._lock.
+        self._lru[key] = vec
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+            self.evictions += 1
+
+    async def get_or_compute(
+        self, model: str, truncate: int, text: str, fetch: Callable[[], Awaitable[Optional[List[float]]]],
+    ) -> Optional[List[float]]:
+        """Cached vector for `text`, awaiting `fetch()` at most once per key at a time."""
+        key = embedding_key(model, truncate, text)
+        with self._lock:
+            vec = self._lru.get(key)
+            if vec is not None:
+                self._lru.move_to_end(key)
+                self.memory_hits += 1
+                return vec
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = asyncio.get_running_loop().create_future()
+            else:
+                self.shared += 1
+        if not leader:
+            return await asyncio.shield(flight)
+        vec = None
+        try:
+            vec = await asyncio.to_thread(self._read_disk, key)
+            if vec is not None:
+                self.disk_hits += 1
+            else:
+                self.misses += 1
+                vec = await fetch()
+                if vec is None:
+                    self.errors += 1
+                else:
+                    await asyncio.to_thread(self._write_disk, key, vec)
+            if vec is not None:
+                with self._lock:
+                    self._remember(key, vec)
+            return vec
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            if not flight.done():
+                flight.set_result(vec)
+
+    async def peek(self, model: str, truncate: int, text: str) -> Optional[List[float]]:
+        """Cached vector from memory or disk without fetching; counts a miss when absent."""
+        key = embedding_key(model, truncate, text)
+        with self._lock:
+            vec = self._lru.get(key)
+            if vec is not None:
+                self._lru.move_to_end(key)
+                self.memory_hits += 1
+                return vec
+        vec = await asyncio.to_thread(self._read_disk, key)
+        with self._lock:
+            if vec is None:
+                self.misses += 1
+            else:
+                self.disk_hits += 1
+                self._remember(key, vec)
+        return vec
+
+    async def put(self, model: str, truncate: int, text: str, vec: List[float]) -> None:
+        """Store a vector fetched outside get_or_compute (e.g. in a batch)."""
+        key = embedding_key(model, truncate, text)
+        await asyncio.to_thread(self._write_disk, key, vec)
+        with self._lock:
+            self._remember(key, vec)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._lru.clear()
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses + self.shared
+        hits = self.memory_hits + self.disk_hits + self.shared
+        return {
+            "entries": len(self._lru),
+            "max_entries": self.max_entries,
+            "disk": self.disk_dir is not None,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "shared_in_flight": self.shared,
+            "upstream_errors": self.errors,
+            "evictions": self.evictions,
+            "disk_pruned": self.pruned,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+embedding_cache = EmbeddingCache(
+    EMBEDDING_CACHE_MAX_ENTRIES,
+    EMBEDDING_CACHE_DIR if EMBEDDING_CACHE_DISK_ENABLED else None,
+    EMBEDDING_CACHE_DISK_MAX_ENTRIES,
+    EMBEDDING_CACHE_DISK_TTL_SECONDS,
+)
@@ -0,0 +1,310 @@
+"""
+Admin-triggered re-embedding of every agent's memories with a new model.
+
+`POST /admin/embeddings/migrate {"model": ...}` starts a background job that
+writes into a new embedding store version (`memory_embeddings:<agent>.v<N>`)
+while the current store keeps serving retrieve. Agents are scanned in turn and
+their unembedded memories are cut into chunks of EMBEDDINGS_BATCH_SIZE; up to
+`concurrency` chunks (EMBEDDING_MIGRATION_CONCURRENCY) are embedded at once.
+Failed chunks are retried with the embedding worker's backoff settings.
+
+When a full pass and the catch-up passes for memories appended meanwhile have
+embedded everything, `embedding_versions.activate` switches all agents to the
+new store in one file replace, and a last pass picks up stragglers appended
+just before the switch. If rows are still missing the job ends as "failed" and
+the old store stays live.
+
+The job document is checkpointed to `memory_embeddings/migration.json`.
+Starting the same model again (or restarting the server mid-run) resumes it:
+memories already present in the new store are skipped.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from app import embedding_versions
+from app.config import (
+    EMBEDDING_MIGRATION_CONCURRENCY, EMBEDDING_WORKER_BACKOFF_MAX_SECONDS,
+    EMBEDDING_WORKER_BACKOFF_SECONDS, EMBEDDING_WORKER_MAX_ATTEMPTS,
+    EMBEDDINGS_BATCH_SIZE, MEMORY_EMBED_DIR,
+)
+from app.storage import embedding_stream, memory_stream, storage
+
+_log = logging.getLogger(__name__)
+
+CHECKPOINT_PATH = MEMORY_EMBED_DIR / "migration.json"
+_CATCH_UP_PASSES = 3
+_SAVE_INTERVAL_SECONDS = 2.0
+
+
+def _pending_rows(agent_key: str, version: int) -> Tuple[int, List[Tuple[str, str]]]:
+    """(memories with text, [(memory_id, text)] not yet in store `version`) for one agent."""
+    done = {r.get("memory_id") for r in storage.read(embedding_stream(agent_key, version))}
+    total, todo = 0, []
+    for r in storage.read(memory_stream(agent_key)):
+        mid = r.get("memory_id")
+        txt = str(r.get("text") or "").strip()
+        if not isinstance(mid, str) or not txt:
+            continue
+        total += 1
+        if mid not in done:
+            todo.append((mid, txt))
+    return total, todo
+
+
+class EmbeddingMigration:
+    def __init__(
+        self,
+        checkpoint_path: Path = CHECKPOINT_PATH,
+        concurrency: int = 4,
+        batch_size: int = 16,
+        max_attempts: int = 8,
+        backoff_seconds: float = 1.0,
+        backoff_max_seconds: float = 60.0,
+    ) -> None:
+        self.checkpoint_path = checkpoint_path
+        self.concurrency = max(1, int(concurrency))
+        self.batch_size = max(1, int(batch_size))
+        self.max_attempts = max(1, int(max_attempts))
+        self.backoff_seconds = max(0.0, float(backoff_seconds))
+        self.backoff_max_seconds = max(self.backoff_seconds, float(backoff_max_seconds))
+        self.job: Optional[dict] = self._load()
+        self._task: Optional[asyncio.Task] = None
+        self._session_rows = 0
+        self._session_started = 0.0
+        self._saved_at = 0.0
+
+    # --- checkpoint ---
+
+    def _load(self) -> Optional[dict]:
+        try:
+            doc = json.loads(self.checkpoint_path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return None
+        except Exception:
+            _log.warning("Ignoring unreadable migration checkpoint %s", self.checkpoint_path, exc_info=True)
+            return None
+        return doc if isinstance(doc, dict) and "version" in doc and "model" in doc else None
+
+    def _save(self) -> None:
+        if self.job is None:
+            return
+        self.job["updated_at"] = time.time()
+        tmp = self.checkpoint_path.with_name(self.checkpoint_path.name + ".tmp")
+        tmp.write_text(json.dumps(self.job), encoding="utf-8")
+        os.replace(tmp, self.checkpoint_path)
+        self._saved_at = time.time()
+
+    def _maybe_save(self) -> None:
+        if time.time() - self._saved_at >= _SAVE_INTERVAL_SECONDS:
+            self._save()
+
+    # --- control ---
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, model: str, concurrency: Optional[int] = None) -> dict:
+        """Start (or resume) migrating every agent to `model`; must be called on the event loop."""
+        model = (model or "").strip()
+        if not model:
+            return {"error": "invalid_model"}
+        if self.running:
+            return {"error": "migration_running", **self.progress()}
+        active = embedding_versions.active()
+        job = self.job
+        resume = (
+            job is not None and job.get("state") != "completed"
+            and job.get("model") == model and int(job.get("from_version", -1)) == active.version
+        )
+        if not resume:
+            last = int(job["version"]) if job is not None else 0
+            job = {
+                "version": max(active.version, last) + 1,
+                "model": model,
+                "from_version": active.version,
+                "from_model": active.model,
+                "created_at": time.time(),
+                "agents": {},
+                "failed": 0,
+            }
+        if concurrency is not None:
+            self.concurrency = max(1, int(concurrency))
+        job.update(state="running", concurrency=self.concurrency, started_at=time.time(), finished_at=None, failed=0)
+        self.job = job
+        self._save()
+        self._session_rows = 0
+        self._session_started = time.time()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        _log.info("%s embedding migration to %s (store v%d)", "Resuming" if resume else "Starting", model, job["version"])
+        return self.progress()
+
+    def resume_interrupted(self) -> Optional[dict]:
+        """Restart a job that was running when the process stopped."""
+        if self.job is not None and self.job.get("state") == "running" and not self.running:
+            return self.start(self.job["model"])
+        return None
+
+    async def stop(self, pause: bool = True) -> dict:
+        """Cancel a running job. With pause=False (shutdown) it stays "running" and resumes on the next start."""
+        task, self._task = self._task, None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            if pause:
+                self.job["state"] = "paused"
+                self._save()
+        return self.progress()
+
+    async def wait(self) -> dict:
+        if self._task is not None:
+            await asyncio.shield(self._task)
+        return self.progress()
+
+    # --- work ---
+
+    async def _run(self) -> None:
+        job = self.job
+        try:
+            await self._pass()
+            for _ in range(_CATCH_UP_PASSES):
+                if not await self._pass():
+                    break
+            if job["failed"]:
+                job["state"] = "failed"
+                _log.warning("Embedding migration to %s left %d memories unembedded; store not switched", job["model"], job["failed"])
+                return
+            embedding_versions.activate(job["version"], job["model"])
+            job["activated_at"] = time.time()
+            # Memories appended between the last pass and the switch were embedded into the old store.
+            await self._pass()
+            job["state"] = "completed"
+            _log.info("Embedding migration complete: store v%d (%s) is live", job["version"], job["model"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            _log.exception("Embedding migration crashed")
+            job["state"] = "failed"
+            job["error"] = str(e)[:300]
+        finally:
+            if job["state"] != "running":
+                job["finished_at"] = time.time()
+            self._save()
+
+    async def _pass(self) -> int:
+        """Embed every memory missing from the new store; returns how many were written."""
+        job = self.job
+        job["failed"] = 0
+        agents = await asyncio.to_thread(storage.memory_agents)
+        job["agents_total"] = len(agents)
+        queue: "asyncio.Queue[Optional[Tuple[str, List[Tuple[str, str]]]]]" = asyncio.Queue(maxsize=self.concurrency * 2)
+        written = [0]
+
+        async def worker() -> None:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                written[0] += await self._embed_chunk(*item)
+
+        workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+        try:
+            for key in agents:
+                total, todo = await asyncio.to_thread(_pending_rows, key, job["version"])
+                job["agents"][key] = {"rows": total, "done": total - len(todo)}
+                for i in range(0, len(todo), self.batch_size):
+                    await queue.put((key, todo[i:i + self.batch_size]))
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for w in workers:
+                w.cancel()
+        self._save()
+        return written[0]
+
+    async def _embed_chunk(self, key: str, items: List[Tuple[str, str]]) -> int:
+        from app import state
+        job = self.job
+        written = 0
+        for attempt in range(self.max_attempts):
+            if attempt:
+                await asyncio.sleep(min(self.backoff_max_seconds, self.backoff_seconds * (2 ** min(attempt - 1, 30))))
+            try:
+                vecs = await state.get_embeddings([t for _, t in items], job["model"])
+            except Exception:
+                _log.debug("Migration chunk for %s failed", key, exc_info=True)
+                vecs = [None] * len(items)
+            now = time.time()
+            rows = [
+                {"memory_id": mid, "embedding": v, "model": job["model"], "dim": len(v), "created_at": now}
+                for (mid, _), v in zip(items, vecs) if v is not None
+            ]
+            if rows:
+                await asyncio.to_thread(self._write, key, rows)
+                written += len(rows)
+                job["agents"][key]["done"] += len(rows)
+                self._session_rows += len(rows)
+                self._maybe_save()
+            items = [it for it, v in zip(items, vecs) if v is None]
+            if not items:
+                break
+        job["failed"] += len(items)
+        return written
+
+    def _write(self, key: str, rows: List[dict]) -> None:
+        stream = embedding_stream(key, self.job["version"])
+        for r in rows:
+            storage.append(stream, r)
+
+    # --- reporting ---
+
+    def progress(self) -> dict:
+        active = embedding_versions.active()
+        out: Dict[str, object] = {"active": {"version": active.version, "model": active.model}, "running": self.running}
+        job = self.job
+        if job is None:
+            return {**out, "state": "idle"}
+        agents = job.get("agents") or {}
+        rows_total = sum(a["rows"] for a in agents.values())
+        rows_done = sum(a["done"] for a in agents.values())
+        elapsed = ((job.get("finished_at") or time.time()) - self._session_started) if self._session_started else 0.0
+        rate = self._session_rows / elapsed if elapsed > 0 else 0.0
+        left = max(0, rows_total - rows_done)
+        return {
+            **out,
+            "state": job.get("state"),
+            "version": job["version"],
+            "model": job["model"],
+            "from_version": job.get("from_version"),
+            "from_model": job.get("from_model"),
+            "concurrency": job.get("concurrency"),
+            "agents_total": job.get("agents_total", len(agents)),
+            "agents_scanned": len(agents),
+            "agents_done": sum(1 for a in agents.values() if a["done"] >= a["rows"]),
+            "rows_total": rows_total,
+            "rows_done": rows_done,
+            "rows_failed": job.get("failed", 0),
+            "rows_per_second": round(rate, 2),
+            "eta_seconds": round(left / rate, 1) if rate > 0 and job.get("state") == "running" else None,
+            "elapsed_seconds": round(elapsed, 3),
+            "started_at": job.get("started_at"),
+            "finished_at": job.get("finished_at"),
+            "error": job.get("error"),
+        }
+
+
+embedding_migration = EmbeddingMigration(
+    CHECKPOINT_PATH, EMBEDDING_MIGRATION_CONCURRENCY, EMBEDDINGS_BATCH_SIZE,
+    EMBEDDING_WORKER_MAX_ATTEMPTS, EMBEDDING_WORKER_BACKOFF_SECONDS, EMBEDDING_WORKER_BACKOFF_MAX_SECONDS,
+)
@@ -0,0 +1,73 @@
+"""
+Which embedding store (version + model) memories are read from and written to.
+
+Version 0 is the original `memory_embeddings:<agent>` store with
+EMBEDDINGS_MODEL. A completed model migration (app.embedding_migration) writes
+`memory_embeddings/active.json`; replacing that one file switches every agent
+to the new store at once. Once it exists, its model overrides EMBEDDINGS_MODEL.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+from app.config import EMBEDDINGS_MODEL, MEMORY_EMBED_DIR
+
+_log = logging.getLogger(__name__)
+
+ACTIVE_PATH = MEMORY_EMBED_DIR / "active.json"
+
+
+@dataclass(frozen=True)
+class EmbeddingStore:
+    version: int
+    model: str
+    activated_at: float = 0.0
+
+
+_lock = threading.Lock()
+_active: Optional[EmbeddingStore] = None
+
+
+def _read() -> EmbeddingStore:
+    try:
+        doc = json.loads(ACTIVE_PATH.read_text(encoding="utf-8"))
+        return EmbeddingStore(int(doc["version"]), str(doc["model"]), float(doc.get("activated_at") or 0.0))
+    except FileNotFoundError:
+        pass
+    except Exception:
+        _log.warning("Ignoring unreadable %s; using the original embedding store", ACTIVE_PATH, exc_info=True)
+    return EmbeddingStore(0, EMBEDDINGS_MODEL)
+
+
+def active() -> EmbeddingStore:
+    global _active
+    with _lock:
+        if _active is None:
+            _active = _read()
+        return _active
+
+
+def activate(version: int, model: str) -> EmbeddingStore:
+    """Atomically make store `version` (embedded with `model`) the live one."""
+    global _active
+    store = EmbeddingStore(int(version), str(model), time.time())
+    tmp = ACTIVE_PATH.with_name(ACTIVE_PATH.name + ".tmp")
+    with _lock:
+        tmp.write_text(json.dumps(asdict(store)), encoding="utf-8")
+        os.replace(tmp, ACTIVE_PATH)
+        _active = store
+    return store
+
+
+def reload() -> EmbeddingStore:
+    """Forget the cached pointer (tests, or after editing active.json by hand)."""
+    global _active
+    with _lock:
+        _active = None
+    return active()
@@ -0,0 +1,258 @@
+"""
+Background worker that embeds appended memories.
+
+`/memory/{agent_id}/append` writes the memory row and enqueues its text here
+instead of waiting for the embeddings server. The worker takes up to
+EMBEDDINGS_BATCH_SIZE pending memories at a time, embeds them through
+`state.get_embeddings` (one /api/embed call when the server supports it) and
+appends the embedding rows. Memories whose embedding failed go back to the
+front of the queue and the worker backs off exponentially
+(EMBEDDING_WORKER_BACKOFF_SECONDS up to EMBEDDING_WORKER_BACKOFF_MAX_SECONDS);
+after EMBEDDING_WORKER_MAX_ATTEMPTS they are dropped and can be re-queued with
+`/memory/{agent_id}/embeddings/backfill`. Until a memory is embedded, retrieve
+ranks it by token relevance alone.
+
+The queue lives in memory: pending items are lost on restart, and backfill
+picks them up again.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+from app import embedding_versions
+from app.config import (
+    EMBEDDING_WORKER_BACKOFF_MAX_SECONDS, EMBEDDING_WORKER_BACKOFF_SECONDS,
+    EMBEDDING_WORKER_MAX_ATTEMPTS, EMBEDDINGS_BATCH_SIZE,
+)
+from app.memory_store import memory_store
+
+_log = logging.getLogger(__name__)
+
+
+@dataclass
+class _Pending:
+    agent_id: str
+    memory_id: str
+    text: str
+    queued_at: float
+    attempts: int = 0
+
+
+class EmbeddingWorker:
+    def __init__(
+        self,
+        batch_size: int = 16,
+        max_attempts: int = 8,
+        backoff_seconds: float = 1.0,
+        backoff_max_seconds: float = 60.0,
+    ) -> None:
+        self.batch_size = max(1, int(batch_size))
+        self.max_attempts = max(1, int(max_attempts))
+        self.backoff_seconds = max(0.0, float(backoff_seconds))
+        self.backoff_max_seconds = max(self.backoff_seconds, float(backoff_max_seconds))
+        self._lock = threading.Lock()
+        self._queue: Deque[_Pending] = deque()
+        self._queued: Set[Tuple[str, str]] = set()
+        self._per_agent: Dict[str, int] = {}
+        self._in_flight: Dict[str, int] = {}
+        self._wake: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._failures = 0
+        self.embedded = 0
+        self.batches = 0
+        self.retries = 0
+        self.dropped = 0
+        self.last_error_at: Optional[float] = None
+
+    # --- queue ---
+
+    def enqueue(self, agent_id: str, memory_id: str, text: str) -> bool:
+        """Queue one memory for embedding; False if it is already pending."""
+        with self._lock:
+            key = (agent_id, memory_id)
+            if key in self._queued:
+                return False
+            self._queued.add(key)
+            self._queue.append(_Pending(agent_id, memory_id, text, time.time()))
+            self._per_agent[agent_id] = self._per_agent.get(agent_id, 0) + 1
+        self._notify()
+        return True
+
+    def _notify(self) -> None:
+        loop, wake = self._loop, self._wake
+        if loop is None or wake is None:
+            return
+        try:
+            if asyncio.get_running_loop() is loop:
+                wake.set()
+                return
+        except RuntimeError:
+            pass
+        loop.call_soon_threadsafe(wake.set)
+
+    def _take(self) -> List[_Pending]:
+        with self._lock:
+            batch = []
+            while self._queue and len(batch) < self.batch_size:
+                p = self._queue.popleft()
+                batch.append(p)
+                self._in_flight[p.agent_id] = self._in_flight.get(p.agent_id, 0) + 1
+            return batch
+
+    def _settle(self, done: List[_Pending], failed: List[_Pending]) -> None:
+        with self._lock:
+            for p in done + failed:
+                self._in_flight[p.agent_id] -= 1
+                if not self._in_flight[p.agent_id]:
+                    del self._in_flight[p.agent_id]
+            retry = []
+            for p in failed:
+                p.attempts += 1
+                if p.attempts < self.max_attempts:
+                    retry.append(p)
+                    continue
+                self.dropped += 1
+                _log.warning("Giving up on embedding memory %s of %s after %d attempts", p.memory_id, p.agent_id, p.attempts)
+                self._forget(p)
+            for p in done:
+                self._forget(p)
+            # Failed items keep their place at the head of the queue.
+            self._queue.extendleft(reversed(retry))
+            self.retries += len(retry)
+
+    def _forget(self, p: _Pending) -> None:
+        # Caller holds self._lock.
+        self._queued.discard((p.agent_id, p.memory_id))
+        left = self._per_agent.get(p.agent_id, 0) - 1
+        if left > 0:
+            self._per_agent[p.agent_id] = left
+        else:
+            self._per_agent.pop(p.agent_id, None)
+
+    # --- processing ---
+
+    async def process_batch(self) -> Optional[bool]:
+        """Embed one batch; True if all succeeded, False if any failed, None if the queue was empty."""
+        from app import state
+        batch = self._take()
+        if not batch:
+            return None
+        # Rows go to the store whose model produced them, even if a migration switches stores meanwhile.
+        store = embedding_versions.active()
+        try:
+            vecs = await state.get_embeddings([p.text for p in batch], store.model)
+        except Exception:
+            _log.warning("Embedding batch of %d failed", len(batch), exc_info=True)
+            vecs = [None] * len(batch)
+        done = [p for p, v in zip(batch, vecs) if v is not None]
+        failed = [p for p, v in zip(batch, vecs) if v is None]
+        try:
+            if done:
+                now = time.time()
+                rows = [
+                    (p.agent_id, {"memory_id": p.memory_id, "embedding": v, "model": store.model, "dim": len(v), "created_at": now})
+                    for p, v in zip(batch, vecs) if v is not None
+                ]
+                await asyncio.to_thread(self._write, rows, store.version)
+        except Exception:
+            _log.warning("Writing %d embedding rows failed", len(done), exc_info=True)
+            failed, done = failed + done, []
+        self._settle(done, failed)
+        self.batches += 1
+        self.embedded += len(done)
+        if failed:
+            self._failures += 1
+            self.last_error_at = time.time()
+        else:
+            self._failures = 0
+        return not failed
+
+    @staticmethod
+    def _write(rows: List[Tuple[str, dict]], version: int) -> None:
+        for agent_id, row in rows:
+            memory_store.append_embedding(agent_id, row, version)
+
+    def backoff(self) -> float:
+        """Delay before the next batch after consecutive failures."""
+        if not self._failures:
+            return 0.0
+        return min(self.backoff_max_seconds, self.backoff_seconds * (2 ** min(self._failures - 1, 30)))
+
+    async def drain(self) -> None:
+        """Process batches until the queue is empty, honouring backoff between failures."""
+        while True:
+            ok = await self.process_batch()
+            if ok is None:
+                return
+            if not ok:
+                await asyncio.sleep(self.backoff())
+
+    async def run(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        while True:
+            self._wake.clear()
+            if not self._queue:
+                await self._wake.wait()
+                continue
+            try:
+                ok = await self.process_batch()
+            except Exception:
+                _log.warning("Embedding worker batch crashed", exc_info=True)
+                ok = False
+            if ok is False:
+                await asyncio.sleep(self.backoff())
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        self._loop = self._wake = None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        if self._queue:
+            _log.info("Embedding worker stopped with %d memories pending (use embeddings/backfill)", len(self._queue))
+
+    # --- reporting ---
+
+    def backlog(self, agent_id: str) -> dict:
+        with self._lock:
+            oldest = next((p.queued_at for p in self._queue if p.agent_id == agent_id), None)
+            return {
+                "agent_id": agent_id,
+                "pending": self._per_agent.get(agent_id, 0),
+                "in_flight": self._in_flight.get(agent_id, 0),
+                "oldest_age_seconds": round(time.time() - oldest, 3) if oldest is not None else None,
+            }
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "pending": sum(self._per_agent.values()),
+                "agents": dict(self._per_agent),
+                "embedded": self.embedded,
+                "batches": self.batches,
+                "retries": self.retries,
+                "dropped": self.dropped,
+                "backoff_seconds": self.backoff(),
+                "running": self._task is not None and not self._task.done(),
+            }
+
+
+embedding_worker = EmbeddingWorker(
+    EMBEDDINGS_BATCH_SIZE, EMBEDDING_WORKER_MAX_ATTEMPTS,
+    EMBEDDING_WORKER_BACKOFF_SECONDS, EMBEDDING_WORKER_BACKOFF_MAX_SECONDS,
+)
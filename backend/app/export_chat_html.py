@@ -7,25 +7,17 @@ import re
 from pathlib import Path
 from typing import Any
 
+from app.run_archive import iter_run_log, load_index
+
 
 DATA_DIR = Path(os.getenv("DATA_DIR", "/app/data"))
 
 
 def _read_jsonl(path: Path) -> list[dict[str, Any]]:
-    if not path.exists():
+    # A live log, or one archived as gzip segments listed in its run's index.json.
+    if not path.exists() and load_index(path.parent) is None:
         raise FileNotFoundError(str(path))
-    out: list[dict[str, Any]] = []
-    for ln in path.read_text(encoding="utf-8", errors="replace").splitlines():
-        ln = ln.strip()
-        if not ln:
-            continue
-        try:
-            v = json.loads(ln)
-            if isinstance(v, dict):
-                out.append(v)
-        except Exception:
-            continue
-    return out
+    return list(iter_run_log(path.parent, path.name))
 
 
 def _find_latest_run_dir(runs_dir: Path) -> Path:
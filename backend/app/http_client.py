@@ -0,0 +1,216 @@
+"""
+Shared outbound HTTP client for the backend (embeddings, LLM judge, web tools, webhooks).
+
+One pooled `httpx.AsyncClient` per event loop keeps connections alive between
+calls (HTTP_POOL_MAX_CONNECTIONS / HTTP_POOL_KEEPALIVE_SECONDS). Each host also
+gets a semaphore (HTTP_PER_HOST_LIMIT) so a slow upstream can only tie up that
+many requests at once. Every call has a timeout, and nothing here blocks the
+event loop.
+
+Code that runs in a worker thread (sync routes, verifiers) uses
+`request_sync` / `post_json_sync`: they schedule the request on the app's loop
+(bound at startup) and wait for it in that thread. Without a running app loop,
+e.g. in scripts, the request runs on a private loop.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import threading
+import urllib.parse
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional
+
+import httpx
+
+from app.config import (
+    HTTP_DEFAULT_TIMEOUT_SECONDS, HTTP_PER_HOST_LIMIT, HTTP_POOL_KEEPALIVE_SECONDS,
+    HTTP_POOL_MAX_CONNECTIONS,
+)
+
+_log = logging.getLogger(__name__)
+
+
+class HttpStatusError(Exception):
+    def __init__(self, status_code: int, url: str) -> None:
+        super().__init__(f"HTTP {status_code} from {url[:120]}")
+        self.status_code = status_code
+
+
+@dataclass
+class HttpResponse:
+    status_code: int
+    url: str
+    headers: Dict[str, str] = field(default_factory=dict)
+    content: bytes = b""
+    truncated: bool = False
+
+    def json(self) -> Any:
+        return json.loads(self.content.decode("utf-8", errors="replace"))
+
+
+class HttpPool:
+    def __init__(
+        self,
+        max_connections: int = 100,
+        per_host: int = 8,
+        keepalive_seconds: float = 30.0,
+        default_timeout: float = 30.0,
+    ) -> None:
+        self.max_connections = max(1, int(max_connections))
+        self.per_host = max(1, int(per_host))
+        self.keepalive_seconds = float(keepalive_seconds)
+        self.default_timeout = float(default_timeout)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._hosts: Dict[str, asyncio.Semaphore] = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+
+    def _new_client(self) -> httpx.AsyncClient:
+        limits = httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_connections,
+            keepalive_expiry=self.keepalive_seconds,
+        )
+        return httpx.AsyncClient(limits=limits, timeout=self.default_timeout, follow_redirects=True)
+
+    def _bound(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    def _client_for_loop(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._client is None:
+            # First use (or the loop the pool was bound to is gone): bind to this loop.
+            self._loop = loop
+            self._client = self._new_client()
+            self._hosts = {}
+        return self._client
+
+    def _host_gate(self, url: str) -> asyncio.Semaphore:
+        host = (urllib.parse.urlparse(url).hostname or "").lower()
+        sem = self._hosts.get(host)
+        if sem is None:
+            sem = self._hosts[host] = asyncio.Semaphore(self.per_host)
+        return sem
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        *,
+        json_body: Any = None,
+        content: Optional[bytes] = None,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+        stop_when: Optional[Callable[[bytes], bool]] = None,
+    ) -> HttpResponse:
+        """Send a request and read at most `max_bytes` of the body. Raises on transport errors/timeouts.
+
+        `stop_when(chunk)` is called per body chunk; returning True stops reading and closes
+        the response (e.g. a streamed completion whose answer is complete).
+        """
+        client = self._client_for_loop()
+        t = self.default_timeout if timeout is None else float(timeout)
+        self.requests += 1
+        try:
+            async with self._host_gate(url):
+                self.in_flight += 1
+                try:
+                    return await asyncio.wait_for(
+                        self._send(client, method, url, json_body, content, headers, t, max_bytes, stop_when), timeout=t,
+                    )
+                finally:
+                    self.in_flight -= 1
+        except Exception:
+            self.errors += 1
+            raise
+
+    async def _send(self, client, method, url, json_body, content, headers, timeout, max_bytes, stop_when) -> HttpResponse:
+        async with client.stream(method, url, json=json_body, content=content, headers=headers, timeout=timeout) as resp:
+            buf = bytearray()
+            truncated = False
+            async for chunk in resp.aiter_bytes():
+                buf.extend(chunk)
+                if max_bytes and len(buf) > max_bytes:
+                    truncated = True
+                    del buf[max_bytes:]
+                    break
+                if stop_when is not None and stop_when(chunk):
+                    truncated = True
+                    break
+            return HttpResponse(
+                status_code=resp.status_code, url=str(resp.url),
+                headers={k.lower(): v for k, v in resp.headers.items()}, content=bytes(buf), truncated=truncated,
+            )
+
+    async def post_json(
+        self, url: str, payload: Any, timeout: Optional[float] = None, headers: Optional[Dict[str, str]] = None,
+    ) -> Any:
+        """POST `payload` as JSON and return the decoded JSON body (raises on HTTP errors)."""
+        h = {"Content-Type": "application/json"}
+        if headers:
+            h.update(headers)
+        resp = await self.request("POST", url, json_body=payload, headers=h, timeout=timeout)
+        if resp.status_code >= 400:
+            raise HttpStatusError(resp.status_code, url)
+        return resp.json()
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Attach the pool to the app's event loop (called from the lifespan)."""
+        with self._lock:
+            self._loop = loop
+            self._client = None
+            self._hosts = {}
+
+    def _run_sync(self, name: str, *args, **kwargs):
+        """Run the coroutine method `name` from a worker thread and return its result."""
+        if self._bound():
+            raise RuntimeError("HttpPool sync call on the event loop thread; await the async API instead")
+        loop = self._loop
+        if loop is not None and loop.is_running():
+            return asyncio.run_coroutine_threadsafe(getattr(self, name)(*args, **kwargs), loop).result()
+        return asyncio.run(self._private(name, *args, **kwargs))
+
+    async def _private(self, name: str, *args, **kwargs):
+        # No running app loop: use a throwaway pool for this one call.
+        pool = HttpPool(self.max_connections, self.per_host, self.keepalive_seconds, self.default_timeout)
+        try:
+            return await getattr(pool, name)(*args, **kwargs)
+        finally:
+            await pool.aclose()
+
+    def request_sync(self, method: str, url: str, **kwargs) -> HttpResponse:
+        return self._run_sync("request", method, url, **kwargs)
+
+    def post_json_sync(
+        self, url: str, payload: Any, timeout: Optional[float] = None, headers: Optional[Dict[str, str]] = None,
+    ) -> Any:
+        return self._run_sync("post_json", url, payload, timeout, headers)
+
+    async def aclose(self) -> None:
+        client, self._client = self._client, None
+        if client is not None:
+            await client.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "hosts": len(self._hosts),
+            "max_connections": self.max_connections,
+            "per_host_limit": self.per_host,
+        }
+
+
+http_pool = HttpPool(
+    HTTP_POOL_MAX_CONNECTIONS, HTTP_PER_HOST_LIMIT, HTTP_POOL_KEEPALIVE_SECONDS, HTTP_DEFAULT_TIMEOUT_SECONDS,
+)
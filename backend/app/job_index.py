@@ -0,0 +1,133 @@
+"""
+Secondary indexes over the live jobs projection.
+
+Every job is filed under ("all", ""), its status, creator, claimer (if any)
+and parent job (if any). Each index is a list of (created_at, job_id) kept
+sorted with bisect, so "newest N jobs with status X" walks N entries from the
+end instead of scanning and sorting every job ever created. `state` keeps it in
+step with `state.jobs` from apply_job_event, load_jobs and remove_jobs.
+"""
+from __future__ import annotations
+
+import bisect
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.models import Job
+
+IndexKey = Tuple[str, str]
+_Entry = Tuple[float, str]
+
+ALL: IndexKey = ("all", "")
+
+
+def _keys_for(job: Job) -> Tuple[IndexKey, ...]:
+    keys = [ALL, ("status", str(job.status)), ("creator", str(job.created_by or ""))]
+    if job.claimed_by:
+        keys.append(("claimer", str(job.claimed_by)))
+    if getattr(job, "parent_job_id", ""):
+        keys.append(("parent", str(job.parent_job_id)))
+    return tuple(keys)
+
+
+class JobIndex:
+    def __init__(self) -> None:
+        self._lists: Dict[IndexKey, List[_Entry]] = {}
+        # job_id -> (sort entry, keys it is filed under)
+        self._filed: Dict[str, Tuple[_Entry, Tuple[IndexKey, ...]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._filed)
+
+    def _add(self, key: IndexKey, entry: _Entry) -> None:
+        lst = self._lists.get(key)
+        if lst is None:
+            lst = self._lists[key] = []
+        if not lst or entry > lst[-1]:
+            lst.append(entry)  # the common case: a new job is the newest
+        else:
+            bisect.insort(lst, entry)
+
+    def _discard(self, key: IndexKey, entry: _Entry) -> None:
+        lst = self._lists.get(key)
+        if not lst:
+            return
+        i = bisect.bisect_left(lst, entry)
+        if i < len(lst) and lst[i] == entry:
+            del lst[i]
+            if not lst:
+                del self._lists[key]
+
+    def update(self, job: Job) -> None:
+        """File `job` under its current status/creator/claimer/parent (cheap when nothing changed)."""
+        entry = (float(job.created_at or 0.0), job.job_id)
+        keys = _keys_for(job)
+        old = self._filed.get(job.job_id)
+        if old is not None:
+            old_entry, old_keys = old
+            if old_entry == entry and old_keys == keys:
+                return
+            for k in old_keys:
+                if old_entry != entry or k not in keys:
+                    self._discard(k, old_entry)
+            for k in keys:
+                if old_entry != entry or k not in old_keys:
+                    self._add(k, entry)
+        else:
+            for k in keys:
+                self._add(k, entry)
+        self._filed[job.job_id] = (entry, keys)
+
+    def remove(self, job_id: str) -> None:
+        old = self._filed.pop(job_id, None)
+        if old is not None:
+            for k in old[1]:
+                self._discard(k, old[0])
+
+    def rebuild(self, jobs: Iterable[Job]) -> None:
+        self._lists = {}
+        self._filed = {}
+        for j in sorted(jobs, key=lambda j: (float(j.created_at or 0.0), j.job_id)):
+            self.update(j)
+
+    def count(self, key: IndexKey) -> int:
+        return len(self._lists.get(key) or ())
+
+    def newest_ids(self, key: IndexKey) -> Iterator[str]:
+        """Job ids filed under `key`, newest first."""
+        for _, jid in reversed(self._lists.get(key) or ()):
+            yield jid
+
+    def newest(
+        self,
+        jobs: Dict[str, Job],
+        keys: Iterable[IndexKey],
+        limit: int,
+        where: Optional[Callable[[Job], bool]] = None,
+    ) -> List[Job]:
+        """Up to `limit` jobs filed under every key in `keys`, newest first.
+
+        Walks the shortest of the lists and checks the other keys per job, so
+        the cost is O(limit) plus whatever `where` or the other keys reject.
+        """
+        keys = list(keys) or [ALL]
+        base = min(keys, key=self.count)
+        rest = [k for k in keys if k != base]
+        out: List[Job] = []
+        for jid in self.newest_ids(base):
+            if len(out) >= limit:
+                break
+            j = jobs.get(jid)
+            if j is None:
+                continue
+            if rest and not all(k in self._filed[jid][1] for k in rest):
+                continue
+            if where is not None and not where(j):
+                continue
+            out.append(j)
+        return out
+
+    def stats(self) -> dict:
+        kinds: Dict[str, int] = {}
+        for kind, _ in self._lists:
+            kinds[kind] = kinds.get(kind, 0) + 1
+        return {"jobs": len(self._filed), "lists": kinds}
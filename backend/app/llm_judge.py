@@ -0,0 +1,290 @@
+"""
+LLM-judge service for the `llm_judge` verifier.
+
+Judge calls go to VERIFY_LLM_BASE_URL's OpenAI-compatible
+`/v1/chat/completions` with `"stream": true`. The streamed deltas are fed to a
+scanner that finds the first `{...}` object in the reply; as soon as it closes,
+the stream is dropped, so a chatty model does not keep the request open after
+giving its verdict. Servers that ignore `stream` and answer with one JSON body
+are parsed the old way.
+
+At most VERIFY_LLM_CONCURRENCY calls run at once; the rest wait their turn
+(`waiting` in stats). Identical concurrent requests share one call. Verdicts
+are cached by the verifier through app.verify_cache, keyed by (model, task
+hash, submission hash). `verify_queue` sends llm_judge jobs here on the event
+loop instead of to its process pool; `judge_sync` serves callers in threads.
+Call latency p50/p95 is under `llm_judge` in GET /admin/metrics.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+from app.config import VERIFY_LLM_BASE_URL, VERIFY_LLM_CONCURRENCY, VERIFY_LLM_MODEL, VERIFY_LLM_TIMEOUT_SECONDS
+from app.http_client import HttpPool, http_pool
+
+_log = logging.getLogger(__name__)
+
+_SAMPLES = 512
+
+Verdict = Tuple[bool, str]
+
+
+def judge_prompt(task_summary: str, submission: str) -> str:
+    return f"""You are a verifier. Given a TASK and a SUBMISSION, decide if the task was completed successfully.
+
+TASK:
+{task_summary[:6000]}
+
+SUBMISSION:
+{submission[:6000]}
+
+Reply with ONLY a JSON object, no other text:
+{{"ok": true or false, "reason": "brief explanation"}}
+"""
+
+
+def parse_verdict(content: str) -> Optional[Verdict]:
+    """(ok, reason) from the first JSON object in a reply (inside a ```json fence if there is one)."""
+    if "```" in content:
+        m = re.search(r"```(?:json)?\s*(\{[\s\S]*?\})\s*```", content)
+        if m:
+            content = m.group(1)
+    i = content.find("{")
+    if i < 0:
+        return None
+    # Same scan as VerdictStream, so the object parsed is the one the stream stopped at.
+    scan = VerdictStream()
+    scan.content = content[i:]
+    if not scan._scan():
+        return None
+    try:
+        obj = json.loads(content[i : i + scan._pos])
+        return (bool(obj.get("ok")), str(obj.get("reason") or "")[:400])
+    except Exception:
+        return None
+
+
+class VerdictStream:
+    """Collects streamed completion text and says when the first JSON object is closed."""
+
+    def __init__(self) -> None:
+        self._buf = b""
+        self.content = ""
+        self.raw = bytearray()
+        self.sse = False
+        self.closed = False
+        self._pos = 0
+        self._depth = 0
+        self._in_str = False
+        self._esc = False
+
+    def feed(self, chunk: bytes) -> bool:
+        self.raw.extend(chunk)
+        self._buf += chunk
+        *lines, self._buf = self._buf.split(b"\n")
+        for line in lines:
+            line = line.strip()
+            if not line.startswith(b"data:"):
+                continue
+            self.sse = True
+            data = line[5:].strip()
+            if data == b"[DONE]":
+                continue
+            try:
+                choice = (json.loads(data).get("choices") or [{}])[0]
+            except Exception:
+                continue
+            piece = (choice.get("delta") or {}).get("content") or (choice.get("message") or {}).get("content") or ""
+            if piece:
+                self.content += piece
+        return self._scan()
+
+    def _scan(self) -> bool:
+        # Brace depth over the reply so far, ignoring braces inside JSON strings.
+        while not self.closed and self._pos < len(self.content):
+            c = self.content[self._pos]
+            self._pos += 1
+            if self._in_str:
+                if self._esc:
+                    self._esc = False
+                elif c == "\\":
+                    self._esc = True
+                elif c == '"':
+                    self._in_str = False
+            elif c == '"' and self._depth:
+                self._in_str = True
+            elif c == "{":
+                self._depth += 1
+            elif c == "}" and self._depth:
+                self._depth -= 1
+                self.closed = self._depth == 0
+        return self.closed
+
+    def text(self) -> str:
+        if self.sse:
+            return self.content
+        # Not an event stream: a plain (non-streamed) completion body.
+        try:
+            obj = json.loads(bytes(self.raw).decode("utf-8", errors="replace"))
+            choices = obj.get("choices") or []
+            return ((choices[0].get("message") or {}).get("content") or "") if choices else ""
+        except Exception:
+            return ""
+
+
+def _percentile(xs: list, q: float) -> float:
+    if not xs:
+        return 0.0
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(len(xs) * q))]
+
+
+class LlmJudge:
+    def __init__(self, base_url: str, model: str, timeout: float = 60.0, concurrency: int = 4) -> None:
+        self.base_url = (base_url or "").rstrip("/")
+        self.model = model
+        self.timeout = float(timeout)
+        self.concurrency = max(1, int(concurrency))
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._sem_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._flights: Dict[str, "asyncio.Future[Optional[Verdict]]"] = {}
+        self._lock = threading.Lock()
+        self._latency: Deque[float] = deque(maxlen=_SAMPLES)
+        self.calls = 0
+        self.errors = 0
+        self.unparsed = 0
+        self.early_stops = 0
+        self.shared = 0
+        self.waiting = 0
+        self.in_flight = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.base_url)
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Loop that `judge_sync` callers in worker threads hand their calls to."""
+        self._loop = loop
+
+    def _gate(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._sem is None or self._sem_loop is not loop:
+            self._sem, self._sem_loop = asyncio.Semaphore(self.concurrency), loop
+        return self._sem
+
+    async def judge(self, task_summary: str, submission: str, pool: Optional[HttpPool] = None) -> Optional[Verdict]:
+        """(ok, reason), or None if the judge is disabled, unreachable or gave no verdict."""
+        if not self.enabled:
+            return None
+        key = hashlib.sha256(f"{self.model}\x00{task_summary}\x00{submission}".encode("utf-8", errors="replace")).hexdigest()
+        flight = self._flights.get(key)
+        if flight is not None and flight.get_loop() is asyncio.get_running_loop():
+            self.shared += 1
+            return await asyncio.shield(flight)
+        flight = self._flights[key] = asyncio.get_running_loop().create_future()
+        verdict = None
+        try:
+            self.waiting += 1
+            try:
+                gate = self._gate()
+                await gate.acquire()
+            finally:
+                self.waiting -= 1
+            try:
+                self.in_flight += 1
+                verdict = await self._call(task_summary, submission, pool or http_pool)
+            finally:
+                self.in_flight -= 1
+                gate.release()
+            return verdict
+        finally:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            if not flight.done():
+                flight.set_result(verdict)
+
+    async def _call(self, task_summary: str, submission: str, pool: HttpPool) -> Optional[Verdict]:
+        payload = {
+            "model": self.model,
+            "messages": [{"role": "user", "content": judge_prompt(task_summary, submission)}],
+            "stream": True,
+            "temperature": 0.0,
+        }
+        stream = VerdictStream()
+        self.calls += 1
+        t0 = time.perf_counter()
+        try:
+            resp = await pool.request(
+                "POST", f"{self.base_url}/v1/chat/completions", json_body=payload,
+                headers={"Content-Type": "application/json"}, timeout=self.timeout, stop_when=stream.feed,
+            )
+        except Exception:
+            self.errors += 1
+            _log.debug("LLM judge call failed", exc_info=True)
+            return None
+        finally:
+            with self._lock:
+                self._latency.append(time.perf_counter() - t0)
+        if resp.status_code >= 400:
+            self.errors += 1
+            return None
+        if stream.closed:
+            self.early_stops += 1
+        verdict = parse_verdict(stream.text())
+        if verdict is None:
+            self.unparsed += 1
+        return verdict
+
+    def judge_sync(self, task_summary: str, submission: str) -> Optional[Verdict]:
+        """`judge` for code running in a worker thread (or outside the app)."""
+        loop = self._loop
+        try:
+            on_loop = asyncio.get_running_loop() is loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            raise RuntimeError("LlmJudge.judge_sync on the event loop thread; await judge() instead")
+        if loop is not None and loop.is_running():
+            return asyncio.run_coroutine_threadsafe(self.judge(task_summary, submission), loop).result()
+        return asyncio.run(self._judge_private(task_summary, submission))
+
+    async def _judge_private(self, task_summary: str, submission: str) -> Optional[Verdict]:
+        # No running app loop: a throwaway HTTP pool for this one call, as http_pool does.
+        pool = HttpPool(http_pool.max_connections, http_pool.per_host, http_pool.keepalive_seconds, http_pool.default_timeout)
+        try:
+            return await self.judge(task_summary, submission, pool)
+        finally:
+            await pool.aclose()
+
+    def stats(self) -> dict:
+        with self._lock:
+            xs = list(self._latency)
+        return {
+            "enabled": self.enabled,
+            "model": self.model,
+            "concurrency": self.concurrency,
+            "waiting": self.waiting,
+            "in_flight": self.in_flight,
+            "calls": self.calls,
+            "errors": self.errors,
+            "unparsed": self.unparsed,
+            "early_stops": self.early_stops,
+            "shared_in_flight": self.shared,
+            "latency_ms": {
+                "p50": round(_percentile(xs, 0.5) * 1000.0, 1),
+                "p95": round(_percentile(xs, 0.95) * 1000.0, 1),
+                "samples": len(xs),
+            },
+        }
+
+
+llm_judge = LlmJudge(VERIFY_LLM_BASE_URL, VERIFY_LLM_MODEL, VERIFY_LLM_TIMEOUT_SECONDS, VERIFY_LLM_CONCURRENCY)
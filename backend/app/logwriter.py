@@ -0,0 +1,236 @@
+"""
+Group-commit JSONL writer.
+
+Each registered log path gets a background thread fed by a bounded queue.
+Rows are batched and written with one open/write/close per batch instead of
+one per row, so request handlers only pay for a queue put. Subclasses override
+_encode/_write_batch to commit batches to another sink (e.g. SQLite).
+"""
+from __future__ import annotations
+
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+_log = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class _FlushRequest:
+    __slots__ = ("done",)
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+
+
+class LogWriter:
+    def __init__(
+        self,
+        path: Path,
+        *,
+        queue_max: int = 10000,
+        flush_interval_ms: float = 50.0,
+        batch_max: int = 500,
+        fsync: bool = False,
+    ) -> None:
+        self.path = Path(path)
+        self.fsync = bool(fsync)
+        self._interval = max(0.0, float(flush_interval_ms)) / 1000.0
+        self._batch_max = max(1, int(batch_max))
+        self._q: "queue.Queue" = queue.Queue(maxsize=max(1, int(queue_max)))
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        # Held while a batch is written; compaction takes it to swap the file safely.
+        self.io_lock = threading.Lock()
+        self._closed = False
+        # Orders appends against close(): nothing is queued behind the stop marker.
+        self._close_lock = threading.Lock()
+        self.enqueued = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.errors = 0
+        self.flush_ms_last = 0.0
+        self.flush_ms_max = 0.0
+        self.flush_ms_total = 0.0
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name=f"logwriter:{self.path.name}", daemon=True)
+            self._thread.start()
+
+    def append(self, obj: Any) -> None:
+        item = self._encode(obj)
+        with self._close_lock:
+            if not self._closed:
+                self._ensure_started()
+                self.enqueued += 1
+                self._q.put(item)
+                return
+        self._commit([item])
+
+    def pending(self) -> int:
+        return max(0, self.enqueued - self.written - self.failed)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until every row appended before this call is on disk (fsynced if configured)."""
+        with self._close_lock:
+            if self._closed or self._thread is None or not self._thread.is_alive():
+                return True
+            if self.pending() == 0:
+                return True
+            req = _FlushRequest()
+            self._q.put(req)
+        return req.done.wait(timeout)
+
+    def close(self, timeout: Optional[float] = 10.0) -> None:
+        with self._close_lock:
+            if self._closed:
+                return
+            self._closed = True
+            running = self._thread is not None and self._thread.is_alive()
+            if running:
+                self._q.put(_STOP)
+        if running:
+            self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        return {
+            "path": str(self.path),
+            "queue_depth": self._q.qsize(),
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "failed": self.failed,
+            "batches": self.batches,
+            "errors": self.errors,
+            "fsync": self.fsync,
+            "flush_ms_last": round(self.flush_ms_last, 3),
+            "flush_ms_max": round(self.flush_ms_max, 3),
+            "flush_ms_avg": round(self.flush_ms_total / self.batches, 3) if self.batches else 0.0,
+        }
+
+    def _run(self) -> None:
+        while True:
+            item = self._q.get()
+            lines: List[Any] = []
+            waiters: List[_FlushRequest] = []
+            stop = False
+            deadline = time.monotonic() + self._interval
+            while True:
+                if item is _STOP:
+                    stop = True
+                elif isinstance(item, _FlushRequest):
+                    waiters.append(item)
+                else:
+                    lines.append(item)
+                if stop or waiters or len(lines) >= self._batch_max:
+                    break
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._q.get(timeout=remaining) if remaining > 0 else self._q.get_nowait()
+                except queue.Empty:
+                    break
+            if stop:
+                # Drain anything still queued behind the stop marker.
+                while True:
+                    try:
+                        extra = self._q.get_nowait()
+                    except queue.Empty:
+                        break
+                    if isinstance(extra, _FlushRequest):
+                        waiters.append(extra)
+                    elif extra is not _STOP:
+                        lines.append(extra)
+            if lines:
+                self._commit(lines)
+            for w in waiters:
+                w.done.set()
+            if stop:
+                return
+
+    def _encode(self, obj: Any) -> Any:
+        return json.dumps(obj, ensure_ascii=False) + "\n"
+
+    def _write_batch(self, items: List[Any]) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a", encoding="utf-8") as f:
+            f.write("".join(items))
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _commit(self, items: List[Any]) -> None:
+        start = time.perf_counter()
+        try:
+            with self.io_lock:
+                self._write_batch(items)
+            self.written += len(items)
+        except Exception:
+            self.errors += 1
+            self.failed += len(items)
+            _log.warning("Log writer failed to write %d rows to %s", len(items), self.path, exc_info=True)
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
+        self.batches += 1
+        self.flush_ms_last = elapsed_ms
+        self.flush_ms_total += elapsed_ms
+        if elapsed_ms > self.flush_ms_max:
+            self.flush_ms_max = elapsed_ms
+
+
+# --- Registry of writers keyed by resolved path ---
+
+_writers: Dict[Path, LogWriter] = {}
+
+
+def register_log(path: Path, **kwargs) -> LogWriter:
+    key = Path(path).resolve()
+    w = _writers.get(key)
+    if w is None or w._closed:
+        w = LogWriter(key, **kwargs)
+        _writers[key] = w
+    return w
+
+
+def get_log_writer(path: Path) -> Optional[LogWriter]:
+    if not _writers:
+        return None
+    w = _writers.get(Path(path).resolve())
+    if w is None or w._closed:
+        return None
+    return w
+
+
+def flush_log(path: Path, timeout: Optional[float] = None) -> bool:
+    w = get_log_writer(path)
+    return w.flush(timeout) if w is not None else True
+
+
+def flush_all_logs(timeout: Optional[float] = None) -> None:
+    for w in list(_writers.values()):
+        w.flush(timeout)
+
+
+def shutdown_logs(timeout: Optional[float] = 10.0) -> None:
+    for w in list(_writers.values()):
+        try:
+            w.close(timeout)
+        except Exception:
+            _log.warning("Log writer shutdown failed for %s", w.path, exc_info=True)
+
+
+def log_writer_stats() -> dict:
+    return {w.path.name: w.stats() for w in _writers.values()}
+
+
+atexit.register(shutdown_logs)
@@ -7,9 +7,11 @@ This file is the app factory: creates the FastAPI app, adds middleware, loads st
 """
 from __future__ import annotations
 
+import asyncio
 import logging
 import time
 import uuid
+from contextlib import asynccontextmanager
 from dataclasses import asdict
 
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request
@@ -17,18 +19,57 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from starlette.responses import RedirectResponse, HTMLResponse, JSONResponse
 
-from app import state
+from app import compactor, state
 from app.auth import agent_from_auth, is_agent_route_allowed, is_public_route, require_admin
-from app.config import ADMIN_TOKEN, BACKEND_VERSION, DATA_DIR, validate_config
+from app.config import (
+    ADMIN_TOKEN, BACKEND_VERSION, CHECKPOINTS_ENABLED, DATA_DIR, EMBEDDINGS_BASE_URL, validate_config,
+)
+from app.embedding_migration import embedding_migration
+from app.embedding_worker import embedding_worker
+from app.http_client import http_pool
+from app.llm_judge import llm_judge
+from app.logwriter import shutdown_logs
 from app.models import AuditEntry
+from app.storage import storage
 from app.utils import safe_json_preview
+from app.verify_queue import verify_queue
+from app.world_feed import world_feed
 from app.ws import ws_manager
 
 _log = logging.getLogger(__name__)
 
+# --- Lifespan: background workers ---
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    http_pool.bind_loop(asyncio.get_running_loop())
+    llm_judge.bind_loop(asyncio.get_running_loop())
+    checkpoint_task = asyncio.create_task(state.checkpoint_loop())
+    compactor_task = asyncio.create_task(compactor.compactor_loop())
+    embedding_worker.start()
+    verify_queue.start()
+    if EMBEDDINGS_BASE_URL:
+        embedding_migration.resume_interrupted()
+    yield
+    await embedding_migration.stop(pause=False)
+    await embedding_worker.stop()
+    await verify_queue.stop()
+    checkpoint_task.cancel()
+    compactor_task.cancel()
+    try:
+        if CHECKPOINTS_ENABLED:
+            state.write_checkpoints()
+    except Exception:
+        _log.warning("Final checkpoint failed", exc_info=True)
+    await http_pool.aclose()
+    # Drain queued log rows before the process exits.
+    await asyncio.to_thread(shutdown_logs)
+    await asyncio.to_thread(storage.close)
+
+
 # --- Create FastAPI app ---
 
-app = FastAPI(title="MoltWorld", version=BACKEND_VERSION)
+app = FastAPI(title="MoltWorld", version=BACKEND_VERSION, lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -129,9 +170,9 @@ async def ui_redirect(rest: str = ""):
 async def ws_world(ws: WebSocket):
     await ws_manager.connect(ws)
     try:
-        await ws.send_json({"type": "world_state", "data": state.get_world_snapshot().model_dump()})
+        await ws_manager.send(ws, world_feed.snapshot_message())
         while True:
-            await ws.receive_text()
+            await world_feed.handle_client_message(ws, await ws.receive_text())
     except WebSocketDisconnect:
         await ws_manager.disconnect(ws)
     except Exception:
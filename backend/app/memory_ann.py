@@ -0,0 +1,270 @@
+"""
+Optional IVF (inverted file) approximate nearest-neighbour index per agent.
+
+The unit-normalised embeddings of an agent are clustered with spherical k-means
+into ~sqrt(n) lists; each vector is filed under its nearest centroid. A query
+probes the `nprobe` closest lists, so retrieve only scores those rows (plus rows
+sharing a query token and the most recent rows, which can win on recency or
+importance alone) instead of every memory. `nprobe` is the recall-vs-latency
+knob: more lists means higher recall and more rows scored.
+
+New vectors are filed incrementally on each cache sync. Centroids are retrained
+when the index has grown 4x since the last training, and the index is discarded
+when EMBEDDINGS_MODEL or the embedding dimension changes. Centroids and list
+assignments are saved to `memory_embeddings/<agent>.ann.npz`; assignments are
+checked against a hash of the memory ids they cover before they are reused.
+
+    python -m app.memory_ann --rows 100000 --dim 256    # recall/latency vs exact search
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import logging
+import os
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+from app.config import (
+    EMBEDDINGS_MODEL, MEMORY_ANN_MIN_ROWS, MEMORY_ANN_NPROBE, MEMORY_ANN_RECENT,
+    MEMORY_ANN_SAVE_EVERY, MEMORY_EMBED_DIR,
+)
+from app.memory_index import MemoryIndex
+from app.storage import safe_key
+
+_log = logging.getLogger(__name__)
+
+ANN_VERSION = 1
+_KMEANS_ITERS = 8
+_SAMPLE_PER_LIST = 64
+_RETRAIN_GROWTH = 4
+
+
+def ann_path(agent_id: str) -> Path:
+    return MEMORY_EMBED_DIR / f"{safe_key(agent_id)}.ann.npz"
+
+
+def _ids_sha(ids: List[Optional[str]]) -> str:
+    return hashlib.sha256("\n".join(i or "" for i in ids).encode("utf-8")).hexdigest()
+
+
+def train_centroids(vecs: np.ndarray, nlist: int, seed: int = 0) -> np.ndarray:
+    """Spherical k-means over unit vectors; returns `nlist` unit centroids."""
+    rng = np.random.default_rng(seed)
+    nlist = max(1, min(nlist, len(vecs)))
+    if len(vecs) > nlist * _SAMPLE_PER_LIST:
+        vecs = vecs[rng.choice(len(vecs), nlist * _SAMPLE_PER_LIST, replace=False)]
+    cent = vecs[rng.choice(len(vecs), nlist, replace=False)].copy()
+    for _ in range(_KMEANS_ITERS):
+        assign = np.argmax(vecs @ cent.T, axis=1)
+        sums = np.zeros_like(cent)
+        np.add.at(sums, assign, vecs)
+        norms = np.linalg.norm(sums, axis=1)
+        empty = norms <= 0
+        # Empty lists keep their previous centroid.
+        sums[empty] = cent[empty]
+        norms[empty] = 1.0
+        cent = (sums / norms[:, None]).astype(np.float32)
+    return cent
+
+
+class IvfIndex:
+    """Inverted-file index over one agent's MemoryIndex embeddings."""
+
+    def __init__(self, path: Optional[Path], model: str = EMBEDDINGS_MODEL, min_rows: int = MEMORY_ANN_MIN_ROWS) -> None:
+        self.path = path
+        self.model = model
+        self.min_rows = max(1, int(min_rows))
+        self.dim = 0
+        self.centroids: Optional[np.ndarray] = None
+        self.trained_rows = 0
+        self.row_list = np.zeros(0, dtype=np.int32)
+        self.lists: List[np.ndarray] = []
+        self._generation = -1
+        self._replaced = 0
+        self._unsaved = 0
+        self._loaded_rows: Optional[np.ndarray] = None
+        self._loaded_sha = ""
+        self._load()
+
+    # --- persistence ---
+
+    def _load(self) -> None:
+        if self.path is None:
+            return
+        try:
+            with np.load(self.path, allow_pickle=False) as z:
+                if int(z["version"]) != ANN_VERSION or str(z["model"]) != self.model:
+                    return
+                self.dim = int(z["dim"])
+                self.centroids = z["centroids"].astype(np.float32)
+                self.trained_rows = int(z["trained_rows"])
+                self._loaded_rows = z["row_list"].astype(np.int32)
+                self._loaded_sha = str(z["ids_sha"])
+        except FileNotFoundError:
+            return
+        except Exception:
+            _log.warning("Ignoring unreadable ANN index %s", self.path, exc_info=True)
+            self.dim, self.centroids = 0, None
+
+    def save(self, index: MemoryIndex) -> None:
+        if self.centroids is None or self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp.npz")
+        n = min(len(self.row_list), index.n)
+        np.savez(
+            tmp,
+            version=np.int64(ANN_VERSION),
+            model=np.str_(self.model),
+            dim=np.int64(self.dim),
+            centroids=self.centroids,
+            trained_rows=np.int64(self.trained_rows),
+            row_list=self.row_list[:n],
+            ids_sha=np.str_(_ids_sha(index.ids[:n])),
+        )
+        os.replace(tmp, self.path)
+        self._unsaved = 0
+
+    # --- maintenance ---
+
+    def _clear_lists(self) -> None:
+        self.row_list = np.full(0, -1, dtype=np.int32)
+        self.lists = [np.zeros(0, dtype=np.int64) for _ in range(0 if self.centroids is None else len(self.centroids))]
+
+    def _file(self, index: MemoryIndex, rows: np.ndarray) -> None:
+        if len(rows) == 0:
+            return
+        assign = np.argmax(index.unit_vectors(rows, self.dim) @ self.centroids.T, axis=1).astype(np.int32)
+        self.row_list[rows] = assign
+        order = np.argsort(assign, kind="stable")
+        bounds = np.searchsorted(assign[order], np.arange(len(self.centroids) + 1))
+        for lid in np.flatnonzero(np.diff(bounds)):
+            self.lists[lid] = np.concatenate([self.lists[lid], rows[order[bounds[lid]:bounds[lid + 1]]]])
+        self._unsaved += len(rows)
+
+    def _train(self, index: MemoryIndex, dim: int) -> None:
+        rows = index.embedded_rows(dim)
+        t0 = time.time()
+        nlist = max(1, int(np.sqrt(len(rows))))
+        self.dim = dim
+        self.centroids = train_centroids(index.unit_vectors(rows, dim), nlist)
+        self.trained_rows = len(rows)
+        self._generation, self._replaced = index.generation, index.replaced
+        self._loaded_rows = None
+        self._clear_lists()
+        self.row_list = np.full(index.n, -1, dtype=np.int32)
+        self._file(index, rows)
+        _log.info("Trained ANN index %s: %d rows, %d lists in %.2fs", self.path or "(unsaved)", len(rows), nlist, time.time() - t0)
+        self.save(index)
+
+    def sync(self, index: MemoryIndex) -> None:
+        """File vectors added since the last sync; train or retrain when needed."""
+        dims = index.dims
+        if len(dims) != 1:
+            return
+        dim, count = next(iter(dims.items()))
+        if self.centroids is None or dim != self.dim:
+            if count >= self.min_rows:
+                self._train(index, dim)
+            return
+        if count >= self.trained_rows * _RETRAIN_GROWTH:
+            self._train(index, dim)
+            return
+        if index.generation != self._generation or index.replaced != self._replaced:
+            self._generation, self._replaced = index.generation, index.replaced
+            self._clear_lists()
+            if self._loaded_rows is not None:
+                loaded, self._loaded_rows = self._loaded_rows, None
+                if len(loaded) <= index.n and _ids_sha(index.ids[:len(loaded)]) == self._loaded_sha:
+                    self.row_list = loaded
+                    for lid in range(len(self.lists)):
+                        self.lists[lid] = np.flatnonzero(loaded == lid)
+        if len(self.row_list) < index.n:
+            self.row_list = np.concatenate([self.row_list, np.full(index.n - len(self.row_list), -1, dtype=np.int32)])
+        rows = index.embedded_rows(dim)
+        self._file(index, rows[self.row_list[rows] < 0])
+        if self._unsaved >= MEMORY_ANN_SAVE_EVERY:
+            self.save(index)
+
+    # --- search ---
+
+    def candidates(
+        self,
+        index: MemoryIndex,
+        qemb: Optional[List[float]],
+        qtok: set,
+        nprobe: int = MEMORY_ANN_NPROBE,
+        recent: int = MEMORY_ANN_RECENT,
+    ) -> Optional[np.ndarray]:
+        """Rows to score for a query, or None when exact search should be used."""
+        if self.centroids is None or nprobe <= 0 or not qemb or len(qemb) != self.dim:
+            return None
+        if index.dims.keys() != {self.dim}:
+            return None
+        q = np.asarray(qemb, dtype=np.float32)
+        nprobe = min(int(nprobe), len(self.centroids))
+        sims = self.centroids @ q
+        probe = np.argpartition(-sims, nprobe - 1)[:nprobe]
+        parts = [self.lists[lid] for lid in probe]
+        parts.append(index.token_rows(qtok))
+        parts.append(np.arange(max(0, index.n - int(recent)), index.n, dtype=np.int64))
+        rows = np.unique(np.concatenate(parts))
+        # Lists can hold rows since re-filed elsewhere; they are just extra candidates.
+        return rows[rows < index.n]
+
+
+def _bench(n_rows: int, dim: int, queries: int, k: int, clusters: int, noise: float) -> None:
+    from app.utils import tok
+    rng = np.random.default_rng(1)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    vecs = centers[rng.integers(0, clusters, n_rows)] + noise * rng.normal(size=(n_rows, dim)).astype(np.float32)
+    rows = [{"memory_id": f"m{i}", "text": f"note {i}", "created_at": 60.0 * i, "importance": 0.3} for i in range(n_rows)]
+    embs = {f"m{i}": vecs[i].tolist() for i in range(n_rows)}
+    index = MemoryIndex()
+    index.add_rows(rows, embs)
+    ivf = IvfIndex(None, min_rows=1)
+    t0 = time.time()
+    ivf.sync(index)
+    print(f"rows={n_rows} dim={dim} lists={len(ivf.centroids)} build={time.time() - t0:.2f}s")
+    qs = [(centers[rng.integers(0, clusters)] + noise * rng.normal(size=dim)).tolist() for _ in range(queries)]
+    # Relevance-only weights: the recent rows the blend would favour are always candidates,
+    # so they would hide how well the lists themselves recall.
+    args = (60.0 * n_rows, 3 * 3600.0, 1.0, 0.0, 0.0)
+
+    def run(nprobe: int):
+        from app.memory_index import top_k
+        out, t0 = [], time.perf_counter()
+        for q in qs:
+            qtok = tok("recall query")
+            sel = ivf.candidates(index, q, qtok, nprobe) if nprobe > 0 else None
+            cols = index.score(qtok, q, *args, rows=sel)
+            top = top_k(cols["score"], k)
+            out.append({int(sel[i]) if sel is not None else i for i in top})
+        return out, (time.perf_counter() - t0) * 1000.0 / len(qs)
+
+    exact, ms = run(0)
+    print(f"exact        {ms:8.2f} ms/query")
+    for nprobe in (1, 2, 4, 8, 16, 32, 64):
+        got, ms = run(nprobe)
+        recall = sum(len(a & b) for a, b in zip(got, exact)) / float(sum(len(b) for b in exact))
+        print(f"nprobe={nprobe:<5} {ms:8.2f} ms/query  recall@{k}={recall:.3f}")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Benchmark the IVF memory index against exact retrieve scoring.")
+    ap.add_argument("--rows", type=int, default=100000)
+    ap.add_argument("--dim", type=int, default=256)
+    ap.add_argument("--queries", type=int, default=50)
+    ap.add_argument("--k", type=int, default=8)
+    ap.add_argument("--clusters", type=int, default=1000, help="topics the synthetic vectors are drawn around")
+    ap.add_argument("--noise", type=float, default=1.5, help="per-dimension spread around each topic")
+    args = ap.parse_args()
+    _bench(args.rows, args.dim, args.queries, args.k, args.clusters, args.noise)
+
+
+if __name__ == "__main__":
+    main()
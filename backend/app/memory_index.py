@@ -0,0 +1,431 @@
+"""
+Columnar scoring index over one agent's memories.
+
+Rows are kept in memory-file order as flat columns: created_at, clamped
+importance, an inverted index (posting list plus term frequencies per word,
+and document lengths), and a float32 embedding matrix with precomputed row
+norms. `score()` evaluates relevance (max of token Jaccard and embedding
+cosine), recency decay, importance and an optional BM25 term for every row in
+one NumPy pass; with the BM25 weight at 0 it skips BM25 and reproduces the
+per-row loop that `/memory/{agent_id}/retrieve` used to run (including skipping
+rows whose fields do not parse). `bm25()` alone ranks `/memory/{agent_id}/search`.
+
+The token side (everything but embeddings) is saved to
+`memory/<agent>.tokens.npz` every MEMORY_TOKEN_INDEX_SAVE_EVERY new rows. On
+the next load, rows covered by a saved index whose content hash still matches
+are restored from it instead of being re-tokenized.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import math
+import os
+from array import array
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.config import MEMORY_DIR, MEMORY_TOKEN_INDEX_SAVE_EVERY
+from app.storage import safe_key
+from app.utils import tok_terms
+
+_log = logging.getLogger(__name__)
+
+_DEFAULT_IMPORTANCE = 0.3
+TOKEN_INDEX_VERSION = 1
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def token_index_path(agent_id: str) -> Path:
+    return MEMORY_DIR / f"{safe_key(agent_id)}.tokens.npz"
+
+
+def _row_terms(r: dict) -> List[str]:
+    text = str(r.get("text") or "")
+    tags = r.get("tags") or []
+    return tok_terms(text + " " + " ".join([str(t) for t in tags]))
+
+
+def _row_columns(r: dict):
+    """(created_at, importance) for a memory row; raises like the old per-row scorer."""
+    created_at = float(r.get("created_at") or 0.0)
+    imp = float(r["importance"]) if ("importance" in r and r["importance"] is not None) else _DEFAULT_IMPORTANCE
+    return created_at, max(0.0, min(1.0, imp))
+
+
+def _rows_sha(rows: List[dict]) -> str:
+    """Hash of the fields the token index is derived from."""
+    h = hashlib.sha256()
+    for r in rows:
+        if isinstance(r, dict):
+            key = (r.get("memory_id"), r.get("created_at"), r.get("importance"), r.get("text"), r.get("tags"))
+        else:
+            key = r
+        h.update(repr(key).encode("utf-8", errors="replace"))
+        h.update(b"\n")
+    return h.hexdigest()
+
+
+def _frombuffer(a: array, dtype) -> np.ndarray:
+    return np.frombuffer(a, dtype=dtype) if len(a) else np.zeros(0, dtype=dtype)
+
+
+class MemoryIndex:
+    """Scoring columns aligned with AgentMemory.rows."""
+
+    def __init__(self, path: Optional[Path] = None) -> None:
+        self.path = path
+        self.reset()
+
+    def reset(self) -> None:
+        self.n = 0
+        self.generation = getattr(self, "generation", 0) + 1
+        self.unsaved = 0
+        self._created = array("d")
+        self._importance = array("d")
+        self._ntok = array("i")
+        self._dl = array("i")
+        self._dl_sum = 0
+        self._valid = array("b")
+        self._postings: Dict[str, array] = {}
+        self._tf: Dict[str, array] = {}
+        self.ids: List[Optional[str]] = []
+        self._rows_by_id: Dict[str, List[int]] = {}
+        self.reset_embeddings()
+
+    def reset_embeddings(self) -> None:
+        self.generation = getattr(self, "generation", 0) + 1
+        self.replaced = 0
+        self._emb = np.zeros((0, 0), dtype=np.float32)
+        self._edim = np.zeros(0, dtype=np.int32)
+        self._enorm = np.zeros(0, dtype=np.float32)
+        self._dims: Dict[int, int] = {}
+
+    # --- building ---
+
+    def add_rows(self, rows: List[dict], embeddings: Dict[str, List[float]]) -> None:
+        start = self.n
+        restored = self._restore(rows) if start == 0 and self.path is not None else 0
+        for r in rows[:restored]:
+            self._add_id(r)
+        for r in rows[restored:]:
+            i = self.n
+            # Rows that fail to parse stay searchable by text but never score in retrieve.
+            ok = 1
+            try:
+                terms = _row_terms(r)
+            except Exception:
+                terms, ok = [], 0
+            try:
+                created_at, imp = _row_columns(r)
+            except Exception:
+                created_at, imp, ok = 0.0, 0.0, 0
+            counts = Counter(terms)
+            self._created.append(created_at)
+            self._importance.append(imp)
+            self._ntok.append(len(counts))
+            self._dl.append(len(terms))
+            self._dl_sum += len(terms)
+            self._valid.append(ok)
+            for t, c in counts.items():
+                p = self._postings.get(t)
+                if p is None:
+                    p = self._postings[t] = array("i")
+                    self._tf[t] = array("i")
+                p.append(i)
+                self._tf[t].append(c)
+            self._add_id(r)
+        self.unsaved += len(rows) - restored
+        self._grow(self.n)
+        for i in range(start, self.n):
+            mid = self.ids[i]
+            if mid is not None and mid in embeddings:
+                self._set_embedding(i, embeddings[mid])
+
+    def _add_id(self, r: dict) -> None:
+        mid = r.get("memory_id") if isinstance(r, dict) else None
+        mid = mid if isinstance(mid, str) else None
+        self.ids.append(mid)
+        if mid is not None:
+            self._rows_by_id.setdefault(mid, []).append(self.n)
+        self.n += 1
+
+    def add_embeddings(self, embeddings: Dict[str, List[float]], memory_ids) -> None:
+        """Copy the (new or replaced) vectors of `memory_ids` onto their rows."""
+        for mid in memory_ids:
+            vec = embeddings.get(mid)
+            if vec is None:
+                continue
+            for i in self._rows_by_id.get(mid, ()):
+                self._set_embedding(i, vec)
+
+    def _grow(self, rows: int, width: int = 0) -> None:
+        cap, cur_w = self._emb.shape
+        width = max(width, cur_w)
+        if rows <= cap and width == cur_w:
+            return
+        new_cap = max(rows, cap * 2 if rows > cap else cap, 64)
+        emb = np.zeros((new_cap, width), dtype=np.float32)
+        emb[:cap, :cur_w] = self._emb
+        self._emb = emb
+        if new_cap > cap:
+            self._edim = np.concatenate([self._edim, np.zeros(new_cap - cap, dtype=np.int32)])
+            self._enorm = np.concatenate([self._enorm, np.zeros(new_cap - cap, dtype=np.float32)])
+
+    def _set_embedding(self, i: int, vec: List[float]) -> None:
+        d = len(vec)
+        self._grow(self.n, d)
+        row = self._emb[i]
+        row[:d] = vec
+        row[d:] = 0.0
+        old = int(self._edim[i])
+        if old:
+            self.replaced += 1
+            self._dims[old] -= 1
+            if not self._dims[old]:
+                del self._dims[old]
+        self._dims[d] = self._dims.get(d, 0) + 1
+        self._edim[i] = d
+        self._enorm[i] = np.sqrt(np.dot(row[:d], row[:d]))
+
+    # --- persistence (token side) ---
+
+    def save(self, rows: List[dict]) -> None:
+        """Write the token index for `rows` (the rows it was built from) to `self.path`."""
+        if self.path is None:
+            return
+        n = self.n
+        vocab = sorted(self._postings)
+        lens = np.array([len(self._postings[t]) for t in vocab], dtype=np.int64)
+        offsets = np.concatenate([[0], np.cumsum(lens)]).astype(np.int64)
+
+        def cat(parts: List[np.ndarray]) -> np.ndarray:
+            return np.concatenate(parts) if parts else np.zeros(0, dtype=np.int32)
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp.npz")
+        np.savez(
+            tmp,
+            version=np.int64(TOKEN_INDEX_VERSION),
+            n=np.int64(n),
+            rows_sha=np.str_(_rows_sha(rows[:n])),
+            created=_frombuffer(self._created, np.float64),
+            importance=_frombuffer(self._importance, np.float64),
+            ntok=_frombuffer(self._ntok, np.int32),
+            dl=_frombuffer(self._dl, np.int32),
+            valid=_frombuffer(self._valid, np.int8),
+            vocab=np.array(vocab, dtype=np.str_),
+            offsets=offsets,
+            postings=cat([_frombuffer(self._postings[t], np.int32) for t in vocab]),
+            tf=cat([_frombuffer(self._tf[t], np.int32) for t in vocab]),
+        )
+        os.replace(tmp, self.path)
+        self.unsaved = 0
+
+    def maybe_save(self, rows: List[dict]) -> None:
+        if self.path is not None and self.unsaved >= MEMORY_TOKEN_INDEX_SAVE_EVERY:
+            try:
+                self.save(rows)
+            except Exception:
+                _log.warning("Could not save token index %s", self.path, exc_info=True)
+
+    def _restore(self, rows: List[dict]) -> int:
+        """Load the saved token columns if they match a prefix of `rows`; returns rows covered."""
+        try:
+            with np.load(self.path, allow_pickle=False) as z:
+                n = int(z["n"])
+                if int(z["version"]) != TOKEN_INDEX_VERSION or n > len(rows) or n <= 0:
+                    return 0
+                if str(z["rows_sha"]) != _rows_sha(rows[:n]):
+                    return 0
+                self._created.frombytes(z["created"].astype(np.float64).tobytes())
+                self._importance.frombytes(z["importance"].astype(np.float64).tobytes())
+                self._ntok.frombytes(z["ntok"].astype(np.int32).tobytes())
+                dl = z["dl"].astype(np.int32)
+                self._dl.frombytes(dl.tobytes())
+                self._dl_sum = int(dl.sum())
+                self._valid.frombytes(z["valid"].astype(np.int8).tobytes())
+                offsets, postings, tf = z["offsets"], z["postings"].astype(np.int32), z["tf"].astype(np.int32)
+                for j, t in enumerate(z["vocab"].tolist()):
+                    lo, hi = int(offsets[j]), int(offsets[j + 1])
+                    p, f = array("i"), array("i")
+                    p.frombytes(postings[lo:hi].tobytes())
+                    f.frombytes(tf[lo:hi].tobytes())
+                    self._postings[t], self._tf[t] = p, f
+                return n
+        except FileNotFoundError:
+            return 0
+        except Exception:
+            _log.warning("Ignoring unreadable token index %s", self.path, exc_info=True)
+            self.reset()
+            return 0
+
+    # --- embedding access (for app.memory_ann) ---
+
+    @property
+    def dims(self) -> Dict[int, int]:
+        """Embedding dimension -> number of rows carrying a vector of that size."""
+        return dict(self._dims)
+
+    def embedded_rows(self, dim: int) -> np.ndarray:
+        return np.flatnonzero(self._edim[:self.n] == dim)
+
+    def unit_vectors(self, rows: np.ndarray, dim: int) -> np.ndarray:
+        """L2-normalised float32 vectors of `rows` (all of dimension `dim`)."""
+        block = self._emb[rows, :dim]
+        norms = self._enorm[rows][:, None]
+        return np.divide(block, norms, out=np.zeros_like(block), where=norms > 0)
+
+    def token_rows(self, qtok: set) -> np.ndarray:
+        """Rows sharing at least one token with the query."""
+        lists = [np.frombuffer(self._postings[t], dtype=np.int32) for t in qtok if t in self._postings]
+        if not lists:
+            return np.zeros(0, dtype=np.int64)
+        return np.unique(np.concatenate(lists)).astype(np.int64)
+
+    # --- scoring ---
+
+    def bm25(self, qtok: set, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Okapi BM25 of every row (or of `rows`, aligned with it) for the query terms, divided
+        by the query's upper bound (each term's idf * (k1 + 1)) so it lies in [0, 1).
+        Costs O(matching postings), or O(len(rows) * log postings) with `rows`."""
+        n = self.n
+        out = np.zeros(n if rows is None else len(rows), dtype=np.float64)
+        if n == 0 or len(out) == 0:
+            return out
+        avgdl = max(self._dl_sum / float(n), 1.0)
+        dl = _frombuffer(self._dl, np.int32)
+        bound = 0.0
+        for t in qtok:
+            p = self._postings.get(t)
+            df = len(p) if p is not None else 0
+            idf = math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+            bound += idf * (BM25_K1 + 1.0)
+            if not df:
+                continue
+            post = np.frombuffer(p, dtype=np.int32)
+            tf = np.frombuffer(self._tf[t], dtype=np.int32).astype(np.float64)
+            if rows is None:
+                dest = post
+            else:
+                dest, src = self._posting_hits(post, rows)
+                post, tf = rows[dest], tf[src]
+            norm = BM25_K1 * (1.0 - BM25_B + BM25_B * dl[post] / avgdl)
+            out[dest] += idf * tf * (BM25_K1 + 1.0) / (tf + norm)
+        return out / bound if bound > 0 else out
+
+    @staticmethod
+    def _posting_hits(post: np.ndarray, rows: np.ndarray):
+        """(positions in `rows`, positions in `post`) of the rows that appear in the sorted posting list."""
+        at = np.searchsorted(post, rows)
+        inside = at < len(post)
+        found = np.zeros(len(rows), dtype=bool)
+        found[inside] = post[at[inside]] == rows[inside]
+        where = np.flatnonzero(found)
+        return where, at[where]
+
+    def _token_relevance(self, qtok: set, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        n = self.n
+        m = n if rows is None else len(rows)
+        lists = [np.frombuffer(self._postings[t], dtype=np.int32) for t in qtok if t in self._postings]
+        if not qtok or not lists:
+            return np.zeros(m, dtype=np.float64)
+        hits = np.concatenate(lists)
+        if rows is None:
+            inter = np.bincount(hits, minlength=n).astype(np.float64)
+            ntok = _frombuffer(self._ntok, np.int32)[:n].astype(np.float64)
+        else:
+            # Count matches for the candidate rows only: O(postings log postings), not O(n).
+            hits.sort()
+            inter = (np.searchsorted(hits, rows, "right") - np.searchsorted(hits, rows, "left")).astype(np.float64)
+            ntok = _frombuffer(self._ntok, np.int32)[:n][rows].astype(np.float64)
+        union = len(qtok) + ntok - inter
+        return np.divide(inter, union, out=np.zeros(m, dtype=np.float64), where=ntok > 0)
+
+    def _embed_relevance(self, qemb: Optional[List[float]], rows: Optional[np.ndarray] = None) -> np.ndarray:
+        n = self.n
+        out = np.zeros(n if rows is None else len(rows), dtype=np.float64)
+        if not qemb or n == 0 or self._emb.shape[1] == 0 or len(out) == 0:
+            return out
+        q = np.asarray(qemb, dtype=np.float32)
+        edim = self._edim[:n] if rows is None else self._edim[rows]
+        dims = sorted(self._dims)
+        for d in dims:
+            m = min(d, len(q))
+            qm = q[:m]
+            qn = float(np.sqrt(np.dot(qm, qm)))
+            if qn <= 0:
+                continue
+            if len(dims) == 1:
+                # Rows without a vector are all-zero with norm 0 and score 0 below.
+                pos = slice(None)
+                src = slice(0, n) if rows is None else rows
+            else:
+                pos = np.flatnonzero(edim == d)
+                src = pos if rows is None else rows[pos]
+            block = self._emb[src, :m]
+            rn = self._enorm[src] if m == d else np.sqrt(np.einsum("ij,ij->i", block, block))
+            dots = block @ qm
+            cos = np.divide(dots, rn * qn, out=np.zeros(len(rn), dtype=np.float32), where=rn > 0)
+            out[pos] = np.clip(cos, 0.0, 1.0)
+        return out
+
+    def score(
+        self,
+        qtok: set,
+        qemb: Optional[List[float]],
+        now: float,
+        halflife_seconds: float,
+        w_relevance: float,
+        w_recency: float,
+        w_importance: float,
+        rows: Optional[np.ndarray] = None,
+        w_bm25: float = 0.0,
+    ) -> Dict[str, np.ndarray]:
+        """Per-row score components; rows that failed to parse score -inf.
+
+        BM25 is only computed, and `relevance_bm25` only returned, when `w_bm25` is non-zero.
+
+        With `rows` (an int array of row indices) only those rows are scored and
+        the returned columns are aligned with `rows` instead of all rows.
+
+        Reads the growable columns through zero-copy views, so callers hold the
+        owning AgentMemory's lock (appends would otherwise fail to resize them).
+        """
+        n = self.n
+        pick = slice(0, n) if rows is None else rows
+        rel_tok = self._token_relevance(qtok, rows)
+        rel_emb = self._embed_relevance(qemb, rows)
+        rel = np.maximum(rel_tok, rel_emb)
+        age = np.maximum(0.0, now - _frombuffer(self._created, np.float64)[:n][pick])
+        rec = np.power(0.5, age / halflife_seconds)
+        imp = np.array(_frombuffer(self._importance, np.float64)[:n][pick])
+        score = float(w_relevance) * rel + float(w_recency) * rec + float(w_importance) * imp
+        rel_bm25 = None
+        if w_bm25:
+            rel_bm25 = self.bm25(qtok, rows)
+            score = score + float(w_bm25) * rel_bm25
+        valid = _frombuffer(self._valid, np.int8)[:n][pick].astype(bool)
+        score = np.where(valid, score, -np.inf)
+        out = {
+            "score": score, "relevance": rel, "recency": rec, "importance": imp,
+            "relevance_token": rel_tok, "relevance_embed": rel_emb,
+        }
+        if rel_bm25 is not None:
+            out["relevance_bm25"] = rel_bm25
+        return out
+
+
+def top_k(score: np.ndarray, k: int) -> List[int]:
+    """Indices of the `k` best finite scores, best first; ties keep row order."""
+    finite = np.flatnonzero(np.isfinite(score))
+    if len(finite) > k:
+        s = score[finite]
+        cut = s[np.argpartition(-s, k - 1)[:k]].min()
+        finite = finite[s >= cut]
+    order = np.lexsort((finite, -score[finite]))
+    return [int(i) for i in finite[order[:k]]]
@@ -0,0 +1,181 @@
+"""
+LRU cache of parsed agent memories and embeddings.
+
+Each cached agent keeps its memory rows and memory_id -> embedding vectors along
+with the storage cursor they were read up to. On access the stream signature is
+checked: unchanged means a hit; if the data before the cursor is intact only the
+new tail is read (appends, from this process or another); anything else (an
+external rewrite) reloads the agent from scratch. Embeddings come from the
+active embedding store; cached agents are reloaded when it is switched.
+"""
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from app import embedding_versions
+from app.config import MEMORY_ANN_ENABLED, MEMORY_CACHE_MAX_AGENTS
+from app.memory_ann import IvfIndex, ann_path
+from app.memory_index import MemoryIndex, token_index_path
+from app.storage import embedding_stream, memory_stream, storage
+
+
+class _StreamView:
+    __slots__ = ("stream", "cursor", "token", "sig")
+
+    def __init__(self, stream: str) -> None:
+        self.stream = stream
+        self.cursor = 0
+        self.token = ""
+        self.sig: tuple = ()
+
+    def sync(self, on_rows, reset) -> str:
+        """Bring the view up to date; returns "hit", "refresh" or "reload"."""
+        # Memory appends go through the background writer; read them back here.
+        storage.flush(self.stream)
+        sig = storage.signature(self.stream)
+        if sig == self.sig:
+            return "hit"
+        outcome = "refresh"
+        if self.cursor and storage.cursor_token(self.stream, self.cursor) != self.token:
+            reset()
+            self.cursor = 0
+            outcome = "reload"
+        rows, self.cursor = storage.read_since(self.stream, self.cursor)
+        self.token = storage.cursor_token(self.stream, self.cursor)
+        self.sig = sig
+        on_rows(rows)
+        return outcome
+
+
+class AgentMemory:
+    """Parsed memories and embeddings of one agent."""
+
+    def __init__(self, agent_id: str) -> None:
+        self.agent_id = agent_id
+        self.store = embedding_versions.active()
+        self.lock = threading.Lock()
+        self.rows: List[dict] = []
+        self.embeddings: Dict[str, List[float]] = {}
+        self.index = MemoryIndex(token_index_path(agent_id))
+        self.ann: Optional[IvfIndex] = IvfIndex(ann_path(agent_id), self.store.model) if MEMORY_ANN_ENABLED else None
+        self._mem = _StreamView(memory_stream(agent_id))
+        self._emb = _StreamView(embedding_stream(agent_id, self.store.version))
+
+    def _add_rows(self, rows: List[dict]) -> None:
+        self.rows.extend(rows)
+        self.index.add_rows(rows, self.embeddings)
+        self.index.maybe_save(self.rows)
+
+    def _reset_rows(self) -> None:
+        self.rows = []
+        self.index.reset()
+
+    def _add_embeddings(self, rows: List[dict]) -> None:
+        added = []
+        for r in rows:
+            mid = r.get("memory_id")
+            emb = r.get("embedding")
+            if isinstance(mid, str) and isinstance(emb, list) and emb:
+                try:
+                    self.embeddings[mid] = [float(x) for x in emb]
+                except Exception:
+                    continue
+                added.append(mid)
+        self.index.add_embeddings(self.embeddings, added)
+
+    def _reset_embeddings(self) -> None:
+        self.embeddings = {}
+        self.index.reset_embeddings()
+
+    def sync(self) -> List[str]:
+        outcomes = [
+            self._mem.sync(self._add_rows, self._reset_rows),
+            self._emb.sync(self._add_embeddings, self._reset_embeddings),
+        ]
+        if self.ann is not None and outcomes != ["hit", "hit"]:
+            self.ann.sync(self.index)
+        return outcomes
+
+
+class MemoryStore:
+    def __init__(self, max_agents: int = 64) -> None:
+        self.max_agents = max(1, int(max_agents))
+        self._lock = threading.Lock()
+        self._agents: "OrderedDict[str, AgentMemory]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.reloads = 0
+        self.evictions = 0
+
+    def get(self, agent_id: str) -> AgentMemory:
+        """Return the up-to-date cached memory for `agent_id`, loading it if needed."""
+        store = embedding_versions.active()
+        with self._lock:
+            am = self._agents.get(agent_id)
+            if am is not None and am.store != store:
+                # The embedding store was switched (model migration): start over.
+                del self._agents[agent_id]
+                am = None
+            if am is None:
+                am = AgentMemory(agent_id)
+                self._agents[agent_id] = am
+                self.misses += 1
+                fresh = True
+            else:
+                self._agents.move_to_end(agent_id)
+                fresh = False
+            while len(self._agents) > self.max_agents:
+                self._agents.popitem(last=False)
+                self.evictions += 1
+        with am.lock:
+            outcomes = am.sync()
+        if not fresh:
+            if "reload" in outcomes:
+                self.reloads += 1
+            elif "refresh" in outcomes:
+                self.refreshes += 1
+            else:
+                self.hits += 1
+        return am
+
+    def memories(self, agent_id: str) -> List[dict]:
+        return self.get(agent_id).rows
+
+    def embeddings(self, agent_id: str) -> Dict[str, List[float]]:
+        return self.get(agent_id).embeddings
+
+    def append(self, agent_id: str, row: dict) -> None:
+        # The next get() reads just this row back as part of the tail.
+        storage.append(memory_stream(agent_id), row)
+
+    def append_embedding(self, agent_id: str, row: dict, version: Optional[int] = None) -> None:
+        """Append to store `version` (default: the active store)."""
+        if version is None:
+            version = embedding_versions.active().version
+        storage.append(embedding_stream(agent_id, version), row)
+
+    def invalidate(self, agent_id: Optional[str] = None) -> None:
+        with self._lock:
+            if agent_id is None:
+                self._agents.clear()
+            else:
+                self._agents.pop(agent_id, None)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses + self.refreshes + self.reloads
+        return {
+            "agents": len(self._agents),
+            "max_agents": self.max_agents,
+            "hits": self.hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "reloads": self.reloads,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+memory_store = MemoryStore(MEMORY_CACHE_MAX_AGENTS)
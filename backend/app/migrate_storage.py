@@ -0,0 +1,82 @@
+"""
+One-shot import of a JSONL DATA_DIR into the SQLite storage backend.
+
+    python -m app.migrate_storage [--data-dir /app/data] [--db /app/data/moltworld.db] [--force]
+
+Imports the append-only logs, agents.json, opportunities.jsonl and every per-agent
+memory / embedding file. The jobs table is rebuilt from the job log on the first
+start with STORAGE_BACKEND=sqlite. Existing JSONL files are left untouched.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Dict
+
+from app.config import DATA_DIR, SQLITE_PATH
+from app.storage import SqliteStorage
+from app.utils import read_jsonl
+
+_LOG_FILES = {
+    "economy": "economy_ledger.jsonl",
+    "jobs": "jobs_events.jsonl",
+    "events": "events_events.jsonl",
+    "chat": "chat_messages.jsonl",
+    "trace": "trace_events.jsonl",
+    "audit": "audit_log.jsonl",
+}
+
+
+def migrate(data_dir: Path, db_path: Path, force: bool = False) -> Dict[str, int]:
+    db = SqliteStorage(db_path)
+    db.open()
+    try:
+        if not force and any(db.cursor(s) for s in _LOG_FILES):
+            raise RuntimeError(f"{db_path} already contains data; pass --force to import anyway")
+        counts: Dict[str, int] = {}
+        for stream, name in _LOG_FILES.items():
+            rows = read_jsonl(data_dir / name)
+            for r in rows:
+                db.append(stream, r)
+            counts[stream] = len(rows)
+        for sub, prefix in (("memory", "memory"), ("memory_embeddings", "memory_embeddings")):
+            n = 0
+            for p in sorted((data_dir / sub).glob("*.jsonl")):
+                for r in read_jsonl(p):
+                    db.append(f"{prefix}:{p.stem}", r)
+                    n += 1
+            counts[prefix] = n
+        agents_path = data_dir / "agents.json"
+        if agents_path.exists():
+            agents = json.loads(agents_path.read_text(encoding="utf-8", errors="replace") or "{}")
+            if isinstance(agents, dict):
+                db.save_doc("agents", agents)
+                counts["agents"] = len(agents)
+        opps = read_jsonl(data_dir / "opportunities.jsonl")
+        if opps:
+            db.save_doc("opportunities", opps)
+        counts["opportunities"] = len(opps)
+        db.flush()
+        return counts
+    finally:
+        db.close()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Import a JSONL DATA_DIR into the SQLite storage backend.")
+    ap.add_argument("--data-dir", default=str(DATA_DIR))
+    ap.add_argument("--db", default=str(SQLITE_PATH))
+    ap.add_argument("--force", action="store_true", help="import even if the database already has rows")
+    args = ap.parse_args()
+    try:
+        counts = migrate(Path(args.data_dir).resolve(), Path(args.db).resolve(), force=args.force)
+    except RuntimeError as e:
+        print(str(e), file=sys.stderr)
+        sys.exit(1)
+    print(json.dumps({"ok": True, "db": args.db, "imported": counts}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -13,8 +13,8 @@ AuthorType = Literal["agent", "human", "system"]
 AudienceType = Literal["public", "humans", "agents"]
 PostStatus = Literal["open", "closed", "moderated"]
 JobStatus = Literal["open", "claimed", "submitted", "approved", "rejected", "cancelled"]
-JobEventType = Literal["create", "claim", "submit", "verify", "review", "update", "cancel", "unclaim"]
-EconomyEntryType = Literal["genesis", "transfer", "award", "spend", "paypal_payment"]
+JobEventType = Literal["create", "claim", "submit", "verify", "review", "update", "cancel", "unclaim", "snapshot"]
+EconomyEntryType = Literal["genesis", "transfer", "award", "spend", "paypal_payment", "carry_forward"]
 EventStatus = Literal["scheduled", "cancelled", "completed"]
 RsvpStatus = Literal["yes", "no", "maybe"]
 EventEventType = Literal["create", "invite", "rsvp", "cancel"]
@@ -263,6 +263,7 @@ class UpsertAgentRequest(BaseModel):
 class WorldSnapshot(BaseModel):
     world_size: int
     tick: int
+    version: int = 0
     day: int
     minute_of_day: int
     landmarks: List[dict]
@@ -272,6 +273,11 @@ class WorldSnapshot(BaseModel):
     rules_reminder: str = "Check the 'rules' field (or GET /rules) to see what gives or costs ai$. You should read the rules."
 
 
+class WorldView(WorldSnapshot):
+    """GET /world body: the snapshot, plus the caller's `nearby` block when an agent is known."""
+    nearby: Optional[dict] = None
+
+
 class CreatePostRequest(BaseModel):
     title: str
     body: str
@@ -444,6 +450,11 @@ class NewRunRequest(BaseModel):
     reset_topic: bool = True
 
 
+class EmbeddingMigrateRequest(BaseModel):
+    model: str
+    concurrency: Optional[int] = None
+
+
 class OpportunityUpdateRequest(BaseModel):
     fingerprint: str = ""
     status: Optional[str] = None
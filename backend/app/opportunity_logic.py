@@ -6,7 +6,6 @@ All functions operate on state.opportunities via module reference.
 from __future__ import annotations
 
 import hashlib
-import json
 import logging
 import re
 import time
@@ -16,8 +15,8 @@ from dataclasses import asdict
 from typing import Optional
 
 import app.state as _state
-from app.config import OPPORTUNITIES_PATH
 from app.models import Opportunity
+from app.storage import storage
 
 _log = logging.getLogger(__name__)
 
@@ -48,26 +47,16 @@ def save_opportunities() -> None:
     try:
         rows = [asdict(o) for o in _state.opportunities.values()]
         rows.sort(key=lambda r: float(r.get("last_seen_at") or r.get("created_at") or 0.0), reverse=True)
-        tmp = OPPORTUNITIES_PATH.with_suffix(".tmp")
-        with tmp.open("w", encoding="utf-8") as f:
-            for r in rows:
-                f.write(json.dumps(r, ensure_ascii=False) + "\n")
-        tmp.replace(OPPORTUNITIES_PATH)
+        storage.save_doc("opportunities", rows)
     except Exception:
         _log.warning("Failed to save opportunities", exc_info=True)
 
 
 def load_opportunities() -> None:
     _state.opportunities = {}
-    if not OPPORTUNITIES_PATH.exists():
-        return
     try:
-        for ln in OPPORTUNITIES_PATH.read_text(encoding="utf-8", errors="replace").splitlines():
-            ln = (ln or "").strip()
-            if not ln:
-                continue
+        for r in storage.load_doc("opportunities") or []:
             try:
-                r = json.loads(ln)
                 if not isinstance(r, dict):
                     continue
                 fp = str(r.get("fingerprint") or "").strip()
@@ -101,7 +90,7 @@ def load_opportunities() -> None:
             except Exception:
                 continue
     except Exception:
-        _log.warning("Failed to load opportunities from %s", OPPORTUNITIES_PATH, exc_info=True)
+        _log.warning("Failed to load opportunities from %s storage", storage.name, exc_info=True)
 
 
 def recalculate_opportunity_success_score(opp: Opportunity) -> None:
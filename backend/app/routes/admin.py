@@ -1,6 +1,7 @@
 """Routes: admin endpoints (new_run, purge, verify_pending, webhooks, agent management, run viewer)."""
 from __future__ import annotations
 
+import asyncio
 import json
 import logging
 import time
@@ -12,19 +13,30 @@ from typing import Dict, List, Optional
 from fastapi import APIRouter, Request
 from starlette.responses import HTMLResponse
 
-from app import state
+from app import checkpoints, compactor, run_archive, state
 from app.auth import load_agent_tokens, require_admin
 from app.config import (
-    AGENT_TOKENS_PATH, AUDIT_PATH, CHAT_PATH, DATA_DIR, ECONOMY_PATH,
-    JOBS_PATH, REGISTRATION_SECRET, RUNS_DIR, TRACE_PATH, BACKEND_VERSION,
+    AGENT_TOKENS_PATH, EMBEDDINGS_BASE_URL,
+    REGISTRATION_SECRET, RUNS_DIR, BACKEND_VERSION,
 )
+from app.embedding_cache import embedding_cache
+from app.embedding_migration import embedding_migration
+from app.embedding_worker import embedding_worker
+from app.http_client import http_pool
+from app.llm_judge import llm_judge
+from app.logwriter import log_writer_stats
+from app.memory_store import memory_store
 from app.models import (
-    AdminChatSayRequest, AgentState, ChatMessage, JobReviewRequest,
+    AdminChatSayRequest, AgentState, ChatMessage, EmbeddingMigrateRequest, JobReviewRequest,
     JobVerifyRequest, MoltWorldWebhookRequest, NewRunRequest,
     PurgeCancelledJobsRequest, RegisterAgentRequest, TokenIssueRequest,
     TokenRequest,
 )
-from app.utils import append_jsonl, rotate_logs
+from app.spatial_index import spatial_index
+from app.storage import storage
+from app.verify_queue import verify_queue
+from app.world_feed import world_feed
+from app.world_snapshot import world_snapshots
 from app.ws import ws_manager
 
 _log = logging.getLogger(__name__)
@@ -56,7 +68,11 @@ def list_runs():
                         meta = json.loads(meta_path.read_text(encoding="utf-8", errors="replace"))
                     except Exception:
                         _log.debug("Failed to read run meta %s", meta_path)
-                runs.append({"run_id": d.name, "dir": str(d), "meta": meta})
+                item = {"run_id": d.name, "dir": str(d), "meta": meta}
+                index = run_archive.load_index(d)
+                if index is not None:
+                    item["summary"] = run_archive.summarize_index(index)
+                runs.append(item)
     runs.sort(key=lambda r: r.get("run_id", ""), reverse=True)
     return {"runs": runs[:100], "current_run_id": state.run_id}
 
@@ -73,6 +89,22 @@ def run_summary(run_id: str):
             meta = json.loads(meta_path.read_text(encoding="utf-8", errors="replace"))
         except Exception:
             _log.debug("Failed to read run meta %s", meta_path)
+    index = run_archive.load_index(rd)
+    if index is not None:
+        logs = index.get("logs") or {}
+        files = [{
+            "name": name,
+            "bytes": e.get("bytes"),
+            "compressed_bytes": e.get("compressed_bytes"),
+            "lines": e.get("lines"),
+            "first_ts": e.get("first_ts"),
+            "last_ts": e.get("last_ts"),
+            "segments": len(e.get("segments") or []),
+            "agents": e.get("agents") or {},
+            "kinds": e.get("kinds") or {},
+        } for name, e in logs.items()]
+        return {"run_id": run_id, "meta": meta, "files": files, "summary": run_archive.summarize_index(index)}
+    # Runs archived before indexed segments: list the raw files.
     files = []
     for p in rd.iterdir():
         if p.is_file():
@@ -89,12 +121,13 @@ async def admin_new_run(req: NewRunRequest, request: Request):
         return {"error": "unauthorized"}
     old_run_id = state.run_id
     new_rid = (req.run_id or "").strip() or time.strftime("%Y%m%d-%H%M%S")
-    rotation = rotate_logs(old_run_id, [AUDIT_PATH, CHAT_PATH, TRACE_PATH], RUNS_DIR)
+    rotation = await asyncio.to_thread(storage.archive_run, old_run_id, ["audit", "chat", "trace"], RUNS_DIR)
     state.run_id = new_rid
     state.run_started_at = time.time()
     state.tick = 0
     state.world_started_at = time.time()
     state.chat.clear()
+    state.chat_version += 1
     state.trace.clear()
     state.audit.clear()
     if req.reset_board:
@@ -109,6 +142,7 @@ async def admin_new_run(req: NewRunRequest, request: Request):
         a.y = 0
     state.save_agents(force=True)
     await ws_manager.broadcast({"type": "new_run", "data": {"run_id": new_rid, "old_run_id": old_run_id}})
+    await world_feed.broadcast_snapshot(changed=True)
     return {"ok": True, "run_id": new_rid, "old_run_id": old_run_id, "rotation": rotation}
 
 
@@ -123,17 +157,21 @@ async def admin_purge_cancelled_jobs(req: PurgeCancelledJobsRequest, request: Re
         limit = 5000
     if limit > 20000:
         limit = 20000
+    # job_events only holds the tail after the last checkpoint; storage has full history.
+    await asyncio.to_thread(storage.flush, "jobs")
+    rows = await asyncio.to_thread(storage.read, "jobs")
     cancel_ts: Dict[str, float] = {}
-    for ev in state.job_events:
-        if getattr(ev, "event_type", "") == "cancel":
+    for r in rows:
+        if r.get("event_type") == "cancel":
             try:
-                cancel_ts[str(ev.job_id)] = float(ev.created_at or 0.0)
+                cancel_ts[str(r.get("job_id"))] = float(r.get("created_at") or 0.0)
             except Exception:
                 continue
     candidates: List[str] = []
-    for jid, job in list(state.jobs.items()):
+    for jid in list(state.job_index.newest_ids(("status", "cancelled"))):
+        job = state.jobs.get(jid)
         try:
-            if str(job.status) != "cancelled":
+            if job is None or str(job.status) != "cancelled":
                 continue
             ts = float(cancel_ts.get(jid) or getattr(job, "created_at", 0.0) or 0.0)
             if older > 0 and (now - ts) < older:
@@ -145,29 +183,21 @@ async def admin_purge_cancelled_jobs(req: PurgeCancelledJobsRequest, request: Re
     purge_ids = set(candidates[:limit])
     if not purge_ids:
         return {"ok": True, "removed_jobs": 0, "removed_events": 0, "note": "no cancelled jobs matched"}
-    before_events = len(state.job_events)
-    from app.models import JobEvent
-    kept_events: List[JobEvent] = [ev for ev in state.job_events if str(ev.job_id) not in purge_ids]
-    removed_events = before_events - len(kept_events)
-    state.job_events[:] = kept_events
-    removed_jobs = 0
-    for jid in list(purge_ids):
-        if jid in state.jobs:
-            try:
-                del state.jobs[jid]
-                removed_jobs += 1
-            except Exception:
-                continue
-    try:
-        from app.utils import write_jsonl_atomic
-        write_jsonl_atomic(JOBS_PATH, [asdict(ev) for ev in state.job_events])
-    except Exception:
-        _log.exception("Failed to write job events after purge")
+    # The log rewrite runs off the event loop; the compactor refreshes jobs and checkpoints.
+    before = len(state.jobs)
+    report = await compactor.purge_jobs(purge_ids)
+    if report.get("error"):
+        return {"error": report["error"]}
+    removed_jobs = before - len(state.jobs)
+    removed_events = int(report["rows_before"]) - int(report["rows_after"])
     try:
         await ws_manager.broadcast({"type": "jobs", "data": {"purge_cancelled": {"removed_jobs": removed_jobs, "removed_events": removed_events}}})
     except Exception:
         _log.debug("Broadcast after purge failed", exc_info=True)
-    return {"ok": True, "removed_jobs": removed_jobs, "removed_events": removed_events}
+    return {
+        "ok": True, "removed_jobs": removed_jobs, "removed_events": removed_events,
+        "bytes_reclaimed": report["bytes_reclaimed"], "duration_ms": report["duration_ms"],
+    }
 
 
 @router.post("/admin/verify_pending")
@@ -175,31 +205,106 @@ async def admin_verify_pending(request: Request):
     if not require_admin(request):
         return {"error": "unauthorized"}
     tag = f"[run:{state.run_id}]"
-    submitted = [j for j in list(state.jobs.values()) if j.status == "submitted" and (tag in (j.title or "") or tag in (j.body or ""))]
-    report = {"run_id": state.run_id, "submitted": len(submitted), "approved": 0, "rejected": 0, "skipped": 0, "items": []}
+    ids = await asyncio.to_thread(storage.query_jobs, status="submitted", run_id=state.run_id)
+    if ids is not None:
+        submitted = [state.jobs[jid] for jid in reversed(ids) if jid in state.jobs and state.jobs[jid].status == "submitted"]
+    else:
+        submitted = [
+            j for j in state.job_index.newest(state.jobs, [("status", "submitted")], len(state.jobs))
+            if tag in (j.title or "") or tag in (j.body or "")
+        ]
+        submitted.reverse()
+    report = {"run_id": state.run_id, "submitted": len(submitted), "queued": 0, "skipped": 0, "full": 0, "items": []}
     from app.routes.jobs import jobs_verify
     for j in submitted[:200]:
-        before = j.status
         try:
             out = await jobs_verify(j.job_id, JobVerifyRequest(by="system:verify_pending", force=False), request)
-            jj = state.jobs.get(j.job_id)
-            st = (jj.status if jj else before)
-            if st == "approved":
-                report["approved"] += 1
-            elif st == "rejected":
-                report["rejected"] += 1
+            if out.get("verification"):
+                report["queued"] += 1
+                status = "verifying"
+            elif out.get("error") == "verify_queue_full":
+                report["full"] += 1
+                status = "submitted"
             else:
                 report["skipped"] += 1
+                status = (out.get("job") or {}).get("status") or j.status
             report["items"].append({
-                "job_id": j.job_id, "title": j.title, "status": st,
-                "auto_verify_ok": (jj.auto_verify_ok if jj else None),
-                "auto_verify_note": (jj.auto_verify_note if jj else ""),
+                "job_id": j.job_id, "title": j.title, "status": status,
+                "auto_verify_ok": j.auto_verify_ok, "auto_verify_note": j.auto_verify_note,
             })
         except Exception as e:
             report["items"].append({"job_id": j.job_id, "title": j.title, "status": "error", "error": str(e)[:200]})
     return {"ok": True, "report": report}
 
 
+@router.post("/admin/checkpoint")
+async def admin_checkpoint(request: Request):
+    if not require_admin(request):
+        return {"error": "unauthorized"}
+    # Snapshot on the loop so each payload matches its offset; only the file writes go to a thread.
+    out = []
+    for doc in state.snapshot_checkpoints():
+        await asyncio.to_thread(checkpoints.save_checkpoint, doc)
+        out.append({"name": doc["name"], "offset": doc["offset"]})
+    return {"ok": True, "checkpoints": out}
+
+
+@router.get("/admin/metrics")
+def admin_metrics(request: Request):
+    if not require_admin(request):
+        return {"error": "unauthorized"}
+    return {
+        "log_writer": log_writer_stats(),
+        "storage": storage.stats(),
+        "compaction": compactor.last_report,
+        "memory_cache": memory_store.stats(),
+        "embedding_cache": embedding_cache.stats(),
+        "embedding_worker": embedding_worker.stats(),
+        "embedding_migration": embedding_migration.progress(),
+        "http_pool": http_pool.stats(),
+        "job_index": state.job_index.stats(),
+        "job_dedup": state.job_dedup.stats(),
+        "verify_queue": verify_queue.stats(),
+        "llm_judge": llm_judge.stats(),
+        "ws": ws_manager.stats(),
+        "world_feed": world_feed.stats(),
+        "world_snapshot": world_snapshots.stats(),
+        "spatial": spatial_index.stats(),
+    }
+
+
+@router.post("/admin/compact")
+async def admin_compact(request: Request):
+    if not require_admin(request):
+        return {"error": "unauthorized"}
+    return {"ok": True, **(await compactor.run_compaction())}
+
+
+@router.post("/admin/embeddings/migrate")
+async def admin_embeddings_migrate(req: EmbeddingMigrateRequest, request: Request):
+    """Re-embed every agent's memories with `req.model` into a new store; resumes an unfinished run."""
+    if not require_admin(request):
+        return {"error": "unauthorized"}
+    if not EMBEDDINGS_BASE_URL:
+        return {"error": "embeddings_disabled"}
+    out = embedding_migration.start(req.model, req.concurrency)
+    return out if "error" in out else {"ok": True, **out}
+
+
+@router.get("/admin/embeddings/migration")
+def admin_embeddings_migration(request: Request):
+    if not require_admin(request):
+        return {"error": "unauthorized"}
+    return embedding_migration.progress()
+
+
+@router.post("/admin/embeddings/migration/stop")
+async def admin_embeddings_migration_stop(request: Request):
+    if not require_admin(request):
+        return {"error": "unauthorized"}
+    return {"ok": True, **(await embedding_migration.stop())}
+
+
 @router.get("/audit/recent")
 def audit_recent(limit: int = 100):
     limit = max(1, min(limit, 500))
@@ -242,12 +347,14 @@ async def register_agent(req: RegisterAgentRequest):
         return {"error": "agent_id_taken", "agent_id": agent_id}
     state.ensure_account(agent_id)
     now = time.time()
-    if agent_id not in state.agents:
+    joined = agent_id not in state.agents
+    if joined:
         state.agents[agent_id] = AgentState(agent_id=agent_id, display_name=display_name, x=0, y=0, last_seen_at=now)
     else:
         state.agents[agent_id].display_name = display_name
         state.agents[agent_id].last_seen_at = now
     state.save_agents(force=True)
+    await world_feed.agent("agent_joined" if joined else "agent_updated", state.agents[agent_id])
     token = uuid.uuid4().hex
     tokens[token] = agent_id
     try:
@@ -345,9 +452,6 @@ async def admin_chat_say(req: AdminChatSayRequest, request: Request):
         sender_id=sender_id, sender_name=sender_name,
         text=text, created_at=now,
     )
-    state.chat.append(chat_msg)
-    if len(state.chat) > state.chat_max:
-        del state.chat[: len(state.chat) - state.chat_max]
-    append_jsonl(CHAT_PATH, asdict(chat_msg))
+    state.append_chat(chat_msg)
     await ws_manager.broadcast({"type": "chat", "data": msg_dict})
     return {"ok": True, "message": msg_dict}
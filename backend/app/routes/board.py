@@ -12,7 +12,7 @@ from app import state
 from app.models import (
     BoardPost, BoardReply, CreatePostRequest, CreateReplyRequest, PostStatus,
 )
-from app.ws import ws_manager
+from app.world_feed import world_feed
 
 router = APIRouter()
 
@@ -58,7 +58,7 @@ async def create_post(req: CreatePostRequest):
     )
     state.board_posts[post_id] = post
     state.board_replies.setdefault(post_id, [])
-    await ws_manager.broadcast_world(state.get_world_snapshot)
+    await world_feed.publish("board_post", {"post_id": post_id, "author_id": author_id, "title": post.title})
     earned_div = await state.award_action_diversity(author_id, "board_post")
     earned_fiverr = await state.try_award_fiverr_discovery(author_id, (req.body or "").strip())
     out = {"ok": True, "post": asdict(post)}
@@ -87,5 +87,5 @@ async def create_reply(post_id: str, req: CreateReplyRequest):
     state.board_replies.setdefault(post_id, []).append(reply)
     post.updated_at = now
     state.board_posts[post_id] = post
-    await ws_manager.broadcast_world(state.get_world_snapshot)
+    await world_feed.publish("board_reply", {"post_id": post_id, "reply_id": reply.reply_id, "author_id": reply.author_id})
     return {"ok": True, "reply": asdict(reply)}
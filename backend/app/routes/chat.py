@@ -12,14 +12,13 @@ from fastapi import APIRouter, Request
 
 from app import state
 from app.auth import agent_from_auth
-from app.config import (
-    CHAT_PATH, CHAT_REPETITION_PENALTY_AIDOLLAR,
-)
+from app.config import CHAT_REPETITION_PENALTY_AIDOLLAR
 from app.models import (
     AgentState, ChatBroadcastRequest, ChatMessage, ChatSendRequest,
     TopicSetRequest,
 )
-from app.utils import append_jsonl
+from app.spatial_index import spatial_index
+from app.world_feed import world_feed
 from app.ws import ws_manager
 
 _log = logging.getLogger(__name__)
@@ -38,10 +37,7 @@ async def chat_send(req: ChatSendRequest):
         text=req.text.strip(),
         created_at=now,
     )
-    state.chat.append(msg)
-    if len(state.chat) > state.chat_max:
-        del state.chat[: len(state.chat) - state.chat_max]
-    append_jsonl(CHAT_PATH, asdict(msg))
+    state.append_chat(msg)
     await ws_manager.broadcast({"type": "chat", "data": asdict(msg)})
     return {"ok": True, "message": asdict(msg)}
 
@@ -79,6 +75,8 @@ async def chat_topic_set(req: TopicSetRequest):
         "reason": (req.reason or "").strip()[:400],
         "created_at": now,
     })
+    await world_feed.publish("topic", {"topic": state.topic, "set_at": state.topic_set_at})
+    # Legacy message for /ws/world consumers that predate world_delta.
     await ws_manager.broadcast({"type": "topic", "data": {"topic": state.topic, "set_at": state.topic_set_at}})
     return {"ok": True, "topic": state.topic, "set_at": state.topic_set_at}
 
@@ -102,6 +100,7 @@ async def chat_say(req: ChatBroadcastRequest):
         state.ensure_account(sender_id)
         sender = state.agents[sender_id]
         state.save_agents(force=True)
+        await world_feed.agent("agent_joined", sender)
     text = (req.text or "").strip()
     if not text:
         _log.warning("chat_say rejected missing_text sender_id=%s", sender_id)
@@ -120,12 +119,9 @@ async def chat_say(req: ChatBroadcastRequest):
         "scope": "say",
         "created_at": now,
     }
-    for a in state.agents.values():
-        if a.agent_id == sender_id:
-            continue
-        if state.distance_fields(sender, a) <= 1:
-            state.push_inbox(a.agent_id, msg_dict)
-            recipients.append(a.agent_id)
+    for aid, _ in spatial_index.agents_within(sender.x, sender.y, 1, exclude=sender_id):
+        state.push_inbox(aid, msg_dict)
+        recipients.append(aid)
     chat_msg = ChatMessage(
         msg_id=str(uuid.uuid4()),
         sender_type="agent",
@@ -134,10 +130,7 @@ async def chat_say(req: ChatBroadcastRequest):
         text=text,
         created_at=now,
     )
-    state.chat.append(chat_msg)
-    if len(state.chat) > state.chat_max:
-        del state.chat[: len(state.chat) - state.chat_max]
-    append_jsonl(CHAT_PATH, asdict(chat_msg))
+    state.append_chat(chat_msg)
     await ws_manager.broadcast({"type": "chat", "data": msg_dict})
     asyncio.create_task(state.fire_moltworld_webhooks(sender_id, req.sender_name or sender_id, text, "say"))
     earned_div = await state.award_action_diversity(sender_id, "chat_say")
@@ -176,6 +169,7 @@ async def chat_shout(req: ChatBroadcastRequest):
         state.ensure_account(sender_id)
         sender = state.agents[sender_id]
         state.save_agents(force=True)
+        await world_feed.agent("agent_joined", sender)
     text = (req.text or "").strip()
     if not text:
         return {"error": "missing_text"}
@@ -192,12 +186,9 @@ async def chat_shout(req: ChatBroadcastRequest):
         "scope": "shout",
         "created_at": now,
     }
-    for a in state.agents.values():
-        if a.agent_id == sender_id:
-            continue
-        if state.distance_fields(sender, a) <= 10:
-            state.push_inbox(a.agent_id, msg_dict)
-            recipients.append(a.agent_id)
+    for aid, _ in spatial_index.agents_within(sender.x, sender.y, 10, exclude=sender_id):
+        state.push_inbox(aid, msg_dict)
+        recipients.append(aid)
     chat_msg = ChatMessage(
         msg_id=str(uuid.uuid4()),
         sender_type="agent",
@@ -206,10 +197,7 @@ async def chat_shout(req: ChatBroadcastRequest):
         text=text,
         created_at=now,
     )
-    state.chat.append(chat_msg)
-    if len(state.chat) > state.chat_max:
-        del state.chat[: len(state.chat) - state.chat_max]
-    append_jsonl(CHAT_PATH, asdict(chat_msg))
+    state.append_chat(chat_msg)
     await ws_manager.broadcast({"type": "chat", "data": msg_dict})
     asyncio.create_task(state.fire_moltworld_webhooks(sender_id, req.sender_name or sender_id, text, "shout"))
     out = {"ok": True, "recipients": recipients}
@@ -15,13 +15,13 @@ from fastapi import APIRouter, Request
 from app import state
 from app.auth import require_admin
 from app.config import (
-    ECONOMY_PATH, PAYPAL_CLIENT_ID, PAYPAL_CLIENT_SECRET, PAYPAL_ENABLED,
+    PAYPAL_CLIENT_ID, PAYPAL_CLIENT_SECRET, PAYPAL_ENABLED,
     PAYPAL_MODE, PAYPAL_USD_TO_AIDOLLAR, PAYPAL_WEBHOOK_ID, TREASURY_ID,
 )
 from app.models import (
     AwardRequest, EconomyEntry, PenaltyRequest, TransferRequest,
 )
-from app.utils import append_jsonl
+from app.storage import storage
 from app.ws import ws_manager
 
 _log = logging.getLogger(__name__)
@@ -42,9 +42,7 @@ async def do_economy_award(agent_id: str, amount: float, reason: str, by: str) -
         memo=(reason or "").strip()[:400],
         created_at=now,
     )
-    state.economy_ledger.append(entry)
-    append_jsonl(ECONOMY_PATH, asdict(entry))
-    state.recompute_balances()
+    state.post_ledger_entry(entry)
     await ws_manager.broadcast({"type": "balances", "data": {"balances": state.balances}})
     return entry
 
@@ -54,6 +52,16 @@ def economy_balances():
     return {"balances": state.balances}
 
 
+@router.get("/economy/ledger")
+def economy_ledger(account: str = "", limit: int = 100):
+    limit = max(1, min(int(limit), 1000))
+    account = (account or "").strip()
+    if not account:
+        return {"entries": storage.read("economy", limit=limit)}
+    rows = storage.ledger_for_account(account, limit=limit)
+    return {"account": account, "balance": float(state.balances.get(account, 0.0)), "entries": rows}
+
+
 @router.post("/economy/transfer")
 async def economy_transfer(req: TransferRequest):
     state.tick += 1
@@ -74,9 +82,8 @@ async def economy_transfer(req: TransferRequest):
         memo=(req.memo or "").strip()[:400],
         created_at=now,
     )
-    state.economy_ledger.append(entry)
-    append_jsonl(ECONOMY_PATH, asdict(entry))
-    state.recompute_balances()
+    state.post_ledger_entry(entry)
+    await state.ledger_barrier()
     await ws_manager.broadcast({"type": "balances", "data": {"balances": state.balances}})
     return {"ok": True, "entry": asdict(entry), "balances": state.balances}
 
@@ -88,6 +95,7 @@ async def economy_award(req: AwardRequest):
     if amount <= 0:
         return {"error": "invalid_amount"}
     entry = await do_economy_award(req.to_id, amount, req.reason, req.by)
+    await state.ledger_barrier()
     return {"ok": True, "entry": asdict(entry), "balances": state.balances}
 
 
@@ -102,9 +110,17 @@ async def economy_penalty(req: PenaltyRequest):
     if float(state.balances.get(req.agent_id, 0.0)) <= 0:
         return {"error": "insufficient_funds"}
     applied, entry = await state.apply_penalty(req.agent_id, amount, req.reason, req.by)
+    await state.ledger_barrier()
     return {"ok": True, "entry": asdict(entry), "balances": state.balances}
 
 
+@router.post("/admin/economy/check")
+async def admin_economy_check(request: Request, repair: bool = False):
+    if not require_admin(request):
+        return {"error": "unauthorized"}
+    return await state.check_balances(repair=repair)
+
+
 # --- PayPal ---
 
 @router.get("/paypal/config")
@@ -162,9 +178,8 @@ async def paypal_webhook(request: Request):
         memo=f"PayPal {PAYPAL_MODE}: ${usd_amount:.2f} USD → {ai_amount:.2f} ai$ (rate={PAYPAL_USD_TO_AIDOLLAR})",
         created_at=now,
     )
-    state.economy_ledger.append(entry)
-    append_jsonl(ECONOMY_PATH, asdict(entry))
-    state.recompute_balances()
+    state.post_ledger_entry(entry)
+    await state.ledger_barrier()
     await ws_manager.broadcast({"type": "balances", "data": {"balances": state.balances}})
     return {
         "ok": True,
@@ -16,12 +16,12 @@ from app import state
 from app.auth import require_admin
 from app.config import TASK_FAIL_PENALTY
 from app.models import (
-    AwardRequest, JobCancelRequest, JobClaimRequest, JobCreateRequest,
+    AutoVerifyOutcome, AwardRequest, JobCancelRequest, JobClaimRequest, JobCreateRequest,
     JobReviewRequest, JobSubmitRequest, JobUpdateRequest, JobVerifyRequest,
     PenaltyRequest, PurgeCancelledJobsRequest,
 )
-from app.utils import fingerprint, jaccard, tokenize, write_jsonl_atomic
-from app.verifiers import auto_verify_task
+from app.utils import fingerprint, tokenize, write_jsonl_atomic
+from app.verify_queue import verify_queue
 from app.ws import ws_manager
 
 _log = logging.getLogger(__name__)
@@ -91,24 +91,34 @@ def _calc_reward_from_ratings(ratings: dict) -> tuple[float, dict]:
 
 
 @router.get("/jobs")
-def jobs_list(status: Optional[str] = None, limit: int = 100, created_by: Optional[str] = None):
+def jobs_list(
+    status: Optional[str] = None,
+    limit: int = 100,
+    created_by: Optional[str] = None,
+    claimed_by: Optional[str] = None,
+    parent_job_id: Optional[str] = None,
+):
     limit = max(1, min(limit, 500))
-    all_jobs = list(state.jobs.values())
+    keys = []
     if status:
-        all_jobs = [j for j in all_jobs if j.status == status]
+        keys.append(("status", status))
     if created_by:
-        all_jobs = [j for j in all_jobs if j.created_by == created_by]
-    available_jobs = []
-    for j in all_jobs:
-        parent_id = getattr(j, "parent_job_id", "") or ""
-        if parent_id:
-            parent = state.jobs.get(parent_id)
-            if not parent or parent.status != "approved":
-                if status in ("open", "claimed"):
-                    continue
-        available_jobs.append(j)
-    available_jobs.sort(key=lambda j: j.created_at, reverse=True)
-    return {"jobs": [asdict(j) for j in available_jobs[:limit]]}
+        keys.append(("creator", created_by))
+    if claimed_by:
+        keys.append(("claimer", claimed_by))
+    if parent_job_id:
+        keys.append(("parent", parent_job_id))
+    # Open/claimed sub-jobs are only listed once their parent is approved.
+    where = _parent_approved if status in ("open", "claimed") else None
+    return {"jobs": [asdict(j) for j in state.job_index.newest(state.jobs, keys, limit, where)]}
+
+
+def _parent_approved(j) -> bool:
+    parent_id = getattr(j, "parent_job_id", "") or ""
+    if not parent_id:
+        return True
+    parent = state.jobs.get(parent_id)
+    return parent is not None and parent.status == "approved"
 
 
 @router.get("/jobs/{job_id}")
@@ -116,7 +126,11 @@ def jobs_get(job_id: str):
     j = state.jobs.get(job_id)
     if not j:
         return {"error": "not_found"}
-    return {"job": asdict(j)}
+    out = {"job": asdict(j)}
+    verification = verify_queue.status(job_id)
+    if verification is not None:
+        out["verification"] = verification
+    return out
 
 
 @router.post("/jobs/create")
@@ -154,25 +168,20 @@ async def jobs_create(req: JobCreateRequest):
     except Exception:
         pass
     if not allow_repeat:
-        recent = sorted(list(state.jobs.values()), key=lambda j: float(j.created_at or 0.0), reverse=True)[:200]
-        for jj in recent:
-            try:
-                if created_by and jj.created_by and (jj.created_by == created_by):
-                    pass
-                else:
-                    if "[run:" not in (title.lower() + body.lower()):
-                        continue
-                    if "[run:" not in ((jj.title or "").lower() + (jj.body or "").lower()):
-                        continue
-                fp2 = str(getattr(jj, "fingerprint", "") or "")
-                if fp2 and fp2 == fp:
-                    return {"error": "duplicate_job", "duplicate_of": jj.job_id, "reason": "fingerprint_match"}
-                t2 = tokenize((jj.title or "") + "\n" + (jj.body or ""))
-                sim = jaccard(toks, t2)
-                if sim >= 0.92:
-                    return {"error": "duplicate_job", "duplicate_of": jj.job_id, "reason": f"similarity:{sim:.2f}"}
-            except Exception:
-                continue
+        run_tagged = "[run:" in (title.lower() + body.lower())
+
+        def eligible(jj) -> bool:
+            # Other creators' jobs only count when both jobs are tagged with a run.
+            if created_by and jj.created_by and jj.created_by == created_by:
+                return True
+            return run_tagged and "[run:" in ((jj.title or "").lower() + (jj.body or "").lower())
+
+        dup = state.job_dedup.find_duplicate(state.jobs, toks, fp, eligible)
+        if dup is not None:
+            return {
+                "error": "duplicate_job", "duplicate_of": dup["job_id"], "reason": dup["reason"],
+                "similarity": dup["similarity"], "estimated_similarity": dup["estimated_similarity"],
+            }
     auto_reward = bool(req.auto_reward)
     reward_mode = "manual"
     reward_calc: dict = {}
@@ -261,23 +270,28 @@ async def jobs_submit(job_id: str, req: JobSubmitRequest):
         hay = ((j2.title or "") + "\n" + (j2.body or "")).lower()
         if "[verifier:proposer_review]" in hay or "[reviewer:creator]" in hay:
             proposer_review = True
-    if not proposer_review:
-        try:
-            j2 = state.jobs.get(job_id)
-            if j2 and j2.status == "submitted":
-                out = auto_verify_task(j2, sub)
-                if out.matched:
-                    state.append_job_event("verify", job_id, {"ok": bool(out.ok), "note": out.note, "verifier": out.verifier, "artifacts": out.artifacts, "created_at": time.time()})
-                if out.matched and out.ok:
-                    review_req = JobReviewRequest(approved=True, reviewed_by="system:auto_verify", note=out.note, payout=0.0, penalty=None)
-                    await jobs_review(job_id, review_req)
-                elif out.matched and (not out.ok):
-                    if out.note.startswith("auto_verify failed"):
-                        review_req = JobReviewRequest(approved=False, reviewed_by="system:auto_verify", note=out.note, payout=0.0, penalty=max(0.0, TASK_FAIL_PENALTY))
-                        await jobs_review(job_id, review_req)
-        except Exception as e:
-            _log.exception("auto_verify in submit failed: %s", e)
-    return {"ok": True, "job": asdict(state.jobs[job_id])}
+    out = {"ok": True, "job": asdict(state.jobs[job_id])}
+    if not proposer_review and j2 and j2.status == "submitted":
+        out["verification"] = verify_queue.enqueue(j2, sub, "system:auto_verify") or {"state": "queue_full"}
+    return out
+
+
+async def apply_verify_outcome(job_id: str, submission: str, out: AutoVerifyOutcome, reviewed_by: str) -> bool:
+    """Record a finished verification (verify event, then auto review); False if the job moved on meanwhile."""
+    cur = state.jobs.get(job_id)
+    if cur is None or cur.status != "submitted" or (cur.submission or "") != submission:
+        return False
+    if out.matched:
+        ev = state.append_job_event("verify", job_id, {"ok": bool(out.ok), "note": out.note, "verifier": out.verifier, "artifacts": out.artifacts, "created_at": time.time()})
+        await ws_manager.broadcast({"type": "jobs", "data": {"event": asdict(ev), "job": asdict(state.jobs[job_id])}})
+    if out.matched and out.ok:
+        review_req = JobReviewRequest(approved=True, reviewed_by=reviewed_by, note=out.note, payout=0.0, penalty=None)
+        await jobs_review(job_id, review_req)
+    elif out.matched and (not out.ok):
+        if out.note.startswith("auto_verify failed"):
+            review_req = JobReviewRequest(approved=False, reviewed_by=reviewed_by, note=out.note, payout=0.0, penalty=max(0.0, TASK_FAIL_PENALTY))
+            await jobs_review(job_id, review_req)
+    return True
 
 
 @router.post("/jobs/{job_id}/review")
@@ -434,14 +448,7 @@ async def jobs_verify(job_id: str, req: JobVerifyRequest, request: Request):
         return {"error": "not_submitted"}
     if (j.auto_verify_ok is not None) and (not req.force):
         return {"ok": True, "job": asdict(j), "note": "already_verified"}
-    out = auto_verify_task(j, j.submission or "")
-    if out.matched:
-        state.append_job_event("verify", job_id, {"ok": bool(out.ok), "note": out.note, "verifier": out.verifier, "artifacts": out.artifacts, "created_at": time.time()})
-    if out.matched and out.ok:
-        review_req = JobReviewRequest(approved=True, reviewed_by=req.by or "human", note=out.note, payout=0.0, penalty=None)
-        await jobs_review(job_id, review_req)
-    elif out.matched and (not out.ok):
-        if out.note.startswith("auto_verify failed"):
-            review_req = JobReviewRequest(approved=False, reviewed_by=req.by or "human", note=out.note, payout=0.0, penalty=max(0.0, TASK_FAIL_PENALTY))
-            await jobs_review(job_id, review_req)
-    return {"ok": True, "job": asdict(state.jobs[job_id])}
+    verification = verify_queue.enqueue(j, j.submission or "", req.by or "human")
+    if verification is None:
+        return {"error": "verify_queue_full", "job": asdict(j)}
+    return {"ok": True, "job": asdict(j), "verification": verification}
@@ -1,17 +1,21 @@
 """Routes: agent memory append/retrieve/search/backfill."""
 from __future__ import annotations
 
+import asyncio
 import time
 import uuid
 from dataclasses import asdict
-from typing import Dict, List
+from typing import Optional
 
 from fastapi import APIRouter
 
 from app import state
-from app.config import EMBEDDINGS_BASE_URL, EMBEDDINGS_MODEL
+from app.config import EMBEDDINGS_BASE_URL, MEMORY_ANN_NPROBE
+from app.embedding_worker import embedding_worker
+from app.memory_index import top_k
+from app.memory_store import memory_store
 from app.models import MemoryAppendRequest, MemoryEntry
-from app.utils import append_jsonl, read_jsonl, tok, jaccard
+from app.utils import tok
 
 router = APIRouter()
 
@@ -32,35 +36,41 @@ async def memory_append(agent_id: str, req: MemoryAppendRequest):
         importance=float(req.importance) if req.importance is not None else 0.3,
         created_at=now,
     )
-    append_jsonl(state.memory_path(agent_id), asdict(entry))
-    emb = state.get_embedding(text)
-    if emb is not None:
-        append_jsonl(
-            state.memory_embed_path(agent_id),
-            {"memory_id": entry.memory_id, "embedding": emb, "model": EMBEDDINGS_MODEL, "dim": len(emb), "created_at": now},
-        )
+    memory_store.append(agent_id, asdict(entry))
+    if EMBEDDINGS_BASE_URL:
+        # Embedded in the background; retrieve ranks it by tokens until then.
+        embedding_worker.enqueue(agent_id, entry.memory_id, entry.text)
     return {"ok": True, "memory": asdict(entry)}
 
 
 @router.get("/memory/{agent_id}/recent")
 def memory_recent(agent_id: str, limit: int = 20):
     limit = max(1, min(limit, 200))
-    rows = read_jsonl(state.memory_path(agent_id), limit=limit)
-    return {"memories": rows}
+    rows = memory_store.memories(agent_id)
+    return {"memories": rows[-limit:]}
 
 
 @router.get("/memory/{agent_id}/search")
 def memory_search(agent_id: str, q: str, limit: int = 20):
-    q = (q or "").strip().lower()
+    """BM25-ranked memories sharing a word with `q`; substring scan when `q` has no indexable words."""
+    q = (q or "").strip()
     limit = max(1, min(limit, 200))
     if not q:
         return {"memories": []}
-    rows = read_jsonl(state.memory_path(agent_id))
+    qtok = tok(q)
+    am = memory_store.get(agent_id)
+    if qtok:
+        with am.lock:
+            cand = am.index.token_rows(qtok)
+            scores = am.index.bm25(qtok)[cand]
+            rows = am.rows
+            return {"memories": [{"score": float(scores[j]), **rows[int(cand[j])]} for j in top_k(scores, limit)]}
+    ql = q.lower()
     hits = []
-    for r in rows:
+    for r in am.rows:
         try:
             txt = str(r.get("text") or "").lower()
-            if q in txt:
+            if ql in txt:
                 hits.append(r)
         except Exception:
             continue
@@ -68,14 +78,15 @@ def memory_search(agent_id: str, q: str, limit: int = 20):
 
 
 @router.post("/memory/{agent_id}/embeddings/backfill")
-def memory_embeddings_backfill(agent_id: str, limit: int = 200):
+async def memory_embeddings_backfill(agent_id: str, limit: int = 200):
+    """Queue the newest `limit` memories that have no embedding yet for the background worker."""
     if not EMBEDDINGS_BASE_URL:
         return {"error": "embeddings_disabled"}
     limit = max(1, min(limit, 500))
-    mems = read_jsonl(state.memory_path(agent_id), limit=limit)
-    idx_rows = read_jsonl(state.memory_embed_path(agent_id))
-    existing = {r.get("memory_id") for r in idx_rows if r.get("memory_id")}
-    wrote = 0
+    am = await asyncio.to_thread(memory_store.get, agent_id)
+    mems = am.rows[-limit:]
+    existing = set(am.embeddings)
+    queued = 0
     for r in mems:
         mid = r.get("memory_id")
         if not mid or mid in existing:
@@ -83,20 +94,19 @@ def memory_embeddings_backfill(agent_id: str, limit: int = 200):
         txt = str(r.get("text") or "").strip()
         if not txt:
             continue
-        emb = state.get_embedding(txt)
-        if emb is None:
-            continue
-        append_jsonl(
-            state.memory_embed_path(agent_id),
-            {"memory_id": mid, "embedding": emb, "model": EMBEDDINGS_MODEL, "dim": len(emb), "created_at": time.time()},
-        )
-        wrote += 1
-        existing.add(mid)
-    return {"ok": True, "wrote": wrote, "scanned": len(mems)}
+        if embedding_worker.enqueue(agent_id, mid, txt):
+            queued += 1
+    return {"ok": True, "queued": queued, "scanned": len(mems)}
+
+
+@router.get("/memory/{agent_id}/embeddings/backlog")
+def memory_embeddings_backlog(agent_id: str):
+    """Memories of `agent_id` still waiting for (or being sent to) the embeddings server."""
+    return embedding_worker.backlog(agent_id)
 
 
 @router.get("/memory/{agent_id}/retrieve")
-def memory_retrieve(
+async def memory_retrieve(
     agent_id: str,
     q: str,
     k: int = 8,
@@ -104,6 +114,8 @@ def memory_retrieve(
     w_relevance: float = 0.55,
     w_recency: float = 0.25,
     w_importance: float = 0.20,
+    w_bm25: float = 0.0,
+    nprobe: Optional[int] = None,
 ):
     q = (q or "").strip()
     if not q:
@@ -111,42 +123,27 @@ def memory_retrieve(
     k = max(1, min(int(k), 50))
     now = time.time()
     qtok = tok(q)
-    qemb = state.get_embedding(q)
-    rows = read_jsonl(state.memory_path(agent_id))
-    embed_rows = read_jsonl(state.memory_embed_path(agent_id))
-    emb_by_id: Dict[str, List[float]] = {}
-    for r in embed_rows:
-        mid = r.get("memory_id")
-        emb = r.get("embedding")
-        if isinstance(mid, str) and isinstance(emb, list) and emb:
-            try:
-                emb_by_id[mid] = [float(x) for x in emb]
-            except Exception:
-                continue
-    scored = []
+    qemb = await state.get_embedding(q)
     hl = max(1.0, float(recency_halflife_minutes)) * 60.0
-    for r in rows:
-        try:
-            text = str(r.get("text") or "")
-            tags = r.get("tags") or []
-            itok = tok(text + " " + " ".join([str(t) for t in tags]))
-            rel_tok = jaccard(qtok, itok)
-            rel_emb = 0.0
-            mid = r.get("memory_id")
-            if qemb is not None and isinstance(mid, str) and mid in emb_by_id:
-                rel_emb = state.cosine(qemb, emb_by_id[mid])
-            rel = max(rel_tok, rel_emb)
-            created_at = float(r.get("created_at") or 0.0)
-            age = max(0.0, now - created_at)
-            rec = 0.5 ** (age / hl)
-            imp = float(r["importance"]) if ("importance" in r and r["importance"] is not None) else 0.3
-            imp = max(0.0, min(1.0, imp))
-            score = float(w_relevance) * rel + float(w_recency) * rec + float(w_importance) * imp
-            scored.append((score, {
-                "score": score, "relevance": rel, "recency": rec, "importance": imp,
-                "relevance_token": rel_tok, "relevance_embed": rel_emb, **r,
-            }))
-        except Exception:
-            continue
-    scored.sort(key=lambda t: t[0], reverse=True)
-    return {"memories": [x[1] for x in scored[:k]]}
+    # Cache sync and scoring are file I/O plus a NumPy pass; keep them off the event loop.
+    return await asyncio.to_thread(
+        _retrieve, agent_id, qtok, qemb, now, hl, k, (w_relevance, w_recency, w_importance, w_bm25), nprobe,
+    )
+
+
+def _retrieve(agent_id: str, qtok: set, qemb, now: float, hl: float, k: int, weights: tuple, nprobe: Optional[int]) -> dict:
+    w_relevance, w_recency, w_importance, w_bm25 = weights
+    am = memory_store.get(agent_id)
+    with am.lock:
+        sel = None
+        if am.ann is not None:
+            # nprobe=0 forces exact scoring; unset uses MEMORY_ANN_NPROBE.
+            sel = am.ann.candidates(am.index, qemb, qtok, MEMORY_ANN_NPROBE if nprobe is None else int(nprobe))
+        cols = am.index.score(qtok, qemb, now, hl, w_relevance, w_recency, w_importance, rows=sel, w_bm25=w_bm25)
+        top = top_k(cols["score"], k)
+        rows = am.rows
+        out = []
+        for i in top:
+            parts = {name: float(col[i]) for name, col in cols.items()}
+            out.append({**parts, **rows[i if sel is None else int(sel[i])]})
+    return {"memories": out}
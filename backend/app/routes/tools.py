@@ -1,13 +1,12 @@
 """Routes: web_fetch and web_search tool gateways."""
 from __future__ import annotations
 
+import asyncio
 import hashlib
 import ipaddress
-import json
 import logging
 import socket
 import urllib.parse
-import urllib.request
 
 from fastapi import APIRouter, Request
 
@@ -17,6 +16,7 @@ from app.config import (
     WEB_FETCH_ENABLED, WEB_FETCH_MAX_BYTES, WEB_FETCH_TIMEOUT_SECONDS,
     WEB_SEARCH_ENABLED,
 )
+from app.http_client import HttpStatusError, http_pool
 from app.models import WebFetchRequest, WebSearchRequest
 
 _log = logging.getLogger(__name__)
@@ -63,7 +63,8 @@ async def tools_web_fetch(req: WebFetchRequest, request: Request):
     if not WEB_FETCH_ENABLED:
         return {"error": "web_fetch_disabled"}
     url = str(req.url or "").strip()
-    ok, why = _is_allowed_web_url(url)
+    # The SSRF check resolves the host; getaddrinfo blocks, so it runs in a thread.
+    ok, why = await asyncio.to_thread(_is_allowed_web_url, url)
     if not ok:
         state.emit_trace(req.agent_id, req.agent_name, "status", "tool:web_fetch blocked", {"url": url[:500], "reason": why})
         return {"error": "blocked", "reason": why}
@@ -81,28 +82,27 @@ async def tools_web_fetch(req: WebFetchRequest, request: Request):
     }
     state.emit_trace(req.agent_id, req.agent_name, "action", "tool:web_fetch start", {"url": url[:500], "timeout": timeout, "max_bytes": max_bytes})
     try:
-        r = urllib.request.Request(url, headers=headers, method="GET")
-        with urllib.request.urlopen(r, timeout=timeout) as resp:
-            final_url = str(getattr(resp, "geturl", lambda: url)() or url)[:1000]
-            ct = str(resp.headers.get("content-type") or "")[:200]
-            raw = resp.read(max_bytes + 1)
-            truncated = len(raw) > max_bytes
-            if truncated:
-                raw = raw[:max_bytes]
-            text = raw.decode("utf-8", errors="replace")
-            sha = hashlib.sha1(raw).hexdigest()[:16]
-            out = {
-                "ok": True,
-                "url": url,
-                "final_url": final_url,
-                "content_type": ct,
-                "bytes": len(raw),
-                "truncated": bool(truncated),
-                "sha1_16": sha,
-                "text": text,
-            }
-            state.emit_trace(req.agent_id, req.agent_name, "action", "tool:web_fetch ok", {"url": url[:500], "final_url": final_url[:500], "bytes": len(raw), "truncated": bool(truncated), "sha1_16": sha, "content_type": ct})
-            return out
+        resp = await http_pool.request("GET", url, headers=headers, timeout=timeout, max_bytes=max_bytes)
+        if resp.status_code >= 400:
+            raise HttpStatusError(resp.status_code, url)
+        final_url = str(resp.url or url)[:1000]
+        ct = str(resp.headers.get("content-type") or "")[:200]
+        raw = resp.content
+        truncated = resp.truncated
+        text = raw.decode("utf-8", errors="replace")
+        sha = hashlib.sha1(raw).hexdigest()[:16]
+        out = {
+            "ok": True,
+            "url": url,
+            "final_url": final_url,
+            "content_type": ct,
+            "bytes": len(raw),
+            "truncated": bool(truncated),
+            "sha1_16": sha,
+            "text": text,
+        }
+        state.emit_trace(req.agent_id, req.agent_name, "action", "tool:web_fetch ok", {"url": url[:500], "final_url": final_url[:500], "bytes": len(raw), "truncated": bool(truncated), "sha1_16": sha, "content_type": ct})
+        return out
     except Exception as e:
         state.emit_trace(req.agent_id, req.agent_name, "error", "tool:web_fetch error", {"url": url[:500], "error": str(e)[:300]})
         return {"error": "fetch_failed", "detail": str(e)[:300]}
@@ -120,15 +120,14 @@ async def tools_web_search(req: WebSearchRequest, request: Request):
     num = max(1, min(int(req.num or 10), 20))
     state.emit_trace(req.agent_id, req.agent_name, "action", "tool:web_search start", {"query": query[:200], "num": num})
     try:
-        body = json.dumps({"q": query, "num": num}).encode("utf-8")
-        request_obj = urllib.request.Request(
-            SERPER_SEARCH_URL, data=body,
+        resp = await http_pool.request(
+            "POST", SERPER_SEARCH_URL, json_body={"q": query, "num": num},
             headers={"X-API-KEY": SERPER_API_KEY, "Content-Type": "application/json"},
-            method="POST",
+            timeout=15, max_bytes=512 * 1024,
         )
-        with urllib.request.urlopen(request_obj, timeout=15) as resp:
-            raw = resp.read(512 * 1024)
-        data = json.loads(raw.decode("utf-8", errors="replace"))
+        if resp.status_code >= 400:
+            raise HttpStatusError(resp.status_code, SERPER_SEARCH_URL)
+        data = resp.json()
         organic = data.get("organic") or []
         results = []
         for i, item in enumerate(organic[:num]):
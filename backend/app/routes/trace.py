@@ -9,8 +9,7 @@ from fastapi import APIRouter
 
 from app import state
 from app.models import TraceEvent, TraceEventRequest
-from app.utils import append_jsonl
-from app.config import TRACE_PATH
+from app.storage import storage
 from app.ws import ws_manager
 
 router = APIRouter()
@@ -32,7 +31,7 @@ async def trace_event(req: TraceEventRequest):
     state.trace.append(ev)
     if len(state.trace) > state.trace_max:
         del state.trace[: len(state.trace) - state.trace_max]
-    append_jsonl(TRACE_PATH, asdict(ev))
+    storage.append("trace", asdict(ev))
     await ws_manager.broadcast({"type": "trace", "data": asdict(ev)})
     return {"ok": True, "event": asdict(ev)}
 
@@ -4,17 +4,20 @@ from __future__ import annotations
 import time
 import uuid
 from dataclasses import asdict
+from typing import Optional
 
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Request, Response
 
 from app import state
 from app.auth import agent_from_auth
 from app.config import WORLD_SIZE
 from app.models import (
     MoveRequest, UpsertAgentRequest, WorldActionRequest,
-    AgentState, ChatBroadcastRequest, WorldSnapshot,
+    AgentState, ChatBroadcastRequest, WorldView,
 )
 from app.utils import clamp
+from app.world_feed import world_feed
+from app.world_snapshot import etag_matches, world_snapshots
 
 router = APIRouter()
 
@@ -24,9 +27,30 @@ def health():
     return {"ok": True, "world_size": WORLD_SIZE, "agents": len(state.agents)}
 
 
-@router.get("/world", response_model=WorldSnapshot)
-def world():
-    return state.get_world_snapshot()
+@router.get(
+    "/world",
+    response_class=Response,
+    responses={
+        200: {"model": WorldView, "description": "World snapshot; `nearby` only when an agent is known. Carries an ETag."},
+        304: {
+            "description": "Not modified: the If-None-Match ETag is still current. The clock has moved on regardless.",
+            "headers": {
+                "X-World-Day": {"description": "Current `day`.", "schema": {"type": "integer"}},
+                "X-World-Minute": {"description": "Current `minute_of_day`.", "schema": {"type": "integer"}},
+            },
+        },
+    },
+)
+def world(request: Request, agent_id: Optional[str] = None):
+    agent_id = (agent_from_auth(request) or agent_id or "").strip()
+    cached = world_snapshots.get()
+    etag = world_snapshots.agent_etag(cached, agent_id) if agent_id else cached.etag
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        world_snapshots.not_modified += 1
+        return Response(status_code=304, headers={**headers, **world_snapshots.clock_headers()})
+    body = world_snapshots.render(cached, agent_id)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 @router.get("/rules")
@@ -43,7 +67,8 @@ async def upsert_agent(req: UpsertAgentRequest, request: Request):
         return {"error": "unauthorized"}
     if agent_from_token and agent_from_token != req.agent_id:
         return {"error": "unauthorized_agent", "agent_id": req.agent_id}
-    if req.agent_id not in state.agents:
+    joined = req.agent_id not in state.agents
+    if joined:
         state.agents[req.agent_id] = AgentState(
             agent_id=req.agent_id,
             display_name=req.display_name or req.agent_id,
@@ -56,8 +81,7 @@ async def upsert_agent(req: UpsertAgentRequest, request: Request):
             a.display_name = req.display_name
         a.last_seen_at = now
     state.save_agents(force=True)
-    from app.ws import ws_manager
-    await ws_manager.broadcast_world(state.get_world_snapshot)
+    await world_feed.agent("agent_joined" if joined else "agent_updated", state.agents[req.agent_id])
     return {"ok": True, "agent": asdict(state.agents[req.agent_id])}
 
 
@@ -83,6 +107,7 @@ async def move_agent(agent_id: str, req: MoveRequest, request: Request):
         a = AgentState(agent_id=agent_id, display_name=agent_id, x=0, y=0, last_seen_at=now)
         state.agents[agent_id] = a
         state.save_agents(force=True)
+        await world_feed.agent("agent_joined", a)
     if req.dx is not None or req.dy is not None:
         dx = req.dx or 0
         dy = req.dy or 0
@@ -93,8 +118,7 @@ async def move_agent(agent_id: str, req: MoveRequest, request: Request):
         a.y = clamp(req.y, 0, WORLD_SIZE - 1)
     a.last_seen_at = now
     state.save_agents()
-    from app.ws import ws_manager
-    await ws_manager.broadcast_world(state.get_world_snapshot)
+    await world_feed.agent("agent_moved", a)
     earned = await state.award_action_diversity(agent_id, "move")
     out = {"ok": True, "agent_id": a.agent_id, "x": a.x, "y": a.y}
     if earned is not None:
@@ -0,0 +1,212 @@
+"""
+Compressed, indexed run archives.
+
+At /admin/new_run each live log is moved (renamed) into runs/<run_id>/ and then
+streamed into gzip segments `<stem>.<n>.jsonl.gz`. A sidecar `index.json`
+records, per log: line and byte counts, time range, per-agent and per-kind
+counts, and for each segment its file, first line and line/byte counts. Run
+summaries answer from the index alone; `iter_run_log` streams the rows back.
+"""
+from __future__ import annotations
+
+import contextlib
+import gzip
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from app.logwriter import flush_log, get_log_writer
+
+_log = logging.getLogger(__name__)
+
+INDEX_NAME = "index.json"
+SEGMENT_MAX_BYTES = 32 * 1024 * 1024
+# Fields that identify the agent / kind of a row in chat, trace and audit logs.
+_AGENT_FIELDS = ("agent_id", "sender_id")
+_KIND_FIELDS = ("kind", "sender_type", "method")
+
+
+def _stem(name: str) -> str:
+    return name[: -len(".jsonl")] if name.endswith(".jsonl") else name
+
+
+def write_segments(lines: Iterable[bytes], rd: Path, name: str, segment_max_bytes: int = SEGMENT_MAX_BYTES) -> dict:
+    """Stream JSONL `lines` into gzip segments under `rd` and return the index entry for `name`."""
+    stem = _stem(name)
+    entry: dict = {
+        "name": name, "lines": 0, "bytes": 0, "compressed_bytes": 0,
+        "first_ts": None, "last_ts": None, "agents": {}, "kinds": {}, "segments": [],
+    }
+    agents: Dict[str, int] = entry["agents"]
+    kinds: Dict[str, int] = entry["kinds"]
+    seg = None
+    seg_meta: dict = {}
+    try:
+        for raw in lines:
+            raw = raw.rstrip(b"\r\n")
+            if not raw.strip():
+                continue
+            if seg is None or seg_meta["bytes"] >= segment_max_bytes:
+                if seg is not None:
+                    seg.close()
+                seg_path = rd / f"{stem}.{len(entry['segments']):03d}.jsonl.gz"
+                seg = gzip.open(seg_path, "wb", compresslevel=6)
+                seg_meta = {"file": seg_path.name, "first_line": entry["lines"], "lines": 0, "bytes": 0}
+                entry["segments"].append(seg_meta)
+            seg.write(raw + b"\n")
+            seg_meta["lines"] += 1
+            seg_meta["bytes"] += len(raw) + 1
+            entry["lines"] += 1
+            entry["bytes"] += len(raw) + 1
+            try:
+                row = json.loads(raw)
+            except Exception:
+                continue
+            if not isinstance(row, dict):
+                continue
+            try:
+                ts = float(row.get("created_at") or 0.0)
+            except Exception:
+                ts = 0.0
+            if ts:
+                entry["first_ts"] = ts if entry["first_ts"] is None else min(entry["first_ts"], ts)
+                entry["last_ts"] = ts if entry["last_ts"] is None else max(entry["last_ts"], ts)
+            for f in _AGENT_FIELDS:
+                if row.get(f):
+                    a = str(row[f])[:80]
+                    agents[a] = agents.get(a, 0) + 1
+                    break
+            for f in _KIND_FIELDS:
+                if row.get(f):
+                    k = str(row[f])[:40]
+                    kinds[k] = kinds.get(k, 0) + 1
+                    break
+    finally:
+        if seg is not None:
+            seg.close()
+    for s in entry["segments"]:
+        s["compressed_bytes"] = int((rd / s["file"]).stat().st_size)
+        entry["compressed_bytes"] += s["compressed_bytes"]
+    return entry
+
+
+def _iter_file_lines(path: Path) -> Iterator[bytes]:
+    with path.open("rb") as f:
+        for ln in f:
+            yield ln
+
+
+def archive_log(src: Path, rd: Path) -> Optional[dict]:
+    """Move `src` into `rd` and compress it into segments; the live log is recreated on the next append."""
+    flush_log(src)
+    if not src.exists():
+        return None
+    staged = rd / (src.name + ".moving")
+    w = get_log_writer(src)
+    # Rename under the writer lock so no batch lands half in the old and half in the new file.
+    with (w.io_lock if w is not None else contextlib.nullcontext()):
+        try:
+            os.replace(src, staged)
+        except OSError:
+            # Different filesystem: fall back to a streamed copy, then truncate.
+            with src.open("rb") as fin, staged.open("wb") as fout:
+                while True:
+                    chunk = fin.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    fout.write(chunk)
+            src.write_text("", encoding="utf-8")
+    try:
+        entry = write_segments(_iter_file_lines(staged), rd, src.name)
+    except Exception:
+        _log.warning("Failed to compress %s; keeping it uncompressed", src.name, exc_info=True)
+        staged.replace(rd / src.name)
+        size = int((rd / src.name).stat().st_size)
+        return {"name": src.name, "lines": None, "bytes": size, "compressed_bytes": size, "segments": [], "raw": True}
+    staged.unlink()
+    return entry
+
+
+def write_index(rd: Path, run_id: str, entries: List[dict]) -> dict:
+    now = time.time()
+    index = {"run_id": run_id, "archived_at": now, "logs": {e["name"]: e for e in entries}}
+    tmp = rd / (INDEX_NAME + ".tmp")
+    tmp.write_text(json.dumps(index, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+    tmp.replace(rd / INDEX_NAME)
+    rotated = [{"file": e["name"], "bytes": int(e["bytes"] or 0), "compressed_bytes": int(e.get("compressed_bytes") or 0)}
+               for e in entries]
+    try:
+        (rd / "meta.json").write_text(
+            json.dumps({"run_id": run_id, "rotated": rotated, "archived_at": now}, ensure_ascii=False, indent=2),
+            encoding="utf-8",
+        )
+    except Exception:
+        pass
+    return {"run_id": run_id, "rotated": rotated, "dir": str(rd)}
+
+
+def rotate_logs(run_id: str, files: List[Path], runs_dir: Path) -> dict:
+    rd = runs_dir / run_id
+    rd.mkdir(parents=True, exist_ok=True)
+    entries = []
+    for p in files:
+        try:
+            e = archive_log(p, rd)
+            if e is not None:
+                entries.append(e)
+        except Exception:
+            _log.warning("Failed to archive %s for run %s", p, run_id, exc_info=True)
+    return write_index(rd, run_id, entries)
+
+
+def load_index(rd: Path) -> Optional[dict]:
+    p = rd / INDEX_NAME
+    if not p.exists():
+        return None
+    try:
+        idx = json.loads(p.read_text(encoding="utf-8"))
+        return idx if isinstance(idx, dict) else None
+    except Exception:
+        _log.debug("Failed to read run index %s", p, exc_info=True)
+        return None
+
+
+def summarize_index(index: dict) -> dict:
+    """Run-level totals for listings: lines, bytes, time range and per-agent counts across logs."""
+    logs = index.get("logs") or {}
+    agents: Dict[str, int] = {}
+    first = [e["first_ts"] for e in logs.values() if e.get("first_ts")]
+    last = [e["last_ts"] for e in logs.values() if e.get("last_ts")]
+    for e in logs.values():
+        for a, n in (e.get("agents") or {}).items():
+            agents[a] = agents.get(a, 0) + int(n)
+    return {
+        "lines": sum(int(e.get("lines") or 0) for e in logs.values()),
+        "bytes": sum(int(e.get("bytes") or 0) for e in logs.values()),
+        "compressed_bytes": sum(int(e.get("compressed_bytes") or 0) for e in logs.values()),
+        "first_ts": min(first) if first else None,
+        "last_ts": max(last) if last else None,
+        "agents": agents,
+    }
+
+
+def iter_run_log(rd: Path, name: str) -> Iterator[dict]:
+    """Rows of one archived log, from gzip segments or a legacy uncompressed copy."""
+    index = load_index(rd) or {}
+    entry = (index.get("logs") or {}).get(name)
+    paths = [rd / s["file"] for s in entry.get("segments") or []] if entry else []
+    if not paths and (rd / name).exists():
+        paths = [rd / name]
+    for p in paths:
+        opener = gzip.open if p.suffix == ".gz" else open
+        with opener(p, "rb") as f:
+            for ln in f:
+                try:
+                    row = json.loads(ln)
+                except Exception:
+                    continue
+                if isinstance(row, dict):
+                    yield row
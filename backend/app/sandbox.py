@@ -0,0 +1,245 @@
+"""
+Pool of pre-warmed Python interpreters for the code verifiers.
+
+`python_run`, `python_test` and `primes_smallest_five` used to start a fresh
+interpreter per verification (`python -c` / `python -m pytest`), and most of
+each run was interpreter and pytest start-up. `sandbox_pool` keeps up to
+SANDBOX_POOL_SIZE `app/sandbox_worker.py` processes running with pytest
+already imported. A run forks a child from a warm worker, so each submission
+still gets a clean process: its own session, no stdin, rlimits on CPU time
+(the run's timeout), address space (SANDBOX_MEMORY_MB), written file size
+(SANDBOX_FILE_MB) and no core files. A worker is replaced after
+SANDBOX_MAX_RUNS runs or after any run that did not exit 0; the replacement
+starts warming right away.
+
+Results have the shape of `subprocess.run(..., capture_output=True,
+text=True)` and a timeout raises `subprocess.TimeoutExpired`, so the verifiers
+keep their exact outcomes. Without fork (Windows), with SANDBOX_POOL_SIZE=0,
+or if a worker breaks mid-run, the same command runs in a fresh interpreter.
+
+The pool belongs to the process that uses it: each verify_queue process warms
+its own on start-up.
+
+    python -m app.sandbox --runs 20    # median latency: fresh interpreter vs pool
+"""
+from __future__ import annotations
+
+import argparse
+import atexit
+import json
+import logging
+import os
+import select
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional
+
+from app.config import SANDBOX_FILE_MB, SANDBOX_MAX_RUNS, SANDBOX_MEMORY_MB, SANDBOX_POOL_SIZE
+
+_log = logging.getLogger(__name__)
+
+WORKER_PATH = Path(__file__).with_name("sandbox_worker.py")
+_START_TIMEOUT_SECONDS = 30.0
+# Extra time to wait for a worker's reply beyond the run's own timeout.
+_REPLY_GRACE_SECONDS = 5.0
+
+
+class SandboxError(Exception):
+    pass
+
+
+@dataclass
+class SandboxResult:
+    returncode: int
+    stdout: str
+    stderr: str
+
+
+class _Worker:
+    def __init__(self) -> None:
+        self.proc = subprocess.Popen(
+            [sys.executable, str(WORKER_PATH)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        )
+        self.ready = False
+        self.runs = 0
+
+    def _reply(self, timeout: float) -> dict:
+        out = self.proc.stdout
+        r, _, _ = select.select([out], [], [], timeout)
+        if not r:
+            raise SandboxError("worker did not reply in time")
+        line = out.readline()
+        if not line:
+            raise SandboxError(f"worker exited ({self.proc.poll()})")
+        return json.loads(line)
+
+    def call(self, req: dict, timeout: float) -> dict:
+        if not self.ready:
+            self._reply(_START_TIMEOUT_SECONDS)
+            self.ready = True
+        self.proc.stdin.write(json.dumps(req).encode("utf-8") + b"\n")
+        self.proc.stdin.flush()
+        self.runs += 1
+        return self._reply(timeout + _REPLY_GRACE_SECONDS)
+
+    def close(self) -> None:
+        try:
+            self.proc.stdin.close()
+        except Exception:
+            pass
+        try:
+            self.proc.wait(timeout=1.0)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+            self.proc.wait()
+
+
+def _run_fresh(argv: List[str], cwd: Optional[str], timeout: float) -> SandboxResult:
+    res = subprocess.run(argv, capture_output=True, text=True, timeout=timeout, cwd=cwd)
+    return SandboxResult(res.returncode, res.stdout, res.stderr)
+
+
+class SandboxPool:
+    def __init__(self, size: int = 1, max_runs: int = 50, memory_mb: int = 2048, file_mb: int = 64) -> None:
+        self.size = max(0, int(size))
+        self.max_runs = max(1, int(max_runs))
+        self.memory_bytes = max(0, int(memory_mb)) * 1024 * 1024
+        self.file_bytes = max(0, int(file_mb)) * 1024 * 1024
+        self._lock = threading.Lock()
+        self._idle: List[_Worker] = []
+        self.runs = 0
+        self.fresh_runs = 0
+        self.recycled = 0
+        self.broken = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0 and hasattr(os, "fork")
+
+    def warm(self) -> None:
+        """Start workers until SANDBOX_POOL_SIZE are idle (they finish importing in the background)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            while len(self._idle) < self.size:
+                self._idle.append(_Worker())
+
+    def _acquire(self) -> _Worker:
+        with self._lock:
+            while self._idle:
+                w = self._idle.pop(0)
+                if w.proc.poll() is None:
+                    return w
+        return _Worker()
+
+    def _release(self, w: _Worker, reuse: bool) -> None:
+        if reuse and w.runs < self.max_runs and w.proc.poll() is None:
+            with self._lock:
+                if len(self._idle) < self.size:
+                    self._idle.append(w)
+                    return
+        w.close()
+        self.recycled += 1
+        self.warm()
+
+    def _run(self, req: dict, argv: List[str], cwd: Optional[str], timeout: float) -> SandboxResult:
+        if not self.enabled:
+            self.fresh_runs += 1
+            return _run_fresh(argv, cwd, timeout)
+        req = dict(req, cwd=cwd, timeout=timeout, cpu_seconds=int(timeout) + 1,
+                   memory_bytes=self.memory_bytes, file_bytes=self.file_bytes)
+        w = self._acquire()
+        try:
+            out = w.call(req, timeout)
+        except Exception:
+            _log.warning("Sandbox worker failed; running in a fresh interpreter", exc_info=True)
+            self.broken += 1
+            self._release(w, False)
+            self.fresh_runs += 1
+            return _run_fresh(argv, cwd, timeout)
+        self.runs += 1
+        rc = int(out["returncode"])
+        self._release(w, rc == 0 and not out.get("timed_out"))
+        if out.get("timed_out"):
+            raise subprocess.TimeoutExpired(argv, timeout)
+        return SandboxResult(rc, out.get("stdout") or "", out.get("stderr") or "")
+
+    def run_code(self, code: str, timeout: float) -> SandboxResult:
+        """`python -c code`, from the current directory."""
+        return self._run({"kind": "code", "code": code}, [sys.executable, "-c", code], None, timeout)
+
+    def run_pytest(self, args: List[str], cwd: str, timeout: float) -> SandboxResult:
+        """`python -m pytest *args` in `cwd`."""
+        return self._run({"kind": "pytest", "args": list(args)}, [sys.executable, "-m", "pytest", *args], cwd, timeout)
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for w in idle:
+            w.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            idle = len(self._idle)
+        return {
+            "enabled": self.enabled,
+            "size": self.size,
+            "idle": idle,
+            "runs": self.runs,
+            "fresh_runs": self.fresh_runs,
+            "recycled": self.recycled,
+            "broken": self.broken,
+        }
+
+
+sandbox_pool = SandboxPool(SANDBOX_POOL_SIZE, SANDBOX_MAX_RUNS, SANDBOX_MEMORY_MB, SANDBOX_FILE_MB)
+atexit.register(sandbox_pool.close)
+
+
+def warm_sandbox() -> None:
+    """ProcessPoolExecutor initializer: warm this process's pool before the first verification."""
+    sandbox_pool.warm()
+
+
+def _bench(runs: int) -> None:
+    code = "print(sum(range(10)))"
+    test = "from solution import add\n\ndef test_add():\n    assert add(2, 3) == 5\n"
+    tmp = tempfile.mkdtemp(prefix="sandbox_bench_")
+    Path(tmp, "solution.py").write_text("def add(a, b):\n    return a + b\n", encoding="utf-8")
+    Path(tmp, "test_solution.py").write_text(test, encoding="utf-8")
+    pytest_args = [str(Path(tmp, "test_solution.py")), "-v", "--tb=short"]
+    fresh = SandboxPool(0)
+    pool = SandboxPool(1, max_runs=max(runs, 1) + 1)
+    pool.warm()
+    pool.run_code("pass", 10)  # wait until the worker is ready
+    for name, fn in (
+        ("python -c", lambda p: p.run_code(code, 15)),
+        ("pytest", lambda p: p.run_pytest(pytest_args, tmp, 30)),
+    ):
+        for label, p in (("fresh", fresh), ("pool", pool)):
+            times = []
+            for _ in range(runs):
+                t0 = time.perf_counter()
+                res = fn(p)
+                times.append((time.perf_counter() - t0) * 1000.0)
+                assert res.returncode == 0, res.stderr
+            print(f"{name:<10} {label:<6} median {statistics.median(times):8.1f} ms  max {max(times):8.1f} ms")
+    pool.close()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Compare verifier run latency: fresh interpreter vs sandbox pool.")
+    ap.add_argument("--runs", type=int, default=20)
+    args = ap.parse_args()
+    _bench(args.runs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+Warm interpreter behind app.sandbox. Not imported by the app: SandboxPool
+starts it as a script (`python app/sandbox_worker.py`), so it only needs the
+standard library and pytest.
+
+At start-up it imports pytest and runs one throwaway session, then reads one JSON
+request per line on stdin. Each request runs in a child forked from this
+process (its own session, stdin on /dev/null, stdout/stderr to files, rlimits
+applied), so nothing a submission does can leak into the next run. The child
+emulates `python -c <code>` or `python -m pytest <args>`; the reply line has
+the exit code (negative signal number if killed, like subprocess), the decoded
+output and whether the timeout killed it.
+"""
+from __future__ import annotations
+
+import atexit
+import gc
+import json
+import os
+import resource
+import shutil
+import signal
+import sys
+import tempfile
+import threading
+import types
+
+_MAX_OUTPUT = 4 * 1024 * 1024
+
+
+def _warm() -> None:
+    # Importing pytest is half of its start-up; one throwaway session imports the rest
+    # (plugins from entry points, assertion rewriting, terminal reporter).
+    try:
+        import pytest
+        from _pytest.config import default_plugins
+        for name in default_plugins:
+            __import__(f"_pytest.{name}")
+        cwd = os.getcwd()
+        tmp = tempfile.mkdtemp(prefix="sandbox_warm_")
+        path = os.path.join(tmp, "test_warm.py")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("def test_warm():\n    assert True\n")
+        try:
+            os.chdir(tmp)
+            pytest.main([path, "-q", "-p", "no:cacheprovider"])
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(tmp, ignore_errors=True)
+    except Exception:
+        pass
+    # Keep the warmed heap out of every child's garbage collections.
+    gc.freeze()
+
+
+def _limits(req: dict) -> None:
+    for which, value in (
+        (resource.RLIMIT_CORE, 0),
+        (resource.RLIMIT_CPU, int(req.get("cpu_seconds") or 0)),
+        (resource.RLIMIT_AS, int(req.get("memory_bytes") or 0)),
+        (resource.RLIMIT_FSIZE, int(req.get("file_bytes") or 0)),
+    ):
+        if which != resource.RLIMIT_CORE and value <= 0:
+            continue
+        try:
+            resource.setrlimit(which, (value, value))
+        except (ValueError, OSError):
+            pass
+
+
+def _exit_code(e: SystemExit) -> int:
+    # Same rules as the interpreter: None -> 0, int -> itself, anything else is printed -> 1.
+    code = e.code
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    try:
+        print(code, file=sys.stderr)
+    except Exception:
+        pass
+    return 1
+
+
+def _finish() -> None:
+    # Interpreter shutdown: wait for non-daemon threads, then run atexit handlers.
+    for t in threading.enumerate():
+        if t is not threading.main_thread() and not t.daemon:
+            t.join()
+    atexit._run_exitfuncs()
+
+
+def _run_code(code: str) -> int:
+    main = types.ModuleType("__main__")
+    main.__dict__["__builtins__"] = __builtins__
+    sys.modules["__main__"] = main
+    sys.argv = ["-c"]
+    sys.path[0] = ""
+    try:
+        exec(compile(code, "<string>", "exec"), main.__dict__)
+        rc = 0
+    except SystemExit as e:
+        rc = _exit_code(e)
+    except BaseException:
+        etype, value, tb = sys.exc_info()
+        # Drop this frame from the exception itself so the report matches `python -c`.
+        value = value.with_traceback(tb.tb_next if tb is not None else None)
+        sys.excepthook(etype, value, value.__traceback__)
+        rc = 1
+    _finish()
+    return rc
+
+
+def _run_pytest(args: list) -> int:
+    import pytest
+    sys.argv = [pytest.__file__] + list(args)
+    sys.path[0] = os.getcwd()
+    try:
+        rc = int(pytest.main(list(args)))
+    except SystemExit as e:
+        rc = _exit_code(e)
+    _finish()
+    return rc
+
+
+def _child(req: dict, proto_fds: tuple, out_path: str, err_path: str) -> None:
+    rc = 1
+    try:
+        for fd in proto_fds:
+            os.close(fd)
+        os.setsid()
+        null = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(null, 0)
+        for fd, path in ((1, out_path), (2, err_path)):
+            f = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            os.dup2(f, fd)
+            os.close(f)
+        if req.get("cwd"):
+            os.chdir(req["cwd"])
+        _limits(req)
+        atexit._clear()
+        signal.signal(signal.SIGALRM, signal.SIG_DFL)
+        if req.get("kind") == "pytest":
+            rc = _run_pytest(req.get("args") or [])
+        else:
+            rc = _run_code(req.get("code") or "")
+    except BaseException:
+        try:
+            import traceback
+            traceback.print_exc()
+        except BaseException:
+            pass
+    finally:
+        for stream in (sys.stdout, sys.stderr):
+            try:
+                stream.flush()
+            except BaseException:
+                pass
+        os._exit(rc if isinstance(rc, int) and -(2 ** 31) <= rc < 2 ** 31 else 1)
+
+
+def _read(path: str) -> str:
+    try:
+        with open(path, "rb") as f:
+            data = f.read(_MAX_OUTPUT)
+        os.unlink(path)
+    except OSError:
+        return ""
+    # What subprocess.run(text=True) returns: decoded, universal newlines.
+    return data.decode("utf-8", errors="replace").replace("\r\n", "\n").replace("\r", "\n")
+
+
+def _handle(req: dict, proto_fds: tuple, tmp: str) -> dict:
+    out_path, err_path = os.path.join(tmp, "stdout"), os.path.join(tmp, "stderr")
+    pid = os.fork()
+    if pid == 0:
+        _child(req, proto_fds, out_path, err_path)
+    killed = [False]
+
+    def on_timeout(signum, frame):
+        killed[0] = True
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+    signal.signal(signal.SIGALRM, on_timeout)
+    signal.setitimer(signal.ITIMER_REAL, max(0.01, float(req.get("timeout") or 30)))
+    try:
+        _, status = os.waitpid(pid, 0)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+    # Background processes the submission left behind go with it.
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except OSError:
+        pass
+    rc = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+    return {
+        "returncode": rc,
+        "stdout": _read(out_path),
+        "stderr": _read(err_path),
+        "timed_out": killed[0] and rc == -signal.SIGKILL,
+    }
+
+
+def main() -> None:
+    proto_in = os.fdopen(os.dup(0), "rb")
+    proto_out = os.fdopen(os.dup(1), "wb")
+    null = os.open(os.devnull, os.O_RDWR)
+    os.dup2(null, 0)
+    os.dup2(2, 1)
+    os.close(null)
+    proto_fds = (proto_in.fileno(), proto_out.fileno())
+    _warm()
+    tmp = tempfile.mkdtemp(prefix="sandbox_")
+
+    def send(obj: dict) -> None:
+        proto_out.write(json.dumps(obj).encode("utf-8") + b"\n")
+        proto_out.flush()
+
+    send({"ready": True, "pid": os.getpid()})
+    try:
+        for line in proto_in:
+            if not line.strip():
+                continue
+            send(_handle(json.loads(line), proto_fds, tmp))
+    finally:
+        try:
+            os.rmdir(tmp)
+        except OSError:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Uniform-grid spatial index for proximity queries.
+
+Chat say/shout used to measure the distance from the sender to every agent,
+and agents scanned the whole agent list (and every landmark) in each
+snapshot to find what is near them. The index buckets agent positions into
+square cells of WORLD_SPATIAL_CELL_SIZE tiles; a radius query only looks at
+the cells that overlap the query square, so its cost depends on how crowded
+that neighbourhood is, not on how many agents exist.
+
+Positions are kept current by `app.world_feed` (every agent join, update and
+move goes through `world_feed.agent`, which calls `update`); bulk resets
+(new run) call `rebuild`. If the number of indexed agents ever differs from
+`state.agents` (e.g. agents loaded from storage at startup) the next query
+rebuilds the index first.
+
+Distances are in tiles: `manhattan` (chat radii) or `chebyshev` (the agents'
+"within N tiles" neighbourhood).
+"""
+from __future__ import annotations
+
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from app import state
+from app.config import LANDMARKS, WORLD_NEARBY_RADIUS, WORLD_SPATIAL_CELL_SIZE
+from app.models import AgentState
+
+Cell = Tuple[int, int]
+
+
+def distance(ax: int, ay: int, bx: int, by: int, metric: str = "manhattan") -> int:
+    dx, dy = abs(ax - bx), abs(ay - by)
+    return max(dx, dy) if metric == "chebyshev" else dx + dy
+
+
+class SpatialIndex:
+    def __init__(self, cell_size: int = 4, landmarks: Iterable[Dict[str, Any]] = (), follow_state: bool = False) -> None:
+        self.cell_size = max(1, int(cell_size))
+        # Re-sync from state.agents when the agent counts drift (the module instance only).
+        self.follow_state = follow_state
+        self._lock = threading.Lock()
+        self._cells: Dict[Cell, Set[str]] = {}
+        self._pos: Dict[str, Tuple[int, int]] = {}
+        self._landmark_cells: Dict[Cell, List[Dict[str, Any]]] = {}
+        for lm in landmarks:
+            x, y = int(lm.get("x", 0)), int(lm.get("y", 0))
+            self._landmark_cells.setdefault(self._cell(x, y), []).append(lm)
+        self.queries = 0
+        self.cells_scanned = 0
+        self.candidates = 0
+        self.rebuilds = 0
+
+    def _cell(self, x: int, y: int) -> Cell:
+        return (x // self.cell_size, y // self.cell_size)
+
+    def _cells_around(self, x: int, y: int, radius: int) -> Iterable[Cell]:
+        c0x, c0y = self._cell(x - radius, y - radius)
+        c1x, c1y = self._cell(x + radius, y + radius)
+        for cx in range(c0x, c1x + 1):
+            for cy in range(c0y, c1y + 1):
+                yield (cx, cy)
+
+    def _place(self, agent_id: str, x: int, y: int) -> None:
+        # Caller holds the lock.
+        old = self._pos.get(agent_id)
+        if old is not None:
+            cell = self._cell(*old)
+            if cell == self._cell(x, y):
+                self._pos[agent_id] = (x, y)
+                return
+            members = self._cells.get(cell)
+            if members is not None:
+                members.discard(agent_id)
+                if not members:
+                    del self._cells[cell]
+        self._pos[agent_id] = (x, y)
+        self._cells.setdefault(self._cell(x, y), set()).add(agent_id)
+
+    def update(self, a: AgentState) -> None:
+        """Record the agent's current position (after a join or move)."""
+        with self._lock:
+            self._place(a.agent_id, int(a.x), int(a.y))
+
+    def remove(self, agent_id: str) -> None:
+        with self._lock:
+            old = self._pos.pop(agent_id, None)
+            if old is None:
+                return
+            cell = self._cell(*old)
+            members = self._cells.get(cell)
+            if members is not None:
+                members.discard(agent_id)
+                if not members:
+                    del self._cells[cell]
+
+    def rebuild(self, agents: Optional[Iterable[AgentState]] = None) -> None:
+        """Re-index every agent (default: `state.agents`)."""
+        items = list(state.agents.values() if agents is None else agents)
+        with self._lock:
+            self._cells.clear()
+            self._pos.clear()
+            for a in items:
+                self._place(a.agent_id, int(a.x), int(a.y))
+            self.rebuilds += 1
+
+    def _ensure(self) -> None:
+        if self.follow_state and len(self._pos) != len(state.agents):
+            self.rebuild()
+
+    def agents_within(self, x: int, y: int, radius: int, metric: str = "manhattan", exclude: str = "") -> List[Tuple[str, int]]:
+        """(agent_id, distance) for agents within `radius` of (x, y), nearest first."""
+        self._ensure()
+        radius = max(0, int(radius))
+        out: List[Tuple[str, int]] = []
+        scanned = checked = 0
+        with self._lock:
+            for cell in self._cells_around(x, y, radius):
+                members = self._cells.get(cell)
+                scanned += 1
+                if not members:
+                    continue
+                for aid in members:
+                    checked += 1
+                    if aid == exclude:
+                        continue
+                    bx, by = self._pos[aid]
+                    d = distance(x, y, bx, by, metric)
+                    if d <= radius:
+                        out.append((aid, d))
+            self.queries += 1
+            self.cells_scanned += scanned
+            self.candidates += checked
+        out.sort(key=lambda t: (t[1], t[0]))
+        return out
+
+    def landmarks_within(self, x: int, y: int, radius: int, metric: str = "manhattan") -> List[Tuple[Dict[str, Any], int]]:
+        """(landmark, distance) for landmarks within `radius` of (x, y), nearest first."""
+        radius = max(0, int(radius))
+        out: List[Tuple[Dict[str, Any], int]] = []
+        for cell in self._cells_around(x, y, radius):
+            for lm in self._landmark_cells.get(cell, ()):
+                d = distance(x, y, int(lm.get("x", 0)), int(lm.get("y", 0)), metric)
+                if d <= radius:
+                    out.append((lm, d))
+        out.sort(key=lambda t: (t[1], str(t[0].get("id") or "")))
+        return out
+
+    def nearby(self, agent_id: str, radius: int = WORLD_NEARBY_RADIUS) -> Optional[Dict[str, Any]]:
+        """What one agent can see: agents and landmarks within `radius` tiles (Chebyshev), and the landmark it is at."""
+        me = state.agents.get(agent_id)
+        if me is None:
+            return None
+        agents = []
+        for aid, d in self.agents_within(me.x, me.y, radius, "chebyshev", exclude=agent_id):
+            a = state.agents.get(aid)
+            if a is not None:
+                agents.append({"agent_id": aid, "display_name": a.display_name, "x": a.x, "y": a.y, "distance": d})
+        landmarks = [
+            {"id": lm.get("id"), "type": lm.get("type"), "x": lm.get("x"), "y": lm.get("y"), "distance": d}
+            for lm, d in self.landmarks_within(me.x, me.y, max(1, radius), "chebyshev")
+        ]
+        place_id = next((str(lm["id"] or "") for lm in landmarks if lm["distance"] <= 1), "")
+        return {
+            "agent_id": agent_id,
+            "x": me.x,
+            "y": me.y,
+            "radius": radius,
+            "place_id": place_id,
+            "agents": agents,
+            "landmarks": landmarks,
+        }
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "agents": len(self._pos),
+                "occupied_cells": len(self._cells),
+                "max_per_cell": max((len(m) for m in self._cells.values()), default=0),
+                "cell_size": self.cell_size,
+                "queries": self.queries,
+                "cells_scanned": self.cells_scanned,
+                "candidates": self.candidates,
+                "rebuilds": self.rebuilds,
+            }
+
+
+spatial_index = SpatialIndex(WORLD_SPATIAL_CELL_SIZE, LANDMARKS, follow_state=True)
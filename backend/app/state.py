@@ -7,23 +7,28 @@ This is a transitional module — eventually replaced by a real database.
 from __future__ import annotations
 
 import asyncio
+import functools
 import json
 import logging
 import math
 import time
-import urllib.parse
-import urllib.request
 import uuid
-from dataclasses import asdict
+from dataclasses import asdict, fields
 from typing import Dict, List, Optional
 
+from app import checkpoints, embedding_versions
+from app.embedding_cache import embedding_cache
+from app.job_dedup import JobDuplicateIndex
+from app.job_index import JobIndex
+from app.http_client import HttpStatusError, http_pool
 from app.config import (
-    AGENTS_PATH, AUDIT_PATH, CHAT_PATH, CHAT_REPETITION_PENALTY_AIDOLLAR,
+    CHAT_REPETITION_PENALTY_AIDOLLAR,
     CHAT_REPETITION_SIMILARITY_THRESHOLD, CHAT_REPETITION_WINDOW,
-    ECONOMY_PATH, EMBEDDINGS_BASE_URL, EMBEDDINGS_MODEL, EMBEDDINGS_TIMEOUT_SECONDS,
-    EMBEDDINGS_TRUNCATE, EVENTS_PATH, JOBS_PATH, LANDMARKS, MEMORY_DIR,
-    MEMORY_EMBED_DIR, MOLTWORLD_WEBHOOK_COOLDOWN_SECONDS,
-    MOLTWORLD_WEBHOOKS_PATH, STARTING_AIDOLLARS, TRACE_PATH, TREASURY_ID,
+    CHECKPOINT_INTERVAL_SECONDS, CHECKPOINTS_ENABLED,
+    EMBEDDINGS_BASE_URL, EMBEDDINGS_BATCH_SIZE,
+    EMBEDDINGS_TIMEOUT_SECONDS, EMBEDDINGS_TRUNCATE, LANDMARKS,
+    MEMORY_DIR, MEMORY_EMBED_DIR, MOLTWORLD_WEBHOOK_COOLDOWN_SECONDS,
+    MOLTWORLD_WEBHOOKS_PATH, STARTING_AIDOLLARS, TREASURY_ID,
     WORLD_PUBLIC_URL, WORLD_SIZE, SIM_MINUTES_PER_REAL_SECOND,
 )
 from app.models import (
@@ -31,10 +36,8 @@ from app.models import (
     ChatMessage, EconomyEntry, EventLogEntry, Job, JobEvent,
     Opportunity, TraceEvent, VillageEvent, WorldSnapshot,
 )
-from app.utils import (
-    append_jsonl, normalize_text_for_similarity, chat_text_similarity,
-    read_jsonl, write_jsonl_atomic,
-)
+from app.storage import safe_key, storage
+from app.utils import normalize_text_for_similarity, chat_text_similarity
 from app.ws import ws_manager
 
 _log = logging.getLogger(__name__)
@@ -44,7 +47,8 @@ _log = logging.getLogger(__name__)
 from app.economy_logic import (  # noqa: E402, F401
     recompute_balances, ensure_account, action_diversity_decay,
     award_action_diversity, extract_fiverr_url, try_award_fiverr_discovery,
-    apply_penalty, action_history,
+    apply_penalty, action_history, ledger_barrier, post_ledger_entry,
+    check_balances,
 )
 from app.opportunity_logic import (  # noqa: E402, F401
     norm_text, opportunity_fingerprint, save_opportunities, load_opportunities,
@@ -59,6 +63,8 @@ run_started_at: float = time.time()
 # --- World tick ---
 tick: int = 0
 world_started_at: float = time.time()
+# Bumped by app.world_feed for every change it broadcasts (agents, topic, board).
+world_version: int = 0
 
 # --- Agents ---
 agents: Dict[str, AgentState] = {}
@@ -68,28 +74,27 @@ _agents_save_debounce_sec: float = 2.0
 
 def load_agents() -> None:
     global agents
-    if AGENTS_PATH.exists():
-        try:
-            raw = AGENTS_PATH.read_text(encoding="utf-8", errors="replace")
-            data = json.loads(raw)
-            if isinstance(data, dict) and data:
-                for aid, d in data.items():
-                    if not isinstance(d, dict) or not aid:
-                        continue
-                    try:
-                        agents[aid] = AgentState(
-                            agent_id=str(aid),
-                            display_name=str(d.get("display_name") or aid),
-                            x=int(d.get("x", 0)),
-                            y=int(d.get("y", 0)),
-                            last_seen_at=float(d.get("last_seen_at", 0)),
-                        )
-                    except Exception:
-                        _log.warning("Skipping bad agent entry %s", aid, exc_info=True)
-                        continue
-                return
-        except Exception:
-            _log.warning("Failed to load agents from %s", AGENTS_PATH, exc_info=True)
+    try:
+        data = storage.load_doc("agents")
+    except Exception:
+        data = None
+        _log.warning("Failed to load agents from %s storage", storage.name, exc_info=True)
+    if isinstance(data, dict) and data:
+        for aid, d in data.items():
+            if not isinstance(d, dict) or not aid:
+                continue
+            try:
+                agents[aid] = AgentState(
+                    agent_id=str(aid),
+                    display_name=str(d.get("display_name") or aid),
+                    x=int(d.get("x", 0)),
+                    y=int(d.get("y", 0)),
+                    last_seen_at=float(d.get("last_seen_at", 0)),
+                )
+            except Exception:
+                _log.warning("Skipping bad agent entry %s", aid, exc_info=True)
+                continue
+        return
     for m in chat:
         sid = str(m.sender_id or "").strip()
         if sid and sid not in agents:
@@ -119,9 +124,9 @@ def save_agents(force: bool = False) -> None:
             }
             for aid, a in agents.items()
         }
-        AGENTS_PATH.write_text(json.dumps(data, ensure_ascii=False, indent=0), encoding="utf-8")
+        storage.save_doc("agents", data)
     except Exception:
-        _log.warning("Failed to save agents to %s", AGENTS_PATH, exc_info=True)
+        _log.warning("Failed to save agents to %s storage", storage.name, exc_info=True)
 
 
 # --- Audit ---
@@ -131,7 +136,7 @@ audit_max = 2000
 
 def load_audit() -> None:
     global audit
-    rows = read_jsonl(AUDIT_PATH, limit=audit_max)
+    rows = storage.read("audit", limit=audit_max)
     out: List[AuditEntry] = []
     for r in rows:
         try:
@@ -157,12 +162,14 @@ def append_audit(entry: AuditEntry) -> None:
     audit.append(entry)
     if len(audit) > audit_max:
         del audit[: len(audit) - audit_max]
-    append_jsonl(AUDIT_PATH, asdict(entry))
+    storage.append("audit", asdict(entry))
 
 
 # --- Chat ---
 chat: List[ChatMessage] = []
 chat_max = 200
+# Bumped whenever `chat` changes; part of the GET /world snapshot key.
+chat_version: int = 0
 inboxes: Dict[str, List[dict]] = {}
 _inbox_max = 120
 _inbox_ttl_seconds = 600
@@ -174,8 +181,8 @@ topic_history: List[dict] = []
 
 
 def load_chat() -> None:
-    global chat
-    rows = read_jsonl(CHAT_PATH, limit=chat_max)
+    global chat, chat_version
+    rows = storage.read("chat", limit=chat_max)
     out: List[ChatMessage] = []
     for r in rows:
         try:
@@ -190,6 +197,16 @@ def load_chat() -> None:
         except Exception:
             continue
     chat = out[-chat_max:]
+    chat_version += 1
+
+
+def append_chat(msg: ChatMessage) -> None:
+    global chat_version
+    chat.append(msg)
+    if len(chat) > chat_max:
+        del chat[: len(chat) - chat_max]
+    chat_version += 1
+    storage.append("chat", asdict(msg))
 
 
 def push_inbox(target_id: str, msg: dict) -> None:
@@ -284,14 +301,12 @@ def save_moltworld_webhooks() -> None:
         _log.warning("Failed to save webhooks to %s", MOLTWORLD_WEBHOOKS_PATH, exc_info=True)
 
 
-def _http_post_webhook(url: str, payload: dict, timeout: float = 10.0, headers: Optional[dict] = None) -> None:
+async def _http_post_webhook(url: str, payload: dict, timeout: float = 10.0, headers: Optional[dict] = None) -> None:
     try:
-        data = json.dumps(payload).encode("utf-8")
         h = {"Content-Type": "application/json"}
         if headers:
             h.update(headers)
-        req = urllib.request.Request(url, data=data, method="POST", headers=h)
-        urllib.request.urlopen(req, timeout=timeout)
+        await http_pool.request("POST", url, json_body=payload, headers=h, timeout=timeout)
     except Exception:
         _log.debug("Webhook POST to %s failed", url[:120], exc_info=True)
 
@@ -312,6 +327,7 @@ async def fire_moltworld_webhooks(sender_id: str, sender_name: str, text: str, s
         "scope": scope,
         "world_base_url": WORLD_PUBLIC_URL,
     }
+    posts = []
     for w in moltworld_webhooks:
         agent_id = (w.get("agent_id") or "").strip()
         url = (w.get("url") or "").strip()
@@ -333,15 +349,11 @@ async def fire_moltworld_webhooks(sender_id: str, sender_name: str, text: str, s
             headers = {}
             if secret:
                 headers["Authorization"] = f"Bearer {secret}"
-            try:
-                await asyncio.to_thread(_http_post_webhook, url, payload, 10.0, headers)
-            except Exception:
-                _log.debug("Webhook thread failed for %s", agent_id, exc_info=True)
+            posts.append(_http_post_webhook(url, payload, 10.0, headers))
         else:
-            try:
-                await asyncio.to_thread(_http_post_webhook, url, new_chat_payload)
-            except Exception:
-                _log.debug("Webhook thread failed for %s", agent_id, exc_info=True)
+            posts.append(_http_post_webhook(url, new_chat_payload))
+    # Each hook is bounded by its own timeout; one slow receiver does not delay the others.
+    await asyncio.gather(*posts)
 
 
 # --- Trace ---
@@ -351,7 +363,7 @@ trace_max = 600
 
 def load_trace() -> None:
     global trace
-    rows = read_jsonl(TRACE_PATH, limit=trace_max)
+    rows = storage.read("trace", limit=trace_max)
     out: List[TraceEvent] = []
     for r in rows:
         try:
@@ -384,7 +396,7 @@ def emit_trace(agent_id: str, agent_name: str, kind: str, summary: str, data: Op
         trace.append(ev)
         if len(trace) > trace_max:
             del trace[: len(trace) - trace_max]
-        append_jsonl(TRACE_PATH, asdict(ev))
+        storage.append("trace", asdict(ev))
         try:
             asyncio.create_task(ws_manager.broadcast({"type": "trace", "data": asdict(ev)}))
         except Exception:
@@ -394,13 +406,26 @@ def emit_trace(agent_id: str, agent_name: str, kind: str, summary: str, data: Op
 
 
 # --- Economy ---
+# economy_ledger holds only entries after the loaded checkpoint; balances_base is the
+# checkpointed balance sheet they apply on top of.
 economy_ledger: List[EconomyEntry] = []
+balances_base: Dict[str, float] = {}
 balances: Dict[str, float] = {}
 
 
 def load_economy() -> None:
-    global economy_ledger
-    rows = read_jsonl(ECONOMY_PATH)
+    global economy_ledger, balances_base
+    balances_base = {}
+    offset = 0
+    cp = checkpoints.load_checkpoint("balances", "economy") if CHECKPOINTS_ENABLED else None
+    if cp is not None:
+        try:
+            balances_base = {str(k): float(v) for k, v in (cp["payload"].get("balances") or {}).items()}
+            offset = int(cp["offset"])
+        except Exception:
+            _log.warning("Balances checkpoint unusable; replaying full ledger", exc_info=True)
+            balances_base, offset = {}, 0
+    rows = storage.read_after("economy", offset)
     ledger: List[EconomyEntry] = []
     for r in rows:
         try:
@@ -421,14 +446,39 @@ def load_economy() -> None:
 
 # --- Jobs ---
 jobs: Dict[str, Job] = {}
+# Sorted per-status/creator/claimer/parent views of `jobs`; see app.job_index.
+job_index = JobIndex()
+# MinHash LSH over job token sets for the duplicate check on create; see app.job_dedup.
+job_dedup = JobDuplicateIndex()
 job_events: List[JobEvent] = []
+_JOB_FIELDS = frozenset(f.name for f in fields(Job))
+
+
+def apply_job_event(ev: JobEvent, target: Optional[Dict[str, Job]] = None) -> None:
+    """Apply one job event to `target` (default: the live `jobs` projection and its indexes)."""
+    if target is not None:
+        _apply_job_event(target, ev)
+        return
+    _apply_job_event(jobs, ev)
+    job = jobs.get(ev.job_id)
+    if job is not None:
+        job_index.update(job)
+        job_dedup.update(job)
 
 
-def apply_job_event(ev: JobEvent) -> None:
+def remove_jobs(job_ids) -> None:
+    """Drop jobs from the live projection and its indexes (compaction/purge)."""
+    for jid in job_ids:
+        jobs.pop(jid, None)
+        job_index.remove(jid)
+        job_dedup.remove(jid)
+
+
+def _apply_job_event(js: Dict[str, Job], ev: JobEvent) -> None:
     t = ev.event_type
     d = ev.data or {}
     if t == "create":
-        jobs[ev.job_id] = Job(
+        js[ev.job_id] = Job(
             job_id=ev.job_id,
             title=str(d.get("title") or "")[:200],
             body=str(d.get("body") or "")[:4000],
@@ -449,7 +499,11 @@ def apply_job_event(ev: JobEvent) -> None:
             parent_job_id=str(d.get("parent_job_id") or "")[:80],
         )
         return
-    job = jobs.get(ev.job_id)
+    if t == "snapshot":
+        # Written by the compactor in place of a terminal job's full history.
+        js[ev.job_id] = Job(**{k: v for k, v in d.items() if k in _JOB_FIELDS})
+        return
+    job = js.get(ev.job_id)
     if not job:
         return
     if t == "claim":
@@ -515,16 +569,31 @@ def append_job_event(event_type: str, job_id: str, data: dict) -> JobEvent:
         created_at=time.time(),
     )
     job_events.append(ev)
-    append_jsonl(JOBS_PATH, asdict(ev))
     apply_job_event(ev)
+    job = jobs.get(job_id) if storage.indexes_jobs else None
+    storage.append_job_event(asdict(ev), asdict(job) if job is not None else None)
     return ev
 
 
+_JOB_SCHEMA = "Job:" + ",".join(f.name for f in fields(Job))
+
+
 def load_jobs() -> None:
     global job_events, jobs
     jobs = {}
     job_events = []
-    rows = read_jsonl(JOBS_PATH)
+    offset = 0
+    cp = checkpoints.load_checkpoint("jobs", "jobs", _JOB_SCHEMA) if CHECKPOINTS_ENABLED else None
+    if cp is not None:
+        try:
+            jobs = {jid: Job(**d) for jid, d in (cp["payload"].get("jobs") or {}).items()}
+            offset = int(cp["offset"])
+        except Exception:
+            _log.warning("Jobs checkpoint unusable; replaying full log", exc_info=True)
+            jobs, offset = {}, 0
+    job_index.rebuild(jobs.values())
+    job_dedup.rebuild(jobs.values())
+    rows = storage.read_after("jobs", offset)
     for r in rows:
         try:
             ev = JobEvent(
@@ -538,6 +607,8 @@ def load_jobs() -> None:
             apply_job_event(ev)
         except Exception:
             continue
+    if storage.indexes_jobs and storage.job_count() != len(jobs):
+        storage.sync_jobs([asdict(j) for j in jobs.values()])
 
 
 def requeue_stale_claims(now: Optional[float] = None) -> int:
@@ -547,9 +618,10 @@ def requeue_stale_claims(now: Optional[float] = None) -> int:
     if stale_seconds <= 0:
         return 0
     requeued = 0
-    for j in list(jobs.values()):
+    for jid in list(job_index.newest_ids(("status", "claimed"))):
+        j = jobs.get(jid)
         try:
-            if j.status != "claimed":
+            if j is None or j.status != "claimed":
                 continue
             if not j.claimed_at:
                 continue
@@ -619,16 +691,28 @@ def append_event_log(event_type: str, event_id: str, data: dict) -> EventLogEntr
         created_at=time.time(),
     )
     event_log.append(ev)
-    append_jsonl(EVENTS_PATH, asdict(ev))
+    storage.append("events", asdict(ev))
     apply_event_log(ev)
     return ev
 
 
+_EVENT_SCHEMA = "VillageEvent:" + ",".join(f.name for f in fields(VillageEvent))
+
+
 def load_events() -> None:
     global events, event_log
     events = {}
     event_log = []
-    rows = read_jsonl(EVENTS_PATH)
+    offset = 0
+    cp = checkpoints.load_checkpoint("events", "events", _EVENT_SCHEMA) if CHECKPOINTS_ENABLED else None
+    if cp is not None:
+        try:
+            events = {eid: VillageEvent(**d) for eid, d in (cp["payload"].get("events") or {}).items()}
+            offset = int(cp["offset"])
+        except Exception:
+            _log.warning("Events checkpoint unusable; replaying full log", exc_info=True)
+            events, offset = {}, 0
+    rows = storage.read_after("events", offset)
     for r in rows:
         try:
             ev = EventLogEntry(
@@ -656,42 +740,91 @@ opportunities: Dict[str, Opportunity] = {}
 # --- Memory helpers ---
 
 def memory_path(agent_id: str):
-    safe = "".join([c for c in agent_id if c.isalnum() or c in ("-", "_")]) or "agent"
-    return MEMORY_DIR / f"{safe}.jsonl"
+    return MEMORY_DIR / f"{safe_key(agent_id)}.jsonl"
 
 
 def memory_embed_path(agent_id: str):
-    safe = "".join([c for c in agent_id if c.isalnum() or c in ("-", "_")]) or "agent"
-    return MEMORY_EMBED_DIR / f"{safe}.jsonl"
+    return MEMORY_EMBED_DIR / f"{safe_key(agent_id)}.jsonl"
 
 
-def get_embedding(text: str) -> Optional[List[float]]:
+async def get_embedding(text: str) -> Optional[List[float]]:
     if not EMBEDDINGS_BASE_URL:
         return None
-    payload = {"model": EMBEDDINGS_MODEL, "prompt": text}
-    data = json.dumps(payload).encode("utf-8")
-    req = urllib.request.Request(
-        url=f"{EMBEDDINGS_BASE_URL}/api/embeddings",
-        data=data,
-        headers={"Content-Type": "application/json"},
-        method="POST",
-    )
+    model = embedding_versions.active().model
+    return await embedding_cache.get_or_compute(model, EMBEDDINGS_TRUNCATE, text, lambda: _fetch_embedding(text, model))
+
+
+def _as_vector(emb) -> Optional[List[float]]:
+    if not isinstance(emb, list) or not emb:
+        return None
+    out = [float(x) for x in emb]
+    if EMBEDDINGS_TRUNCATE > 0 and len(out) > EMBEDDINGS_TRUNCATE:
+        out = out[:EMBEDDINGS_TRUNCATE]
+    return out
+
+
+async def _fetch_embedding(text: str, model: str) -> Optional[List[float]]:
+    payload = {"model": model, "prompt": text}
     try:
-        with urllib.request.urlopen(req, timeout=EMBEDDINGS_TIMEOUT_SECONDS) as resp:
-            raw = resp.read().decode("utf-8", errors="replace")
-            obj = json.loads(raw)
-            emb = obj.get("embedding")
-            if not isinstance(emb, list) or not emb:
-                return None
-            out = [float(x) for x in emb]
-            if EMBEDDINGS_TRUNCATE > 0 and len(out) > EMBEDDINGS_TRUNCATE:
-                out = out[:EMBEDDINGS_TRUNCATE]
-            return out
+        obj = await http_pool.post_json(f"{EMBEDDINGS_BASE_URL}/api/embeddings", payload, timeout=EMBEDDINGS_TIMEOUT_SECONDS)
+        return _as_vector(obj.get("embedding"))
     except Exception:
         _log.debug("Embedding request failed for text len=%d", len(text or ""), exc_info=True)
         return None
 
 
+# None until the first batch call; False once the server answered 404 to /api/embed.
+_embed_batch_supported: Optional[bool] = None
+
+
+async def _fetch_embedding_batch(texts: List[str], model: str) -> Optional[List[Optional[List[float]]]]:
+    """One /api/embed call for all `texts`; None when the server has no batch endpoint."""
+    global _embed_batch_supported
+    payload = {"model": model, "input": texts}
+    try:
+        obj = await http_pool.post_json(f"{EMBEDDINGS_BASE_URL}/api/embed", payload, timeout=EMBEDDINGS_TIMEOUT_SECONDS)
+    except HttpStatusError as e:
+        if e.status_code in (404, 405):
+            _log.info("Embeddings server has no /api/embed; embedding one text per request.")
+            _embed_batch_supported = False
+            return None
+        _log.debug("Batch embedding request failed for %d texts", len(texts), exc_info=True)
+        return [None] * len(texts)
+    except Exception:
+        _log.debug("Batch embedding request failed for %d texts", len(texts), exc_info=True)
+        return [None] * len(texts)
+    _embed_batch_supported = True
+    embs = obj.get("embeddings") if isinstance(obj, dict) else None
+    if not isinstance(embs, list) or len(embs) != len(texts):
+        return [None] * len(texts)
+    return [_as_vector(e) for e in embs]
+
+
+async def get_embeddings(texts: List[str], model: Optional[str] = None) -> List[Optional[List[float]]]:
+    """Vectors for `texts` (None where unavailable), fetching cache misses in batches.
+
+    `model` defaults to the active embedding store's model.
+    """
+    if not EMBEDDINGS_BASE_URL:
+        return [None] * len(texts)
+    model = model or embedding_versions.active().model
+    out = [await embedding_cache.peek(model, EMBEDDINGS_TRUNCATE, t) for t in texts]
+    missing = [i for i, v in enumerate(out) if v is None]
+    step = max(1, EMBEDDINGS_BATCH_SIZE)
+    for start in range(0, len(missing), step):
+        idx = missing[start:start + step]
+        vecs = None
+        if len(idx) > 1 and _embed_batch_supported is not False:
+            vecs = await _fetch_embedding_batch([texts[i] for i in idx], model)
+        if vecs is None:
+            vecs = [await _fetch_embedding(texts[i], model) for i in idx]
+        for i, v in zip(idx, vecs):
+            if v is not None:
+                out[i] = v
+                await embedding_cache.put(model, EMBEDDINGS_TRUNCATE, texts[i], v)
+    return out
+
+
 def cosine(a: List[float], b: List[float]) -> float:
     if not a or not b:
         return 0.0
@@ -716,6 +849,7 @@ token_requests_max = 200
 
 # --- World snapshot ---
 
+@functools.lru_cache(maxsize=1)
 def get_rules_text() -> str:
     from app.config import CHAT_REPETITION_PENALTY_AIDOLLAR, TASK_FAIL_PENALTY
     return f"""MoltWorld ai$ rules — read these to know what earns or costs ai$.
@@ -735,11 +869,18 @@ COST ai$:
 There is a **Rules room** on the map (landmark at (12,10)); walk there to read the rules. The rules are also in this response and at GET /rules."""
 
 
+def sim_minutes() -> int:
+    """Simulated minutes since the world (run) started."""
+    return int(max(0.0, time.time() - world_started_at) * SIM_MINUTES_PER_REAL_SECOND)
+
+
+def world_clock() -> Dict[str, int]:
+    """The simulated clock as the `day` / `minute_of_day` fields of a world snapshot."""
+    sim_minutes_total = sim_minutes()
+    return {"day": sim_minutes_total // (24 * 60), "minute_of_day": sim_minutes_total % (24 * 60)}
+
+
 def get_world_snapshot() -> WorldSnapshot:
-    elapsed = max(0.0, time.time() - world_started_at)
-    sim_minutes_total = int(elapsed * SIM_MINUTES_PER_REAL_SECOND)
-    day = sim_minutes_total // (24 * 60)
-    minute_of_day = sim_minutes_total % (24 * 60)
     agents_list = []
     for a in agents.values():
         agents_list.append({
@@ -753,9 +894,9 @@ def get_world_snapshot() -> WorldSnapshot:
     recent_chat_deduped = dedupe_recent_chat(raw_recent)
     return WorldSnapshot(
         world_size=WORLD_SIZE,
+        version=world_version,
         tick=tick,
-        day=day,
-        minute_of_day=minute_of_day,
+        **world_clock(),
         landmarks=LANDMARKS,
         agents=agents_list,
         recent_chat=recent_chat_deduped,
@@ -764,9 +905,62 @@ def get_world_snapshot() -> WorldSnapshot:
     )
 
 
+# --- Checkpoints ---
+
+def snapshot_checkpoints(names: Optional[List[str]] = None) -> List[dict]:
+    """Snapshot projections pinned to their log offsets. Runs on the event loop without awaiting."""
+    wanted = set(names or ("jobs", "events", "balances"))
+    docs: List[dict] = []
+    if "jobs" in wanted:
+        docs.append(checkpoints.snapshot_checkpoint(
+            "jobs", "jobs", {"jobs": {jid: asdict(j) for jid, j in jobs.items()}}, _JOB_SCHEMA))
+    if "events" in wanted:
+        docs.append(checkpoints.snapshot_checkpoint(
+            "events", "events", {"events": {eid: asdict(e) for eid, e in events.items()}}, _EVENT_SCHEMA))
+    if "balances" in wanted:
+        docs.append(checkpoints.snapshot_checkpoint("balances", "economy", {"balances": dict(balances)}))
+    return docs
+
+
+def write_checkpoints(names: Optional[List[str]] = None) -> List[dict]:
+    out = []
+    for doc in snapshot_checkpoints(names):
+        checkpoints.save_checkpoint(doc)
+        out.append({"name": doc["name"], "offset": doc["offset"]})
+    return out
+
+
+_checkpoint_offsets: Dict[str, int] = {}
+
+
+async def checkpoint_loop() -> None:
+    if not CHECKPOINTS_ENABLED or CHECKPOINT_INTERVAL_SECONDS <= 0:
+        return
+    logs = {"jobs": "jobs", "events": "events", "balances": "economy"}
+    while True:
+        await asyncio.sleep(CHECKPOINT_INTERVAL_SECONDS)
+        try:
+            changed = []
+            for name, stream in logs.items():
+                size = await asyncio.to_thread(storage.cursor, stream)
+                if size != _checkpoint_offsets.get(name):
+                    changed.append(name)
+            if not changed:
+                continue
+            docs = snapshot_checkpoints(changed)
+            for doc in docs:
+                await asyncio.to_thread(checkpoints.save_checkpoint, doc)
+                _checkpoint_offsets[doc["name"]] = int(doc["offset"])
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            _log.warning("Periodic checkpoint failed", exc_info=True)
+
+
 # --- Load all state on module import ---
 
 def load_all() -> None:
+    storage.open()
     load_audit()
     load_chat()
     load_agents()
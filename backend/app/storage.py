@@ -0,0 +1,676 @@
+"""
+Pluggable storage engine for logs, memories and small documents.
+
+State and routes address data by stream name instead of file path:
+
+    economy, jobs, events, chat, trace, audit      append-only logs
+    memory:<agent>, memory_embeddings:<agent>      per-agent memory logs
+    memory_embeddings:<agent>.v<N>                 embeddings in store version N (see embedding_versions)
+    agents, opportunities                          documents (load/save whole)
+
+STORAGE_BACKEND=jsonl (default) keeps the original JSONL files under DATA_DIR.
+STORAGE_BACKEND=sqlite stores everything in one WAL-mode database with indexed
+columns, so ledger-by-account, memory-by-agent and jobs-by-status/run queries
+do not scan, and readers never block the single writer thread.
+
+Appends are queued for a background writer. Reads see what has been written
+so far and do not wait for the queue; a caller that must read its own writes
+calls `flush(stream)` first (off the event loop). `cursor()` flushes itself,
+since a checkpoint offset has to cover every event already applied in memory.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.config import (
+    AGENTS_PATH, AUDIT_PATH, CHAT_PATH, DATA_DIR, ECONOMY_LEDGER_FSYNC,
+    ECONOMY_PATH, EVENTS_PATH, JOBS_PATH, LOG_WRITER_BATCH_MAX,
+    LOG_WRITER_ENABLED, LOG_WRITER_FLUSH_INTERVAL_MS, LOG_WRITER_QUEUE_MAX,
+    MEMORY_DIR, MEMORY_EMBED_DIR, OPPORTUNITIES_PATH, SQLITE_PATH,
+    STORAGE_BACKEND, TRACE_PATH,
+)
+from app.logwriter import LogWriter, flush_log, register_log
+from app.run_archive import rotate_logs, write_index, write_segments
+from app.utils import (
+    _parse_jsonl_line, append_jsonl, compact_jsonl, read_jsonl, read_jsonl_from,
+    write_jsonl_atomic,
+)
+
+_log = logging.getLogger(__name__)
+
+LOG_STREAMS = ("economy", "jobs", "events", "chat", "trace", "audit")
+_PREFIX_HASH_BYTES = 4096
+_RUN_TAG_RE = re.compile(r"\[run:([^\]]+)\]", re.IGNORECASE)
+
+
+def safe_key(agent_id: str) -> str:
+    return "".join([c for c in agent_id if c.isalnum() or c in ("-", "_")]) or "agent"
+
+
+def memory_stream(agent_id: str) -> str:
+    return f"memory:{safe_key(agent_id)}"
+
+
+def embedding_stream(agent_id: str, version: int = 0) -> str:
+    key = safe_key(agent_id)
+    # Version 0 is the original, unversioned store.
+    return f"memory_embeddings:{key}.v{int(version)}" if version else f"memory_embeddings:{key}"
+
+
+def _split_stream(stream: str) -> Tuple[str, str]:
+    base, _, key = stream.partition(":")
+    return base, key
+
+
+def job_run_id(job: dict) -> str:
+    m = _RUN_TAG_RE.search(str(job.get("title") or "") + "\n" + str(job.get("body") or ""))
+    return m.group(1).strip()[:80] if m else ""
+
+
+class StorageEngine(ABC):
+    """Interface shared by all backends; a backend missing an abstract method fails at construction."""
+
+    name = "base"
+    # True when the backend keeps an indexed jobs table (see query_jobs).
+    indexes_jobs = False
+
+    def open(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    @abstractmethod
+    def append(self, stream: str, row: dict) -> None:
+        ...
+
+    def append_job_event(self, row: dict, job: Optional[dict] = None) -> None:
+        self.append("jobs", row)
+
+    @abstractmethod
+    def read(self, stream: str, limit: Optional[int] = None) -> List[dict]:
+        ...
+
+    @abstractmethod
+    def read_after(self, stream: str, cursor: int) -> List[dict]:
+        """Rows appended after `cursor` (see cursor())."""
+
+    @abstractmethod
+    def cursor(self, stream: str) -> int:
+        """Opaque, monotonically increasing position of the end of `stream`, after flushing queued appends."""
+
+    @abstractmethod
+    def cursor_token(self, stream: str, cursor: int) -> str:
+        """Hash identifying the data just before `cursor`; changes if the stream was rewritten."""
+
+    @abstractmethod
+    def read_since(self, stream: str, cursor: int) -> Tuple[List[dict], int]:
+        """Rows after `cursor` plus the cursor just past the last row returned."""
+
+    @abstractmethod
+    def signature(self, stream: str) -> tuple:
+        """Cheap value that changes whenever `stream` is appended to or rewritten."""
+
+    @abstractmethod
+    def rewrite(self, stream: str, rows: List[dict]) -> None:
+        ...
+
+    def flush(self, stream: Optional[str] = None) -> None:
+        """Block until appends queued so far are written, so reads see them."""
+
+    @abstractmethod
+    def compact(self, stream: str, transform: Callable[[Iterable[dict]], Iterable[dict]]) -> dict:
+        """Replace the current rows of `stream` with transform(rows) without losing concurrent appends.
+
+        `rows` may be iterated more than once; the transform yields the rows to keep.
+
+        Returns rows_before/rows_after/bytes_before/bytes_after. Called off the event loop.
+        """
+
+    @abstractmethod
+    def load_doc(self, name: str) -> Any:
+        ...
+
+    @abstractmethod
+    def save_doc(self, name: str, data: Any) -> None:
+        ...
+
+    @abstractmethod
+    def archive_run(self, run_id: str, streams: Iterable[str], runs_dir: Path) -> dict:
+        ...
+
+    @abstractmethod
+    def memory_agents(self) -> List[str]:
+        """Safe keys of all agents that have a memory stream."""
+
+    def ledger_for_account(self, account: str, limit: int = 100) -> List[dict]:
+        rows = [r for r in self.read("economy") if account in (r.get("from_id"), r.get("to_id"))]
+        return rows[-limit:] if limit > 0 else rows
+
+    def query_jobs(
+        self, status: Optional[str] = None, run_id: Optional[str] = None,
+        created_by: Optional[str] = None, limit: int = 500,
+    ) -> Optional[List[str]]:
+        """Job ids matching the filters, newest first, or None if this backend has no job index."""
+        return None
+
+    def sync_jobs(self, jobs: List[dict]) -> None:
+        pass
+
+    def job_count(self) -> int:
+        """Rows in the job index; 0 for backends without one."""
+        return 0
+
+    def delete_jobs(self, job_ids: Iterable[str]) -> None:
+        pass
+
+    def stats(self) -> dict:
+        return {"backend": self.name}
+
+
+# --- JSONL backend ---
+
+class JsonlStorage(StorageEngine):
+    name = "jsonl"
+
+    def __init__(self, data_dir: Path = DATA_DIR) -> None:
+        self.data_dir = Path(data_dir)
+        self._paths: Dict[str, Path] = {
+            "economy": ECONOMY_PATH,
+            "jobs": JOBS_PATH,
+            "events": EVENTS_PATH,
+            "chat": CHAT_PATH,
+            "trace": TRACE_PATH,
+            "audit": AUDIT_PATH,
+        }
+
+    def open(self) -> None:
+        if not LOG_WRITER_ENABLED:
+            return
+        opts = {
+            "queue_max": LOG_WRITER_QUEUE_MAX,
+            "flush_interval_ms": LOG_WRITER_FLUSH_INTERVAL_MS,
+            "batch_max": LOG_WRITER_BATCH_MAX,
+        }
+        register_log(ECONOMY_PATH, fsync=ECONOMY_LEDGER_FSYNC, **opts)
+        for s in LOG_STREAMS:
+            if s != "economy":
+                register_log(self._paths[s], **opts)
+
+    def path(self, stream: str) -> Path:
+        base, key = _split_stream(stream)
+        if base == "memory":
+            return MEMORY_DIR / f"{key}.jsonl"
+        if base == "memory_embeddings":
+            return MEMORY_EMBED_DIR / f"{key}.jsonl"
+        return self._paths[base]
+
+    def append(self, stream: str, row: dict) -> None:
+        append_jsonl(self.path(stream), row)
+
+    def memory_agents(self) -> List[str]:
+        return sorted(p.stem for p in MEMORY_DIR.glob("*.jsonl"))
+
+    def read(self, stream: str, limit: Optional[int] = None) -> List[dict]:
+        return read_jsonl(self.path(stream), limit=limit)
+
+    def read_after(self, stream: str, cursor: int) -> List[dict]:
+        return read_jsonl_from(self.path(stream), cursor)
+
+    def cursor(self, stream: str) -> int:
+        p = self.path(stream)
+        flush_log(p)
+        return int(p.stat().st_size) if p.exists() else 0
+
+    def cursor_token(self, stream: str, cursor: int) -> str:
+        if cursor <= 0:
+            return ""
+        p = self.path(stream)
+        start = max(0, cursor - _PREFIX_HASH_BYTES)
+        try:
+            with p.open("rb") as f:
+                f.seek(start)
+                raw = f.read(cursor - start)
+        except FileNotFoundError:
+            return ""
+        if len(raw) != cursor - start or not raw.endswith(b"\n"):
+            return ""
+        return hashlib.sha256(raw).hexdigest()
+
+    def read_since(self, stream: str, cursor: int) -> Tuple[List[dict], int]:
+        p = self.path(stream)
+        try:
+            with p.open("rb") as f:
+                f.seek(cursor)
+                raw = f.read()
+        except FileNotFoundError:
+            return [], 0
+        cut = raw.rfind(b"\n") + 1
+        rows = [r for r in (_parse_jsonl_line(ln) for ln in raw[:cut].splitlines()) if r is not None]
+        return rows, cursor + cut
+
+    def signature(self, stream: str) -> tuple:
+        try:
+            st = self.path(stream).stat()
+        except FileNotFoundError:
+            return (0, 0)
+        return (st.st_mtime_ns, st.st_size)
+
+    def rewrite(self, stream: str, rows: List[dict]) -> None:
+        write_jsonl_atomic(self.path(stream), rows)
+
+    def flush(self, stream: Optional[str] = None) -> None:
+        if stream is None:
+            for s in LOG_STREAMS:
+                flush_log(self._paths[s])
+            return
+        flush_log(self.path(stream))
+
+    def compact(self, stream: str, transform: Callable[[Iterable[dict]], Iterable[dict]]) -> dict:
+        return compact_jsonl(self.path(stream), transform)
+
+    def load_doc(self, name: str) -> Any:
+        if name == "agents":
+            if not AGENTS_PATH.exists():
+                return None
+            return json.loads(AGENTS_PATH.read_text(encoding="utf-8", errors="replace"))
+        if name == "opportunities":
+            return read_jsonl(OPPORTUNITIES_PATH)
+        raise KeyError(name)
+
+    def save_doc(self, name: str, data: Any) -> None:
+        if name == "agents":
+            AGENTS_PATH.write_text(json.dumps(data, ensure_ascii=False, indent=0), encoding="utf-8")
+            return
+        if name == "opportunities":
+            write_jsonl_atomic(OPPORTUNITIES_PATH, list(data))
+            return
+        raise KeyError(name)
+
+    def archive_run(self, run_id: str, streams: Iterable[str], runs_dir: Path) -> dict:
+        return rotate_logs(run_id, [self._paths[s] for s in streams], runs_dir)
+
+
+# --- SQLite backend ---
+
+# stream base -> (table, indexed columns, indexes)
+_LOG_TABLES: Dict[str, Tuple[str, Tuple[str, ...], Tuple[Tuple[str, ...], ...]]] = {
+    "economy": ("economy_ledger", ("entry_id", "entry_type", "from_id", "to_id", "amount", "created_at"),
+                (("from_id", "seq"), ("to_id", "seq"))),
+    "jobs": ("job_events", ("event_id", "job_id", "event_type", "created_at"), (("job_id", "seq"),)),
+    "events": ("village_events", ("log_id", "event_id", "event_type", "created_at"), (("event_id", "seq"),)),
+    "chat": ("chat_messages", ("msg_id", "sender_id", "created_at"), (("sender_id", "seq"),)),
+    "trace": ("trace_events", ("event_id", "agent_id", "kind", "created_at"), (("agent_id", "seq"),)),
+    "audit": ("audit_log", ("audit_id", "method", "path", "status_code", "created_at"), (("created_at",),)),
+    "memory": ("memories", ("agent_key", "memory_id", "kind", "importance", "created_at"),
+               (("agent_key", "seq"),)),
+    "memory_embeddings": ("memory_embeddings", ("agent_key", "memory_id", "model", "dim", "created_at"),
+                          (("agent_key", "seq"),)),
+}
+
+_RUN_FILES = {"chat": CHAT_PATH.name, "trace": TRACE_PATH.name, "audit": AUDIT_PATH.name}
+
+_SCHEMA_EXTRA = """
+CREATE TABLE IF NOT EXISTS agents (
+    agent_id TEXT PRIMARY KEY, display_name TEXT, x INTEGER, y INTEGER, last_seen_at REAL, doc TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS opportunities (
+    fingerprint TEXT PRIMARY KEY, status TEXT, last_seen_at REAL, doc TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_opportunities_status ON opportunities(status, last_seen_at);
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY, status TEXT, run_id TEXT, created_by TEXT, claimed_by TEXT,
+    created_at REAL, doc TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_run ON jobs(run_id, status, created_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_created_by ON jobs(created_by, created_at);
+"""
+
+_JOB_UPSERT = (
+    "INSERT OR REPLACE INTO jobs (job_id, status, run_id, created_by, claimed_by, created_at, doc) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+
+
+def _dumps(row: Any) -> str:
+    return json.dumps(row, ensure_ascii=False)
+
+
+def _job_params(job: dict) -> tuple:
+    return (
+        str(job.get("job_id") or ""), str(job.get("status") or ""), job_run_id(job),
+        str(job.get("created_by") or ""), str(job.get("claimed_by") or ""),
+        float(job.get("created_at") or 0.0), _dumps(job),
+    )
+
+
+class _SqliteWriter(LogWriter):
+    """Single writer thread; each queue item is a list of statements applied atomically."""
+
+    def __init__(self, db_path: Path, **kwargs) -> None:
+        super().__init__(db_path, **kwargs)
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _encode(self, obj: Any) -> Any:
+        return obj
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = _connect(self.path, isolation_level=None)
+            self._conn.execute(f"PRAGMA synchronous={'FULL' if self.fsync else 'NORMAL'}")
+        return self._conn
+
+    def _write_batch(self, items: List[Any]) -> None:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for stmts in items:
+                for sql, params in stmts:
+                    conn.execute(sql, params)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def close(self, timeout: Optional[float] = 10.0) -> None:
+        super().close(timeout)
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def _connect(path: Path, **kwargs) -> sqlite3.Connection:
+    conn = sqlite3.connect(str(path), timeout=30.0, check_same_thread=False, **kwargs)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA busy_timeout=30000")
+    return conn
+
+
+class SqliteStorage(StorageEngine):
+    name = "sqlite"
+    indexes_jobs = True
+
+    def __init__(self, db_path: Path = SQLITE_PATH) -> None:
+        self.db_path = Path(db_path)
+        self._local = threading.local()
+        self._writer: Optional[_SqliteWriter] = None
+        self._lock = threading.Lock()
+
+    # --- connections ---
+
+    def open(self) -> None:
+        with self._lock:
+            if self._writer is not None and not self._writer._closed:
+                return
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = _connect(self.db_path)
+            try:
+                conn.executescript(self._schema_sql())
+            finally:
+                conn.close()
+            self._writer = _SqliteWriter(
+                self.db_path,
+                queue_max=LOG_WRITER_QUEUE_MAX,
+                flush_interval_ms=LOG_WRITER_FLUSH_INTERVAL_MS if LOG_WRITER_ENABLED else 0.0,
+                batch_max=LOG_WRITER_BATCH_MAX,
+                fsync=ECONOMY_LEDGER_FSYNC,
+            )
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+
+    @staticmethod
+    def _schema_sql() -> str:
+        parts = []
+        for table, cols, indexes in _LOG_TABLES.values():
+            col_sql = ", ".join(f"{c} {'REAL' if c in ('amount', 'created_at', 'importance') else 'TEXT'}" for c in cols)
+            parts.append(
+                f"CREATE TABLE IF NOT EXISTS {table} (seq INTEGER PRIMARY KEY AUTOINCREMENT, {col_sql}, doc TEXT NOT NULL);"
+            )
+            for idx in indexes:
+                parts.append(f"CREATE INDEX IF NOT EXISTS idx_{table}_{'_'.join(idx)} ON {table}({', '.join(idx)});")
+        return "\n".join(parts) + _SCHEMA_EXTRA
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.open()
+            conn = _connect(self.db_path)
+            conn.execute("PRAGMA query_only=1")
+            self._local.conn = conn
+        return conn
+
+    def _query(self, sql: str, params: tuple = ()) -> List[tuple]:
+        # Sees committed rows only; callers that need their own queued writes flush first.
+        return self._reader().execute(sql, params).fetchall()
+
+    def _submit(self, stmts: List[Tuple[str, tuple]]) -> None:
+        if self._writer is None or self._writer._closed:
+            self.open()
+        self._writer.append(stmts)
+
+    # --- logs ---
+
+    def _insert_stmt(self, stream: str, row: dict, seq: Optional[int] = None) -> Tuple[str, tuple]:
+        base, key = _split_stream(stream)
+        table, cols, _ = _LOG_TABLES[base]
+        vals = []
+        for c in cols:
+            if c == "agent_key":
+                vals.append(key)
+                continue
+            v = row.get(c)
+            vals.append(v if isinstance(v, (int, float)) or v is None else str(v))
+        if seq is not None:
+            sql = f"INSERT INTO {table} (seq, {', '.join(cols)}, doc) VALUES ({', '.join('?' * (len(cols) + 2))})"
+            return sql, (int(seq),) + tuple(vals) + (_dumps(row),)
+        sql = f"INSERT INTO {table} ({', '.join(cols)}, doc) VALUES ({', '.join('?' * (len(cols) + 1))})"
+        return sql, tuple(vals) + (_dumps(row),)
+
+    def _where(self, stream: str) -> Tuple[str, str, tuple]:
+        base, key = _split_stream(stream)
+        table = _LOG_TABLES[base][0]
+        if base in ("memory", "memory_embeddings"):
+            return table, "agent_key = ?", (key,)
+        return table, "1 = 1", ()
+
+    def append(self, stream: str, row: dict) -> None:
+        self._submit([self._insert_stmt(stream, row)])
+
+    def memory_agents(self) -> List[str]:
+        return [r[0] for r in self._query("SELECT DISTINCT agent_key FROM memories ORDER BY agent_key")]
+
+    def append_job_event(self, row: dict, job: Optional[dict] = None) -> None:
+        stmts = [self._insert_stmt("jobs", row)]
+        if job is not None:
+            stmts.append((_JOB_UPSERT, _job_params(job)))
+        self._submit(stmts)
+
+    def read(self, stream: str, limit: Optional[int] = None) -> List[dict]:
+        table, where, params = self._where(stream)
+        if limit is not None and limit > 0:
+            rows = self._query(f"SELECT doc FROM {table} WHERE {where} ORDER BY seq DESC LIMIT ?", params + (int(limit),))
+            rows.reverse()
+        else:
+            rows = self._query(f"SELECT doc FROM {table} WHERE {where} ORDER BY seq", params)
+        return [json.loads(r[0]) for r in rows]
+
+    def read_after(self, stream: str, cursor: int) -> List[dict]:
+        table, where, params = self._where(stream)
+        rows = self._query(f"SELECT doc FROM {table} WHERE {where} AND seq > ? ORDER BY seq", params + (int(cursor),))
+        return [json.loads(r[0]) for r in rows]
+
+    def cursor(self, stream: str) -> int:
+        table, where, params = self._where(stream)
+        self.flush()
+        return int(self._query(f"SELECT COALESCE(MAX(seq), 0) FROM {table} WHERE {where}", params)[0][0])
+
+    def cursor_token(self, stream: str, cursor: int) -> str:
+        if cursor <= 0:
+            return ""
+        table, where, params = self._where(stream)
+        rows = self._query(f"SELECT doc FROM {table} WHERE {where} AND seq = ?", params + (int(cursor),))
+        if not rows:
+            return ""
+        return hashlib.sha256(f"{cursor}:{rows[0][0]}".encode("utf-8")).hexdigest()
+
+    def read_since(self, stream: str, cursor: int) -> Tuple[List[dict], int]:
+        table, where, params = self._where(stream)
+        found = self._query(f"SELECT seq, doc FROM {table} WHERE {where} AND seq > ? ORDER BY seq", params + (int(cursor),))
+        if not found:
+            return [], int(cursor)
+        return [json.loads(r[1]) for r in found], int(found[-1][0])
+
+    def signature(self, stream: str) -> tuple:
+        table, where, params = self._where(stream)
+        return tuple(self._query(f"SELECT COALESCE(MAX(seq), 0), COUNT(*) FROM {table} WHERE {where}", params)[0])
+
+    def rewrite(self, stream: str, rows: List[dict]) -> None:
+        table, where, params = self._where(stream)
+        stmts: List[Tuple[str, tuple]] = [(f"DELETE FROM {table} WHERE {where}", params)]
+        stmts.extend(self._insert_stmt(stream, r) for r in rows)
+        self._submit(stmts)
+        self.flush()
+
+    def flush(self, stream: Optional[str] = None) -> None:
+        if self._writer is not None:
+            self._writer.flush()
+
+    def compact(self, stream: str, transform: Callable[[Iterable[dict]], Iterable[dict]]) -> dict:
+        table, where, params = self._where(stream)
+        self.flush()
+        found = self._query(f"SELECT seq, doc FROM {table} WHERE {where} ORDER BY seq", params)
+        if not found:
+            return {"rows_before": 0, "rows_after": 0, "bytes_before": 0, "bytes_after": 0}
+        seqs = [int(r[0]) for r in found]
+        new_rows = list(transform([json.loads(r[1]) for r in found]))
+        if len(new_rows) > len(seqs):
+            raise ValueError("compaction must not add rows")
+        # Reuse the lowest old sequence numbers so compacted rows stay ahead of later appends.
+        stmts: List[Tuple[str, tuple]] = [(f"DELETE FROM {table} WHERE {where} AND seq <= ?", params + (seqs[-1],))]
+        stmts.extend(self._insert_stmt(stream, r, seq) for r, seq in zip(new_rows, seqs))
+        self._submit(stmts)
+        self.flush()
+        # SQLite reuses freed pages; report the payload size rather than the file size.
+        return {
+            "rows_before": len(found), "rows_after": len(new_rows),
+            "bytes_before": sum(len(r[1].encode("utf-8")) for r in found),
+            "bytes_after": sum(len(_dumps(r).encode("utf-8")) for r in new_rows),
+        }
+
+    # --- documents ---
+
+    def load_doc(self, name: str) -> Any:
+        if name == "agents":
+            rows = self._query("SELECT agent_id, doc FROM agents")
+            return {aid: json.loads(doc) for aid, doc in rows} if rows else None
+        if name == "opportunities":
+            return [json.loads(r[0]) for r in self._query("SELECT doc FROM opportunities ORDER BY last_seen_at DESC")]
+        raise KeyError(name)
+
+    def save_doc(self, name: str, data: Any) -> None:
+        if name == "agents":
+            self._submit([
+                ("INSERT OR REPLACE INTO agents (agent_id, display_name, x, y, last_seen_at, doc) VALUES (?, ?, ?, ?, ?, ?)",
+                 (str(aid), str(d.get("display_name") or aid), int(d.get("x") or 0), int(d.get("y") or 0),
+                  float(d.get("last_seen_at") or 0.0), _dumps(d)))
+                for aid, d in dict(data).items()
+            ])
+            return
+        if name == "opportunities":
+            stmts: List[Tuple[str, tuple]] = [("DELETE FROM opportunities", ())]
+            for r in data:
+                stmts.append((
+                    "INSERT OR REPLACE INTO opportunities (fingerprint, status, last_seen_at, doc) VALUES (?, ?, ?, ?)",
+                    (str(r.get("fingerprint") or ""), str(r.get("status") or ""),
+                     float(r.get("last_seen_at") or r.get("created_at") or 0.0), _dumps(r)),
+                ))
+            self._submit(stmts)
+            return
+        raise KeyError(name)
+
+    # --- runs ---
+
+    def archive_run(self, run_id: str, streams: Iterable[str], runs_dir: Path) -> dict:
+        rd = runs_dir / run_id
+        rd.mkdir(parents=True, exist_ok=True)
+        entries = []
+        for s in streams:
+            try:
+                table, where, params = self._where(s)
+                cur = self.cursor(s)
+                docs = self._reader().execute(
+                    f"SELECT doc FROM {table} WHERE {where} AND seq <= ? ORDER BY seq", params + (cur,))
+                entries.append(write_segments((d[0].encode("utf-8") for d in docs), rd, _RUN_FILES.get(s, f"{s}.jsonl")))
+                self._submit([(f"DELETE FROM {table} WHERE {where} AND seq <= ?", params + (cur,))])
+            except Exception:
+                _log.warning("Failed to archive stream %s for run %s", s, run_id, exc_info=True)
+        self.flush()
+        return write_index(rd, run_id, entries)
+
+    # --- indexed queries ---
+
+    def ledger_for_account(self, account: str, limit: int = 100) -> List[dict]:
+        rows = self._query(
+            "SELECT doc FROM economy_ledger WHERE seq IN ("
+            " SELECT seq FROM economy_ledger WHERE from_id = ?"
+            " UNION SELECT seq FROM economy_ledger WHERE to_id = ?"
+            ") ORDER BY seq DESC LIMIT ?",
+            (account, account, int(limit) if limit > 0 else -1),
+        )
+        rows.reverse()
+        return [json.loads(r[0]) for r in rows]
+
+    def query_jobs(
+        self, status: Optional[str] = None, run_id: Optional[str] = None,
+        created_by: Optional[str] = None, limit: int = 500,
+    ) -> Optional[List[str]]:
+        where, params = [], []
+        for col, val in (("status", status), ("run_id", run_id), ("created_by", created_by)):
+            if val:
+                where.append(f"{col} = ?")
+                params.append(val)
+        sql = "SELECT job_id FROM jobs"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY created_at DESC LIMIT ?"
+        return [r[0] for r in self._query(sql, tuple(params) + (int(limit),))]
+
+    def sync_jobs(self, jobs: List[dict]) -> None:
+        stmts: List[Tuple[str, tuple]] = [("DELETE FROM jobs", ())]
+        stmts.extend((_JOB_UPSERT, _job_params(j)) for j in jobs)
+        self._submit(stmts)
+
+    def job_count(self) -> int:
+        return int(self._query("SELECT COUNT(*) FROM jobs")[0][0])
+
+    def delete_jobs(self, job_ids: Iterable[str]) -> None:
+        self._submit([("DELETE FROM jobs WHERE job_id = ?", (str(j),)) for j in job_ids])
+
+    def stats(self) -> dict:
+        out: Dict[str, Any] = {"backend": self.name, "path": str(self.db_path)}
+        if self._writer is not None:
+            out["writer"] = self._writer.stats()
+        return out
+
+
+def create_storage(backend: str = STORAGE_BACKEND) -> StorageEngine:
+    b = (backend or "jsonl").strip().lower()
+    if b == "sqlite":
+        return SqliteStorage()
+    if b != "jsonl":
+        _log.warning("Unknown STORAGE_BACKEND=%s; using jsonl", backend)
+    return JsonlStorage()
+
+
+storage: StorageEngine = create_storage()
@@ -3,21 +3,35 @@ Shared utility functions: JSONL I/O, text normalization, fingerprinting.
 """
 from __future__ import annotations
 
+import contextlib
 import hashlib
 import json
+import os
 import re
+import shutil
 import string
 from pathlib import Path
-from typing import Any, List, Optional
+from typing import Any, Callable, Iterable, Iterator, List, Optional
+
+from app.logwriter import flush_log, get_log_writer
 
 
 def append_jsonl(path: Path, obj: dict) -> None:
+    w = get_log_writer(path)
+    if w is not None:
+        w.append(obj)
+        return
     path.parent.mkdir(parents=True, exist_ok=True)
     with path.open("a", encoding="utf-8") as f:
         f.write(json.dumps(obj, ensure_ascii=False) + "\n")
 
 
-def read_jsonl(path: Path, limit: Optional[int] = None) -> List[dict]:
+def read_jsonl(path: Path, limit: Optional[int] = None, flush: bool = False) -> List[dict]:
+    """Rows of `path` as written so far; `flush=True` first waits for rows queued by its log writer."""
+    if limit is not None and limit > 0:
+        return read_jsonl_tail(path, limit, flush=flush)
+    if flush:
+        flush_log(path)
     if not path.exists():
         return []
     out: List[dict] = []
@@ -30,12 +44,72 @@ def read_jsonl(path: Path, limit: Optional[int] = None) -> List[dict]:
                 out.append(json.loads(line))
             except Exception:
                 continue
-    if limit is not None and limit > 0:
-        return out[-limit:]
     return out
 
 
+def read_jsonl_tail(path: Path, limit: int, block_size: int = 65536, flush: bool = False) -> List[dict]:
+    """Parse only the last `limit` valid rows, reading fixed-size blocks backwards from EOF.
+
+    Blank and unparseable lines are skipped exactly like read_jsonl, so the result
+    equals read_jsonl(path)[-limit:] while the cost scales with `limit`, not file size.
+    """
+    if flush:
+        flush_log(path)
+    if limit <= 0 or not path.exists():
+        return []
+    out: List[dict] = []
+    with path.open("rb") as f:
+        f.seek(0, 2)
+        pos = f.tell()
+        carry = b""
+        while pos > 0 and len(out) < limit:
+            step = min(block_size, pos)
+            pos -= step
+            f.seek(pos)
+            chunk = f.read(step) + carry
+            parts = chunk.split(b"\n")
+            # The first part may continue in the previous block; keep it for the next read.
+            carry = parts[0] if pos > 0 else b""
+            lines = parts[1:] if pos > 0 else parts
+            for raw in reversed(lines):
+                row = _parse_jsonl_line(raw)
+                if row is not None:
+                    out.append(row)
+                    if len(out) >= limit:
+                        break
+    out.reverse()
+    return out
+
+
+def read_jsonl_from(path: Path, offset: int = 0, flush: bool = False) -> List[dict]:
+    """Parse rows starting at byte `offset` (a line boundary), e.g. the tail after a checkpoint."""
+    if flush:
+        flush_log(path)
+    if not path.exists():
+        return []
+    out: List[dict] = []
+    with path.open("rb") as f:
+        f.seek(max(0, int(offset)))
+        for raw in f:
+            row = _parse_jsonl_line(raw)
+            if row is not None:
+                out.append(row)
+    return out
+
+
+def _parse_jsonl_line(raw: bytes) -> Optional[dict]:
+    try:
+        line = raw.decode("utf-8").strip()
+        if not line:
+            return None
+        return json.loads(line)
+    except Exception:
+        return None
+
+
 def write_jsonl_atomic(path: Path, rows: List[dict]) -> None:
+    # Queued appends must land in the old file, not after `rows` in the new one.
+    flush_log(path)
     path.parent.mkdir(parents=True, exist_ok=True)
     tmp = path.with_suffix(path.suffix + ".tmp")
     with tmp.open("w", encoding="utf-8") as f:
@@ -47,6 +121,75 @@ def write_jsonl_atomic(path: Path, rows: List[dict]) -> None:
     tmp.replace(path)
 
 
+class _JsonlRows:
+    """Re-iterable rows of `path` up to byte `end`, read from disk on every pass."""
+
+    def __init__(self, path: Path, end: int) -> None:
+        self.path = path
+        self.end = end
+        self.count = 0
+
+    def __iter__(self) -> Iterator[dict]:
+        n = 0
+        pos = 0
+        with self.path.open("rb") as f:
+            for raw in f:
+                pos += len(raw)
+                if pos > self.end:
+                    break
+                row = _parse_jsonl_line(raw)
+                if row is not None:
+                    n += 1
+                    yield row
+        self.count = n
+
+
+def _last_line_end(path: Path, block_size: int = 65536) -> int:
+    """Offset just past the last newline in `path` (0 if none)."""
+    with path.open("rb") as f:
+        pos = f.seek(0, os.SEEK_END)
+        while pos > 0:
+            step = min(block_size, pos)
+            pos -= step
+            f.seek(pos)
+            i = f.read(step).rfind(b"\n")
+            if i >= 0:
+                return pos + i + 1
+    return 0
+
+
+def compact_jsonl(path: Path, transform: Callable[[Iterable[dict]], Iterable[dict]]) -> dict:
+    """Replace the rows currently in `path` with transform(rows), keeping rows appended meanwhile.
+
+    `rows` is streamed from the file (and may be iterated more than once), and the
+    output is streamed to a temp file, so memory does not grow with the log. The
+    transform runs without any lock. Only the final step (copy the bytes appended
+    since the snapshot, fsync, rename) holds the path's writer lock; rows still queued
+    in the writer are not waited for and land in the compacted file.
+    """
+    if not path.exists():
+        return {"rows_before": 0, "rows_after": 0, "bytes_before": 0, "bytes_after": 0}
+    cut = _last_line_end(path)
+    rows = _JsonlRows(path, cut)
+    rows_after = 0
+    tmp = path.with_suffix(path.suffix + ".compact")
+    with tmp.open("wb") as f:
+        for r in transform(rows):
+            f.write((json.dumps(r, ensure_ascii=False) + "\n").encode("utf-8"))
+            rows_after += 1
+        w = get_log_writer(path)
+        with (w.io_lock if w is not None else contextlib.nullcontext()):
+            with path.open("rb") as src:
+                size_before = src.seek(0, os.SEEK_END)
+                src.seek(cut)
+                shutil.copyfileobj(src, f)
+            f.flush()
+            os.fsync(f.fileno())
+            size_after = f.tell()
+            tmp.replace(path)
+    return {"rows_before": rows.count, "rows_after": rows_after, "bytes_before": size_before, "bytes_after": size_after}
+
+
 def normalize_for_fingerprint(s: str) -> str:
     t = (s or "").lower()
     t = re.sub(r"\[run:[^\]]+\]", " ", t)
@@ -74,8 +217,8 @@ def fingerprint(title: str, body: str) -> str:
     return hashlib.sha1(base.encode("utf-8", errors="ignore")).hexdigest()[:16]
 
 
-def tok(s: str) -> set:
-    """Tokenizer for memory retrieval (word-set for Jaccard)."""
+def tok_terms(s: str) -> List[str]:
+    """Lower-cased alphanumeric words of 3+ chars, in order and with repeats (for term frequencies)."""
     s = (s or "").lower()
     out = []
     cur: list[str] = []
@@ -88,7 +231,12 @@ def tok(s: str) -> set:
                 cur = []
     if cur:
         out.append("".join(cur))
-    return {t for t in out if len(t) >= 3}
+    return [t for t in out if len(t) >= 3]
+
+
+def tok(s: str) -> set:
+    """Tokenizer for memory retrieval (word-set for Jaccard)."""
+    return set(tok_terms(s))
 
 
 def safe_json_preview(body: bytes) -> Optional[dict]:
@@ -172,27 +320,3 @@ def chat_text_similarity(a: str, b: str) -> float:
 
 def clamp(v: int, lo: int, hi: int) -> int:
     return max(lo, min(hi, v))
-
-
-def rotate_logs(run_id: str, files: list[Path], runs_dir: Path) -> dict:
-    import time
-    rd = runs_dir / run_id
-    rd.mkdir(parents=True, exist_ok=True)
-    rotated = []
-    for p in files:
-        try:
-            if p.exists():
-                dst = rd / p.name
-                dst.write_bytes(p.read_bytes())
-                p.write_text("", encoding="utf-8")
-                rotated.append({"file": str(p.name), "bytes": int(dst.stat().st_size)})
-        except Exception:
-            continue
-    try:
-        (rd / "meta.json").write_text(
-            json.dumps({"run_id": run_id, "rotated": rotated, "archived_at": time.time()}, ensure_ascii=False, indent=2),
-            encoding="utf-8",
-        )
-    except Exception:
-        pass
-    return {"run_id": run_id, "rotated": rotated, "dir": str(rd)}
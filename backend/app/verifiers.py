@@ -10,16 +10,16 @@ import json
 import logging
 import re
 import subprocess
-import sys
 import tempfile
 import time
 import urllib.parse
-import urllib.request
 from typing import Any, Optional
 
-from app.config import VERIFY_LLM_BASE_URL, VERIFY_LLM_MODEL, VERIFY_LLM_TIMEOUT_SECONDS
+from app.llm_judge import llm_judge
 from app.models import AutoVerifyOutcome, Job
+from app.sandbox import sandbox_pool
 from app.utils import extract_code_fence
+from app.verify_cache import normalize_code, normalize_text, verify_cache
 
 _log = logging.getLogger(__name__)
 
@@ -86,67 +86,55 @@ def _is_urlish(s: str) -> bool:
 
 
 def _llm_judge_call(task_summary: str, submission: str) -> Optional[tuple[bool, str]]:
-    if not VERIFY_LLM_BASE_URL:
+    # auto_verify_task runs in a worker thread or process; app.llm_judge streams and bounds the calls.
+    try:
+        return llm_judge.judge_sync(task_summary, submission)
+    except Exception:
         return None
-    prompt = f"""You are a verifier. Given a TASK and a SUBMISSION, decide if the task was completed successfully.
 
-TASK:
-{task_summary[:6000]}
 
-SUBMISSION:
-{submission[:6000]}
+def _llm_judge_outcome(result: Optional[tuple[bool, str]]) -> tuple[AutoVerifyOutcome, bool]:
+    if result is None:
+        return AutoVerifyOutcome(True, False, "auto_verify failed: llm_judge unavailable", "llm_judge", {}), False
+    ok, reason = result
+    if ok:
+        return AutoVerifyOutcome(True, True, f"auto_verify ok: llm_judge approved ({reason})", "llm_judge", {"reason": reason}), True
+    return AutoVerifyOutcome(True, False, f"auto_verify failed: llm_judge rejected ({reason})", "llm_judge", {"reason": reason}), True
 
-Reply with ONLY a JSON object, no other text:
-{{"ok": true or false, "reason": "brief explanation"}}
-"""
-    payload = {
-        "model": VERIFY_LLM_MODEL,
-        "messages": [{"role": "user", "content": prompt}],
-        "stream": False,
-        "temperature": 0.0,
-    }
-    data = json.dumps(payload).encode("utf-8")
-    req = urllib.request.Request(
-        url=f"{VERIFY_LLM_BASE_URL}/v1/chat/completions",
-        data=data,
-        headers={"Content-Type": "application/json"},
-        method="POST",
-    )
-    try:
-        with urllib.request.urlopen(req, timeout=VERIFY_LLM_TIMEOUT_SECONDS) as resp:
-            raw = resp.read().decode("utf-8", errors="replace")
-            obj = json.loads(raw)
-            choices = obj.get("choices") or []
-            if not choices:
-                return None
-            content = (choices[0].get("message") or {}).get("content") or ""
-            if "```" in content:
-                m = re.search(r"```(?:json)?\s*(\{[\s\S]*?\})\s*```", content)
-                if m:
-                    content = m.group(1)
-            i = content.find("{")
-            if i < 0:
-                return None
-            depth = 0
-            for k, c in enumerate(content[i:], start=i):
-                if c == "{":
-                    depth += 1
-                elif c == "}":
-                    depth -= 1
-                    if depth == 0:
-                        try:
-                            obj2 = json.loads(content[i : k + 1])
-                            return (bool(obj2.get("ok")), str(obj2.get("reason") or "")[:400])
-                        except Exception:
-                            return None
-            return None
-    except Exception:
-        return None
 
+def _llm_judge_key(job: Job, submission: str) -> tuple[tuple[str, str], str]:
+    task_summary = (job.title or "") + "\n" + (job.body or "")
+    return (llm_judge.model, normalize_text(task_summary)), normalize_text(submission)
 
-def auto_verify_task(job: Job, submission: str) -> AutoVerifyOutcome:
+
+def _is_primes_task(job: Job) -> bool:
     title = (job.title or "").lower()
     body = (job.body or "").lower()
+    return ("prime" in title or "prime" in body) and ("five" in title or "five" in body or "5" in title or "5" in body)
+
+
+def uses_llm_judge(job: Job) -> bool:
+    """True if auto_verify_task would settle `job` with the llm_judge verifier."""
+    return _extract_bracket_tag(job, "verifier").lower() == "llm_judge" and not _is_primes_task(job)
+
+
+async def auto_verify_llm_judge(job: Job, submission: str) -> AutoVerifyOutcome:
+    """The llm_judge verifier on the event loop, for jobs where `uses_llm_judge(job)`."""
+    task_summary = (job.title or "") + "\n" + (job.body or "")
+    spec, subject = _llm_judge_key(job, submission or "")
+
+    async def run() -> tuple[AutoVerifyOutcome, bool]:
+        try:
+            result = await llm_judge.judge(task_summary, submission or "")
+        except Exception:
+            _log.debug("llm_judge failed", exc_info=True)
+            result = None
+        return _llm_judge_outcome(result)
+
+    return await verify_cache.cached_async("llm_judge", spec, subject, run)
+
+
+def auto_verify_task(job: Job, submission: str) -> AutoVerifyOutcome:
     text = submission or ""
 
     def _verify_acceptance_criteria() -> tuple[bool, bool, str, list[str]]:
@@ -338,20 +326,24 @@ def auto_verify_task(job: Job, submission: str) -> AutoVerifyOutcome:
 
     # --- primes verifier ---
     def _verifier_primes_smallest_five() -> Optional[AutoVerifyOutcome]:
-        if not (("prime" in title or "prime" in body) and ("five" in title or "five" in body or "5" in title or "5" in body)):
+        if not _is_primes_task(job):
             return None
         code = extract_code_fence(text, "python") or extract_code_fence(text, "py")
         if not code:
             return AutoVerifyOutcome(True, False, "auto_verify failed: no Python code fence found in submission", "primes_smallest_five", {})
-        try:
-            res = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, timeout=10)
-            out_text = res.stdout.strip()
-            nums = [int(x) for x in re.findall(r"\d+", out_text)]
-            if nums[:5] == [2, 3, 5, 7, 11]:
-                return AutoVerifyOutcome(True, True, "auto_verify ok: prints correct first 5 primes", "primes_smallest_five", {"stdout": out_text[:500]})
-            return AutoVerifyOutcome(True, False, f"auto_verify failed: expected 2,3,5,7,11 but got {nums[:10]}", "primes_smallest_five", {"stdout": out_text[:500]})
-        except Exception as e:
-            return AutoVerifyOutcome(True, False, f"auto_verify failed: execution error: {e}", "primes_smallest_five", {"error": str(e)[:400]})
+
+        def run() -> tuple[AutoVerifyOutcome, bool]:
+            try:
+                res = sandbox_pool.run_code(code, timeout=10)
+                out_text = res.stdout.strip()
+                nums = [int(x) for x in re.findall(r"\d+", out_text)]
+                if nums[:5] == [2, 3, 5, 7, 11]:
+                    return AutoVerifyOutcome(True, True, "auto_verify ok: prints correct first 5 primes", "primes_smallest_five", {"stdout": out_text[:500]}), True
+                return AutoVerifyOutcome(True, False, f"auto_verify failed: expected 2,3,5,7,11 but got {nums[:10]}", "primes_smallest_five", {"stdout": out_text[:500]}), True
+            except Exception as e:
+                return AutoVerifyOutcome(True, False, f"auto_verify failed: execution error: {e}", "primes_smallest_five", {"error": str(e)[:400]}), False
+
+        return verify_cache.cached("primes_smallest_five", (), normalize_code(code), run)
 
     # --- python_run verifier ---
     def _verifier_python_run() -> Optional[AutoVerifyOutcome]:
@@ -362,23 +354,27 @@ def auto_verify_task(job: Job, submission: str) -> AutoVerifyOutcome:
         if not code:
             return AutoVerifyOutcome(True, False, "auto_verify failed: no Python code fence", "python_run", {})
         expected = _extract_bracket_tag(job, "expected_output").strip()
-        try:
-            res = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, timeout=15)
-            stdout = res.stdout.strip()[:5000]
-            stderr = res.stderr.strip()[:2000]
-            if res.returncode != 0:
-                return AutoVerifyOutcome(True, False, f"auto_verify failed: exit code {res.returncode}", "python_run", {"stdout": stdout, "stderr": stderr})
-            if expected:
-                if expected.lower().strip() in stdout.lower():
-                    return AutoVerifyOutcome(True, True, f"auto_verify ok: expected output found", "python_run", {"stdout": stdout})
-                return AutoVerifyOutcome(True, False, f"auto_verify failed: expected '{expected}' not found in stdout", "python_run", {"stdout": stdout, "expected": expected})
-            if stdout:
-                return AutoVerifyOutcome(True, True, f"auto_verify ok: code executed (exit 0), stdout={_trunc(stdout, 200)}", "python_run", {"stdout": stdout})
-            return AutoVerifyOutcome(True, True, "auto_verify ok: code executed (exit 0, no output)", "python_run", {})
-        except subprocess.TimeoutExpired:
-            return AutoVerifyOutcome(True, False, "auto_verify failed: timeout (15s)", "python_run", {})
-        except Exception as e:
-            return AutoVerifyOutcome(True, False, f"auto_verify failed: {e}", "python_run", {"error": str(e)[:400]})
+
+        def run() -> tuple[AutoVerifyOutcome, bool]:
+            try:
+                res = sandbox_pool.run_code(code, timeout=15)
+                stdout = res.stdout.strip()[:5000]
+                stderr = res.stderr.strip()[:2000]
+                if res.returncode != 0:
+                    return AutoVerifyOutcome(True, False, f"auto_verify failed: exit code {res.returncode}", "python_run", {"stdout": stdout, "stderr": stderr}), True
+                if expected:
+                    if expected.lower().strip() in stdout.lower():
+                        return AutoVerifyOutcome(True, True, f"auto_verify ok: expected output found", "python_run", {"stdout": stdout}), True
+                    return AutoVerifyOutcome(True, False, f"auto_verify failed: expected '{expected}' not found in stdout", "python_run", {"stdout": stdout, "expected": expected}), True
+                if stdout:
+                    return AutoVerifyOutcome(True, True, f"auto_verify ok: code executed (exit 0), stdout={_trunc(stdout, 200)}", "python_run", {"stdout": stdout}), True
+                return AutoVerifyOutcome(True, True, "auto_verify ok: code executed (exit 0, no output)", "python_run", {}), True
+            except subprocess.TimeoutExpired:
+                return AutoVerifyOutcome(True, False, "auto_verify failed: timeout (15s)", "python_run", {}), False
+            except Exception as e:
+                return AutoVerifyOutcome(True, False, f"auto_verify failed: {e}", "python_run", {"error": str(e)[:400]}), False
+
+        return verify_cache.cached("python_run", (expected,), normalize_code(code), run)
 
     # --- python_test verifier ---
     def _verifier_python_test() -> Optional[AutoVerifyOutcome]:
@@ -388,28 +384,32 @@ def auto_verify_task(job: Job, submission: str) -> AutoVerifyOutcome:
         code = extract_code_fence(text, "python") or extract_code_fence(text, "py")
         if not code:
             return AutoVerifyOutcome(True, False, "auto_verify failed: no Python code fence", "python_test", {})
-        try:
-            tmpdir = tempfile.mkdtemp(prefix="moltworld_verify_")
-            import pathlib
-            code_path = pathlib.Path(tmpdir) / "solution.py"
-            code_path.write_text(code, encoding="utf-8")
-            test_code = _extract_bracket_tag(job, "test_code").strip()
-            if not test_code:
-                test_code = extract_code_fence((job.body or ""), "python")
-            if not test_code:
-                return AutoVerifyOutcome(True, False, "auto_verify failed: no test_code tag/fence in task body", "python_test", {})
-            test_path = pathlib.Path(tmpdir) / "test_solution.py"
-            test_path.write_text(test_code, encoding="utf-8")
-            res = subprocess.run([sys.executable, "-m", "pytest", str(test_path), "-v", "--tb=short"], capture_output=True, text=True, timeout=30, cwd=tmpdir)
-            stdout = res.stdout.strip()[:5000]
-            stderr = res.stderr.strip()[:2000]
-            if res.returncode == 0:
-                return AutoVerifyOutcome(True, True, "auto_verify ok: all tests passed", "python_test", {"stdout": stdout, "stderr": stderr})
-            return AutoVerifyOutcome(True, False, f"auto_verify failed: tests failed (exit {res.returncode})", "python_test", {"stdout": stdout, "stderr": stderr})
-        except subprocess.TimeoutExpired:
-            return AutoVerifyOutcome(True, False, "auto_verify failed: timeout (30s)", "python_test", {})
-        except Exception as e:
-            return AutoVerifyOutcome(True, False, f"auto_verify failed: {e}", "python_test", {"error": str(e)[:400]})
+        test_code = _extract_bracket_tag(job, "test_code").strip()
+        if not test_code:
+            test_code = extract_code_fence((job.body or ""), "python")
+        if not test_code:
+            return AutoVerifyOutcome(True, False, "auto_verify failed: no test_code tag/fence in task body", "python_test", {})
+
+        def run() -> tuple[AutoVerifyOutcome, bool]:
+            try:
+                tmpdir = tempfile.mkdtemp(prefix="moltworld_verify_")
+                import pathlib
+                code_path = pathlib.Path(tmpdir) / "solution.py"
+                code_path.write_text(code, encoding="utf-8")
+                test_path = pathlib.Path(tmpdir) / "test_solution.py"
+                test_path.write_text(test_code, encoding="utf-8")
+                res = sandbox_pool.run_pytest([str(test_path), "-v", "--tb=short"], cwd=tmpdir, timeout=30)
+                stdout = res.stdout.strip()[:5000]
+                stderr = res.stderr.strip()[:2000]
+                if res.returncode == 0:
+                    return AutoVerifyOutcome(True, True, "auto_verify ok: all tests passed", "python_test", {"stdout": stdout, "stderr": stderr}), True
+                return AutoVerifyOutcome(True, False, f"auto_verify failed: tests failed (exit {res.returncode})", "python_test", {"stdout": stdout, "stderr": stderr}), True
+            except subprocess.TimeoutExpired:
+                return AutoVerifyOutcome(True, False, "auto_verify failed: timeout (30s)", "python_test", {}), False
+            except Exception as e:
+                return AutoVerifyOutcome(True, False, f"auto_verify failed: {e}", "python_test", {"error": str(e)[:400]}), False
+
+        return verify_cache.cached("python_test", (normalize_code(test_code),), normalize_code(code), run)
 
     # --- llm_judge verifier ---
     def _verifier_llm_judge() -> Optional[AutoVerifyOutcome]:
@@ -417,13 +417,8 @@ def auto_verify_task(job: Job, submission: str) -> AutoVerifyOutcome:
         if vtag not in ("llm_judge",):
             return None
         task_summary = (job.title or "") + "\n" + (job.body or "")
-        result = _llm_judge_call(task_summary, text)
-        if result is None:
-            return AutoVerifyOutcome(True, False, "auto_verify failed: llm_judge unavailable", "llm_judge", {})
-        ok, reason = result
-        if ok:
-            return AutoVerifyOutcome(True, True, f"auto_verify ok: llm_judge approved ({reason})", "llm_judge", {"reason": reason})
-        return AutoVerifyOutcome(True, False, f"auto_verify failed: llm_judge rejected ({reason})", "llm_judge", {"reason": reason})
+        spec, subject = _llm_judge_key(job, text)
+        return verify_cache.cached("llm_judge", spec, subject, lambda: _llm_judge_outcome(_llm_judge_call(task_summary, text)))
 
     # --- acceptance_criteria verifier ---
     def _verifier_acceptance() -> Optional[AutoVerifyOutcome]:
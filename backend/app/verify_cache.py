@@ -0,0 +1,183 @@
+"""
+Persistent cache of auto-verify outcomes for the expensive verifiers.
+
+`python_run`, `python_test`, `primes_smallest_five` and `llm_judge` look up
+(verifier, hash of the job tags that decide the verdict, hash of the
+normalized submission) before running code or calling the judge. The spec
+covers e.g. expected_output or the test code (plus the judge model), and the
+subject is the extracted code fence or, for the judge, the submission with
+whitespace collapsed, so a redo that resubmits the same code with different
+prose is a hit. Entries are JSON files under DATA_DIR/verify_cache/<2 hex>/,
+written atomically so the verify pool's processes share them, and expire
+after VERIFY_CACHE_TTL_SECONDS. Transient outcomes (timeouts, execution
+errors, judge unavailable) are not stored.
+
+Every outcome that went through the cache carries
+`artifacts["cache"] = {"hit": bool, "key": ..., "cached_at": ...}`.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from dataclasses import asdict
+from pathlib import Path
+from typing import Awaitable, Callable, Iterable, Optional, Tuple
+
+from app.config import VERIFY_CACHE_DIR, VERIFY_CACHE_ENABLED, VERIFY_CACHE_TTL_SECONDS
+from app.models import AutoVerifyOutcome
+
+_log = logging.getLogger(__name__)
+
+# Bump when a cached verifier changes how it judges, so old verdicts are not reused.
+CACHE_VERSION = 1
+_PRUNE_EVERY = 256
+
+
+def _sha(s: str) -> str:
+    return hashlib.sha256(s.encode("utf-8", errors="replace")).hexdigest()
+
+
+def normalize_code(code: str) -> str:
+    """Line endings unified and trailing whitespace dropped."""
+    lines = (code or "").replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(ln.rstrip() for ln in lines).strip("\n")
+
+
+def normalize_text(text: str) -> str:
+    return re.sub(r"\s+", " ", text or "").strip()
+
+
+def verify_key(verifier: str, spec: Iterable[str], subject: str) -> str:
+    spec_hash = _sha("\x00".join(str(s) for s in spec))
+    runtime = f"py{sys.version_info[0]}.{sys.version_info[1]}"
+    return _sha(f"v{CACHE_VERSION}\x00{runtime}\x00{verifier}\x00{spec_hash}\x00{_sha(subject)}")
+
+
+class VerifyCache:
+    def __init__(self, disk_dir: Optional[Path], ttl_seconds: float = 7 * 86400.0) -> None:
+        self.disk_dir = disk_dir
+        self.ttl_seconds = float(ttl_seconds)
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.disk_dir is not None and self.ttl_seconds > 0
+
+    def _path(self, key: str) -> Path:
+        return self.disk_dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Tuple[AutoVerifyOutcome, float]]:
+        """(outcome, cached_at) if a live entry exists."""
+        p = self._path(key)
+        try:
+            doc = json.loads(p.read_text(encoding="utf-8"))
+            cached_at = float(doc["cached_at"])
+            out = AutoVerifyOutcome(**doc["outcome"])
+        except FileNotFoundError:
+            return None
+        except Exception:
+            _log.debug("Unreadable verify cache entry %s", p, exc_info=True)
+            return None
+        if time.time() - cached_at > self.ttl_seconds:
+            self.expired += 1
+            try:
+                p.unlink()
+            except OSError:
+                pass
+            return None
+        return out, cached_at
+
+    def put(self, key: str, out: AutoVerifyOutcome) -> None:
+        p = self._path(key)
+        try:
+            p.parent.mkdir(parents=True, exist_ok=True)
+            tmp = p.with_name(f"{p.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_text(json.dumps({"cached_at": time.time(), "outcome": asdict(out)}), encoding="utf-8")
+            os.replace(tmp, p)
+        except Exception:
+            _log.warning("Could not write verify cache entry %s", p, exc_info=True)
+            return
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % _PRUNE_EVERY == 0
+        if prune:
+            self.prune()
+
+    def prune(self) -> int:
+        """Delete expired entries; returns how many."""
+        if not self.enabled or not self.disk_dir.exists():
+            return 0
+        cutoff = time.time() - self.ttl_seconds
+        removed = 0
+        for p in self.disk_dir.glob("*/*.json"):
+            try:
+                if p.stat().st_mtime < cutoff:
+                    p.unlink()
+                    removed += 1
+            except OSError:
+                continue
+        return removed
+
+    def cached(
+        self,
+        verifier: str,
+        spec: Iterable[str],
+        subject: str,
+        compute: Callable[[], Tuple[AutoVerifyOutcome, bool]],
+    ) -> AutoVerifyOutcome:
+        """Cached outcome for (verifier, spec, subject), else `compute()` -> (outcome, cacheable)."""
+        if not self.enabled:
+            return compute()[0]
+        key, out = self._lookup(verifier, spec, subject)
+        if out is not None:
+            return out
+        return self._store(key, *compute())
+
+    async def cached_async(
+        self,
+        verifier: str,
+        spec: Iterable[str],
+        subject: str,
+        compute: Callable[[], Awaitable[Tuple[AutoVerifyOutcome, bool]]],
+    ) -> AutoVerifyOutcome:
+        """`cached` for a coroutine `compute` (the LLM judge on the event loop); file I/O runs in a thread."""
+        if not self.enabled:
+            return (await compute())[0]
+        key, out = await asyncio.to_thread(self._lookup, verifier, spec, subject)
+        if out is not None:
+            return out
+        return await asyncio.to_thread(self._store, key, *(await compute()))
+
+    def _lookup(self, verifier: str, spec: Iterable[str], subject: str) -> Tuple[str, Optional[AutoVerifyOutcome]]:
+        key = verify_key(verifier, spec, subject)
+        found = self.get(key)
+        if found is None:
+            self.misses += 1
+            return key, None
+        out, cached_at = found
+        self.hits += 1
+        out.artifacts = {**(out.artifacts or {}), "cache": {"hit": True, "key": key[:16], "cached_at": cached_at}}
+        return key, out
+
+    def _store(self, key: str, out: AutoVerifyOutcome, cacheable: bool) -> AutoVerifyOutcome:
+        if cacheable:
+            self.put(key, out)
+        out.artifacts = {**(out.artifacts or {}), "cache": {"hit": False, "key": key[:16], "stored": bool(cacheable)}}
+        return out
+
+    def stats(self) -> dict:
+        return {"enabled": self.enabled, "hits": self.hits, "misses": self.misses, "expired": self.expired}
+
+
+verify_cache = VerifyCache(VERIFY_CACHE_DIR if VERIFY_CACHE_ENABLED else None, VERIFY_CACHE_TTL_SECONDS)
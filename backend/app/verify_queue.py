@@ -0,0 +1,289 @@
+"""
+Background verification of job submissions.
+
+`POST /jobs/{job_id}/submit` and `POST /jobs/{job_id}/verify` no longer run
+`auto_verify_task` on the request: they queue the job here and answer with
+`"verification": {"state": "verifying", ...}` while the job stays
+`submitted`. VERIFY_WORKERS coroutines each hand one job at a time to a
+process pool of the same size, so the python_run/python_test subprocesses
+never hold the event loop or the GIL of the server process.
+When a verifier finishes, `routes.jobs.apply_verify_outcome` appends the
+verify and review events and broadcasts them on the "jobs" WebSocket channel,
+exactly as the inline code did, unless the job was reviewed, cancelled or
+resubmitted meanwhile.
+
+Jobs settled by the `llm_judge` verifier take a second lane: they only wait
+on an HTTP call, so VERIFY_LLM_CONCURRENCY coroutines await
+`app.llm_judge` on the event loop instead of occupying a pool process, and a
+slow judge no longer holds up code runs (or the other way round).
+
+At most VERIFY_QUEUE_MAX jobs wait across both lanes; beyond that `enqueue`
+refuses and the job stays submitted for `/admin/verify_pending`. Queueing a
+job again with the same submission is a no-op; with a new submission (rejected
+and resubmitted) the queued item is updated, or, if the old one is already
+running, the new one is queued behind it. The queue lives in memory, so
+jobs queued at shutdown are picked up again by `/admin/verify_pending`.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import multiprocessing
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional
+
+from app.config import VERIFY_LLM_CONCURRENCY, VERIFY_QUEUE_MAX, VERIFY_WORKERS
+from app.models import AutoVerifyOutcome, Job
+from app.sandbox import warm_sandbox
+from app.verifiers import auto_verify_llm_judge, auto_verify_task, uses_llm_judge
+
+_log = logging.getLogger(__name__)
+
+_SAMPLES = 256
+
+POOL_LANE = "pool"
+JUDGE_LANE = "llm_judge"
+
+
+@dataclass
+class _Pending:
+    job: Job
+    submission: str
+    reviewed_by: str
+    queued_at: float
+    lane: str = POOL_LANE
+    started_at: float = 0.0
+
+
+def _timing(samples: Deque[float]) -> dict:
+    if not samples:
+        return {"avg": 0.0, "p95": 0.0, "max": 0.0}
+    xs = sorted(samples)
+    return {
+        "avg": round(sum(xs) / len(xs), 4),
+        "p95": round(xs[min(len(xs) - 1, int(len(xs) * 0.95))], 4),
+        "max": round(xs[-1], 4),
+    }
+
+
+class VerifyQueue:
+    def __init__(self, workers: int = 2, max_queued: int = 500, judge_workers: int = 4) -> None:
+        self.workers = max(1, int(workers))
+        self.judge_workers = max(1, int(judge_workers))
+        self.max_queued = max(1, int(max_queued))
+        self._lock = threading.Lock()
+        self._queues: Dict[str, Deque[_Pending]] = {POOL_LANE: deque(), JUDGE_LANE: deque()}
+        # job_id -> queued or running item
+        self._pending: Dict[str, _Pending] = {}
+        self._running = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._wakes: Dict[str, asyncio.Event] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: List[asyncio.Task] = []
+        self._wait_samples: Deque[float] = deque(maxlen=_SAMPLES)
+        self._run_samples: Deque[float] = deque(maxlen=_SAMPLES)
+        self.enqueued = 0
+        self.completed = 0
+        self.stale = 0
+        self.errors = 0
+        self.rejected = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    # --- queue ---
+
+    def enqueue(self, job: Job, submission: str, reviewed_by: str) -> Optional[dict]:
+        """Queue `job` for verification; its status dict, or None if the queue is full."""
+        with self._lock:
+            lane = JUDGE_LANE if uses_llm_judge(job) else POOL_LANE
+            p = self._pending.get(job.job_id)
+            if p is not None and p.submission != submission and not p.started_at and p.lane == lane:
+                # Resubmitted while still queued: verify the new submission in the old slot.
+                p.job, p.submission, p.reviewed_by = job, submission, reviewed_by
+            elif p is None or p.submission != submission:
+                # New job, or resubmitted while the old submission is being verified
+                # (its outcome will be stale): queue the new submission behind it.
+                if p is not None and not p.started_at:
+                    self._queues[p.lane].remove(p)
+                elif self._queued() >= self.max_queued:
+                    self.rejected += 1
+                    return None
+                p = _Pending(job, submission, reviewed_by, time.time(), lane)
+                self._queues[lane].append(p)
+                self._pending[job.job_id] = p
+                self.enqueued += 1
+            out = self._status(job.job_id)
+        self._notify(p.lane)
+        return out
+
+    def status(self, job_id: str) -> Optional[dict]:
+        """{"state": "verifying", ...} while `job_id` is queued or running, else None."""
+        with self._lock:
+            return self._status(job_id)
+
+    def _status(self, job_id: str) -> Optional[dict]:
+        # Caller holds self._lock.
+        p = self._pending.get(job_id)
+        if p is None:
+            return None
+        out = {"state": "verifying", "stage": "running" if p.started_at else "queued", "queued_at": p.queued_at, "lane": p.lane}
+        if not p.started_at:
+            out["position"] = next(i for i, q in enumerate(self._queues[p.lane]) if q is p)
+        return out
+
+    def _queued(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def _notify(self, lane: str) -> None:
+        loop, wake = self._loop, self._wakes.get(lane)
+        if loop is None or wake is None:
+            return
+        try:
+            if asyncio.get_running_loop() is loop:
+                wake.set()
+                return
+        except RuntimeError:
+            pass
+        loop.call_soon_threadsafe(wake.set)
+
+    def _take(self, lane: str) -> Optional[_Pending]:
+        with self._lock:
+            queue = self._queues[lane]
+            if not queue:
+                return None
+            p = queue.popleft()
+            p.started_at = time.time()
+            self._running += 1
+            self._wait_samples.append(p.started_at - p.queued_at)
+            return p
+
+    def _finish(self, p: _Pending) -> None:
+        with self._lock:
+            if self._pending.get(p.job.job_id) is p:
+                del self._pending[p.job.job_id]
+            self._running -= 1
+            self._run_samples.append(time.time() - p.started_at)
+
+    # --- processing ---
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: forking a server with live threads (log writers, HTTP pool loop) is not safe.
+            self._executor = ProcessPoolExecutor(
+                self.workers, mp_context=multiprocessing.get_context("spawn"), initializer=warm_sandbox,
+            )
+        return self._executor
+
+    async def _verify(self, p: _Pending) -> AutoVerifyOutcome:
+        if p.lane == JUDGE_LANE:
+            return await auto_verify_llm_judge(p.job, p.submission)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool(), auto_verify_task, p.job, p.submission)
+        except BrokenProcessPool:
+            self._executor = None
+            raise
+
+    async def process_one(self, lane: str = POOL_LANE) -> Optional[bool]:
+        """Verify one job from `lane`; True if its outcome was applied, False if not, None if the lane was empty."""
+        from app.routes.jobs import apply_verify_outcome
+        p = self._take(lane)
+        if p is None:
+            return None
+        try:
+            out = await self._verify(p)
+            cache = (out.artifacts or {}).get("cache")
+            if cache is not None:
+                if cache.get("hit"):
+                    self.cache_hits += 1
+                else:
+                    self.cache_misses += 1
+            applied = await apply_verify_outcome(p.job.job_id, p.submission, out, p.reviewed_by)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.errors += 1
+            _log.exception("Verifying job %s failed; it stays submitted", p.job.job_id)
+            return False
+        finally:
+            self._finish(p)
+        if applied:
+            self.completed += 1
+        else:
+            # Reviewed, cancelled or resubmitted while the verifier ran.
+            self.stale += 1
+        return applied
+
+    def _lanes(self) -> List[tuple]:
+        return [(POOL_LANE, self.workers), (JUDGE_LANE, self.judge_workers)]
+
+    async def drain(self) -> None:
+        """Verify queued jobs (VERIFY_WORKERS plus VERIFY_LLM_CONCURRENCY at a time) until both lanes are empty."""
+        async def worker(lane: str) -> None:
+            while await self.process_one(lane) is not None:
+                pass
+        await asyncio.gather(*(worker(lane) for lane, n in self._lanes() for _ in range(n)))
+
+    async def _worker(self, lane: str) -> None:
+        wake = self._wakes[lane]
+        while True:
+            if await self.process_one(lane) is None:
+                wake.clear()
+                if not self._queues[lane]:
+                    await wake.wait()
+
+    def start(self) -> None:
+        if self._tasks and not all(t.done() for t in self._tasks):
+            return
+        loop = asyncio.get_running_loop()
+        self._loop = loop
+        self._wakes = {lane: asyncio.Event() for lane, _ in self._lanes()}
+        self._tasks = [loop.create_task(self._worker(lane)) for lane, n in self._lanes() for _ in range(n)]
+
+    async def stop(self) -> None:
+        tasks, self._tasks = self._tasks, []
+        self._loop, self._wakes = None, {}
+        for t in tasks:
+            t.cancel()
+        for t in tasks:
+            try:
+                await t
+            except asyncio.CancelledError:
+                pass
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        if self._pending:
+            _log.info("Verify queue stopped with %d jobs pending (use /admin/verify_pending)", len(self._pending))
+
+    # --- reporting ---
+
+    def stats(self) -> dict:
+        with self._lock:
+            queued = self._queued()
+            heads = [q[0].queued_at for q in self._queues.values() if q]
+            return {
+                "queued": queued,
+                "queued_by_lane": {lane: len(q) for lane, q in self._queues.items()},
+                "running": self._running,
+                "oldest_wait_seconds": round(time.time() - min(heads), 3) if heads else None,
+                "workers": self.workers,
+                "judge_workers": self.judge_workers,
+                "max_queued": self.max_queued,
+                "enqueued": self.enqueued,
+                "completed": self.completed,
+                "stale": self.stale,
+                "errors": self.errors,
+                "rejected": self.rejected,
+                "cache_hits": self.cache_hits,
+                "cache_misses": self.cache_misses,
+                "wait_seconds": _timing(self._wait_samples),
+                "run_seconds": _timing(self._run_samples),
+            }
+
+
+verify_queue = VerifyQueue(VERIFY_WORKERS, VERIFY_QUEUE_MAX, VERIFY_LLM_CONCURRENCY)
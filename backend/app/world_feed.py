@@ -0,0 +1,103 @@
+"""
+Versioned world updates for /ws/world.
+
+Moves, joins, topic changes and board activity used to broadcast the whole
+`WorldSnapshot` (every agent, recent chat, the rules text) to every client.
+Each change now bumps `state.world_version` and broadcasts one small message:
+
+    {"type": "world_delta", "version": 42, "tick": 317, "op": "agent_moved",
+     "data": {"agent_id": ..., "display_name": ..., "x": 3, "y": 7, "last_seen_at": ...}}
+
+Ops: `agent_joined`, `agent_updated`, `agent_moved` (data: the agent),
+`topic` (topic, set_at), `board_post` (post_id, author_id, title) and
+`board_reply` (post_id, reply_id, author_id).
+
+A full `{"type": "world_state", "version": N, "data": <WorldSnapshot>}` is
+sent on connect, after every WORLD_FULL_SNAPSHOT_EVERY deltas, after resets
+(new run), and to a client that sends `{"type": "resync"}`. A client applies
+a delta only if its version is exactly one more than the last version it
+has; on a gap (e.g. messages dropped by its send queue) it asks for a resync.
+"""
+from __future__ import annotations
+
+import json
+import logging
+from dataclasses import asdict
+from typing import Any, Dict
+
+from fastapi import WebSocket
+
+from app import state
+from app.config import WORLD_FULL_SNAPSHOT_EVERY
+from app.models import AgentState
+from app.spatial_index import spatial_index
+from app.world_snapshot import world_snapshots
+from app.ws import ws_manager
+
+_log = logging.getLogger(__name__)
+
+
+class WorldFeed:
+    def __init__(self, full_every: int = 100) -> None:
+        self.full_every = max(1, int(full_every))
+        self._since_full = 0
+        self.deltas = 0
+        self.snapshots = 0
+        self.resyncs = 0
+
+    @property
+    def version(self) -> int:
+        return state.world_version
+
+    def snapshot_message(self) -> Dict[str, Any]:
+        cached = world_snapshots.get()
+        return {"type": "world_state", "version": cached.snapshot.version, "data": {**cached.payload, **state.world_clock()}}
+
+    async def publish(self, op: str, data: Dict[str, Any]) -> int:
+        """Bump the world version and broadcast one delta; returns the new version."""
+        state.world_version += 1
+        version = state.world_version
+        await ws_manager.broadcast({"type": "world_delta", "version": version, "tick": state.tick, "op": op, "data": data})
+        self.deltas += 1
+        self._since_full += 1
+        if self._since_full >= self.full_every:
+            await self.broadcast_snapshot()
+        return version
+
+    async def agent(self, op: str, a: AgentState) -> int:
+        # Every agent join/update/move comes through here, so the spatial index follows it.
+        spatial_index.update(a)
+        return await self.publish(op, asdict(a))
+
+    async def broadcast_snapshot(self, changed: bool = False) -> None:
+        """Full world_state to every client; `changed` bumps the version first (bulk resets)."""
+        if changed:
+            state.world_version += 1
+            spatial_index.rebuild()
+        self._since_full = 0
+        self.snapshots += 1
+        await ws_manager.broadcast(self.snapshot_message())
+
+    async def handle_client_message(self, ws: WebSocket, text: str) -> None:
+        """Messages from a /ws/world client: keepalive pings are ignored, {"type": "resync"} gets a snapshot."""
+        if not text.startswith("{"):
+            return
+        try:
+            msg = json.loads(text)
+        except ValueError:
+            return
+        if isinstance(msg, dict) and msg.get("type") == "resync":
+            self.resyncs += 1
+            await ws_manager.send(ws, self.snapshot_message())
+
+    def stats(self) -> dict:
+        return {
+            "version": self.version,
+            "deltas": self.deltas,
+            "snapshots": self.snapshots,
+            "resyncs": self.resyncs,
+            "full_every": self.full_every,
+        }
+
+
+world_feed = WorldFeed(WORLD_FULL_SNAPSHOT_EVERY)
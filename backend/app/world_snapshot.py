@@ -0,0 +1,131 @@
+"""
+Cached world snapshot for GET /world and /ws/world.
+
+Agents poll GET /world every loop iteration. The snapshot only changes when
+one of the inputs it is built from changes, so it is built once per
+combination of
+
+    state.world_version   agents, topic, board (bumped by app.world_feed)
+    state.tick            bumped by most agent actions
+    state.chat_version    bumped by state.append_chat
+    run_id, world_started_at
+
+and kept together with its serialized JSON bytes. GET /world answers with
+those bytes and an `ETag` derived from the key (plus a per-process nonce, so a
+restarted server never matches a stale tag); a request whose
+`If-None-Match` carries the current tag gets `304 Not Modified` with no body.
+
+The simulated clock (`day`, `minute_of_day`) advances several times per real
+second, so it is left out of the cached bytes and the key: it is appended to
+each response, and a 304 carries it in `X-World-Day` / `X-World-Minute` for
+the client to apply to the body it already has.
+
+`GET /world?agent_id=X` (or a request with X's agent token) also gets
+`"nearby"`: the agents and landmarks around X from `app.spatial_index`. That
+block is appended per request too, under an ETag derived from the shared one
+and the agent id; since agent positions are part of `world_version`, it is as
+fresh as the snapshot it rides on.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from app import state
+from app.models import WorldSnapshot
+from app.spatial_index import spatial_index
+
+_BOOT = uuid.uuid4().hex
+
+
+_CLOCK_FIELDS = {"day", "minute_of_day"}
+
+
+@dataclass(frozen=True)
+class CachedSnapshot:
+    """A built snapshot; `payload` and `body` leave out the clock fields (see `render`)."""
+    etag: str
+    snapshot: WorldSnapshot
+    payload: Dict[str, Any]
+    body: bytes
+
+
+def _key() -> Tuple:
+    return (state.run_id, state.world_started_at, state.world_version, state.tick, state.chat_version)
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """True if an If-None-Match header value names `etag` (weak comparison, `*` matches)."""
+    if not header:
+        return False
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+
+class WorldSnapshotCache:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._key: Optional[Tuple] = None
+        self._cached: Optional[CachedSnapshot] = None
+        self.hits = 0
+        self.builds = 0
+        self.not_modified = 0
+        self.nearby_served = 0
+
+    def get(self) -> CachedSnapshot:
+        key = _key()
+        with self._lock:
+            if self._cached is not None and self._key == key:
+                self.hits += 1
+                return self._cached
+        snap = state.get_world_snapshot()
+        payload = snap.model_dump(exclude=_CLOCK_FIELDS)
+        body = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        etag = '"' + hashlib.sha1(f"{_BOOT}:{key!r}".encode("utf-8")).hexdigest()[:20] + '"'
+        cached = CachedSnapshot(etag, snap, payload, body)
+        with self._lock:
+            self._key, self._cached = key, cached
+            self.builds += 1
+        return cached
+
+    def agent_etag(self, cached: CachedSnapshot, agent_id: str) -> str:
+        return '"' + hashlib.sha1(f"{cached.etag}:{agent_id}".encode("utf-8")).hexdigest()[:20] + '"'
+
+    def render(self, cached: CachedSnapshot, agent_id: str = "") -> bytes:
+        """The cached body with the current clock and, for an agent, its `nearby` block added as last fields."""
+        tail = json.dumps(state.world_clock(), separators=(",", ":")).encode("utf-8")[1:-1]
+        if agent_id:
+            nearby = json.dumps(spatial_index.nearby(agent_id), separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+            tail += b',"nearby":' + nearby
+            self.nearby_served += 1
+        return cached.body[:-1] + b"," + tail + b"}"
+
+    @staticmethod
+    def clock_headers() -> Dict[str, str]:
+        clock = state.world_clock()
+        return {"X-World-Day": str(clock["day"]), "X-World-Minute": str(clock["minute_of_day"])}
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._cached.body) if self._cached is not None else 0
+        return {
+            "hits": self.hits,
+            "builds": self.builds,
+            "not_modified": self.not_modified,
+            "nearby_served": self.nearby_served,
+            "bytes": size,
+        }
+
+
+world_snapshots = WorldSnapshotCache()
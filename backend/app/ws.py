@@ -1,42 +1,232 @@
 """
 WebSocket manager for broadcasting world state, chat, and other events.
+
+Each connection has its own bounded outbound queue and writer task, so
+`broadcast` never waits on a client: it serializes the message once, appends
+the same text to every queue and returns. A client that cannot keep up fills
+its queue (WS_SEND_QUEUE_MAX messages) and is handled by WS_SLOW_CLIENT_POLICY:
+
+- `drop_oldest`: the oldest queued message is dropped;
+- `coalesce` (default): a new `world_state` removes any queued `world_state`
+  and `world_delta` (all older than it) and is queued at the tail, so only the
+  latest snapshot is sent and never ahead of older deltas; otherwise the
+  oldest message is dropped;
+- `disconnect`: the connection is closed with code 1013 (try again later).
+
+A single send that takes longer than WS_SEND_TIMEOUT_SECONDS closes the
+connection too. Per-client queue depth, lag and drop counters are under `ws`
+in GET /admin/metrics.
 """
 from __future__ import annotations
 
 import asyncio
-from typing import Any, Dict, List
+import itertools
+import json
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
 
 from fastapi import WebSocket
 
+from app.config import WS_SEND_QUEUE_MAX, WS_SEND_TIMEOUT_SECONDS, WS_SLOW_CLIENT_POLICY
+
+_log = logging.getLogger(__name__)
+
+POLICIES = ("drop_oldest", "coalesce", "disconnect")
+_COALESCE_TYPES = ("world_state",)
+# Queued message types a newer message of the key type makes obsolete.
+_SUPERSEDED_BY = {"world_state": ("world_state", "world_delta")}
+_ids = itertools.count(1)
+
+
+def encode(msg: Dict[str, Any]) -> str:
+    # Same text Starlette's send_json produces.
+    return json.dumps(msg, separators=(",", ":"), ensure_ascii=False)
+
+
+class _Client:
+    def __init__(self, ws: WebSocket, max_queued: int) -> None:
+        self.ws = ws
+        self.client_id = next(_ids)
+        self.max_queued = max_queued
+        self.connected_at = time.time()
+        self._lock = threading.Lock()
+        # (message type, text, queued_at)
+        self._queue: Deque[Tuple[str, str, float]] = deque()
+        self._wake = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+        self.task: Optional[asyncio.Task] = None
+        self.closed = False
+        self.close_code: Optional[int] = None
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.peak_queued = 0
+        self.last_lag_seconds = 0.0
+
+    def offer(self, kind: str, text: str, policy: str) -> bool:
+        """Queue one message; False if the client is too slow and must be disconnected."""
+        with self._lock:
+            if self.closed:
+                return True
+            now = time.time()
+            if policy == "coalesce" and kind in _COALESCE_TYPES:
+                # Everything world-related queued so far is older than this
+                # snapshot. Drop it and queue the snapshot at the tail, so the
+                # client never gets a delta after a newer snapshot.
+                kept = [item for item in self._queue if item[0] not in _SUPERSEDED_BY[kind]]
+                superseded = len(self._queue) - len(kept)
+                if superseded:
+                    self._queue = deque(kept)
+                    self.coalesced += superseded
+            if len(self._queue) >= self.max_queued:
+                if policy == "disconnect":
+                    return False
+                self._queue.popleft()
+                self.dropped += 1
+            self._queue.append((kind, text, now))
+            self.peak_queued = max(self.peak_queued, len(self._queue))
+        self._notify()
+        return True
+
+    def _notify(self) -> None:
+        try:
+            if asyncio.get_running_loop() is self._loop:
+                self._wake.set()
+                return
+        except RuntimeError:
+            pass
+        try:
+            self._loop.call_soon_threadsafe(self._wake.set)
+        except RuntimeError:
+            # The connection's loop is gone; so is the connection.
+            pass
+
+    def _take(self) -> Optional[Tuple[str, str, float]]:
+        with self._lock:
+            return self._queue.popleft() if self._queue else None
+
+    def close(self, code: Optional[int]) -> None:
+        """Stop the writer; it closes the socket with `code` if one is given."""
+        with self._lock:
+            self.closed = True
+            self.close_code = code
+            self._queue.clear()
+        self._notify()
+
+    async def run(self, manager: "WSManager") -> None:
+        try:
+            while not self.closed:
+                item = self._take()
+                if item is None:
+                    self._wake.clear()
+                    if not self._queue and not self.closed:
+                        await self._wake.wait()
+                    continue
+                _, text, queued_at = item
+                await asyncio.wait_for(self.ws.send_text(text), timeout=manager.send_timeout)
+                self.sent += 1
+                self.last_lag_seconds = time.time() - queued_at
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            manager.slow_disconnects += 1
+            _log.info("WebSocket client %d: send timed out; disconnecting", self.client_id)
+            manager._remove(self, 1013)
+        except Exception:
+            manager._remove(self, None)
+        if self.close_code is not None:
+            try:
+                await self.ws.close(code=self.close_code)
+            except Exception:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            queued = len(self._queue)
+            oldest = self._queue[0][2] if self._queue else None
+        return {
+            "client_id": self.client_id,
+            "connected_seconds": round(time.time() - self.connected_at, 1),
+            "queued": queued,
+            "peak_queued": self.peak_queued,
+            "lag_seconds": round(time.time() - oldest, 3) if oldest is not None else 0.0,
+            "last_lag_seconds": round(self.last_lag_seconds, 3),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+        }
+
 
 class WSManager:
-    def __init__(self) -> None:
-        self._connections: List[WebSocket] = []
-        self._lock = asyncio.Lock()
+    def __init__(self, max_queued: int = 256, policy: str = "coalesce", send_timeout: float = 10.0) -> None:
+        if policy not in POLICIES:
+            _log.warning("Unknown WS_SLOW_CLIENT_POLICY %r; using coalesce", policy)
+            policy = "coalesce"
+        self.max_queued = max(1, int(max_queued))
+        self.policy = policy
+        self.send_timeout = float(send_timeout)
+        self._clients: Dict[int, _Client] = {}
+        self._lock = threading.Lock()
+        self.broadcasts = 0
+        self.slow_disconnects = 0
 
     async def connect(self, ws: WebSocket) -> None:
         await ws.accept()
-        async with self._lock:
-            self._connections.append(ws)
+        client = _Client(ws, self.max_queued)
+        with self._lock:
+            self._clients[id(ws)] = client
+        client.task = asyncio.create_task(client.run(self))
 
     async def disconnect(self, ws: WebSocket) -> None:
-        async with self._lock:
-            self._connections = [c for c in self._connections if c is not ws]
+        with self._lock:
+            client = self._clients.get(id(ws))
+        if client is not None:
+            self._remove(client, None)
 
-    async def broadcast_world(self, snapshot_fn=None) -> None:
-        if snapshot_fn is not None:
-            snapshot = snapshot_fn()
-            payload = snapshot.model_dump()
-            await self.broadcast({"type": "world_state", "data": payload})
+    def _remove(self, client: _Client, code: Optional[int]) -> None:
+        with self._lock:
+            if self._clients.get(id(client.ws)) is client:
+                del self._clients[id(client.ws)]
+        client.close(code)
+
+    async def send(self, ws: WebSocket, msg: Dict[str, Any]) -> None:
+        """Queue `msg` for one connection, behind anything already queued for it."""
+        client = self._clients.get(id(ws))
+        if client is not None:
+            self._offer([client], str(msg.get("type") or ""), encode(msg))
 
     async def broadcast(self, msg: Dict[str, Any]) -> None:
-        async with self._lock:
-            conns = list(self._connections)
-        for ws in conns:
-            try:
-                await ws.send_json(msg)
-            except Exception:
-                await self.disconnect(ws)
+        with self._lock:
+            clients = list(self._clients.values())
+        if not clients:
+            return
+        self.broadcasts += 1
+        self._offer(clients, str(msg.get("type") or ""), encode(msg))
+
+    def _offer(self, clients: List[_Client], kind: str, text: str) -> None:
+        for client in clients:
+            if not client.offer(kind, text, self.policy):
+                self.slow_disconnects += 1
+                _log.info("WebSocket client %d: send queue full; disconnecting", client.client_id)
+                self._remove(client, 1013)
+
+    def stats(self) -> dict:
+        with self._lock:
+            clients = [c.stats() for c in self._clients.values()]
+        return {
+            "connections": len(clients),
+            "policy": self.policy,
+            "max_queued": self.max_queued,
+            "broadcasts": self.broadcasts,
+            "slow_disconnects": self.slow_disconnects,
+            "dropped": sum(c["dropped"] for c in clients),
+            "coalesced": sum(c["coalesced"] for c in clients),
+            "max_lag_seconds": max((c["lag_seconds"] for c in clients), default=0.0),
+            "clients": clients,
+        }
 
 
-ws_manager = WSManager()
+ws_manager = WSManager(WS_SEND_QUEUE_MAX, WS_SLOW_CLIENT_POLICY, WS_SEND_TIMEOUT_SECONDS)
@@ -33,3 +33,20 @@ def client(_isolate_data_dir) -> TestClient:
 @pytest.fixture(scope="session")
 def admin_headers() -> dict:
     return {"Authorization": "Bearer test-admin-token"}
+
+
+@pytest.fixture()
+def make_job():
+    """Factory for a bare `Job` (status "open"); keyword arguments override any field."""
+    from app.models import Job
+
+    def make(**overrides) -> Job:
+        fields = dict(
+            job_id="job", title="t", body="b", reward=1.0, status="open", created_by="human",
+            created_at=0.0, claimed_by="", claimed_at=0.0, submitted_by="", submitted_at=0.0, submission="",
+            reviewed_by="", reviewed_at=0.0, review_note="",
+        )
+        fields.update(overrides)
+        return Job(**fields)
+
+    return make
@@ -0,0 +1,98 @@
+"""Tests for projection checkpoints and tail replay."""
+from __future__ import annotations
+
+from dataclasses import asdict
+
+
+def _create_job(client, admin_headers, title):
+    r = client.post("/jobs/create", json={
+        "title": title,
+        "body": f"Checkpoint test body for {title}.",
+        "reward": 1.0,
+        "created_by": "human",
+    }, headers=admin_headers)
+    return r.json()["job"]["job_id"]
+
+
+def _jobs_snapshot():
+    from app import state
+    return {jid: asdict(j) for jid, j in state.jobs.items()}
+
+
+def test_load_replays_only_tail_after_checkpoint(client, admin_headers):
+    from app import checkpoints, state
+    _create_job(client, admin_headers, "checkpoint head job")
+    r = client.post("/admin/checkpoint", headers=admin_headers)
+    assert r.json().get("ok") is True
+    cp = checkpoints.load_checkpoint("jobs", "jobs", state._JOB_SCHEMA)
+    assert cp is not None and cp["offset"] > 0
+
+    jid = _create_job(client, admin_headers, "checkpoint tail job")
+    client.post(f"/jobs/{jid}/claim", json={"agent_id": "cp_agent"})
+    before = _jobs_snapshot()
+    state.load_jobs()
+    assert _jobs_snapshot() == before
+    assert all(ev.job_id == jid for ev in state.job_events)
+
+
+def test_corrupt_checkpoint_falls_back(client, admin_headers):
+    from app import checkpoints, state
+    from app.config import CHECKPOINTS_DIR
+    from app.storage import storage
+    _create_job(client, admin_headers, "checkpoint corrupt job")
+    state.write_checkpoints(["jobs"])
+    newest = sorted(CHECKPOINTS_DIR.glob("jobs-*.json"))[-1]
+    newest.write_text(newest.read_text(encoding="utf-8").replace('"status":"open"', '"status":"approved"'), encoding="utf-8")
+    before = _jobs_snapshot()
+    cp = checkpoints.load_checkpoint("jobs", "jobs", state._JOB_SCHEMA)
+    assert cp is None or cp["offset"] < storage.cursor("jobs")
+    state.load_jobs()
+    assert _jobs_snapshot() == before
+
+
+def test_balances_restore_from_checkpoint(client, admin_headers):
+    from app import state
+    client.post("/economy/award", json={"to_id": "cp_rich", "amount": 7.0, "reason": "seed", "by": "test"}, headers=admin_headers)
+    state.write_checkpoints(["balances"])
+    client.post("/economy/award", json={"to_id": "cp_rich", "amount": 2.5, "reason": "tail", "by": "test"}, headers=admin_headers)
+    before = dict(state.balances)
+    state.load_economy()
+    assert state.balances == before
+    assert len(state.economy_ledger) == 1
+
+
+def test_admin_checkpoint_pins_balances_while_ledger_moves(client, admin_headers, monkeypatch):
+    import asyncio
+    import time
+
+    import httpx
+
+    from app import state
+    from app.main import app
+    from app.storage import storage
+    client.post("/economy/award", json={"to_id": "cp_race", "amount": 3.0, "reason": "seed", "by": "test"}, headers=admin_headers)
+    start = state.balances["cp_race"]
+    real_cursor = storage.cursor
+
+    def slow_cursor(stream):
+        # Widen the gap between building the payload and reading the offset.
+        if stream == "economy":
+            time.sleep(0.2)
+        return real_cursor(stream)
+
+    monkeypatch.setattr(storage, "cursor", slow_cursor)
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+            cp = asyncio.create_task(ac.post("/admin/checkpoint", headers=admin_headers))
+            await asyncio.sleep(0.05)
+            award = await ac.post("/economy/award", json={"to_id": "cp_race", "amount": 4.0, "reason": "race", "by": "test"}, headers=admin_headers)
+            return await cp, award
+
+    cp, award = asyncio.run(run())
+    assert cp.json().get("ok") is True and award.status_code == 200
+    before = dict(state.balances)
+    state.load_economy()
+    assert state.balances == before
+    assert state.balances["cp_race"] == start + 4.0
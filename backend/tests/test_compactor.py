@@ -0,0 +1,124 @@
+"""Tests for log compaction and retention."""
+from __future__ import annotations
+
+import json
+
+from app.utils import compact_jsonl
+
+
+def test_compact_jsonl_keeps_rows_appended_during_transform(tmp_path):
+    p = tmp_path / "log.jsonl"
+    p.write_text("".join(json.dumps({"i": i}) + "\n" for i in range(10)), encoding="utf-8")
+
+    def transform(rows):
+        with p.open("a", encoding="utf-8") as f:
+            f.write(json.dumps({"i": 99}) + "\n")
+        return [r for r in rows if r["i"] % 2 == 0]
+
+    out = compact_jsonl(p, transform)
+    got = [json.loads(ln)["i"] for ln in p.read_text(encoding="utf-8").splitlines()]
+    assert got == [0, 2, 4, 6, 8, 99]
+    assert out["rows_before"] == 10 and out["rows_after"] == 5
+    assert out["bytes_after"] < out["bytes_before"]
+
+
+def test_compact_jsonl_streams_the_policy_over_the_file(tmp_path):
+    from app.compactor import carry_forward, drop_expired
+    p = tmp_path / "ledger.jsonl"
+    rows = [{"entry_id": str(i), "amount": 1.0, "from_id": "", "to_id": "a" if i % 2 else "b", "created_at": float(i)}
+            for i in range(20)]
+    p.write_text("".join(json.dumps(r) + "\n" for r in rows) + '{"partial"', encoding="utf-8")
+
+    out = compact_jsonl(p, lambda rs: carry_forward(rs, max_age_seconds=5.0, now=20.0))
+    lines = p.read_text(encoding="utf-8").splitlines()
+    got = [json.loads(ln) for ln in lines[:-1]]
+    assert lines[-1] == '{"partial"'
+    assert [r["entry_type"] for r in got[:2]] == ["carry_forward", "carry_forward"]
+    assert sum(r["amount"] for r in got) == 20.0 and len(got) == 2 + 5
+    assert out["rows_before"] == 20 and out["rows_after"] == 7
+
+    kept = list(drop_expired(rows, max_age_seconds=0.0, max_bytes=3 * (len(json.dumps(rows[-1])) + 1), now=20.0))
+    assert [r["entry_id"] for r in kept] == ["17", "18", "19"]
+
+
+def test_carry_forward_preserves_balances():
+    from app.compactor import carry_forward
+    now = 10_000.0
+    rows = [
+        {"entry_id": "1", "entry_type": "genesis", "amount": 100.0, "from_id": "", "to_id": "a", "created_at": 1.0},
+        {"entry_id": "2", "entry_type": "genesis", "amount": 100.0, "from_id": "", "to_id": "b", "created_at": 2.0},
+        {"entry_id": "3", "entry_type": "transfer", "amount": 100.0, "from_id": "a", "to_id": "b", "created_at": 3.0},
+        {"entry_id": "4", "entry_type": "award", "amount": 5.0, "from_id": "", "to_id": "b", "created_at": 4.0},
+        {"entry_id": "5", "entry_type": "transfer", "amount": 1.0, "from_id": "b", "to_id": "a", "created_at": 9_999.0},
+    ]
+
+    def totals(rs):
+        out = {}
+        for r in rs:
+            if r["from_id"]:
+                out[r["from_id"]] = out.get(r["from_id"], 0.0) - r["amount"]
+            if r["to_id"]:
+                out[r["to_id"]] = out.get(r["to_id"], 0.0) + r["amount"]
+        return out
+
+    compacted = list(carry_forward(rows, max_age_seconds=100.0, now=now))
+    assert totals(compacted) == totals(rows)
+    assert [r["entry_type"] for r in compacted] == ["carry_forward", "carry_forward", "transfer"]
+    # "a" is at zero before the tail but must keep an entry so it is not re-granted genesis.
+    assert any(r["to_id"] == "a" and r["amount"] == 0.0 for r in compacted)
+
+
+def test_collapse_jobs_replays_to_same_state():
+    from app import state
+    from app.compactor import collapse_jobs
+    from app.models import JobEvent
+
+    def ev(i, t, jid, data, at):
+        return {"event_id": str(i), "event_type": t, "job_id": jid, "data": data, "created_at": at}
+
+    rows = [
+        ev(1, "create", "done", {"title": "t", "body": "b", "reward": 1.0}, 1.0),
+        ev(2, "claim", "done", {"agent_id": "x"}, 2.0),
+        ev(3, "submit", "done", {"agent_id": "x", "submission": "s"}, 3.0),
+        ev(4, "review", "done", {"approved": True, "reviewed_by": "h"}, 4.0),
+        ev(5, "create", "gone", {"title": "c"}, 5.0),
+        ev(6, "cancel", "gone", {}, 6.0),
+        ev(7, "create", "live", {"title": "l"}, 7.0),
+    ]
+
+    def replay(rs):
+        js = {}
+        for r in rs:
+            state.apply_job_event(JobEvent(**r), target=js)
+        return js
+
+    dropped = set()
+    out = list(collapse_jobs(rows, terminal_age_seconds=10.0, cancelled_age_seconds=10.0, now=100.0, dropped=dropped))
+    assert dropped == {"gone"}
+    assert [r["event_type"] for r in out] == ["snapshot", "create"]
+    before, after = replay(rows), replay(out)
+    assert after["done"] == before["done"] and after["live"] == before["live"]
+    assert "gone" not in after
+
+
+def test_purge_cancelled_runs_through_compactor(client, admin_headers):
+    from app import state
+    r = client.post("/jobs/create", json={
+        "title": "compactor purge target", "body": "To be cancelled and purged.", "reward": 1.0, "created_by": "human",
+    }, headers=admin_headers)
+    jid = r.json()["job"]["job_id"]
+    client.post(f"/jobs/{jid}/cancel", json={"by": "human"}, headers=admin_headers)
+    r = client.post("/admin/jobs/purge_cancelled", json={}, headers=admin_headers)
+    body = r.json()
+    assert body["ok"] is True and body["removed_jobs"] >= 1 and body["removed_events"] >= 2
+    assert "bytes_reclaimed" in body and "duration_ms" in body
+    assert jid not in state.jobs
+    state.load_jobs()
+    assert jid not in state.jobs
+
+
+def test_admin_compact_reports_pass(client, admin_headers):
+    r = client.post("/admin/compact", headers=admin_headers)
+    body = r.json()
+    assert body["ok"] is True
+    assert "bytes_reclaimed" in body and "duration_ms" in body
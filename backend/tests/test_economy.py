@@ -69,3 +69,51 @@ def test_penalty(client, admin_headers):
     assert r.status_code == 200
     data = r.json()
     assert data.get("ok") is True
+
+
+def test_balance_consistency_check(client, admin_headers):
+    client.post("/economy/award", json={
+        "to_id": "drift_agent",
+        "amount": 4.0,
+        "reason": "seed for drift test",
+        "by": "test",
+    }, headers=admin_headers)
+    r = client.post("/admin/economy/check", headers=admin_headers)
+    data = r.json()
+    assert data.get("ok") is True
+    assert data["drift"] == []
+
+    from app import state
+    state.balances["drift_agent"] += 1.0
+    data = client.post("/admin/economy/check?repair=true", headers=admin_headers).json()
+    assert data.get("ok") is False
+    assert [d["account"] for d in data["drift"]] == ["drift_agent"]
+    assert data.get("repaired") is True
+    assert client.post("/admin/economy/check", headers=admin_headers).json().get("ok") is True
+
+
+def test_balance_check_keeps_entries_posted_during_the_read(client, admin_headers, monkeypatch):
+    import uuid
+
+    from app import economy_logic, state
+    from app.models import EconomyEntry
+
+    client.post("/economy/award", json={"to_id": "racing_agent", "amount": 2.0, "reason": "seed", "by": "test"}, headers=admin_headers)
+    read = economy_logic.storage.read
+
+    def read_then_post(stream, limit=None):
+        rows = read(stream, limit)
+        # An award lands after the log was read but before the check finishes.
+        state.post_ledger_entry(EconomyEntry(
+            entry_id=str(uuid.uuid4()), entry_type="award", amount=3.0,
+            from_id=state.TREASURY_ID, to_id="racing_agent", memo="", created_at=0.0,
+        ))
+        return rows
+
+    monkeypatch.setattr(economy_logic.storage, "read", read_then_post)
+    state.balances["racing_agent"] += 1.0
+    data = client.post("/admin/economy/check?repair=true", headers=admin_headers).json()
+    assert [d["account"] for d in data["drift"]] == ["racing_agent"]
+    assert data["drift"][0]["recomputed"] == state.balances["racing_agent"]
+    monkeypatch.setattr(economy_logic.storage, "read", read)
+    assert client.post("/admin/economy/check", headers=admin_headers).json().get("ok") is True
@@ -19,6 +19,40 @@ def test_world(client):
     assert "recent_chat" in data
 
 
+def test_world_etag_and_not_modified(client, monkeypatch):
+    from app import state
+    from app.world_snapshot import world_snapshots
+
+    monkeypatch.setattr(state, "sim_minutes", lambda: 600)
+    first = client.get("/world")
+    etag = first.headers["etag"]
+    builds = world_snapshots.builds
+    again = client.get("/world")
+    assert again.headers["etag"] == etag and again.content == first.content
+    assert world_snapshots.builds == builds
+    r = client.get("/world", headers={"If-None-Match": etag})
+    assert r.status_code == 304 and r.content == b"" and r.headers["etag"] == etag
+    # Any change that shows up in the snapshot changes the tag.
+    client.post("/chat/say", json={"sender_id": "etag_agent", "sender_name": "Etag", "text": "new chat line"})
+    r = client.get("/world", headers={"If-None-Match": etag})
+    assert r.status_code == 200 and r.headers["etag"] != etag
+    assert any(m["text"] == "new chat line" for m in r.json()["recent_chat"])
+    etag = r.headers["etag"]
+    client.post("/agents/etag_agent/move", json={"x": 2, "y": 3})
+    r = client.get("/world", headers={"If-None-Match": f'W/{etag}, "other"'})
+    assert r.status_code == 200 and r.headers["etag"] != etag
+    assert [(a["x"], a["y"]) for a in r.json()["agents"] if a["agent_id"] == "etag_agent"] == [(2, 3)]
+    # The clock is not part of the tag: it rides on every response and on the 304's headers.
+    etag = r.headers["etag"]
+    assert r.json()["day"] == 0 and r.json()["minute_of_day"] == 600
+    monkeypatch.setattr(state, "sim_minutes", lambda: 24 * 60 + 15)
+    r = client.get("/world", headers={"If-None-Match": etag})
+    assert r.status_code == 304 and r.headers["x-world-day"] == "1" and r.headers["x-world-minute"] == "15"
+    r = client.get("/world")
+    assert r.headers["etag"] == etag and (r.json()["day"], r.json()["minute_of_day"]) == (1, 15)
+    assert world_snapshots.get().payload.get("minute_of_day") is None
+
+
 def test_rules(client):
     r = client.get("/rules")
     assert r.status_code == 200
@@ -77,3 +111,11 @@ def test_trace_recent(client):
 def test_opportunities(client):
     r = client.get("/opportunities")
     assert r.status_code == 200
+
+
+def test_world_openapi_describes_nearby_and_not_modified(client):
+    op = client.get("/openapi.json").json()["paths"]["/world"]["get"]
+    assert set(op["responses"]) >= {"200", "304"}
+    ref = op["responses"]["200"]["content"]["application/json"]["schema"]["$ref"]
+    schema = client.get("/openapi.json").json()["components"]["schemas"][ref.rsplit("/", 1)[-1]]
+    assert "nearby" in schema["properties"] and "agents" in schema["properties"]
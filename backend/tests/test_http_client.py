@@ -0,0 +1,93 @@
+"""Tests for the shared outbound HTTP pool: a hung upstream must not stall the event loop."""
+from __future__ import annotations
+
+import asyncio
+import socket
+import threading
+import time
+
+import httpx
+import pytest
+
+
+@pytest.fixture()
+def hanging_upstream():
+    """A TCP server that accepts connections and never answers."""
+    srv = socket.socket()
+    srv.bind(("127.0.0.1", 0))
+    srv.listen(16)
+    conns = []
+    stop = threading.Event()
+
+    def accept():
+        srv.settimeout(0.1)
+        while not stop.is_set():
+            try:
+                conns.append(srv.accept()[0])
+            except OSError:
+                continue
+
+    t = threading.Thread(target=accept, daemon=True)
+    t.start()
+    yield f"http://127.0.0.1:{srv.getsockname()[1]}"
+    stop.set()
+    t.join()
+    for c in conns:
+        c.close()
+    srv.close()
+
+
+def test_event_loop_stays_responsive_while_embeddings_upstream_hangs(client, hanging_upstream, monkeypatch):
+    from app import state
+    from app.main import app
+    monkeypatch.setattr(state, "EMBEDDINGS_BASE_URL", hanging_upstream)
+    monkeypatch.setattr(state, "EMBEDDINGS_TIMEOUT_SECONDS", 1.0)
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+            gaps = []
+
+            async def ticker():
+                last = time.perf_counter()
+                while True:
+                    await asyncio.sleep(0.01)
+                    now = time.perf_counter()
+                    gaps.append(now - last)
+                    last = now
+
+            tick = asyncio.create_task(ticker())
+            t0 = time.perf_counter()
+            retrieve = asyncio.create_task(ac.get("/memory/http_hang/retrieve", params={"q": "anything"}))
+            await asyncio.sleep(0.1)
+            health = await ac.get("/health")
+            health_at = time.perf_counter() - t0
+            r = await retrieve
+            done_at = time.perf_counter() - t0
+            tick.cancel()
+            return health, health_at, r, done_at, max(gaps)
+
+    health, health_at, r, done_at, worst_gap = asyncio.run(run())
+    assert health.status_code == 200 and health_at < 0.5
+    # The embedding call timed out and retrieve fell back to token relevance.
+    assert r.status_code == 200 and r.json() == {"memories": []}
+    assert 0.9 <= done_at < 5.0
+    assert worst_gap < 0.25
+
+
+def test_per_host_limit_caps_concurrent_requests(hanging_upstream):
+    from app.http_client import HttpPool
+
+    async def run():
+        pool = HttpPool(per_host=2, default_timeout=0.5)
+        tasks = [asyncio.create_task(pool.request("GET", hanging_upstream)) for _ in range(5)]
+        await asyncio.sleep(0.2)
+        peak = pool.in_flight
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        await pool.aclose()
+        return peak, results, pool.stats()
+
+    peak, results, stats = asyncio.run(run())
+    assert peak == 2
+    assert all(isinstance(x, Exception) for x in results)
+    assert stats["errors"] == 5
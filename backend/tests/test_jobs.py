@@ -91,3 +91,195 @@ def test_claim_already_claimed(client, admin_headers):
     client.post(f"/jobs/{job_id}/claim", json={"agent_id": "agent_a"})
     r2 = client.post(f"/jobs/{job_id}/claim", json={"agent_id": "agent_b"})
     assert r2.json().get("error") in ("already_claimed", "not_claimable")
+
+
+def _scan_jobs(status=None, created_by=None, claimed_by=None, parent_job_id=None, limit=100):
+    """The pre-index implementation of GET /jobs: filter everything, then sort."""
+    from app import state
+    out = []
+    for j in state.jobs.values():
+        if status and j.status != status:
+            continue
+        if created_by and j.created_by != created_by:
+            continue
+        if claimed_by and j.claimed_by != claimed_by:
+            continue
+        if parent_job_id and j.parent_job_id != parent_job_id:
+            continue
+        parent = state.jobs.get(j.parent_job_id) if j.parent_job_id else None
+        if j.parent_job_id and (parent is None or parent.status != "approved") and status in ("open", "claimed"):
+            continue
+        out.append(j)
+    out.sort(key=lambda j: (j.created_at, j.job_id), reverse=True)
+    return [j.job_id for j in out[:limit]]
+
+
+def test_jobs_list_indexes_match_full_scan(client, admin_headers):
+    def create(title, by, **kw):
+        r = client.post("/jobs/create", json={
+            "title": title, "body": f"Index test body for {title}", "reward": 1.0, "created_by": by, **kw,
+        }, headers=admin_headers)
+        return r.json()["job"]["job_id"]
+
+    parent = create("Index parent", "idx_creator_a")
+    words = ["apple", "birch", "cedar", "delta", "ember", "fjord", "grove"]
+    kids = [create(f"Index child {w}", "idx_creator_b", parent_job_id=parent) for w in words[:3]]
+    solo = [create(f"Index solo {w}", "idx_creator_a") for w in words[3:]]
+    client.post(f"/jobs/{solo[0]}/claim", json={"agent_id": "idx_worker"})
+    client.post(f"/jobs/{solo[1]}/claim", json={"agent_id": "idx_worker"})
+    client.post(f"/jobs/{solo[1]}/submit", json={"agent_id": "idx_worker", "submission": "done"})
+    client.post(f"/jobs/{kids[0]}/cancel", json={"by": "idx_creator_b"}, headers=admin_headers)
+
+    queries = [
+        {}, {"status": "open"}, {"status": "claimed"}, {"status": "submitted"}, {"status": "cancelled"},
+        {"created_by": "idx_creator_a"}, {"status": "open", "created_by": "idx_creator_b"},
+        {"claimed_by": "idx_worker"}, {"parent_job_id": parent}, {"status": "open", "limit": 2},
+    ]
+    for q in queries:
+        got = [j["job_id"] for j in client.get("/jobs", params=q).json()["jobs"]]
+        assert got == _scan_jobs(**q), q
+    # Children of an unapproved parent are hidden from the open list.
+    assert not set(kids) & {j["job_id"] for j in client.get("/jobs", params={"status": "open", "limit": 500}).json()["jobs"]}
+
+
+def test_job_index_moves_jobs_between_lists(make_job):
+    from app.job_index import JobIndex
+    idx = JobIndex()
+    jobs = {}
+    for i in range(5):
+        jobs[f"j{i}"] = make_job(job_id=f"j{i}", created_by="c", created_at=float(i))
+        idx.update(jobs[f"j{i}"])
+    jobs["j1"].status, jobs["j1"].claimed_by = "claimed", "w"
+    idx.update(jobs["j1"])
+    assert [j.job_id for j in idx.newest(jobs, [("status", "open")], 10)] == ["j4", "j3", "j2", "j0"]
+    assert [j.job_id for j in idx.newest(jobs, [("claimer", "w"), ("status", "claimed")], 10)] == ["j1"]
+    idx.remove("j3")
+    assert list(idx.newest_ids(("creator", "c"))) == ["j4", "j2", "j1", "j0"]
+    assert idx.stats()["jobs"] == 4
+
+
+def test_duplicate_job_reports_match_and_similarity(client, admin_headers):
+    body = "Write a haiku about autumn leaves falling on quiet mountain rivers near the old stone bridge " * 3
+    first = client.post("/jobs/create", json={
+        "title": "Dedup haiku task", "body": body, "reward": 1.0, "created_by": "dedup_creator",
+    }, headers=admin_headers).json()["job"]["job_id"]
+    again = client.post("/jobs/create", json={
+        "title": "Dedup haiku task", "body": body + " please", "reward": 1.0, "created_by": "dedup_creator",
+    }, headers=admin_headers).json()
+    assert again["error"] == "duplicate_job" and again["duplicate_of"] == first
+    assert again["reason"].startswith("similarity:") and again["similarity"] >= 0.92
+    assert 0.0 < again["estimated_similarity"] <= 1.0
+    same = client.post("/jobs/create", json={
+        "title": "Dedup haiku task", "body": body, "reward": 1.0, "created_by": "dedup_creator",
+    }, headers=admin_headers).json()
+    assert same["reason"] == "fingerprint_match" and same["similarity"] == 1.0
+    # Another creator's job only counts when both are run-tagged.
+    other = client.post("/jobs/create", json={
+        "title": "Dedup haiku task", "body": body, "reward": 1.0, "created_by": "dedup_other",
+    }, headers=admin_headers).json()
+    assert other.get("ok") is True
+
+
+def test_lsh_duplicate_index_matches_full_scan(make_job):
+    import random
+    from app.job_dedup import JobDuplicateIndex, job_tokens
+    from app.utils import fingerprint, jaccard
+    rng = random.Random(3)
+    vocab = [f"word{i:04d}" for i in range(3000)]
+    jobs = {}
+    idx = JobDuplicateIndex()
+    for i in range(600):
+        body = " ".join(rng.sample(vocab, 40))
+        j = make_job(
+            job_id=f"d{i}", title=f"job {i}", body=body, created_by="c", created_at=float(i),
+            fingerprint=fingerprint(f"job {i}", body),
+        )
+        jobs[j.job_id] = j
+        idx.update(j)
+    all_toks = {jid: job_tokens(j.title, j.body) for jid, j in jobs.items()}
+    for i in range(0, 600, 7):
+        words = jobs[f"d{i}"].body.split()
+        if i % 2:
+            words[rng.randrange(len(words))] = "changed"  # ~0.95 similar
+        else:
+            words = words[:25] + rng.sample(vocab, 15)  # well below 0.92
+        toks = job_tokens(f"job {i}", " ".join(words))
+        scan = [j.job_id for j in sorted(jobs.values(), key=lambda j: -j.created_at) if jaccard(toks, all_toks[j.job_id]) >= 0.92]
+        got = idx.find_duplicate(jobs, toks, "", lambda j: True)
+        assert (got["job_id"] if got else None) == (scan[0] if scan else None)
+        if got:
+            assert abs(got["estimated_similarity"] - got["similarity"]) < 0.15
+    assert idx.stats()["avg_candidates"] < 5
+
+
+def _python_run_job(client, admin_headers, title, expected, agent):
+    r = client.post("/jobs/create", json={
+        "title": title,
+        "body": f"Print the answer.\n[verifier:python_run]\n[expected_output:{expected}]",
+        "reward": 1.0,
+        "created_by": "human",
+    }, headers=admin_headers)
+    job_id = r.json()["job"]["job_id"]
+    client.post(f"/jobs/{job_id}/claim", json={"agent_id": agent})
+    return job_id
+
+
+def test_submit_verifies_in_background_queue(client, admin_headers, monkeypatch):
+    import asyncio
+
+    from app import state
+    from app.verify_queue import verify_queue
+    from app.ws import ws_manager
+
+    sent = []
+
+    async def fake_broadcast(msg):
+        sent.append(msg)
+
+    monkeypatch.setattr(ws_manager, "broadcast", fake_broadcast)
+    good = _python_run_job(client, admin_headers, "Queue verify quokka", "42", "vq_a")
+    bad = _python_run_job(client, admin_headers, "Queue verify narwhal", "43", "vq_b")
+    gone = _python_run_job(client, admin_headers, "Queue verify pangolin", "44", "vq_c")
+    for job_id, agent in ((good, "vq_a"), (bad, "vq_b"), (gone, "vq_c")):
+        r = client.post(f"/jobs/{job_id}/submit", json={"agent_id": agent, "submission": "```python\nprint(6 * 7)\n```"})
+        data = r.json()
+        assert data["job"]["status"] == "submitted"
+        assert data["verification"]["state"] == "verifying"
+    assert client.get(f"/jobs/{good}").json()["verification"]["stage"] == "queued"
+    metrics = client.get("/admin/metrics", headers=admin_headers).json()["verify_queue"]
+    assert metrics["queued"] >= 3
+    client.post(f"/jobs/{gone}/cancel", json={"by": "human"}, headers=admin_headers)
+
+    stale = verify_queue.stale
+    asyncio.run(verify_queue.drain())
+
+    assert state.jobs[good].status == "approved" and state.jobs[good].auto_verify_ok is True
+    assert state.jobs[good].reviewed_by == "system:auto_verify"
+    assert state.jobs[bad].status == "rejected" and state.jobs[bad].auto_verify_ok is False
+    assert state.jobs[gone].status == "cancelled" and state.jobs[gone].auto_verify_ok is None
+    assert verify_queue.stale > stale
+    assert "verification" not in client.get(f"/jobs/{good}").json()
+    kinds = [(m["data"]["event"]["event_type"], m["data"]["event"]["job_id"]) for m in sent if m["type"] == "jobs"]
+    assert ("verify", good) in kinds and ("review", good) in kinds and ("review", bad) in kinds
+    stats = verify_queue.stats()
+    assert stats["queued"] == 0 and stats["running"] == 0
+    assert stats["run_seconds"]["max"] > 0
+
+
+def test_resubmission_replaces_or_follows_the_pending_verification(make_job):
+    from app.verify_queue import POOL_LANE, VerifyQueue
+
+    q = VerifyQueue(workers=1, max_queued=4)
+    job = make_job(job_id="resub", status="submitted", submission="v1")
+    q.enqueue(job, "v1", "system:auto_verify")
+    q.enqueue(job, "v1", "system:auto_verify")
+    q.enqueue(make_job(job_id="resub", status="submitted", submission="v2"), "v2", "system:auto_verify")
+    assert [p.submission for p in q._queues[POOL_LANE]] == ["v2"] and q.enqueued == 1
+
+    running = q._take(POOL_LANE)
+    out = q.enqueue(make_job(job_id="resub", status="submitted", submission="v3"), "v3", "system:auto_verify")
+    assert out["stage"] == "queued"
+    assert [p.submission for p in q._queues[POOL_LANE]] == ["v3"]
+    assert q.stats()["running"] == 1
+    q._finish(running)
+    assert q.status("resub")["stage"] == "queued" and q.stats()["running"] == 0
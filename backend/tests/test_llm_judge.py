@@ -0,0 +1,138 @@
+"""Tests for the streaming, bounded LLM-judge service."""
+from __future__ import annotations
+
+import asyncio
+import json
+import socket
+import threading
+import time
+
+import pytest
+
+
+def _sse(piece: str) -> bytes:
+    return b"data: " + json.dumps({"choices": [{"delta": {"content": piece}}]}).encode() + b"\n\n"
+
+
+@pytest.fixture()
+def judge_server():
+    """An OpenAI-style streaming server that sends a verdict, then keeps the stream open."""
+    srv = socket.socket()
+    srv.bind(("127.0.0.1", 0))
+    srv.listen(32)
+    stop = threading.Event()
+    state = {"active": 0, "peak": 0, "requests": 0, "verdict": '{"ok": true, "reason": "looks {right}"}'}
+    lock = threading.Lock()
+
+    def handle(conn):
+        with lock:
+            state["active"] += 1
+            state["requests"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+        try:
+            data = b""
+            while b"\r\n\r\n" not in data:
+                data += conn.recv(65536)
+            head, _, body = data.partition(b"\r\n\r\n")
+            length = int([ln.split(b":")[1] for ln in head.split(b"\r\n") if ln.lower().startswith(b"content-length")][0])
+            while len(body) < length:
+                body += conn.recv(65536)
+            time.sleep(0.05)
+            conn.sendall(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nTransfer-Encoding: chunked\r\n\r\n")
+            text = "Sure. " + state["verdict"] + " Hope that helps, and here is a long epilogue"
+            for i in range(0, len(text), 7):
+                chunk = _sse(text[i : i + 7])
+                conn.sendall(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            # Never finish the stream: only an early stop returns before the timeout.
+            conn.settimeout(0.05)
+            while not stop.is_set():
+                try:
+                    if not conn.recv(65536):
+                        break
+                except socket.timeout:
+                    continue
+        except OSError:
+            pass
+        finally:
+            with lock:
+                state["active"] -= 1
+            conn.close()
+
+    def accept():
+        srv.settimeout(0.1)
+        while not stop.is_set():
+            try:
+                conn = srv.accept()[0]
+            except OSError:
+                continue
+            threading.Thread(target=handle, args=(conn,), daemon=True).start()
+
+    t = threading.Thread(target=accept, daemon=True)
+    t.start()
+    state["url"] = f"http://127.0.0.1:{srv.getsockname()[1]}"
+    yield state
+    stop.set()
+    t.join()
+    srv.close()
+
+
+def test_verdict_stream_stops_at_closing_brace():
+    from app.llm_judge import VerdictStream, parse_verdict
+    s = VerdictStream()
+    assert not s.feed(_sse('Verdict: {"ok": true, "reason": "a } in'))
+    assert s.feed(_sse(' a string"} and more'))
+    assert parse_verdict(s.text()) == (True, "a } in a string")
+
+
+def test_judge_stops_early_bounds_concurrency_and_reports_latency(judge_server):
+    from app.http_client import HttpPool
+    from app.llm_judge import LlmJudge
+
+    judge = LlmJudge(judge_server["url"], "m", timeout=5.0, concurrency=2)
+
+    async def run():
+        pool = HttpPool(max_connections=16, per_host=16)
+        try:
+            t0 = time.perf_counter()
+            verdicts = await asyncio.gather(*(judge.judge("task", f"answer {i}", pool) for i in range(5)))
+            # The same request while one is in flight shares its call.
+            shared = await asyncio.gather(judge.judge("task", "same", pool), judge.judge("task", "same", pool))
+            return verdicts, shared, time.perf_counter() - t0
+        finally:
+            await pool.aclose()
+
+    verdicts, shared, elapsed = asyncio.run(run())
+    assert verdicts == [(True, "looks {right}")] * 5 and shared == [(True, "looks {right}")] * 2
+    assert elapsed < 3.0
+    assert judge_server["peak"] <= 2 and judge_server["requests"] == 6
+    st = judge.stats()
+    assert st["calls"] == 6 and st["early_stops"] == 6 and st["errors"] == 0 and st["shared_in_flight"] == 1
+    assert st["latency_ms"]["samples"] == 6 and 0 < st["latency_ms"]["p50"] <= st["latency_ms"]["p95"] < 3000
+
+
+def test_queue_runs_llm_judge_jobs_on_the_loop_with_cache(client, admin_headers, judge_server, tmp_path, monkeypatch):
+    from app import state
+    from app.llm_judge import llm_judge
+    from app.verifiers import auto_verify_llm_judge
+    from app.verify_cache import verify_cache
+    from app.verify_queue import VerifyQueue, verify_queue
+
+    monkeypatch.setattr(llm_judge, "base_url", judge_server["url"])
+    monkeypatch.setattr(verify_cache, "disk_dir", tmp_path / "verify_cache")
+    # The judge lane must not touch the process pool.
+    monkeypatch.setattr(VerifyQueue, "_pool", lambda self: pytest.fail("llm_judge job sent to the process pool"))
+    r = client.post("/jobs/create", json={
+        "title": "Judge lane haiku", "body": "Write a haiku about ponds.\n[verifier:llm_judge]",
+        "reward": 1.0, "created_by": "human",
+    }, headers=admin_headers)
+    job_id = r.json()["job"]["job_id"]
+    client.post(f"/jobs/{job_id}/claim", json={"agent_id": "lj_poet"})
+    r = client.post(f"/jobs/{job_id}/submit", json={"agent_id": "lj_poet", "submission": "old pond / a frog"})
+    assert r.json()["verification"]["lane"] == "llm_judge"
+    assert verify_queue.stats()["queued_by_lane"]["llm_judge"] >= 1
+    asyncio.run(verify_queue.drain())
+    assert state.jobs[job_id].status == "approved" and state.jobs[job_id].auto_verify_ok is True
+    assert judge_server["requests"] == 1
+    # Same verdict for the same task and (whitespace-normalized) submission: no second call.
+    again = asyncio.run(auto_verify_llm_judge(state.jobs[job_id], "  old pond /\na frog"))
+    assert again.ok and again.artifacts["cache"]["hit"] is True and judge_server["requests"] == 1
@@ -0,0 +1,87 @@
+"""Tests for the group-commit JSONL writer."""
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from app.logwriter import LogWriter
+
+
+def _lines(path):
+    return [json.loads(ln) for ln in path.read_text(encoding="utf-8").splitlines() if ln.strip()]
+
+
+def test_flush_is_a_barrier(tmp_path):
+    w = LogWriter(tmp_path / "a.jsonl", flush_interval_ms=1000)
+    for i in range(50):
+        w.append({"i": i})
+    assert w.flush(timeout=5)
+    assert [r["i"] for r in _lines(w.path)] == list(range(50))
+    assert w.stats()["written"] == 50
+    w.close()
+
+
+def test_close_drains_queue(tmp_path):
+    w = LogWriter(tmp_path / "b.jsonl", flush_interval_ms=1000, batch_max=7)
+    for i in range(30):
+        w.append({"i": i})
+    w.close()
+    assert len(_lines(w.path)) == 30
+    # Appends after close fall back to direct writes.
+    w.append({"i": 30})
+    assert len(_lines(w.path)) == 31
+
+
+def test_appends_racing_close_are_not_lost(tmp_path):
+    import threading
+
+    w = LogWriter(tmp_path / "c.jsonl", flush_interval_ms=5, batch_max=16)
+    started = threading.Barrier(5)
+
+    def writer(t):
+        started.wait()
+        for i in range(400):
+            w.append({"t": t, "i": i})
+
+    threads = [threading.Thread(target=writer, args=(t,)) for t in range(4)]
+    for th in threads:
+        th.start()
+    started.wait()
+    w.close()
+    for th in threads:
+        th.join()
+    assert len(_lines(w.path)) == 1600
+
+
+def test_admin_metrics_reports_log_writers(client, admin_headers):
+    from app.storage import storage
+    if storage.name != "jsonl":
+        pytest.skip("JSONL log writers are not used by this storage backend")
+    client.post("/chat/send", json={
+        "sender_type": "agent",
+        "sender_id": "logwriter_agent",
+        "sender_name": "LogWriter",
+        "text": "queued write",
+    })
+    r = client.get("/admin/metrics", headers=admin_headers)
+    assert r.status_code == 200
+    stats = r.json()["log_writer"]
+    assert "chat_messages.jsonl" in stats
+    assert "queue_depth" in stats["chat_messages.jsonl"]
+
+
+def test_readers_wait_for_queued_rows_only_when_asked(tmp_path):
+    from app.logwriter import register_log
+    from app.utils import append_jsonl, read_jsonl, read_jsonl_from
+
+    p = tmp_path / "d.jsonl"
+    w = register_log(p, flush_interval_ms=10_000)
+    try:
+        append_jsonl(p, {"i": 0})
+        assert read_jsonl(p) == [] and read_jsonl(p, limit=5) == []
+        assert read_jsonl(p, limit=5, flush=True) == [{"i": 0}]
+        append_jsonl(p, {"i": 1})
+        assert read_jsonl_from(p, 0, flush=True) == [{"i": 0}, {"i": 1}]
+    finally:
+        w.close()
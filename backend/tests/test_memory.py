@@ -0,0 +1,466 @@
+"""Tests for agent memory routes and the per-agent memory cache."""
+from __future__ import annotations
+
+import json
+
+import pytest
+
+
+def _append(client, agent_id, text, **kw):
+    r = client.post(f"/memory/{agent_id}/append", json={"text": text, **kw})
+    return r.json()["memory"]
+
+
+def test_memory_cache_hits_and_incremental_appends(client):
+    from app.memory_store import memory_store
+    _append(client, "mem_cache_a", "first memory about apples")
+    client.get("/memory/mem_cache_a/recent")
+    before = memory_store.stats()
+    client.get("/memory/mem_cache_a/recent")
+    assert memory_store.stats()["hits"] == before["hits"] + 1
+
+    _append(client, "mem_cache_a", "second memory about pears")
+    r = client.get("/memory/mem_cache_a/search", params={"q": "pears"})
+    assert [m["text"] for m in r.json()["memories"]] == ["second memory about pears"]
+    after = memory_store.stats()
+    assert after["refreshes"] == before["refreshes"] + 1
+    assert after["reloads"] == before["reloads"]
+
+
+def test_memory_cache_reloads_after_external_rewrite(client):
+    from app import state
+    from app.memory_store import memory_store
+    from app.storage import storage
+    if storage.name != "jsonl":
+        pytest.skip("rewrites the JSONL memory file directly")
+    _append(client, "mem_cache_b", "original text")
+    client.get("/memory/mem_cache_b/recent")
+    reloads = memory_store.stats()["reloads"]
+    p = state.memory_path("mem_cache_b")
+    p.write_text(json.dumps({"memory_id": "x", "text": "rewritten elsewhere", "created_at": 1.0}) + "\n", encoding="utf-8")
+    rows = client.get("/memory/mem_cache_b/recent").json()["memories"]
+    assert [m["text"] for m in rows] == ["rewritten elsewhere"]
+    assert memory_store.stats()["reloads"] == reloads + 1
+
+
+def test_memory_cache_evicts_least_recently_used():
+    from app.memory_store import MemoryStore
+    store = MemoryStore(max_agents=2)
+    for aid in ("lru_a", "lru_b", "lru_a", "lru_c"):
+        store.get(aid)
+    assert store.stats()["evictions"] == 1
+    assert list(store._agents) == ["lru_a", "lru_c"]
+
+
+def _reference_scores(rows, emb_by_id, qtok, qemb, now, hl, w=(0.55, 0.25, 0.20)):
+    """The per-row loop memory_retrieve ran before it was vectorized."""
+    from app import state
+    from app.utils import jaccard, tok
+    scored = []
+    for r in rows:
+        try:
+            tags = r.get("tags") or []
+            rel_tok = jaccard(qtok, tok(str(r.get("text") or "") + " " + " ".join([str(t) for t in tags])))
+            mid = r.get("memory_id")
+            rel_emb = state.cosine(qemb, emb_by_id[mid]) if qemb is not None and mid in emb_by_id else 0.0
+            rec = 0.5 ** (max(0.0, now - float(r.get("created_at") or 0.0)) / hl)
+            imp = float(r["importance"]) if ("importance" in r and r["importance"] is not None) else 0.3
+            imp = max(0.0, min(1.0, imp))
+            scored.append((w[0] * max(rel_tok, rel_emb) + w[1] * rec + w[2] * imp, r["memory_id"]))
+        except Exception:
+            continue
+    scored.sort(key=lambda t: t[0], reverse=True)
+    return scored
+
+
+def test_vectorized_retrieve_matches_reference_scoring():
+    import random
+    from app.memory_index import MemoryIndex, top_k
+    from app.utils import tok
+    rnd = random.Random(7)
+    words = ["apple", "pear", "plum", "job", "market", "coin", "verify", "chat", "move", "rest"]
+    rows, embs = [], {}
+    for i in range(400):
+        r = {"memory_id": f"m{i}", "text": " ".join(rnd.choices(words, k=rnd.randint(0, 6))),
+             "tags": rnd.choices(words, k=rnd.randint(0, 2)), "created_at": 1000.0 + rnd.random() * 50000}
+        if i % 3:
+            r["importance"] = rnd.choice([None, rnd.random() * 1.4 - 0.2])
+        if i % 97 == 5:
+            r["importance"] = "not a number"
+        rows.append(r)
+        if i % 4:
+            embs[r["memory_id"]] = [rnd.gauss(0, 1) for _ in range(16 if i % 11 else 12)]
+    qtok, qemb, now, hl = tok("apple market coin"), [rnd.gauss(0, 1) for _ in range(16)], 60000.0, 3 * 3600.0
+
+    idx = MemoryIndex()
+    idx.add_rows(rows[:150], embs)
+    idx.add_rows(rows[150:], {})
+    idx.add_embeddings(embs, [r["memory_id"] for r in rows[150:] if r["memory_id"] in embs])
+    cols = idx.score(qtok, qemb, now, hl, 0.55, 0.25, 0.20)
+
+    ref = _reference_scores(rows, embs, qtok, qemb, now, hl)
+    got = top_k(cols["score"], 20)
+    assert [rows[i]["memory_id"] for i in got] == [mid for _, mid in ref[:20]]
+    for (s, _), i in zip(ref, got):
+        assert cols["score"][i] == pytest.approx(s, abs=1e-5)
+    assert len(top_k(cols["score"], 1000)) == len(ref)
+
+
+def test_retrieve_route_ranks_by_relevance_and_importance(client):
+    _append(client, "mem_vec_a", "notes about the market price", importance=0.9)
+    _append(client, "mem_vec_a", "unrelated chatter", importance=0.1)
+    _append(client, "mem_vec_a", "market chatter", importance=0.1)
+    r = client.get("/memory/mem_vec_a/retrieve", params={"q": "market price", "k": 2})
+    mems = r.json()["memories"]
+    assert [m["text"] for m in mems] == ["notes about the market price", "market chatter"]
+    assert mems[0]["relevance_token"] == pytest.approx(2 / 5)
+    assert mems[0]["importance"] == 0.9
+
+
+def _clustered_index(n, dim=16, seed=3):
+    import numpy as np
+    from app.memory_index import MemoryIndex
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(8, dim))
+    vecs = centers[rng.integers(0, 8, n)] + 0.1 * rng.normal(size=(n, dim))
+    rows = [{"memory_id": f"a{i}", "text": f"note {i}", "created_at": 60.0 * i} for i in range(n)]
+    embs = {f"a{i}": vecs[i].tolist() for i in range(n)}
+    idx = MemoryIndex()
+    idx.add_rows(rows, embs)
+    return idx, rows, embs, centers
+
+
+def test_ann_candidates_recall_exact_top_hits(tmp_path):
+    from app.memory_ann import IvfIndex
+    from app.memory_index import top_k
+    idx, rows, _, centers = _clustered_index(600)
+    ivf = IvfIndex(tmp_path / "a.ann.npz", model="m1", min_rows=100)
+    ivf.sync(idx)
+    assert ivf.centroids is not None and (tmp_path / "a.ann.npz").exists()
+    q = centers[2].tolist()
+    sel = ivf.candidates(idx, q, set(), nprobe=4, recent=10)
+    assert sel is not None and len(sel) < idx.n
+    args = (60.0 * 600, 3 * 3600.0, 1.0, 0.0, 0.0)
+    exact = top_k(idx.score(set(), q, *args)["score"], 5)
+    approx = top_k(idx.score(set(), q, *args, rows=sel)["score"], 5)
+    assert [int(sel[i]) for i in approx] == exact
+    assert ivf.candidates(idx, q, set(), nprobe=0) is None
+
+
+def test_score_on_candidate_rows_matches_full_pass():
+    import numpy as np
+    from app.memory_index import MemoryIndex
+    rng = np.random.default_rng(5)
+    words = ["alpha", "beta", "gamma", "delta", "omega"]
+    rows = [{"memory_id": f"r{i}", "text": " ".join(rng.choice(words, 3)), "created_at": float(i)} for i in range(200)]
+    idx = MemoryIndex()
+    idx.add_rows(rows, {})
+    qtok = {"alpha", "omega", "zzzz"}
+    sel = np.sort(rng.choice(200, 40, replace=False)).astype(np.int64)[::-1].copy()
+    full = idx.score(qtok, None, 300.0, 3600.0, 0.5, 0.3, 0.2, w_bm25=0.4)
+    part = idx.score(qtok, None, 300.0, 3600.0, 0.5, 0.3, 0.2, rows=sel, w_bm25=0.4)
+    for name, col in part.items():
+        assert np.allclose(col, full[name][sel]), name
+    assert "relevance_bm25" in part
+    assert "relevance_bm25" not in idx.score(qtok, None, 300.0, 3600.0, 0.5, 0.3, 0.2)
+
+
+def test_ann_files_appends_and_reloads_from_disk(tmp_path):
+    import numpy as np
+    from app.memory_ann import IvfIndex
+    idx, rows, embs, _ = _clustered_index(300)
+    path = tmp_path / "a.ann.npz"
+    ivf = IvfIndex(path, model="m1", min_rows=100)
+    ivf.sync(idx)
+    idx.add_rows([{"memory_id": "new", "text": "late", "created_at": 1.0}], {"new": embs["a0"]})
+    ivf.sync(idx)
+    assert ivf.row_list[300] == ivf.row_list[0]
+    ivf.save(idx)
+
+    again = IvfIndex(path, model="m1", min_rows=100)
+    again.sync(idx)
+    assert np.array_equal(again.centroids, ivf.centroids)
+    assert np.array_equal(again.row_list, ivf.row_list)
+    # A different embedding model ignores the saved index and retrains.
+    other = IvfIndex(path, model="m2", min_rows=1000)
+    other.sync(idx)
+    assert other.centroids is None
+
+
+def test_search_ranks_by_bm25(client):
+    _append(client, "mem_bm25_a", "coffee at the cafe")
+    _append(client, "mem_bm25_a", "coffee coffee coffee and more coffee")
+    _append(client, "mem_bm25_a", "tea at the market")
+    mems = client.get("/memory/mem_bm25_a/search", params={"q": "coffee cafe"}).json()["memories"]
+    assert [m["text"] for m in mems] == ["coffee at the cafe", "coffee coffee coffee and more coffee"]
+    assert 0 < mems[1]["score"] < mems[0]["score"] < 1
+    # Queries without a 3+ letter word fall back to the substring scan.
+    assert [m["text"] for m in client.get("/memory/mem_bm25_a/search", params={"q": "e m"}).json()["memories"]] == [
+        "tea at the market"]
+
+
+def test_bm25_matches_okapi_formula():
+    import math
+    from app.memory_index import BM25_B, BM25_K1, MemoryIndex
+    rows = [{"text": "alpha beta"}, {"text": "alpha alpha gamma delta"}, {"text": "delta"}]
+    idx = MemoryIndex()
+    idx.add_rows(rows, {})
+    got = idx.bm25({"alpha"})
+    avgdl = 7 / 3.0
+    idf = math.log(1 + (3 - 2 + 0.5) / (2 + 0.5))
+
+    def term(tf, dl):
+        return idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * dl / avgdl))
+    bound = idf * (BM25_K1 + 1)
+    assert list(got) == pytest.approx([term(1, 2) / bound, term(2, 4) / bound, 0.0])
+
+
+def test_token_index_restores_saved_prefix(tmp_path, monkeypatch):
+    import numpy as np
+    from app import memory_index
+    from app.memory_index import MemoryIndex
+    rows = [{"memory_id": f"t{i}", "text": f"word{i % 7} shared text", "created_at": float(i)} for i in range(50)]
+    path = tmp_path / "agent.tokens.npz"
+    built = MemoryIndex(path)
+    built.add_rows(rows, {})
+    built.save(rows)
+
+    calls = []
+    real = memory_index._row_terms
+    monkeypatch.setattr(memory_index, "_row_terms", lambda r: calls.append(r) or real(r))
+    more = rows + [{"memory_id": "t50", "text": "word3 late", "created_at": 50.0}]
+    loaded = MemoryIndex(path)
+    loaded.add_rows(more, {})
+    assert calls == [more[-1]]
+    assert loaded.n == 51 and loaded.ids[:50] == built.ids
+    assert np.allclose(loaded.bm25({"word3", "shared"})[:50], built.bm25({"word3", "shared"}), atol=0.05)
+
+    # Rows that no longer match the saved hash are re-tokenized from scratch.
+    changed = [dict(rows[0], text="rewritten")] + rows[1:]
+    calls.clear()
+    MemoryIndex(path).add_rows(changed, {})
+    assert len(calls) == 50
+
+
+def test_embedding_cache_tiers_and_keys(tmp_path):
+    import asyncio
+    from app.embedding_cache import EmbeddingCache
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        return [0.5, 0.25]
+
+    async def run():
+        cache = EmbeddingCache(max_entries=8, disk_dir=tmp_path)
+        assert await cache.get_or_compute("m", 256, "hello", fetch) == [0.5, 0.25]
+        assert await cache.get_or_compute("m", 256, "hello", fetch) == [0.5, 0.25]
+        # Different model or truncation is a different key.
+        await cache.get_or_compute("m2", 256, "hello", fetch)
+        await cache.get_or_compute("m", 128, "hello", fetch)
+        assert len(calls) == 3
+        assert cache.stats()["memory_hits"] == 1 and cache.stats()["misses"] == 3
+
+        # A fresh process-level cache is served from disk.
+        again = EmbeddingCache(max_entries=8, disk_dir=tmp_path)
+        assert await again.get_or_compute("m", 256, "hello", fetch) == [0.5, 0.25]
+        assert len(calls) == 3
+        assert again.stats()["disk_hits"] == 1
+
+    asyncio.run(run())
+
+
+def test_embedding_cache_prunes_disk_by_ttl_and_entry_cap(tmp_path):
+    import os
+    import time
+    from app.embedding_cache import EmbeddingCache
+
+    cache = EmbeddingCache(max_entries=8, disk_dir=tmp_path, disk_max_entries=3, disk_ttl_seconds=3600)
+    now = time.time()
+    for i in range(6):
+        key = f"{i:02d}" + "0" * 62
+        cache._write_disk(key, [float(i)])
+        os.utime(cache._disk_path(key), (now - i * 60, now - i * 60))
+    old = "ff" + "0" * 62
+    cache._write_disk(old, [9.0])
+    os.utime(cache._disk_path(old), (now - 7200, now - 7200))
+
+    assert cache.prune() == 4
+    left = sorted(p.stem[:2] for p in tmp_path.glob("*/*.json"))
+    assert left == ["00", "01", "02"]
+    assert cache.stats()["disk_pruned"] == 4
+
+
+def test_embedding_cache_shares_in_flight_fetch_and_skips_failures():
+    import asyncio
+    from app.embedding_cache import EmbeddingCache
+    cache = EmbeddingCache(max_entries=8)
+    calls = []
+
+    async def slow():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return [1.0]
+
+    async def none():
+        return None
+
+    async def two():
+        return [2.0]
+
+    async def run():
+        out = await asyncio.gather(*[cache.get_or_compute("m", 0, "same", slow) for _ in range(5)])
+        assert out == [[1.0]] * 5 and len(calls) == 1
+        assert cache.stats()["shared_in_flight"] == 4
+        assert await cache.get_or_compute("m", 0, "down", none) is None
+        assert await cache.get_or_compute("m", 0, "down", two) == [2.0]
+        assert cache.stats()["upstream_errors"] == 1
+
+    asyncio.run(run())
+
+
+def test_admin_metrics_report_embedding_cache(client, admin_headers):
+    body = client.get("/admin/metrics", headers=admin_headers).json()
+    assert "hit_rate" in body["embedding_cache"]
+
+
+@pytest.fixture()
+def fake_embeddings(monkeypatch):
+    """Route embedding calls to an in-process fake server; returns its call log."""
+    from app import state
+    from app.embedding_worker import embedding_worker
+    from app.http_client import HttpStatusError
+    from app.routes import memory as memory_routes
+    calls = []
+    fake = {"batch": True, "fail": 0, "fail_text": None}
+
+    def vec(text, model):
+        return [1.0 if "market" in text else 0.0, 1.0, float(len(text)), 1.0 if model == "embed-v2" else 0.0]
+
+    async def post_json(url, payload, timeout=None, headers=None):
+        calls.append((url.rsplit("/", 1)[-1], payload))
+        if fake["fail"]:
+            fake["fail"] -= 1
+            raise OSError("embeddings server down")
+        if fake["fail_text"] and any(fake["fail_text"] in t for t in payload.get("input") or [payload.get("prompt")]):
+            raise OSError("embeddings server rejected input")
+        if url.endswith("/api/embed"):
+            if not fake["batch"]:
+                raise HttpStatusError(404, url)
+            return {"embeddings": [vec(t, payload["model"]) for t in payload["input"]]}
+        return {"embedding": vec(payload["prompt"], payload["model"])}
+
+    monkeypatch.setattr(state, "EMBEDDINGS_BASE_URL", "http://embed.test")
+    monkeypatch.setattr(memory_routes, "EMBEDDINGS_BASE_URL", "http://embed.test")
+    monkeypatch.setattr(state.http_pool, "post_json", post_json)
+    monkeypatch.setattr(state, "_embed_batch_supported", None)
+    monkeypatch.setattr(embedding_worker, "backoff_seconds", 0.0)
+    state.embedding_cache.clear()
+    return calls, fake
+
+
+def test_append_returns_before_embedding_and_worker_batches(client, fake_embeddings):
+    import asyncio
+    from app.embedding_worker import embedding_worker
+    from app.memory_store import memory_store
+    calls, fake = fake_embeddings
+    ids = [_append(client, "mem_worker_a", t)["memory_id"] for t in ("market prices up", "walked home", "market closed")]
+    assert calls == []
+    assert client.get("/memory/mem_worker_a/embeddings/backlog").json()["pending"] == 3
+
+    # Not embedded yet: retrieve ranks by token relevance alone.
+    mems = client.get("/memory/mem_worker_a/retrieve", params={"q": "market", "k": 3}).json()["memories"]
+    assert all(m["relevance_embed"] == 0.0 and m["relevance"] == m["relevance_token"] for m in mems)
+
+    fake["fail"] = 1
+    asyncio.run(embedding_worker.drain())
+    batches = [p["input"] for name, p in calls if name == "embed"]
+    assert batches[-1] == ["market prices up", "walked home", "market closed"]
+    assert embedding_worker.stats()["retries"] == 3
+    assert client.get("/memory/mem_worker_a/embeddings/backlog").json() == {
+        "agent_id": "mem_worker_a", "pending": 0, "in_flight": 0, "oldest_age_seconds": None,
+    }
+    assert set(memory_store.embeddings("mem_worker_a")) == set(ids)
+
+    # Backfill only queues memories that still lack an embedding.
+    assert client.post("/memory/mem_worker_a/embeddings/backfill").json()["queued"] == 0
+
+
+def test_embedding_worker_drops_after_max_attempts(monkeypatch):
+    import asyncio
+    from app import state
+    from app.embedding_worker import EmbeddingWorker
+
+    async def down(texts):
+        return [None] * len(texts)
+
+    monkeypatch.setattr(state, "get_embeddings", down)
+    worker = EmbeddingWorker(batch_size=2, max_attempts=3, backoff_seconds=0.0)
+    for i in range(3):
+        worker.enqueue("mem_worker_b", f"m{i}", f"text {i}")
+    assert not worker.enqueue("mem_worker_b", "m0", "text 0")
+    asyncio.run(worker.drain())
+    s = worker.stats()
+    assert s["dropped"] == 3 and s["pending"] == 0 and s["retries"] == 6
+    assert EmbeddingWorker(backoff_seconds=1.0, backoff_max_seconds=5.0).backoff() == 0.0
+
+
+def test_get_embeddings_falls_back_when_batch_endpoint_missing(fake_embeddings):
+    import asyncio
+    from app import state
+    calls, fake = fake_embeddings
+    fake["batch"] = False
+    out = asyncio.run(state.get_embeddings(["one text", "two text"]))
+    assert [v[2] for v in out] == [8.0, 8.0]
+    assert [name for name, _ in calls] == ["embed", "embeddings", "embeddings"]
+    assert state._embed_batch_supported is False
+    assert asyncio.run(state.get_embeddings(["one text"]))[0] == out[0]
+    assert len(calls) == 3
+
+
+def test_embedding_migration_resumes_and_switches_store(client, fake_embeddings, tmp_path, monkeypatch):
+    import asyncio
+    from app import embedding_versions
+    from app.embedding_migration import EmbeddingMigration
+    from app.embedding_worker import embedding_worker
+    from app.memory_store import memory_store
+    monkeypatch.setattr(embedding_versions, "ACTIVE_PATH", tmp_path / "active.json")
+    monkeypatch.setattr(embedding_versions, "_active", None)
+    calls, fake = fake_embeddings
+    for i in range(5):
+        _append(client, "mem_migrate_a", f"migrate note {i}")
+    _append(client, "mem_migrate_b", "other agent note")
+    asyncio.run(embedding_worker.drain())
+    old = memory_store.embeddings("mem_migrate_a")
+    assert len(old) == 5 and all(v[3] == 0.0 for v in old.values())
+
+    mig = EmbeddingMigration(tmp_path / "migration.json", concurrency=2, batch_size=1, max_attempts=1, backoff_seconds=0.0)
+
+    async def interrupted():
+        fake["fail_text"] = "migrate note 3"
+        mig.start("embed-v2")
+        return await mig.wait()
+
+    p = asyncio.run(interrupted())
+    # One memory could not be embedded: the old store stays live and the job can be resumed.
+    assert p["state"] == "failed" and p["rows_failed"] == 1 and p["active"]["version"] == 0
+    assert p["rows_done"] == p["rows_total"] - 1
+    assert memory_store.embeddings("mem_migrate_a") == old
+
+    fake["fail_text"] = None
+    resumed = EmbeddingMigration(tmp_path / "migration.json", concurrency=2, batch_size=2, max_attempts=1)
+    before = len(calls)
+
+    async def finish():
+        resumed.start("embed-v2")
+        return await resumed.wait()
+
+    p = asyncio.run(finish())
+    assert p["state"] == "completed" and p["version"] == 1 and p["rows_failed"] == 0
+    assert p["active"] == {"version": 1, "model": "embed-v2"}
+    assert p["rows_done"] == p["rows_total"] and p["rows_per_second"] > 0
+    # Only the memories missing from the new store were sent again.
+    assert [pl.get("input") or [pl.get("prompt")] for _, pl in calls[before:]] == [["migrate note 3"]]
+    new = memory_store.embeddings("mem_migrate_a")
+    assert set(new) == set(old) and all(v[3] == 1.0 for v in new.values())
+    assert embedding_versions.reload().model == "embed-v2"
@@ -0,0 +1,80 @@
+"""Tests for the pre-warmed verifier sandbox pool."""
+from __future__ import annotations
+
+import subprocess
+
+import pytest
+
+SNIPPETS = [
+    "print(6 * 7)",
+    "import sys\nprint('out'); print('err', file=sys.stderr)\nsys.exit(3)",
+    "import sys\nsys.exit('bad input')",
+    "raise ValueError('boom')",
+    "def f():\n    raise KeyError('deep')\ntry:\n    f()\nexcept KeyError as e:\n    raise RuntimeError('wrapped') from e",
+    "def f(:\n    pass",
+    "import os, sys\nprint(sys.argv, sys.path[0] == '', __name__)",
+    "import threading\nthreading.Thread(target=lambda: print('late')).start()",
+    "import atexit\natexit.register(lambda: print('bye'))\nprint('hi')",
+    "print('a\\r\\nb')",
+]
+
+
+@pytest.fixture(scope="module")
+def pools(_isolate_data_dir):
+    from app.sandbox import SandboxPool
+    fresh, warm = SandboxPool(0), SandboxPool(1, max_runs=3)
+    yield fresh, warm
+    warm.close()
+
+
+def test_pool_matches_fresh_interpreter(pools):
+    fresh, warm = pools
+    if not warm.enabled:
+        pytest.skip("no fork on this platform")
+    for code in SNIPPETS:
+        a, b = fresh.run_code(code, 15), warm.run_code(code, 15)
+        assert (a.returncode, a.stdout) == (b.returncode, b.stdout), code
+        assert a.stderr == b.stderr, code
+    assert warm.runs == len(SNIPPETS) and warm.fresh_runs == 0
+    # Failed runs and every third run replace the worker.
+    assert warm.recycled >= 4
+
+
+def test_pool_runs_pytest_and_times_out(pools, tmp_path):
+    fresh, warm = pools
+    if not warm.enabled:
+        pytest.skip("no fork on this platform")
+    (tmp_path / "solution.py").write_text("def add(a, b):\n    return a + b\n", encoding="utf-8")
+    test = tmp_path / "test_solution.py"
+    for body, rc in (("assert add(2, 3) == 5", 0), ("assert add(2, 2) == 5", 1)):
+        test.write_text(f"from solution import add\n\ndef test_add():\n    {body}\n", encoding="utf-8")
+        a = fresh.run_pytest([str(test), "-v", "--tb=short"], str(tmp_path), 30)
+        b = warm.run_pytest([str(test), "-v", "--tb=short"], str(tmp_path), 30)
+        assert a.returncode == b.returncode == rc
+        assert ("1 passed" in b.stdout) == (rc == 0) and ("1 passed" in a.stdout) == (rc == 0)
+    with pytest.raises(subprocess.TimeoutExpired):
+        warm.run_code("import time\ntime.sleep(30)", 0.5)
+    assert warm.run_code("print('still fine')", 5).stdout == "still fine\n"
+
+
+def test_verifier_outcomes_use_pool(monkeypatch, make_job):
+    from app.sandbox import sandbox_pool
+    from app.verifiers import auto_verify_task
+    from app.verify_cache import verify_cache
+
+    monkeypatch.setattr(verify_cache, "disk_dir", None)
+
+    def job(body):
+        return make_job(job_id="sbx", title="Sandbox check", body=body, status="submitted")
+
+    runs = sandbox_pool.runs + sandbox_pool.fresh_runs
+    ok = auto_verify_task(job("[verifier:python_run]\n[expected_output:42]"), "```python\nprint(6 * 7)\n```")
+    assert (ok.ok, ok.note, ok.artifacts) == (True, "auto_verify ok: expected output found", {"stdout": "42"})
+    bad = auto_verify_task(job("[verifier:python_run]"), "```python\nraise SystemExit(2)\n```")
+    assert (bad.ok, bad.note) == (False, "auto_verify failed: exit code 2")
+    test_body = "[verifier:python_test]\n```python\nfrom solution import sq\n\ndef test_sq():\n    assert sq(3) == 9\n```"
+    passed = auto_verify_task(job(test_body), "```python\ndef sq(x):\n    return x * x\n```")
+    assert (passed.ok, passed.note) == (True, "auto_verify ok: all tests passed")
+    failed = auto_verify_task(job(test_body), "```python\ndef sq(x):\n    return x + x\n```")
+    assert (failed.ok, failed.note) == (False, "auto_verify failed: tests failed (exit 1)")
+    assert sandbox_pool.runs + sandbox_pool.fresh_runs == runs + 4
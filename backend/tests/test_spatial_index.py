@@ -0,0 +1,61 @@
+"""Tests for the grid spatial index and the proximity queries built on it."""
+from __future__ import annotations
+
+import random
+
+
+def test_radius_queries_match_brute_force_and_follow_moves():
+    from app.models import AgentState
+    from app.spatial_index import SpatialIndex, distance
+
+    rng = random.Random(7)
+    agents = [AgentState(f"g{i}", f"G{i}", rng.randrange(64), rng.randrange(64), 0.0) for i in range(300)]
+    idx = SpatialIndex(cell_size=4)
+    idx.rebuild(agents)
+    for a in agents[:100]:
+        a.x, a.y = rng.randrange(64), rng.randrange(64)
+        idx.update(a)
+    for _ in range(50):
+        x, y, r = rng.randrange(64), rng.randrange(64), rng.choice([0, 1, 2, 5, 10])
+        for metric in ("manhattan", "chebyshev"):
+            want = sorted((a.agent_id, distance(x, y, a.x, a.y, metric)) for a in agents if distance(x, y, a.x, a.y, metric) <= r)
+            assert sorted(idx.agents_within(x, y, r, metric)) == want
+    before = idx.stats()["candidates"]
+    idx.agents_within(30, 30, 1)
+    # Only the 1-2 cells around the point are examined, not all 300 agents.
+    assert idx.stats()["candidates"] - before < 60
+    assert idx.stats()["agents"] == 300 and idx.stats()["rebuilds"] == 1
+
+
+def test_chat_recipients_come_from_the_index(client):
+    for aid, (x, y) in {"sp_a": (25, 25), "sp_b": (26, 25), "sp_c": (25, 31), "sp_d": (31, 31)}.items():
+        client.post(f"/agents/{aid}/move", json={"x": x, "y": y})
+    r = client.post("/chat/say", json={"sender_id": "sp_a", "sender_name": "A", "text": "psst, neighbour"})
+    assert r.json()["recipients"] == ["sp_b"]
+    r = client.post("/chat/shout", json={"sender_id": "sp_a", "sender_name": "A", "text": "hello everyone out there"})
+    recipients = r.json()["recipients"]
+    assert recipients[:2] == ["sp_b", "sp_c"] and "sp_d" not in recipients
+
+
+def test_world_reports_nearby_for_the_requesting_agent(client):
+    from app.config import LANDMARKS
+
+    cafe = next(lm for lm in LANDMARKS if lm["id"] == "cafe")
+    client.post("/agents/sp_here/move", json={"x": cafe["x"] + 1, "y": cafe["y"]})
+    client.post("/agents/sp_near/move", json={"x": cafe["x"] + 3, "y": cafe["y"] + 2})
+    client.post("/agents/sp_far/move", json={"x": cafe["x"] + 4, "y": cafe["y"]})
+    shared = client.get("/world")
+    assert "nearby" not in shared.json()
+    r = client.get("/world", params={"agent_id": "sp_here"})
+    nearby = r.json()["nearby"]
+    assert nearby["agent_id"] == "sp_here" and nearby["place_id"] == "cafe"
+    ids = [a["agent_id"] for a in nearby["agents"]]
+    assert "sp_near" in ids and "sp_far" not in ids
+    assert nearby["landmarks"][0]["id"] == "cafe" and nearby["landmarks"][0]["distance"] == 1
+    # Per-agent ETag: distinct from the shared one, and 304 until the world changes.
+    etag = r.headers["etag"]
+    assert etag != shared.headers["etag"]
+    assert client.get("/world", params={"agent_id": "sp_here"}, headers={"If-None-Match": etag}).status_code == 304
+    client.post("/agents/sp_far/move", json={"x": cafe["x"] + 2, "y": cafe["y"]})
+    r = client.get("/world", params={"agent_id": "sp_here"}, headers={"If-None-Match": etag})
+    assert r.status_code == 200 and "sp_far" in [a["agent_id"] for a in r.json()["nearby"]["agents"]]
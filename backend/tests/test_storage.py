@@ -0,0 +1,94 @@
+"""Tests for the SQLite storage backend and the JSONL import tool."""
+from __future__ import annotations
+
+import json
+
+import pytest
+
+
+def test_sqlite_streams_cursors_and_indexes(tmp_path):
+    from app.storage import SqliteStorage
+    db = SqliteStorage(tmp_path / "s.db")
+    db.open()
+    for i in range(5):
+        db.append("economy", {"entry_id": f"e{i}", "from_id": "a" if i % 2 else "", "to_id": "b", "amount": float(i)})
+    db.append("memory:agent1", {"memory_id": "m1", "text": "hello"})
+    db.append("memory:agent2", {"memory_id": "m2", "text": "other"})
+    # Reads see committed rows only; flush for read-your-writes.
+    db.flush()
+
+    assert [r["entry_id"] for r in db.read("economy", limit=2)] == ["e3", "e4"]
+    cur = db.cursor("economy")
+    token = db.cursor_token("economy", cur)
+    db.append("economy", {"entry_id": "e5", "to_id": "c", "amount": 1.0})
+    db.flush()
+    assert [r["entry_id"] for r in db.read_after("economy", cur)] == ["e5"]
+    assert db.cursor_token("economy", cur) == token
+    assert [r["entry_id"] for r in db.ledger_for_account("a")] == ["e1", "e3"]
+    assert [r["memory_id"] for r in db.read("memory:agent1")] == ["m1"]
+
+    db.rewrite("memory:agent1", [{"memory_id": "m9", "text": "rewritten"}])
+    assert [r["memory_id"] for r in db.read("memory:agent1")] == ["m9"]
+    assert [r["memory_id"] for r in db.read("memory:agent2")] == ["m2"]
+    db.close()
+
+
+def test_sqlite_job_index(tmp_path):
+    from app.storage import SqliteStorage
+    db = SqliteStorage(tmp_path / "j.db")
+    db.open()
+    db.append_job_event({"event_id": "1", "job_id": "j1", "event_type": "create"},
+                        {"job_id": "j1", "status": "open", "title": "[run:r1] a", "created_at": 1.0})
+    db.append_job_event({"event_id": "2", "job_id": "j2", "event_type": "create"},
+                        {"job_id": "j2", "status": "submitted", "title": "[run:r1] b", "created_at": 2.0})
+    db.append_job_event({"event_id": "3", "job_id": "j3", "event_type": "create"},
+                        {"job_id": "j3", "status": "submitted", "title": "[run:r2] c", "created_at": 3.0})
+    db.flush()
+    assert db.query_jobs(status="submitted", run_id="r1") == ["j2"]
+    assert db.query_jobs(status="submitted") == ["j3", "j2"]
+    db.delete_jobs(["j3"])
+    db.flush()
+    assert db.job_count() == 2
+    db.close()
+
+
+def test_backend_missing_a_method_fails_at_construction():
+    from app.storage import JsonlStorage, SqliteStorage, StorageEngine
+
+    class Partial(StorageEngine):
+        def append(self, stream, row):
+            pass
+
+    with pytest.raises(TypeError, match="abstract"):
+        Partial()
+    assert not JsonlStorage.__abstractmethods__ and not SqliteStorage.__abstractmethods__
+
+
+def test_migrate_imports_data_dir(tmp_path):
+    from app.migrate_storage import migrate
+    from app.storage import SqliteStorage
+    data = tmp_path / "data"
+    (data / "memory").mkdir(parents=True)
+    (data / "chat_messages.jsonl").write_text(
+        "".join(json.dumps({"msg_id": str(i), "sender_id": "x", "text": "hi"}) + "\n" for i in range(3)), encoding="utf-8")
+    (data / "memory" / "agent_a.jsonl").write_text(json.dumps({"memory_id": "m", "text": "t"}) + "\n", encoding="utf-8")
+    (data / "agents.json").write_text(json.dumps({"x": {"agent_id": "x", "display_name": "X", "x": 1, "y": 2}}), encoding="utf-8")
+    counts = migrate(data, tmp_path / "m.db")
+    assert counts["chat"] == 3 and counts["memory"] == 1 and counts["agents"] == 1
+
+    db = SqliteStorage(tmp_path / "m.db")
+    assert len(db.read("chat")) == 3
+    assert db.read("memory:agent_a")[0]["memory_id"] == "m"
+    assert db.load_doc("agents")["x"]["y"] == 2
+    db.close()
+    with pytest.raises(RuntimeError, match="already contains data"):
+        migrate(data, tmp_path / "m.db")
+
+
+def test_economy_ledger_by_account(client, admin_headers):
+    client.post("/economy/award", json={"to_id": "ledger_acct", "amount": 3.0, "reason": "seed", "by": "test"}, headers=admin_headers)
+    r = client.get("/economy/ledger", params={"account": "ledger_acct"})
+    assert r.status_code == 200
+    body = r.json()
+    assert body["entries"] and all("ledger_acct" in (e["from_id"], e["to_id"]) for e in body["entries"])
+    assert body["balance"] >= 3.0
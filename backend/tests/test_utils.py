@@ -0,0 +1,38 @@
+"""Tests for JSONL helpers in app.utils."""
+from __future__ import annotations
+
+import json
+
+from app.utils import read_jsonl, read_jsonl_tail
+
+
+def _write_messy_log(path):
+    lines = []
+    for i in range(200):
+        lines.append(json.dumps({"i": i, "pad": "x" * (i % 17)}))
+        if i % 23 == 0:
+            lines.append("{not json")
+        if i % 31 == 0:
+            lines.append("   ")
+    # Truncated write at the end of the file (no trailing newline).
+    path.write_text("\n".join(lines) + "\n" + '{"i": 999, "partial', encoding="utf-8")
+
+
+def test_tail_matches_full_parse(tmp_path):
+    p = tmp_path / "log.jsonl"
+    _write_messy_log(p)
+    full = read_jsonl(p)
+    for limit in (1, 2, 5, 40, 199, 200, 500):
+        for block in (7, 64, 4096):
+            assert read_jsonl_tail(p, limit, block_size=block) == full[-limit:]
+
+
+def test_tail_keeps_complete_last_line_without_newline(tmp_path):
+    p = tmp_path / "log.jsonl"
+    p.write_text('{"i": 1}\n{"i": 2}', encoding="utf-8")
+    assert read_jsonl(p, limit=1) == [{"i": 2}]
+    assert read_jsonl_tail(p, 5, block_size=3) == [{"i": 1}, {"i": 2}]
+
+
+def test_tail_missing_file(tmp_path):
+    assert read_jsonl_tail(tmp_path / "nope.jsonl", 10) == []
@@ -0,0 +1,92 @@
+"""Tests for the persistent auto-verify outcome cache."""
+from __future__ import annotations
+
+import pytest
+
+
+@pytest.fixture()
+def cache_job(make_job):
+    return lambda body, title="Cache check": make_job(job_id="vc", title=title, body=body, status="submitted")
+
+
+@pytest.fixture()
+def cache(tmp_path, monkeypatch):
+    from app.verify_cache import verify_cache
+    monkeypatch.setattr(verify_cache, "disk_dir", tmp_path / "verify_cache")
+    monkeypatch.setattr(verify_cache, "ttl_seconds", 3600.0)
+    return verify_cache
+
+
+def test_resubmitted_code_hits_cache(cache, monkeypatch, cache_job):
+    from app.sandbox import sandbox_pool
+    from app.verifiers import auto_verify_task
+
+    runs = []
+    real = sandbox_pool.run_code
+    monkeypatch.setattr(sandbox_pool, "run_code", lambda code, timeout: runs.append(code) or real(code, timeout))
+    job = cache_job("[verifier:python_run]\n[expected_output:42]")
+    first = auto_verify_task(job, "Here you go:\n```python\nprint(6 * 7)\n```")
+    assert first.ok and first.artifacts["cache"]["hit"] is False and first.artifacts["cache"]["stored"]
+    # Redo with different prose, CRLF line endings and trailing spaces: same code, no new run.
+    again = auto_verify_task(job, "Redo, now with evidence.\r\n```python\r\nprint(6 * 7)   \r\n```\r\n## Evidence")
+    assert again.artifacts["cache"]["hit"] is True and again.artifacts["cache"]["key"] == first.artifacts["cache"]["key"]
+    assert (again.ok, again.note, again.artifacts["stdout"]) == (first.ok, first.note, first.artifacts["stdout"])
+    assert len(runs) == 1
+    # A different expected_output is a different spec.
+    other = auto_verify_task(cache_job("[verifier:python_run]\n[expected_output:43]"), "```python\nprint(6 * 7)\n```")
+    assert other.artifacts["cache"]["hit"] is False and not other.ok
+    assert len(runs) == 2
+
+
+def test_llm_judge_cache_skips_unavailable_and_expires(cache, monkeypatch, cache_job):
+    import time
+
+    from app import verifiers
+
+    calls = []
+    verdict = [None]
+
+    def judge(task, submission):
+        calls.append(submission)
+        return verdict[0]
+
+    monkeypatch.setattr(verifiers, "_llm_judge_call", judge)
+    job = cache_job("Write a haiku about queues.\n[verifier:llm_judge]")
+    out = verifiers.auto_verify_task(job, "waiting in a line")
+    assert out.note == "auto_verify failed: llm_judge unavailable" and out.artifacts["cache"]["stored"] is False
+    verdict[0] = (True, "fine haiku")
+    out = verifiers.auto_verify_task(job, "waiting in a line")
+    assert out.ok and out.artifacts["cache"]["hit"] is False and len(calls) == 2
+    out = verifiers.auto_verify_task(job, "  waiting   in a\nline ")
+    assert out.ok and out.artifacts["cache"]["hit"] is True and len(calls) == 2
+    # Past the TTL the entry is dropped and the judge is asked again.
+    real_time = time.time
+    monkeypatch.setattr(time, "time", lambda: real_time() + 7200.0)
+    out = verifiers.auto_verify_task(job, "waiting in a line")
+    assert out.artifacts["cache"]["hit"] is False and len(calls) == 3
+    assert cache.expired == 1
+
+
+def test_cached_async_keeps_file_io_off_the_event_loop(cache, monkeypatch):
+    import asyncio
+    import threading
+
+    from app.models import AutoVerifyOutcome
+
+    io_threads = []
+    real_get, real_put = cache.get, cache.put
+    monkeypatch.setattr(cache, "get", lambda key: io_threads.append(threading.get_ident()) or real_get(key))
+    monkeypatch.setattr(cache, "put", lambda key, out: io_threads.append(threading.get_ident()) or real_put(key, out))
+
+    async def compute():
+        return AutoVerifyOutcome(matched=True, ok=True, note="fine", verifier="llm_judge", artifacts={}), True
+
+    async def run():
+        loop_thread = threading.get_ident()
+        first = await cache.cached_async("llm_judge", ["spec"], "subject", compute)
+        again = await cache.cached_async("llm_judge", ["spec"], "subject", compute)
+        return loop_thread, first, again
+
+    loop_thread, first, again = asyncio.run(run())
+    assert first.artifacts["cache"]["stored"] and again.artifacts["cache"]["hit"] is True
+    assert len(io_threads) == 3 and loop_thread not in io_threads
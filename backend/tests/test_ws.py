@@ -0,0 +1,207 @@
+"""Tests for per-connection WebSocket send queues."""
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+
+
+class FakeWS:
+    def __init__(self, delay: float = 0.0) -> None:
+        self.delay = delay
+        self.gate = asyncio.Event()
+        self.gate.set()
+        self.texts = []
+        self.closed_with = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        await self.gate.wait()
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.texts.append(text)
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+def test_stalled_client_does_not_delay_broadcast_or_others():
+    from app.ws import WSManager
+
+    async def run():
+        m = WSManager(max_queued=4, policy="drop_oldest", send_timeout=5.0)
+        fast, stalled = FakeWS(), FakeWS()
+        stalled.gate.clear()
+        await m.connect(fast)
+        await m.connect(stalled)
+        took = 0.0
+        for i in range(10):
+            t0 = time.perf_counter()
+            await m.broadcast({"type": "chat", "data": {"i": i}})
+            took = max(took, time.perf_counter() - t0)
+            await asyncio.sleep(0.005)
+        await asyncio.sleep(0.05)
+        stats = {c["client_id"]: c for c in m.stats()["clients"]}
+        stalled.gate.set()
+        await asyncio.sleep(0.05)
+        return m, fast, stalled, took, stats
+
+    m, fast, stalled, took, stats = asyncio.run(run())
+    assert took < 0.005
+    assert [json.loads(t)["data"]["i"] for t in fast.texts] == list(range(10))
+    # The stalled client was mid-send on message 0; it keeps the newest 4 of the rest.
+    assert [json.loads(t)["data"]["i"] for t in stalled.texts] == [0, 6, 7, 8, 9]
+    lagging = [c for c in stats.values() if c["dropped"]]
+    assert len(lagging) == 1 and lagging[0]["dropped"] == 5 and lagging[0]["queued"] == 4
+    assert lagging[0]["lag_seconds"] > 0
+    # Serialized once: every client got the identical text.
+    assert fast.texts[-1] == stalled.texts[-1] == json.dumps({"type": "chat", "data": {"i": 9}}, separators=(",", ":"))
+
+
+def test_coalesce_keeps_only_the_latest_world_state():
+    from app.ws import WSManager
+
+    async def run():
+        m = WSManager(max_queued=8, policy="coalesce")
+        ws = FakeWS()
+        ws.gate.clear()
+        await m.connect(ws)
+        await m.broadcast({"type": "chat", "data": 0})
+        await asyncio.sleep(0.01)
+        for n in range(5):
+            await m.broadcast({"type": "world_state", "data": n})
+        await m.broadcast({"type": "chat", "data": 1})
+        ws.gate.set()
+        await asyncio.sleep(0.05)
+        return m, ws
+
+    m, ws = asyncio.run(run())
+    assert [(json.loads(t)["type"], json.loads(t)["data"]) for t in ws.texts] == [
+        ("chat", 0), ("world_state", 4), ("chat", 1),
+    ]
+    assert m.stats()["coalesced"] == 4 and m.stats()["dropped"] == 0
+
+
+def test_coalesced_world_state_is_never_sent_ahead_of_older_deltas():
+    from app.ws import WSManager
+
+    async def run():
+        m = WSManager(max_queued=16, policy="coalesce")
+        ws = FakeWS()
+        ws.gate.clear()
+        await m.connect(ws)
+        await m.broadcast({"type": "chat", "data": 0})
+        await asyncio.sleep(0.01)
+        await m.broadcast({"type": "world_state", "version": 1})
+        for v in (2, 3):
+            await m.broadcast({"type": "world_delta", "version": v})
+        await m.broadcast({"type": "chat", "data": 1})
+        await m.broadcast({"type": "world_state", "version": 3})
+        await m.broadcast({"type": "world_delta", "version": 4})
+        ws.gate.set()
+        await asyncio.sleep(0.05)
+        return m, ws
+
+    m, ws = asyncio.run(run())
+    got = [json.loads(t) for t in ws.texts]
+    assert [(g["type"], g.get("version", g.get("data"))) for g in got] == [
+        ("chat", 0), ("chat", 1), ("world_state", 3), ("world_delta", 4),
+    ]
+    assert m.stats()["coalesced"] == 3
+
+
+def test_disconnect_policy_and_send_timeout_close_slow_clients():
+    from app.ws import WSManager
+
+    async def run():
+        full = WSManager(max_queued=2, policy="disconnect")
+        ws = FakeWS()
+        ws.gate.clear()
+        await full.connect(ws)
+        for i in range(4):
+            await full.broadcast({"type": "chat", "data": i})
+        ws.gate.set()
+        await asyncio.sleep(0.05)
+
+        stuck = WSManager(max_queued=8, policy="coalesce", send_timeout=0.05)
+        ws2 = FakeWS()
+        ws2.gate.clear()
+        await stuck.connect(ws2)
+        await stuck.broadcast({"type": "chat", "data": 0})
+        await asyncio.sleep(0.2)
+        return full, ws, stuck, ws2
+
+    full, ws, stuck, ws2 = asyncio.run(run())
+    assert ws.closed_with == 1013 and full.stats()["connections"] == 0 and full.stats()["slow_disconnects"] == 1
+    assert ws2.closed_with == 1013 and stuck.stats()["connections"] == 0 and ws2.texts == []
+
+
+def test_ws_world_endpoint_streams_snapshot_and_broadcasts(client):
+    with client.websocket_connect("/ws/world") as ws:
+        first = ws.receive_json()
+        assert first["type"] == "world_state" and {"day", "minute_of_day"} <= set(first["data"])
+        client.post("/chat/say", json={"sender_id": "ws_tester", "sender_name": "WS", "text": "hello sockets"})
+        while True:
+            msg = ws.receive_json()
+            if msg["type"] == "chat":
+                break
+        assert msg["data"]["text"] == "hello sockets"
+
+
+def _next_world_message(ws):
+    while True:
+        msg = ws.receive_json()
+        if msg["type"] in ("world_state", "world_delta"):
+            return msg
+
+
+def test_world_changes_stream_as_versioned_deltas_with_resync(client):
+    with client.websocket_connect("/ws/world") as ws:
+        snap = ws.receive_json()
+        assert snap["type"] == "world_state" and snap["version"] == snap["data"]["version"]
+        v = snap["version"]
+        client.post("/agents/upsert", json={"agent_id": "delta_walker", "display_name": "Walker"})
+        client.post("/agents/delta_walker/move", json={"x": 5, "y": 6})
+        client.post("/chat/topic/set", json={"topic": "deltas", "by_agent_id": "delta_walker", "by_agent_name": "Walker"})
+        joined, moved, topic = (_next_world_message(ws) for _ in range(3))
+        assert [(m["type"], m["op"], m["version"]) for m in (joined, moved, topic)] == [
+            ("world_delta", "agent_joined", v + 1), ("world_delta", "agent_moved", v + 2), ("world_delta", "topic", v + 3),
+        ]
+        assert (moved["data"]["agent_id"], moved["data"]["x"], moved["data"]["y"]) == ("delta_walker", 5, 6)
+        assert topic["data"]["topic"] == "deltas"
+        # Older clients still get the standalone topic message.
+        legacy = ws.receive_json()
+        while legacy["type"] != "topic":
+            legacy = ws.receive_json()
+        assert legacy["data"]["topic"] == "deltas"
+        # A client that missed a delta asks for the full state and picks up from its version.
+        ws.send_text(json.dumps({"type": "resync"}))
+        full = _next_world_message(ws)
+        assert full["type"] == "world_state" and full["version"] == v + 3
+        assert {"agent_id": "delta_walker", "display_name": "Walker", "x": 5, "y": 6} == {
+            k: a[k] for a in full["data"]["agents"] if a["agent_id"] == "delta_walker" for k in ("agent_id", "display_name", "x", "y")
+        }
+    assert client.get("/world").json()["version"] == v + 3
+
+
+def test_full_snapshot_follows_every_n_deltas(monkeypatch):
+    from app import world_feed as wf
+
+    sent = []
+
+    async def fake_broadcast(msg):
+        sent.append(msg)
+
+    monkeypatch.setattr(wf.ws_manager, "broadcast", fake_broadcast)
+    feed = wf.WorldFeed(full_every=3)
+
+    async def run():
+        for i in range(7):
+            await feed.publish("board_post", {"post_id": f"p{i}"})
+
+    asyncio.run(run())
+    assert [m["type"] for m in sent] == ["world_delta"] * 3 + ["world_state"] + ["world_delta"] * 3 + ["world_state"] + ["world_delta"]
+    assert sent[3]["version"] == sent[2]["version"] and sent[4]["version"] == sent[3]["version"] + 1
+    assert feed.stats()["snapshots"] == 2